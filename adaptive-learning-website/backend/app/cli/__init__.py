@@ -0,0 +1,5 @@
+"""
+Command-line entry points for offline jobs (training, batch scoring, ...).
+
+Run them from the backend directory, e.g. `python -m app.cli.train data.csv`.
+"""
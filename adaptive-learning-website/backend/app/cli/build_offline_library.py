@@ -0,0 +1,108 @@
+"""
+Build the offline content library served while Gemini is unavailable.
+
+Covers every saga chapter topic from the default journeys, plus the most
+completed topics from the chapter recommender (--recommender/--popular)
+and any topics listed in --topics (one per line). For each topic it
+generates all three lesson modes, a quiz bank and the requested diagrams
+with the bulk-generation runner, so concurrency, quota aborts and diagram
+validation match mentor batches. Content already in the content store
+(CONTENT_STORE_PATH) is reused without calling Gemini. The output file is
+what OFFLINE_LIBRARY_PATH points the API at.
+
+Usage (from the backend directory; needs GEMINI_API_KEY):
+
+    python -m app.cli.build_offline_library --output models/offline_library.bin \\
+        --recommender models/recommender.npz --popular 200
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ..services.bulk_generation import BulkGenerationService
+from ..services.gemini import GeminiService
+from ..services.offline_library import DIAGRAM, LESSON, QUIZ, normalize_topic, write_library
+from ..services.personalization import PersonalizationService
+from ..services.recommender import ChapterRecommender
+
+
+def _topics(args: argparse.Namespace) -> List[str]:
+    topics = PersonalizationService().seed_topics()
+    if args.recommender and args.popular > 0:
+        recommender = ChapterRecommender.load(args.recommender)
+        order = np.argsort(-recommender.counts, kind="stable")[:args.popular]
+        topics += [recommender.items[i] for i in order]
+    if args.topics:
+        with open(args.topics, encoding="utf-8") as f:
+            topics += [line.strip() for line in f if line.strip()]
+    by_key = {}
+    for topic in topics:
+        by_key.setdefault(normalize_topic(topic), " ".join(topic.split()))
+    return list(by_key.values())
+
+
+# Bulk-generation tools -> library entry kinds.
+_KINDS = {"explain": LESSON, "quiz": QUIZ, "visualize": DIAGRAM}
+
+
+async def _generate(
+    service: GeminiService, topics: List[str], diagrams: List[str], num_questions: int, concurrency: int
+) -> Tuple[List[Tuple[str, str, str, str]], int]:
+    """
+    Runs the topics through the bulk runner (GeminiService.precompute),
+    then packs what landed in the assigned cache. Diagrams that stay
+    invalid after repair fail there and are left out.
+    """
+    runner = BulkGenerationService(service, concurrency=concurrency, max_topics=max(1, len(topics)))
+    job = runner.submit("offline-library", topics, diagram_types=diagrams, num_questions=num_questions)
+    await runner.drain()
+    for error in job.errors:
+        print(f"⚠️ {error}", file=sys.stderr)
+    entries: List[Tuple[str, str, str, str]] = []
+    for tool, topic, variant in job.units:
+        value = service.precomputed(tool, topic, variant, num_questions=num_questions)
+        if value is None:
+            continue
+        text = json.dumps(value, ensure_ascii=False) if tool == "quiz" else value
+        entries.append((_KINDS[tool], topic, variant or "", text))
+    return entries, len(job.units) - len(entries)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the offline content library.")
+    parser.add_argument("--output", required=True, help="Output library path")
+    parser.add_argument("--recommender", help="Recommender .npz to take popular topics from")
+    parser.add_argument("--popular", type=int, default=100, help="Most completed topics to include")
+    parser.add_argument("--topics", help="Extra topics, one per line")
+    parser.add_argument("--diagrams", default="flowchart", help="Comma-separated diagram types")
+    parser.add_argument("--num-questions", type=int, default=10, help="Quiz bank size per topic")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    try:
+        topics = _topics(args)
+    except (OSError, KeyError, ValueError) as exc:
+        print(f"[build_offline_library] failed: {exc}", file=sys.stderr)
+        return 1
+    diagrams = [d.strip().lower() for d in args.diagrams.split(",") if d.strip()]
+    started = time.perf_counter()
+    service = GeminiService(prefetch=False)
+    entries, failed = asyncio.run(_generate(service, topics, diagrams, args.num_questions, args.concurrency))
+    if not entries:
+        print("[build_offline_library] failed: nothing was generated", file=sys.stderr)
+        return 1
+    written = write_library(args.output, entries, meta={"model": service.router.model_ids[0]})
+    print(
+        f"✅ Packed {written} entries for {len(topics)} topics ({failed} failed) "
+        f"in {time.perf_counter() - started:.1f}s -> {args.output}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
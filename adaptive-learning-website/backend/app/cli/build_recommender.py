@@ -0,0 +1,70 @@
+"""
+Build the next-chapter neighbour table from saga completion data.
+
+Input is an export of `saga_progress` (CSV or parquet) with columns
+student_id, chapter_id, status. Only completed rows count. When a `topic`
+column is present it is used instead of chapter_id, so personalized
+chapters (one UUID per student) still line up across students. The output
+.npz is what RECOMMENDER_PATH points the API at.
+
+Usage (from the backend directory):
+
+    python -m app.cli.build_recommender saga_progress.csv --output models/recommender.npz
+"""
+import argparse
+import sys
+import time
+from typing import List, Optional
+
+import pandas as pd
+
+from ..services.recommender import build_neighbors
+
+
+REQUIRED_COLUMNS = ["student_id", "chapter_id", "status"]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Build the saga chapter recommender.")
+    parser.add_argument("input", help="CSV or parquet export of saga_progress")
+    parser.add_argument("--output", required=True, help="Output .npz path")
+    parser.add_argument("--neighbors", type=int, default=20, help="Neighbours kept per chapter/topic")
+    parser.add_argument("--shrinkage", type=float, default=10.0)
+    parser.add_argument("--min-support", type=int, default=2, help="Minimum co-completions per pair")
+    args = parser.parse_args(argv)
+
+    if args.input.endswith(".parquet"):
+        frame = pd.read_parquet(args.input)
+    else:
+        frame = pd.read_csv(args.input)
+    missing = [c for c in REQUIRED_COLUMNS if c not in frame.columns]
+    if missing:
+        print(f"[build_recommender] failed: missing columns {missing}", file=sys.stderr)
+        return 1
+    frame = frame[frame["status"] == "completed"]
+    if frame.empty:
+        print("[build_recommender] failed: no completed rows", file=sys.stderr)
+        return 1
+    items = frame["chapter_id"].astype(str)
+    if "topic" in frame.columns:
+        items = frame["topic"].fillna(items).astype(str)
+
+    started = time.perf_counter()
+    recommender = build_neighbors(
+        frame["student_id"].to_numpy(),
+        items.to_numpy(),
+        k=args.neighbors,
+        shrinkage=args.shrinkage,
+        min_support=args.min_support,
+    )
+    recommender.save(args.output)
+    stats = recommender.stats()
+    print(
+        f"✅ Built neighbours for {stats['items']} chapters/topics from {len(frame)} completions "
+        f"({stats['students']} students) in {time.perf_counter() - started:.1f}s -> {args.output}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
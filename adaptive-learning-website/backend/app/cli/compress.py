@@ -0,0 +1,174 @@
+"""
+Model compression and distillation candidates for the training pipeline.
+
+`python -m app.cli.train data.csv --compress` builds a set of smaller models
+from the trained forest (the "teacher") and benchmarks each against it on
+accuracy, fidelity to the teacher, serialized size, load time and
+single-row/batch latency. Pass `--serve-candidate NAME` to ship one of them
+as the artifact's model instead of the full forest.
+
+Candidates:
+  - pruned_forest_<k>: the first k trees of the teacher, no retraining.
+  - shallow_forest_d<d>: a small depth-capped forest fit on teacher labels.
+  - distilled_gbdt: histogram gradient boosting fit on teacher labels; its
+    split thresholds are quantized to at most 64 bins per feature.
+  - distilled_logistic: logistic regression over one-hot categoricals and
+    quantile-binned (quantized) numeric features, fit on teacher labels.
+"""
+import copy
+import pickle
+import time
+import warnings
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..services.model_artifact import CATEGORICAL_FEATURES, FEATURE_COLUMNS
+
+
+TEACHER = "teacher"
+
+# Rows timed one at a time for the single-row latency figure.
+SINGLE_ROW_SAMPLES = 200
+BATCH_ROWS = 1000
+
+
+def _pruned_forest(teacher: Any, n_trees: int) -> Any:
+    pruned = copy.copy(teacher)
+    pruned.estimators_ = teacher.estimators_[:n_trees]
+    pruned.n_estimators = len(pruned.estimators_)
+    return pruned
+
+
+def _quantized_logistic(random_state: int) -> Any:
+    from sklearn.compose import ColumnTransformer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import KBinsDiscretizer, OneHotEncoder
+
+    categorical_idx = [FEATURE_COLUMNS.index(c) for c in CATEGORICAL_FEATURES]
+    numeric_idx = [i for i in range(len(FEATURE_COLUMNS)) if i not in categorical_idx]
+    features = ColumnTransformer([
+        ("categorical", OneHotEncoder(handle_unknown="ignore"), categorical_idx),
+        ("numeric", KBinsDiscretizer(n_bins=8, encode="onehot", strategy="quantile"), numeric_idx),
+    ])
+    return Pipeline([
+        ("features", features),
+        ("model", LogisticRegression(max_iter=500, random_state=random_state)),
+    ])
+
+
+def build_candidates(
+    teacher: Any,
+    X_train: np.ndarray,
+    random_state: int = 42,
+) -> Dict[str, Any]:
+    """
+    Build compressed candidates from a fitted RandomForestClassifier.
+
+    Students are fit on the teacher's own predictions so they learn its
+    decision surface rather than re-learning the noisy labels.
+    """
+    from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+
+    teacher_labels = teacher.predict(X_train)
+    candidates: Dict[str, Any] = {TEACHER: teacher}
+
+    for n_trees in (25, 50):
+        if n_trees < len(teacher.estimators_):
+            candidates[f"pruned_forest_{n_trees}"] = _pruned_forest(teacher, n_trees)
+
+    shallow = RandomForestClassifier(
+        n_estimators=30, max_depth=6, min_samples_leaf=2, random_state=random_state, n_jobs=1
+    )
+    candidates["shallow_forest_d6"] = shallow.fit(X_train, teacher_labels)
+
+    if len(np.unique(teacher_labels)) > 1:
+        gbdt = HistGradientBoostingClassifier(
+            max_iter=60, max_depth=4, max_bins=63, random_state=random_state
+        )
+        candidates["distilled_gbdt"] = gbdt.fit(X_train, teacher_labels)
+
+        with warnings.catch_warnings():
+            # Quantile binning warns about collapsed bins on low-cardinality columns.
+            warnings.simplefilter("ignore")
+            logistic = _quantized_logistic(random_state)
+            candidates["distilled_logistic"] = logistic.fit(X_train, teacher_labels)
+
+    return candidates
+
+
+def _median_ms(fn, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return float(np.median(timings))
+
+
+def benchmark_candidates(
+    candidates: Dict[str, Any],
+    X_test: np.ndarray,
+    y_test: np.ndarray,
+    latency_budget_ms: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Compare every candidate with the teacher on held-out data.
+
+    Returns {"candidates": [...], "recommended": name} where the recommendation
+    is the most accurate candidate whose single-row p50 fits the budget.
+    """
+    teacher_pred = candidates[TEACHER].predict(X_test)
+    batch = X_test[:BATCH_ROWS]
+    rows = [X_test[i:i + 1] for i in range(min(SINGLE_ROW_SAMPLES, len(X_test)))]
+
+    results: List[Dict[str, Any]] = []
+    for name, model in candidates.items():
+        blob = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+        predictions = model.predict(X_test)
+
+        single = []
+        for row in rows:
+            started = time.perf_counter()
+            model.predict(row)
+            single.append((time.perf_counter() - started) * 1000)
+
+        results.append({
+            "name": name,
+            "accuracy": round(float(np.mean(predictions == y_test)), 4),
+            "fidelity": round(float(np.mean(predictions == teacher_pred)), 4),
+            "size_kb": round(len(blob) / 1024, 1),
+            "load_ms": round(_median_ms(lambda: pickle.loads(blob), 3), 3),
+            "single_row_p50_ms": round(float(np.percentile(single, 50)), 3) if single else None,
+            "single_row_p95_ms": round(float(np.percentile(single, 95)), 3) if single else None,
+            "batch_ms": round(_median_ms(lambda: model.predict(batch), 3), 3),
+            "batch_rows": int(len(batch)),
+        })
+
+    eligible = [
+        r for r in results
+        if latency_budget_ms is None
+        or (r["single_row_p50_ms"] is not None and r["single_row_p50_ms"] <= latency_budget_ms)
+    ]
+    recommended = max(eligible, key=lambda r: (r["accuracy"], -r["single_row_p50_ms"]))["name"] if eligible else None
+    return {
+        "latency_budget_ms": latency_budget_ms,
+        "recommended": recommended,
+        "candidates": results,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    header = (
+        f"{'candidate':<22}{'acc':>8}{'fidelity':>10}{'size KB':>11}"
+        f"{'load ms':>10}{'1-row ms':>10}{'batch ms':>10}"
+    )
+    lines = [header, "-" * len(header)]
+    for r in report["candidates"]:
+        marker = " *" if r["name"] == report["recommended"] else ""
+        lines.append(
+            f"{r['name']:<22}{r['accuracy']:>8.4f}{r['fidelity']:>10.4f}{r['size_kb']:>11.1f}"
+            f"{r['load_ms']:>10.2f}{r['single_row_p50_ms']:>10.3f}{r['batch_ms']:>10.2f}{marker}"
+        )
+    return "\n".join(lines)
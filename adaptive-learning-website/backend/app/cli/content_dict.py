@@ -0,0 +1,52 @@
+"""
+Train a zlib preset dictionary on stored lessons and activate it.
+
+Samples the most recent documents in the content store, builds a dictionary
+with train_dictionary() and makes it the one new blobs are compressed with.
+`--recompress` also re-encodes the existing blobs with it.
+
+Usage (from the backend directory):
+
+    python -m app.cli.content_dict --store data/content.db --size 16384 --recompress
+"""
+import argparse
+import os
+import sys
+from typing import List, Optional
+
+from ..services.content_store import ContentStore, train_dictionary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Train and activate a content store dictionary.")
+    parser.add_argument("--store", default=os.getenv("CONTENT_STORE_PATH"), help="Content store SQLite path")
+    parser.add_argument("--size", type=int, default=16 * 1024, help="Dictionary size in bytes (max 32768)")
+    parser.add_argument("--samples", type=int, default=2000, help="How many recent documents to train on")
+    parser.add_argument("--recompress", action="store_true", help="Re-encode existing blobs with the new dictionary")
+    args = parser.parse_args(argv)
+
+    if not args.store or not os.path.exists(args.store):
+        print("[content_dict] failed: pass --store or set CONTENT_STORE_PATH to an existing store", file=sys.stderr)
+        return 1
+    store = ContentStore(args.store)
+    samples = list(store.samples(args.samples))
+    if len(samples) < 10:
+        print(f"[content_dict] failed: only {len(samples)} stored documents, need at least 10", file=sys.stderr)
+        return 1
+
+    before = store.stats()
+    dictionary = train_dictionary(samples, size=args.size)
+    dict_id = store.add_dictionary(dictionary, samples=len(samples))
+    print(f"✅ Trained dictionary {dict_id} ({len(dictionary)} bytes) on {len(samples)} documents")
+    if args.recompress:
+        changed = store.recompress(dict_id)
+        after = store.stats()
+        print(
+            f"✅ Recompressed {changed} blobs: ratio {before['compression_ratio']} -> {after['compression_ratio']}"
+        )
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+"""
+Fit per-topic Bayesian knowledge tracing parameters offline with EM.
+
+Input is a CSV of historical quiz answers in time order with columns
+student_id, topic, correct (0/1). An optional `timestamp` column is used to
+sort the rows first. The output JSON is what BKT_PARAMS_PATH points the API at.
+
+Usage (from the backend directory):
+
+    python -m app.cli.fit_bkt responses.csv --output models/bkt_params.json
+"""
+import argparse
+import json
+import os
+import sys
+from typing import List, Optional
+
+import pandas as pd
+
+from ..services.knowledge_tracing import PARAM_NAMES, fit_params
+
+
+REQUIRED_COLUMNS = ["student_id", "topic", "correct"]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fit BKT parameters per topic.")
+    parser.add_argument("input", help="CSV of quiz answers (student_id, topic, correct[, timestamp])")
+    parser.add_argument("--output", required=True, help="Output JSON path")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--min-students", type=int, default=5, help="Skip topics with fewer students")
+    args = parser.parse_args(argv)
+
+    frame = pd.read_csv(args.input)
+    missing = [c for c in REQUIRED_COLUMNS if c not in frame.columns]
+    if missing:
+        print(f"[fit_bkt] failed: missing columns {missing}", file=sys.stderr)
+        return 1
+    if "timestamp" in frame.columns:
+        frame = frame.sort_values("timestamp", kind="stable")
+
+    params = fit_params(
+        frame[REQUIRED_COLUMNS].to_dict("records"),
+        n_iter=args.iterations,
+        min_sequences=args.min_students,
+    )
+    # Only the BKT params: loglik/iterations are fit diagnostics.
+    params = {topic: {name: fitted[name] for name in PARAM_NAMES} for topic, fitted in params.items()}
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(params, f, indent=2)
+    print(f"✅ Fitted BKT params for {len(params)} topics -> {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+"""
+Nightly bulk risk scoring over the full student table.
+
+Streams the student table (CSV or parquet) in chunks, fans the chunks out
+over a process pool, scores each chunk with the vectorized risk heuristic
+(predict_student_risk_batch) and the active final-result model
+(predict_final_result_batch), and writes one parquet file plus a JSON
+summary.
+
+Usage (from the backend directory):
+
+    python -m app.cli.score_students students.parquet --output scores.parquet --workers 8
+
+Required columns: student_id, interactions, last_score, days_overdue,
+studied_credits, total_clicks. Extra model features are used when present.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..services.predictor import (
+    RESULT_SCORES,
+    predict_final_result_batch,
+    predict_student_risk_batch,
+    registry,
+)
+
+
+REQUIRED_COLUMNS = [
+    "student_id",
+    "interactions",
+    "last_score",
+    "days_overdue",
+    "studied_credits",
+    "total_clicks",
+]
+
+# Risk bands used in the summary.
+RISK_BANDS = {"low": (0, 40), "medium": (40, 70), "high": (70, 101)}
+
+
+def iter_chunks(path: str, chunksize: int) -> Iterator[pd.DataFrame]:
+    """Yield the student table in chunks without loading it whole."""
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def score_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    """Score one chunk. Runs in a worker process, so it must stay top-level."""
+    missing = [c for c in REQUIRED_COLUMNS if c not in chunk.columns]
+    if missing:
+        raise RuntimeError(f"Student table is missing required columns: {missing}")
+    return pd.DataFrame({
+        "student_id": chunk["student_id"].astype(str).to_numpy(),
+        "risk_score": predict_student_risk_batch(
+            chunk["interactions"].to_numpy(),
+            chunk["last_score"].to_numpy(),
+            chunk["days_overdue"].to_numpy(),
+        ),
+        "predicted_final_result": predict_final_result_batch(chunk),
+    })
+
+
+def _ordered_results(
+    chunks: Iterator[pd.DataFrame],
+    workers: int,
+) -> Iterator[pd.DataFrame]:
+    """
+    Score chunks in parallel while keeping input order and a bounded number
+    of chunks in flight, so memory stays flat on arbitrarily large tables.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield score_chunk(chunk)
+        return
+
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: List[Any] = []
+        for chunk in chunks:
+            pending.append(pool.submit(score_chunk, chunk))
+            if len(pending) >= max_in_flight:
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
+
+
+def score_students(
+    input_path: str,
+    output_path: str,
+    chunksize: int = 100_000,
+    workers: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Score every student and return the summary (also written next to the output).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    total = 0
+    band_counts = {band: 0 for band in RISK_BANDS}
+    result_counts: Dict[int, int] = {}
+    risk_sum = 0.0
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    writer = None
+    try:
+        for scored in _ordered_results(iter_chunks(input_path, chunksize), workers):
+            table = pa.Table.from_pandas(scored, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table)
+
+            risk = scored["risk_score"].to_numpy()
+            total += len(risk)
+            risk_sum += float(risk.sum())
+            for band, (low, high) in RISK_BANDS.items():
+                band_counts[band] += int(np.count_nonzero((risk >= low) & (risk < high)))
+            values, counts = np.unique(scored["predicted_final_result"].to_numpy(), return_counts=True)
+            for value, count in zip(values, counts):
+                result_counts[int(value)] = result_counts.get(int(value), 0) + int(count)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        raise RuntimeError(f"Student table {input_path} has no rows.")
+    os.replace(tmp_path, output_path)
+
+    seconds = time.perf_counter() - started
+    labels = {score: label for label, score in RESULT_SCORES.items()}
+    summary = {
+        "input_path": os.path.abspath(input_path),
+        "output_path": os.path.abspath(output_path),
+        "model_version": registry.active.version if registry.active else None,
+        "students": total,
+        "workers": workers,
+        "chunksize": chunksize,
+        "seconds": round(seconds, 3),
+        "students_per_second": round(total / seconds, 1) if seconds else None,
+        "mean_risk_score": round(risk_sum / total, 2) if total else None,
+        "risk_bands": band_counts,
+        "predicted_final_result": {
+            labels.get(score, str(score)): count for score, count in sorted(result_counts.items())
+        },
+    }
+    with open(os.path.splitext(output_path)[0] + ".summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Re-score every student in bulk.")
+    parser.add_argument("input", help="Student table (.csv or .parquet)")
+    parser.add_argument("--output", required=True, help="Output parquet path")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, default=None, help="Process count (default: all cores)")
+    args = parser.parse_args(argv)
+
+    try:
+        summary = score_students(args.input, args.output, args.chunksize, args.workers)
+    except RuntimeError as exc:
+        print(f"[score] failed: {exc}", file=sys.stderr)
+        return 1
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+Out-of-core training pipeline for the student final-result model.
+
+Replaces the notebook flow (read_csv -> fillna -> LabelEncoder -> groupby ->
+fit) with a reproducible CLI:
+
+  1. read the clickstream CSV in chunks with explicit dtypes,
+  2. aggregate each chunk to (student, module, presentation) partials and fold
+     them together incrementally,
+  3. cache the aggregated frame as parquet keyed by the input hash,
+  4. fit the forest with n_jobs parallelism,
+  5. optionally benchmark compressed candidates (--compress),
+  6. write model + encoders + metadata as one versioned artifact.
+
+Usage (from the backend directory):
+
+    python -m app.cli.train student_learning_dataset.csv --n-jobs -1
+"""
+import argparse
+import hashlib
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from ..services.drift import build_reference_profile
+from ..services.model_artifact import (
+    CATEGORICAL_FEATURES,
+    FEATURE_COLUMNS,
+    NUMERIC_FEATURES,
+    ModelArtifact,
+)
+
+
+# Bump when the aggregation logic changes so stale caches are not reused.
+PIPELINE_VERSION = "1"
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+DEFAULT_OUTPUT_DIR = os.path.join(BACKEND_DIR, "models")
+DEFAULT_CACHE_DIR = os.path.join(BACKEND_DIR, ".cache", "training")
+
+GROUP_KEYS = ["id_student", "code_module", "code_presentation"]
+TARGET_COLUMN = "final_result"
+SUM_COLUMNS = ["total_clicks", "total_vle_interactions"]
+FIRST_COLUMNS = [
+    c for c in CATEGORICAL_FEATURES + NUMERIC_FEATURES
+    if c not in GROUP_KEYS and c not in SUM_COLUMNS
+] + [TARGET_COLUMN]
+
+CSV_DTYPES: Dict[str, Any] = {
+    "id_student": "int64",
+    "score": "float32",
+    "total_clicks": "float32",
+    "total_vle_interactions": "float32",
+    "studied_credits": "float32",
+    "num_of_prev_attempts": "float32",
+    **{col: "category" for col in CATEGORICAL_FEATURES + [TARGET_COLUMN]},
+}
+
+# Fold buffered partial aggregates together once this many have accumulated.
+COMBINE_EVERY = 8
+
+
+class StageReport:
+    """Collects wall time and peak traced memory for each pipeline stage."""
+
+    def __init__(self) -> None:
+        self.stages: List[Dict[str, Any]] = []
+
+    @contextmanager
+    def stage(self, name: str, trace_memory: bool = True) -> Iterator[None]:
+        """
+        Time a stage. Pass trace_memory=False for stages that measure latency
+        themselves, since tracemalloc slows every allocation.
+        """
+        if trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            peak_mb = None
+            if trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                peak_mb = round(peak / (1024 * 1024), 2)
+            entry = {
+                "stage": name,
+                "seconds": round(seconds, 3),
+                "peak_mb": peak_mb,
+                "max_rss_mb": round(_max_rss_mb(), 2),
+            }
+            self.stages.append(entry)
+            peak_text = f"{peak_mb:>9.2f} MB" if peak_mb is not None else f"{'n/a':>12}"
+            print(
+                f"[train] {name:<10} {entry['seconds']:>9.3f}s  "
+                f"peak {peak_text}  rss {entry['max_rss_mb']:>9.2f} MB"
+            )
+
+
+def _max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes.
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def hash_input(path: str, block_size: int = 1 << 20) -> str:
+    """sha256 over the CSV bytes and the pipeline version."""
+    digest = hashlib.sha256(PIPELINE_VERSION.encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _csv_columns(path: str) -> List[str]:
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def _partial_aggregate(chunk: pd.DataFrame) -> pd.DataFrame:
+    # Missing scores count as 0, matching the notebooks' fillna(0) before mean.
+    chunk["score"] = chunk["score"].fillna(0)
+    grouped = chunk.groupby(GROUP_KEYS, observed=True, sort=False)
+    spec: Dict[str, Any] = {
+        "score_sum": ("score", "sum"),
+        "score_count": ("score", "size"),
+    }
+    for col in SUM_COLUMNS:
+        spec[col] = (col, "sum")
+    for col in FIRST_COLUMNS:
+        spec[col] = (col, "first")
+    return grouped.agg(**spec).reset_index()
+
+
+def _combine(partials: List[pd.DataFrame]) -> pd.DataFrame:
+    frame = pd.concat(partials, ignore_index=True)
+    spec: Dict[str, Any] = {col: "sum" for col in ["score_sum", "score_count"] + SUM_COLUMNS}
+    spec.update({col: "first" for col in FIRST_COLUMNS})
+    return frame.groupby(GROUP_KEYS, observed=True, sort=False).agg(spec).reset_index()
+
+
+def aggregate_csv(path: str, chunksize: int = 200_000) -> pd.DataFrame:
+    """
+    Stream the CSV and aggregate it to one row per (student, module, presentation).
+
+    Memory is bounded by the number of distinct groups, not the number of rows.
+    """
+    columns = _csv_columns(path)
+    wanted = GROUP_KEYS + ["score"] + SUM_COLUMNS + FIRST_COLUMNS
+    usecols = [c for c in dict.fromkeys(wanted) if c in columns]
+    missing = [c for c in GROUP_KEYS + [TARGET_COLUMN] if c not in columns]
+    if missing:
+        raise RuntimeError(f"Training CSV is missing required columns: {missing}")
+
+    dtypes = {c: t for c, t in CSV_DTYPES.items() if c in usecols}
+    reader = pd.read_csv(
+        path,
+        usecols=usecols,
+        dtype=dtypes,
+        na_values=["?"],
+        chunksize=chunksize,
+    )
+
+    accumulated: Optional[pd.DataFrame] = None
+    buffered: List[pd.DataFrame] = []
+    for chunk in reader:
+        for col in wanted:
+            if col not in chunk.columns:
+                chunk[col] = 0.0 if col in NUMERIC_FEATURES + SUM_COLUMNS + ["score"] else "unknown"
+        buffered.append(_partial_aggregate(chunk))
+        if len(buffered) >= COMBINE_EVERY:
+            if accumulated is not None:
+                buffered.insert(0, accumulated)
+            accumulated = _combine(buffered)
+            buffered = []
+
+    if accumulated is not None:
+        buffered.insert(0, accumulated)
+    if not buffered:
+        raise RuntimeError(f"Training CSV {path} has no rows.")
+    frame = _combine(buffered)
+
+    frame["avg_assessment_score"] = (
+        frame["score_sum"] / frame["score_count"].clip(lower=1)
+    ).astype("float32")
+    frame = frame.drop(columns=["score_sum", "score_count"])
+
+    for col in CATEGORICAL_FEATURES + [TARGET_COLUMN]:
+        frame[col] = frame[col].astype("object").fillna("unknown").astype(str).astype("category")
+    for col in NUMERIC_FEATURES:
+        frame[col] = pd.to_numeric(frame[col], errors="coerce").fillna(0).astype("float32")
+    return frame
+
+
+def load_or_build_aggregate(
+    path: str,
+    cache_dir: str,
+    chunksize: int,
+    use_cache: bool = True,
+) -> Dict[str, Any]:
+    """Return the aggregated frame, reading it from the parquet cache when possible."""
+    input_hash = hash_input(path)
+    cache_path = os.path.join(cache_dir, f"{input_hash[:16]}.parquet")
+    if use_cache and os.path.exists(cache_path):
+        return {"frame": pd.read_parquet(cache_path), "input_hash": input_hash, "cache_hit": True}
+
+    frame = aggregate_csv(path, chunksize=chunksize)
+    if use_cache:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        frame.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    return {"frame": frame, "input_hash": input_hash, "cache_hit": False}
+
+
+def encode_frame(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Encode categoricals to integer codes; returns X, y and the encoders."""
+    encoders: Dict[str, List[str]] = {}
+    X = np.empty((len(frame), len(FEATURE_COLUMNS)), dtype=np.float32)
+    for j, col in enumerate(FEATURE_COLUMNS):
+        if col in CATEGORICAL_FEATURES:
+            classes = sorted(str(c) for c in frame[col].cat.categories)
+            encoders[col] = classes
+            lookup = {value: code for code, value in enumerate(classes)}
+            X[:, j] = frame[col].astype(str).map(lookup).to_numpy(dtype=np.float32)
+        else:
+            X[:, j] = frame[col].to_numpy(dtype=np.float32)
+    y = frame[TARGET_COLUMN].astype(str).to_numpy()
+    return {"X": X, "y": y, "encoders": encoders}
+
+
+def train(
+    csv_path: str,
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    chunksize: int = 200_000,
+    n_jobs: int = -1,
+    n_estimators: int = 300,
+    max_depth: int = 10,
+    test_size: float = 0.25,
+    random_state: int = 42,
+    use_cache: bool = True,
+    compress: bool = False,
+    serve_candidate: Optional[str] = None,
+    latency_budget_ms: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Run the full pipeline and return {"artifact_dir", "metadata"}.
+
+    With compress=True, compressed candidates are benchmarked against the
+    forest (see app.cli.compress); serve_candidate ships one of them as the
+    artifact's model.
+    """
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score
+    from sklearn.model_selection import train_test_split
+    import sklearn
+
+    report = StageReport()
+
+    with report.stage("aggregate"):
+        aggregated = load_or_build_aggregate(csv_path, cache_dir, chunksize, use_cache)
+        frame = aggregated["frame"]
+        frame = frame[frame[TARGET_COLUMN].astype(str) != "unknown"]
+
+    with report.stage("encode"):
+        encoded = encode_frame(frame)
+        X, y = encoded["X"], encoded["y"]
+        classes, counts = np.unique(y, return_counts=True)
+        stratify = y if len(classes) > 1 and counts.min() >= 2 else None
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=test_size, random_state=random_state, stratify=stratify
+        )
+
+    params = {
+        "n_estimators": n_estimators,
+        "max_depth": max_depth,
+        "min_samples_split": 4,
+        "min_samples_leaf": 2,
+        "random_state": random_state,
+        "n_jobs": n_jobs,
+    }
+    with report.stage("fit"):
+        model = RandomForestClassifier(**params)
+        model.fit(X_train, y_train)
+
+    with report.stage("evaluate"):
+        test_predictions = model.predict(X_test)
+        metrics = {
+            "train_accuracy": float(accuracy_score(y_train, model.predict(X_train))),
+            "test_accuracy": float(accuracy_score(y_test, test_predictions)),
+        }
+        # Baseline the drift monitor compares live traffic against.
+        reference_profile = build_reference_profile(
+            {col: frame[col].astype(str) if col in CATEGORICAL_FEATURES else frame[col] for col in FEATURE_COLUMNS},
+            categorical=CATEGORICAL_FEATURES,
+            predictions=list(test_predictions),
+        )
+    print(f"[train] accuracy train={metrics['train_accuracy']:.4f} test={metrics['test_accuracy']:.4f}")
+
+    # Serving predicts one row at a time, where fanning out to threads only adds latency.
+    model.set_params(n_jobs=1)
+
+    compression: Optional[Dict[str, Any]] = None
+    served_model: Any = model
+    if compress or serve_candidate:
+        from .compress import benchmark_candidates, build_candidates, format_report
+
+        with report.stage("compress"):
+            candidates = build_candidates(model, X_train, random_state=random_state)
+        with report.stage("benchmark", trace_memory=False):
+            compression = benchmark_candidates(candidates, X_test, y_test, latency_budget_ms)
+        print(format_report(compression))
+        if serve_candidate:
+            if serve_candidate not in candidates:
+                raise RuntimeError(
+                    f"Unknown candidate {serve_candidate!r}; choose from {sorted(candidates)}"
+                )
+            served_model = candidates[serve_candidate]
+            reference_profile["prediction"] = build_reference_profile(
+                {}, categorical=[], predictions=list(served_model.predict(X_test))
+            )["prediction"]
+
+    created_at = datetime.now(timezone.utc)
+    metadata: Dict[str, Any] = {
+        "version": f"{created_at.strftime('%Y%m%d%H%M%S')}-{aggregated['input_hash'][:8]}",
+        "created_at": created_at.isoformat(),
+        "input_path": os.path.abspath(csv_path),
+        "input_hash": aggregated["input_hash"],
+        "pipeline_version": PIPELINE_VERSION,
+        "cache_hit": aggregated["cache_hit"],
+        "n_students": int(len(frame)),
+        "n_train": int(len(y_train)),
+        "n_test": int(len(y_test)),
+        "features": FEATURE_COLUMNS,
+        "categorical_features": CATEGORICAL_FEATURES,
+        "classes": [str(c) for c in model.classes_],
+        "model_type": type(served_model).__name__,
+        "params": params,
+        "metrics": metrics,
+        "sklearn_version": sklearn.__version__,
+        "reference_profile": reference_profile,
+    }
+    if compression is not None:
+        metadata["compression"] = compression
+        metadata["served_candidate"] = serve_candidate or "teacher"
+
+    metadata["stages"] = list(report.stages)
+    with report.stage("save"):
+        artifact = ModelArtifact(served_model, encoded["encoders"], metadata)
+        artifact_dir = artifact.save(output_dir)
+
+    print(f"[train] wrote artifact {metadata['version']} to {artifact_dir}")
+    return {"artifact_dir": artifact_dir, "metadata": metadata}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Train the student final-result model.")
+    parser.add_argument("csv", help="Path to student_learning_dataset.csv")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--n-estimators", type=int, default=300)
+    parser.add_argument("--max-depth", type=int, default=10)
+    parser.add_argument("--test-size", type=float, default=0.25)
+    parser.add_argument("--random-state", type=int, default=42)
+    parser.add_argument("--no-cache", action="store_true", help="Ignore and do not write the aggregate cache")
+    parser.add_argument("--compress", action="store_true", help="Benchmark compressed/distilled candidates")
+    parser.add_argument("--serve-candidate", help="Ship this compression candidate instead of the full forest")
+    parser.add_argument("--latency-budget-ms", type=float, help="Single-row p50 budget used to recommend a candidate")
+    args = parser.parse_args(argv)
+
+    try:
+        train(
+            args.csv,
+            output_dir=args.output_dir,
+            cache_dir=args.cache_dir,
+            chunksize=args.chunksize,
+            n_jobs=args.n_jobs,
+            n_estimators=args.n_estimators,
+            max_depth=args.max_depth,
+            test_size=args.test_size,
+            random_state=args.random_state,
+            use_cache=not args.no_cache,
+            compress=args.compress,
+            serve_candidate=args.serve_candidate,
+            latency_budget_ms=args.latency_budget_ms,
+        )
+    except RuntimeError as exc:
+        print(f"[train] failed: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,12 @@
+import asyncio
+import json
 import os
-from fastapi import FastAPI, HTTPException
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
 
 from dotenv import load_dotenv
 
@@ -16,12 +22,52 @@ from .models import (
     StudyToolResponse,
     PersonalizeSagaRequest,
     PersonalizeSagaResponse,
+    NextChaptersRequest,
+    CompleteChapterRequest,
+    AddXPRequest,
     SagaChapter,
+    ModelActivateRequest,
+    ShadowModelRequest,
+    TraceSampleRateRequest,
+    OrgMembersRequest,
+    BulkGenerateRequest,
+    StudentRiskUpdateRequest,
+    OrgRiskResponse,
+    QuizAnswersRequest,
+    ReviewGradesRequest,
 )
 from .mock_data import generate_mock_student_status
-from .services.predictor import predict_student_risk, predict_final_result
-from .services.gemini import AdaptiveTutor, GeminiService, list_gemini_models
+from .services.predictor import (
+    explain_final_result,
+    explain_student_risk,
+    predict_student_risk,
+    registry,
+)
+from .services.auth import AuthError, Identity, identity_from_claims, verify_access_token
+from .services.gemini import AdaptiveTutor, GeminiService, list_gemini_models, resolve_explain_mode
+from .services.bulk_generation import BulkGenerationService
+from .services.leaderboard import ALL_TIME, WEEK, LeaderboardFollower, LeaderboardService
+from .services.model_router import UpstreamUnavailable, is_quota_error
+from .services.offline_library import LESSON, load_offline_library
+from .services.payloads import EncodedPayload, PayloadStore, etag_matches
 from .services.personalization import PersonalizationService
+from .services.progress_store import ConnectionPool, ProgressWriter
+from .services.recommender import load_recommender
+from .services.cohort_risk import CohortRiskService
+from .services.knowledge_tracing import KnowledgeTracer
+from .services.deadlines import (
+    SOCRATIC_DEADLINE,
+    DeadlineExceeded,
+    DeadlineMiddleware,
+    deadline_scope,
+    stats as cancellation_stats,
+)
+from .services.profiling import RequestTracer, SamplingProfiler, TraceMiddleware, mark, span
+from .services.prompts import COURSE_PACE_INSTRUCTIONS, default_registry
+from .services.quota import Limit, QuotaExceeded, SharedQuota, estimate_request_tokens
+from .services.search_index import SearchIndex
+from .services.socratic_sessions import SocraticSessionStore, estimate_tokens
+from .services.spaced_repetition import SpacedRepetitionScheduler, is_correct_answer
 
 
 load_dotenv()
@@ -35,7 +81,65 @@ logging.basicConfig(
 )
 logging.info("Backend server starting up...")
 
-app = FastAPI(title="AI-Powered Adaptive Learning System")
+async def _snapshot_leaderboards(path: str, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(leaderboards.snapshot, path)
+        except Exception as exc:
+            print(f"⚠️ Leaderboard snapshot failed: {exc}")
+
+
+async def _refresh_search_index(interval: float) -> None:
+    while True:
+        try:
+            indexed = await asyncio.to_thread(gemini_service.index_stored)
+            if indexed:
+                search_index.maybe_snapshot(background=True)
+        except Exception as exc:
+            print(f"⚠️ Search index refresh failed: {exc}")
+        await asyncio.sleep(interval)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Follow the model registry's ACTIVE pointer so promotions reach every worker.
+    watch_seconds = float(os.getenv("MODEL_REGISTRY_WATCH_SECONDS", "5"))
+    if watch_seconds > 0:
+        registry.start_watcher(watch_seconds)
+    following = None
+    if leaderboard_follower is not None:
+        # With a progress DB every worker's boards follow its committed XP log
+        # and memberships; the snapshot only matters without one.
+        seeded = await leaderboard_follower.start()
+        print(f"✅ Seeded leaderboards with {seeded} students from the progress DB")
+        following = asyncio.create_task(leaderboard_follower.run())
+    # Every worker indexes what the others saved to the shared content store.
+    refresh_seconds = float(os.getenv("SEARCH_REFRESH_SECONDS", "30"))
+    refreshing = None
+    if gemini_service.store is not None and refresh_seconds > 0:
+        refreshing = asyncio.create_task(_refresh_search_index(refresh_seconds))
+    snapshot_seconds = float(os.getenv("LEADERBOARD_SNAPSHOT_SECONDS", "300"))
+    snapshots = None
+    if _leaderboard_path and snapshot_seconds > 0:
+        snapshots = asyncio.create_task(_snapshot_leaderboards(_leaderboard_path, snapshot_seconds))
+    yield
+    if snapshots is not None:
+        snapshots.cancel()
+    if following is not None:
+        following.cancel()
+    if refreshing is not None:
+        refreshing.cancel()
+    registry.stop_watcher()
+    search_index.wait_for_snapshot()
+    search_index.maybe_snapshot(force=True)
+    if progress_writer is not None:
+        await progress_writer.close()
+    if _leaderboard_path:
+        leaderboards.snapshot(_leaderboard_path)
+
+
+app = FastAPI(title="AI-Powered Adaptive Learning System", lifespan=lifespan)
 
 # CORS configuration - expanded for dev troubleshooting
 origins = [
@@ -52,10 +156,136 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-route deadlines; cancels upstream AI calls when the client disconnects.
+app.add_middleware(DeadlineMiddleware)
+# Outermost, so sampled traces cover deadlines, validation and serialization.
+request_tracer = RequestTracer(sample_rate=float(os.getenv("TRACE_SAMPLE_RATE", "0")))
+app.add_middleware(TraceMiddleware, tracer=request_tracer)
+profiler = SamplingProfiler()
+
+knowledge_tracer = KnowledgeTracer()
+_bkt_params_path = os.getenv("BKT_PARAMS_PATH")
+if _bkt_params_path and os.path.exists(_bkt_params_path):
+    print(f"✅ Loaded BKT params for {knowledge_tracer.load_params(_bkt_params_path)} topics")
+_search_index_path = os.getenv("SEARCH_INDEX_PATH")
+_search_snapshot_every = int(os.getenv("SEARCH_SNAPSHOT_EVERY", "50"))
+if _search_index_path and os.path.exists(_search_index_path):
+    search_index = SearchIndex.load(
+        _search_index_path, snapshot_path=_search_index_path, snapshot_every=_search_snapshot_every
+    )
+    print(f"✅ Loaded search index with {len(search_index)} documents")
+else:
+    search_index = SearchIndex(snapshot_path=_search_index_path, snapshot_every=_search_snapshot_every)
+prompt_registry = default_registry(os.getenv("PROMPT_COMPACTION", "off"))
+offline_library = load_offline_library(os.getenv("OFFLINE_LIBRARY_PATH"))
+gemini_service = GeminiService(search_index=search_index, prompts=prompt_registry)
+tutor = AdaptiveTutor(service=gemini_service, tracer=knowledge_tracer)
+personalization_service = PersonalizationService(
+    recommender=load_recommender(os.getenv("RECOMMENDER_PATH")),
+    prompts=prompt_registry,
+    min_score=float(os.getenv("RECOMMENDER_MIN_SCORE", "0.1")),
+)
+cohort_risk = CohortRiskService()
+payload_store = PayloadStore(
+    directory=os.getenv("PAYLOAD_DIR"),
+    max_bytes=int(os.getenv("PAYLOAD_CACHE_MAX_MB", "64")) * 1024 * 1024,
+)
+_leaderboard_path = os.getenv("LEADERBOARD_SNAPSHOT_PATH")
+if _leaderboard_path and os.path.exists(_leaderboard_path):
+    leaderboards = LeaderboardService.load(_leaderboard_path)
+    print(f"✅ Loaded leaderboards with {leaderboards.stats()['members']} students")
+else:
+    leaderboards = LeaderboardService(keep_weeks=int(os.getenv("LEADERBOARD_KEEP_WEEKS", "2")))
+_progress_db_path = os.getenv("PROGRESS_DB_PATH")
+progress_writer = ProgressWriter(
+    ConnectionPool(_progress_db_path, size=int(os.getenv("PROGRESS_DB_POOL_SIZE", "4"))),
+    flush_interval=float(os.getenv("PROGRESS_FLUSH_MS", "50")) / 1000,
+    max_batch=int(os.getenv("PROGRESS_MAX_BATCH", "500")),
+) if _progress_db_path else None
+leaderboard_follower = LeaderboardFollower(
+    leaderboards, progress_writer, interval=float(os.getenv("LEADERBOARD_POLL_SECONDS", "1"))
+) if progress_writer is not None else None
+if leaderboard_follower is not None:
+    # Our own commits show up on the next poll, without waiting out the interval.
+    progress_writer.on_commit = leaderboard_follower.poke
+review_scheduler = SpacedRepetitionScheduler()
+socratic_sessions = SocraticSessionStore(
+    ttl_seconds=float(os.getenv("SOCRATIC_SESSION_TTL_SECONDS", "1800")),
+    max_sessions=int(os.getenv("SOCRATIC_MAX_SESSIONS", "2000")),
+    max_bytes=int(os.getenv("SOCRATIC_MAX_BYTES", str(32 * 1024 * 1024))),
+    prompt_budget=int(os.getenv("SOCRATIC_PROMPT_TOKENS", "1500")),
+)
+MAX_SOCRATIC_MESSAGE_CHARS = 2000
+MAX_SOCRATIC_TOPIC_CHARS = 300
+# Frames above this are rejected unparsed; a full message fits easily.
+MAX_SOCRATIC_FRAME_CHARS = 4 * MAX_SOCRATIC_MESSAGE_CHARS
+# Bounds on client/service supplied progress values.
+MAX_XP_AWARD = 5000
+MAX_CHAPTER_MINUTES = 24 * 60
+_quota_path = os.getenv("QUOTA_PATH")
+ai_quota = SharedQuota(
+    _quota_path,
+    limits={
+        "student": [
+            Limit(60, int(os.getenv("QUOTA_STUDENT_PER_MINUTE", "20"))),
+            Limit(3600, tokens=int(os.getenv("QUOTA_STUDENT_TOKENS_PER_HOUR", "100000"))),
+        ],
+        "org": [
+            Limit(60, int(os.getenv("QUOTA_ORG_PER_MINUTE", "300"))),
+            Limit(3600, tokens=int(os.getenv("QUOTA_ORG_TOKENS_PER_HOUR", "2000000"))),
+        ],
+        # Anonymous callers, by client address.
+        "client": [
+            Limit(60, int(os.getenv("QUOTA_CLIENT_PER_MINUTE", "10"))),
+            Limit(3600, tokens=int(os.getenv("QUOTA_CLIENT_TOKENS_PER_HOUR", "50000"))),
+        ],
+    },
+) if _quota_path else None
+bulk_generation = BulkGenerationService(
+    gemini_service,
+    concurrency=int(os.getenv("BULK_GENERATION_CONCURRENCY", "4")),
+    max_topics=int(os.getenv("BULK_GENERATION_MAX_TOPICS", "50")),
+    quota=ai_quota,
+)
+
+
+def require_admin(x_admin_token: str | None = Header(default=None)) -> None:
+    """
+    Guards /api/admin routes with the shared ADMIN_API_TOKEN.
+
+    Admin routes are disabled entirely when the token is not configured.
+    """
+    expected = os.getenv("ADMIN_API_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin API is disabled.")
+    if x_admin_token != expected:
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+def current_identity(authorization: str | None = Header(default=None)) -> Identity | None:
+    """
+    The signed-in student from a Supabase access token, or None when the
+    request carries no Authorization header.
+    """
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        raise HTTPException(status_code=401, detail="Expected a Bearer access token.")
+    secret = os.getenv("AUTH_JWT_SECRET")
+    if not secret:
+        raise HTTPException(status_code=403, detail="Student authentication is disabled.")
+    try:
+        return identity_from_claims(verify_access_token(token.strip(), secret))
+    except AuthError as exc:
+        raise HTTPException(status_code=401, detail=str(exc)) from exc
 
-tutor = AdaptiveTutor()
-gemini_service = GeminiService()
-personalization_service = PersonalizationService()
+
+def require_student(identity: Identity | None = Depends(current_identity)) -> Identity:
+    """Routes that act on the caller's own progress need a signed-in student."""
+    if identity is None:
+        raise HTTPException(status_code=401, detail="Sign in required.")
+    return identity
 
 
 @app.get("/")
@@ -96,74 +326,191 @@ async def list_models():
 @app.get("/api/student/status", response_model=StudentStatus)
 async def get_student_status():
     """
-    Returns mock student engagement stats and a derived risk score.
+    Returns mock student engagement stats and a derived risk score,
+    with the top factors behind the risk score and the predicted result.
     """
     print("DEBUG: Received request for /api/student/status")
+    mark("handler_start")
     base = generate_mock_student_status()
+    with span("inference"):
+        risk_score, risk_factors, (predicted_result, result_factors, result_explained) = _score_status(base)
+    base["predicted_final_result"] = predicted_result
+    mark("handler_end")
+    return StudentStatus(
+        risk_score=risk_score,
+        risk_factors=risk_factors,
+        result_factors=result_factors,
+        result_explained=result_explained,
+        **base,
+    )
+
+
+def _score_status(base: dict):
     risk_score = predict_student_risk(
         interactions=base["interactions"],
         last_score=base["last_score"],
         days_overdue=base["days_overdue"],
     )
+    risk_factors = explain_student_risk(
+        interactions=base["interactions"],
+        last_score=base["last_score"],
+        days_overdue=base["days_overdue"],
+    )
     
     # Calculate predicted result based on dataset fields
-    predicted_result = predict_final_result(
+    result = explain_final_result(
         credits=base.get("studied_credits", 0),
         clicks=base.get("total_clicks", 0)
     )
-    
-    base["predicted_final_result"] = predicted_result
-    
-    return StudentStatus(risk_score=risk_score, **base)
+    return risk_score, risk_factors, result
 
 
 @app.post("/api/ai/explain", response_model=AIExplainResponse)
-async def explain_topic(payload: AIExplainRequest):
+async def explain_topic(
+    payload: AIExplainRequest,
+    request: Request,
+    identity: Identity | None = Depends(current_identity),
+):
     """
     Uses Gemini via AdaptiveTutor to generate an adaptive explanation or challenge.
+
+    For a signed-in student with quiz history the tracer's mastery sets the
+    pitch and the client's struggle_score is ignored.
     """
-    try:
-        explanation = await tutor.get_adaptive_explanation(
-            topic=payload.topic, struggle_score=payload.struggle_score
-        )
-    except RuntimeError as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    student_id = identity.student_id if identity is not None else None
+    async with _metered(_quota_principals(identity, request.client), "explain", payload.topic) as charge:
+        try:
+            explanation = await tutor.get_adaptive_explanation(
+                topic=payload.topic,
+                struggle_score=payload.struggle_score,
+                student_id=student_id,
+            )
+        except DeadlineExceeded as exc:
+            raise HTTPException(status_code=504, detail=str(exc)) from exc
+        except UpstreamUnavailable as exc:
+            mode = tutor.resolve_mode(payload.topic, student_id, payload.struggle_score)
+            return AIExplainResponse(explanation=_offline_lesson(payload.topic, mode, exc), cached=True)
+        except RuntimeError as exc:
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+        charge.record(payload.topic, explanation)
 
     return AIExplainResponse(explanation=explanation)
 
 
 @app.post("/api/generate", response_model=GenerateContentResponse)
-async def generate_content(payload: GenerateContentRequest):
+async def generate_content(
+    payload: GenerateContentRequest,
+    request: Request,
+    identity: Identity | None = Depends(current_identity),
+):
     """
     Generic Gemini endpoint used by the Study Room to generate lessons/challenges.
     """
-    try:
-        content = await gemini_service.generate_content(
-            topic=payload.topic, difficulty=payload.difficulty
-        )
-    except RuntimeError as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    async with _metered(_quota_principals(identity, request.client), "explain", payload.topic) as charge:
+        try:
+            content = await gemini_service.generate_content(
+                topic=payload.topic, difficulty=payload.difficulty
+            )
+        except DeadlineExceeded as exc:
+            raise HTTPException(status_code=504, detail=str(exc)) from exc
+        except RuntimeError as exc:
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+        charge.record(payload.topic, content)
 
     return GenerateContentResponse(content=content)
 
 
 @app.post("/api/ai/generate", response_model=AIGenerateLessonResponse)
-async def ai_generate_lesson(payload: AIGenerateLessonRequest):
+async def ai_generate_lesson(
+    payload: AIGenerateLessonRequest,
+    request: Request,
+    identity: Identity | None = Depends(current_identity),
+):
     """
     MVP endpoint for the Study Room, backed by GeminiService.generate_lesson.
     """
-    try:
-        content = await gemini_service.generate_lesson(
-            topic=payload.topic, mode=payload.mode
-        )
-    except RuntimeError as exc:
-        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    async with _metered(_quota_principals(identity, request.client), "explain", payload.topic) as charge:
+        try:
+            content = await gemini_service.generate_lesson(
+                topic=payload.topic, mode=payload.mode
+            )
+        except DeadlineExceeded as exc:
+            raise HTTPException(status_code=504, detail=str(exc)) from exc
+        except UpstreamUnavailable as exc:
+            return AIGenerateLessonResponse(content=_offline_lesson(payload.topic, payload.mode, exc), cached=True)
+        except RuntimeError as exc:
+            raise HTTPException(status_code=500, detail=str(exc)) from exc
+        charge.record(payload.topic, content)
 
     return AIGenerateLessonResponse(content=content)
 
 
+def _offline_lesson(topic: str, mode: str, exc: UpstreamUnavailable) -> str:
+    """
+    The offline library's closest lesson while Gemini is unavailable; 429 or
+    503 (as for the study tool) when it has nothing close.
+    """
+    entry = offline_library.lookup(LESSON, topic, mode) if offline_library is not None else None
+    if entry is None:
+        if is_quota_error(exc):
+            raise HTTPException(status_code=429, detail="AI service quota exceeded. Please try again later.") from exc
+        raise HTTPException(status_code=503, detail="AI service temporarily unavailable.") from exc
+    return entry.text
+
+
+def _quota_principals(identity: Identity | None, client) -> list[tuple[str, str]]:
+    """
+    Who an AI request is charged to: the signed-in student and their
+    organization, or the client address for anonymous callers.
+    """
+    if identity is not None:
+        return [("student", identity.student_id), ("org", identity.organization_id)]
+    return [("client", client.host if client else "unknown")]
+
+
+class _QuotaCharge:
+    """Tokens one metered AI call really used; the handler sets it."""
+
+    __slots__ = ("used",)
+
+    def __init__(self) -> None:
+        self.used = 0
+
+    def record(self, *texts: str | None) -> None:
+        self.used = estimate_tokens("".join(t or "" for t in texts))
+
+
+@asynccontextmanager
+async def _metered(principals: list[tuple[str, str]], tool: str, text: str, num_questions: int | None = None):
+    """
+    Admits one AI call against the shared quota (429 when over) and settles
+    the reservation however the call ends. Unless the handler records what
+    was used, the reservation is refunded: errors, cancellations, cache and
+    offline hits never reach the model's bill.
+    """
+    charge = _QuotaCharge()
+    if ai_quota is None:
+        yield charge
+        return
+    reserved = estimate_request_tokens(tool, text, num_questions)
+    try:
+        ai_quota.admit(principals, reserved)
+    except QuotaExceeded as exc:
+        raise HTTPException(
+            status_code=429, detail=str(exc), headers={"Retry-After": str(exc.retry_after)}
+        ) from exc
+    try:
+        yield charge
+    finally:
+        ai_quota.settle(principals, charge.used - reserved)
+
+
 @app.post("/api/ai/study-tool", response_model=StudyToolResponse)
-async def ai_study_tool(payload: StudyToolRequest):
+async def ai_study_tool(
+    payload: StudyToolRequest,
+    request: Request,
+    identity: Identity | None = Depends(current_identity),
+):
     """
     Multi-tool endpoint powering the Study Room 2.0.
     Supports:
@@ -171,50 +518,138 @@ async def ai_study_tool(payload: StudyToolRequest):
       - summarize
       - quiz
       - socratic
+
+    The student (quiz history, review items, quota) is the signed-in one;
+    anonymous requests are charged to the client address.
     """
     print(f"DEBUG: Received study-tool request: {payload.tool_type} for topic: {payload.topic}")
-    try:
-        mode, content, quiz_items = await gemini_service.generate_study_tool(
-            tool_type=payload.tool_type,
-            topic=payload.topic,
-            input_text=payload.input_text,
-            difficulty=payload.difficulty,
-            diagram_type=payload.diagram_type,
-            num_questions=payload.num_questions,
-            level=payload.level,
-            detail=payload.detail,
-        )
-    except RuntimeError as exc:
-        error_msg = str(exc)
-        # Check for quota errors
-        if "quota" in error_msg.lower() or "429" in error_msg:
-            raise HTTPException(
-                status_code=429,
-                detail="AI service quota exceeded. Please try again later."
-            ) from exc
-        # Check for API key errors
-        if "GEMINI_API_KEY" in error_msg or "not set" in error_msg.lower():
-            raise HTTPException(
-                status_code=500,
-                detail="AI service not configured. Please check server configuration."
-            ) from exc
-        raise HTTPException(status_code=500, detail=f"AI service error: {error_msg}") from exc
-    except Exception as exc:
-        import traceback
-        print(f"Unexpected error in study-tool: {exc}")
-        print(traceback.format_exc())
-        raise HTTPException(status_code=500, detail=f"Failed to process study tool request: {str(exc)}") from exc
+    mark("handler_start")
+    student_id = identity.student_id if identity is not None else None
+    principals = _quota_principals(identity, request.client)
+    prompt_text = (payload.topic or "") + (payload.input_text or "")
+    async with _metered(principals, payload.tool_type, prompt_text, payload.num_questions) as charge:
+        explain_mode = None
+        cached_entry = None
+        if student_id and payload.topic:
+            if knowledge_tracer.struggle_score(student_id, payload.topic) is not None:
+                explain_mode = tutor.resolve_mode(payload.topic, student_id=student_id)
+        try:
+            mode, content, quiz_items = await gemini_service.generate_study_tool(
+                tool_type=payload.tool_type,
+                topic=payload.topic,
+                input_text=payload.input_text,
+                difficulty=payload.difficulty,
+                diagram_type=payload.diagram_type,
+                num_questions=payload.num_questions,
+                level=payload.level,
+                detail=payload.detail,
+                explain_mode=explain_mode,
+            )
+        except DeadlineExceeded as exc:
+            raise HTTPException(status_code=504, detail=str(exc)) from exc
+        except UpstreamUnavailable as exc:
+            # Quota exhausted or circuit open: the closest pre-rendered entry beats an error.
+            offline = offline_library.study_tool(
+                payload.tool_type,
+                payload.topic or "",
+                resolve_explain_mode(payload.difficulty, explain_mode),
+                payload.diagram_type,
+                payload.num_questions or 5,
+            ) if offline_library is not None and payload.topic else None
+            if offline is None:
+                if is_quota_error(exc):
+                    raise HTTPException(
+                        status_code=429,
+                        detail="AI service quota exceeded. Please try again later."
+                    ) from exc
+                raise HTTPException(status_code=503, detail="AI service temporarily unavailable.") from exc
+            mode, content, quiz_items, cached_entry = offline
+        except RuntimeError as exc:
+            error_msg = str(exc)
+            # Check for quota errors
+            if "quota" in error_msg.lower() or "429" in error_msg:
+                raise HTTPException(
+                    status_code=429,
+                    detail="AI service quota exceeded. Please try again later."
+                ) from exc
+            # Check for API key errors
+            if "GEMINI_API_KEY" in error_msg or "not set" in error_msg.lower():
+                raise HTTPException(
+                    status_code=500,
+                    detail="AI service not configured. Please check server configuration."
+                ) from exc
+            raise HTTPException(status_code=500, detail=f"AI service error: {error_msg}") from exc
+        except Exception as exc:
+            import traceback
+            print(f"Unexpected error in study-tool: {exc}")
+            print(traceback.format_exc())
+            raise HTTPException(status_code=500, detail=f"Failed to process study tool request: {str(exc)}") from exc
+        if cached_entry is None:
+            charge.record(prompt_text, content, str(quiz_items or ""))
+
+        if mode == "quiz" and quiz_items and student_id:
+            # Keep generated questions for later review instead of discarding them.
+            item_ids = review_scheduler.register_items(
+                student_id, [{**item, "topic": payload.topic} for item in quiz_items]
+            )
+            quiz_items = [{**item, "item_id": item_id} for item, item_id in zip(quiz_items, item_ids)]
 
     print(f"DEBUG: Study-tool request completed successfully for {payload.tool_type}")
-    return StudyToolResponse(mode=mode, content=content, quiz=quiz_items)
+    mark("handler_end")
+    return StudyToolResponse(
+        mode=mode,
+        content=content,
+        quiz=quiz_items,
+        cached=cached_entry is not None,
+        cached_topic=cached_entry.topic if cached_entry is not None else None,
+    )
+
+
+def _payload_response(
+    encoded: EncodedPayload,
+    accept_encoding: str | None,
+    if_none_match: str | None = None,
+    cache_control: str | None = None,
+) -> Response:
+    """
+    Sends a stored payload's precompressed variant for the client's
+    Accept-Encoding, or 304 when If-None-Match already names one of its
+    ETags. Each variant has its own ETag.
+    """
+    encoding, body = encoded.select(accept_encoding)
+    headers = {"ETag": encoded.etag_for(encoding), "Vary": "Accept-Encoding"}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    if etag_matches(if_none_match, encoded.etag):
+        payload_store.record_served(None, not_modified=True)
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    payload_store.record_served(encoding)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def _store_payload(kind: str, document: dict, accept_encoding: str | None) -> Response:
+    # Compression runs once per payload but can take tens of ms at max level.
+    encoded = await asyncio.to_thread(payload_store.put, kind, document)
+    return _payload_response(encoded, accept_encoding)
 
 
 @app.post("/api/ai/generate-course")
-async def generate_course(payload: dict):
+async def generate_course(
+    payload: dict,
+    request: Request,
+    accept_encoding: str | None = Header(default=None),
+    identity: Identity | None = Depends(current_identity),
+):
     """
     Generate a personalized course based on topic and student pace.
     Only accessible to personal accounts.
+
+    The response carries the course's id (see GET /api/ai/courses/{id})
+    and is sent precompressed when the client accepts gzip/br.
     """
+    mark("handler_start")
     try:
         topic = payload.get("topic", "")
         pace = payload.get("pace", "moderate")
@@ -223,81 +658,81 @@ async def generate_course(payload: dict):
         if not topic:
             raise HTTPException(status_code=400, detail="Topic is required")
 
-        # Build detailed prompt based on pace
-        pace_instructions = {
-            "blitz": "Create 3-4 concise summary modules with key concepts only. Each module should be 15-20 minutes. Focus on essentials.",
-            "moderate": "Create 5-6 balanced modules with practice exercises. Each module should be 30-45 minutes. Include hands-on examples.",
-            "deep": "Create 7-10 detailed modules with quizzes, projects, and deep dives. Each module should be 60-90 minutes. Include comprehensive exercises and assessments."
-        }
-        
-        pace_instruction = pace_instructions.get(pace, pace_instructions["moderate"])
+        pace_instruction = COURSE_PACE_INSTRUCTIONS.get(pace, COURSE_PACE_INSTRUCTIONS["moderate"])
+
+        # Same topic and pace: re-serve the stored course instead of regenerating.
+        course_key = ("course", " ".join(topic.lower().split()), pace)
+        stored_course = gemini_service.load_stored(course_key)
+        if stored_course is not None:
+            return await _store_payload("course", {"course": stored_course}, accept_encoding)
 
         # Generate course content using Gemini
-        prompt = f"""You are an expert course creator. Create a comprehensive, engaging course on: {topic}
-
-Student Pace: {pace}
-{pace_instruction}
-
-Return ONLY a valid JSON object (no markdown, no explanation) with this exact structure:
-{{
-  "title": "Course title (engaging and specific)",
-  "description": "Detailed course description (2-3 sentences)",
-  "difficulty": "beginner|intermediate|advanced",
-  "thumbnail_url": null,
-  "modules": [
-    {{
-      "title": "Module title",
-      "description": "Module description",
-      "lessons": [
-        {{
-          "title": "Lesson title",
-          "content": "Detailed lesson content with explanations, examples, and key takeaways"
-        }}
-      ]
-    }}
-  ]
-}}
-
-Make it practical, engaging, and tailored to {pace} pace learning!"""
+        with span("prompt_build"):
+            rendered = prompt_registry.render(
+                "course", "/api/ai/generate-course", topic=topic, pace=pace, pace_instruction=pace_instruction
+            )
+        started = time.perf_counter()
 
-        try:
-            content = await gemini_service.generate_content(topic=prompt, difficulty="standard")
-        except RuntimeError as gemini_error:
-            # Handle quota errors specifically
-            error_msg = str(gemini_error)
-            if "quota" in error_msg.lower() or "429" in error_msg:
-                raise HTTPException(
-                    status_code=429,
-                    detail="AI service quota exceeded. Please try again later or upgrade your plan."
-                ) from gemini_error
-            raise HTTPException(status_code=500, detail=f"AI generation failed: {error_msg}") from gemini_error
+        async with _metered(_quota_principals(identity, request.client), "course", rendered.text) as charge:
+            try:
+                content = await gemini_service.generate_content(topic=rendered.text, difficulty="standard")
+            except DeadlineExceeded as exc:
+                raise HTTPException(status_code=504, detail=str(exc)) from exc
+            except UpstreamUnavailable as exc:
+                offline_course = _offline_course(topic, pace)
+                if offline_course is None:
+                    if is_quota_error(exc):
+                        raise HTTPException(
+                            status_code=429,
+                            detail="AI service quota exceeded. Please try again later or upgrade your plan."
+                        ) from exc
+                    raise HTTPException(status_code=503, detail="AI service temporarily unavailable.") from exc
+                mark("handler_end")
+                return await _store_payload("course", {"course": offline_course, "cached": True}, accept_encoding)
+            except RuntimeError as gemini_error:
+                # Handle quota errors specifically
+                error_msg = str(gemini_error)
+                if "quota" in error_msg.lower() or "429" in error_msg:
+                    raise HTTPException(
+                        status_code=429,
+                        detail="AI service quota exceeded. Please try again later or upgrade your plan."
+                    ) from gemini_error
+                raise HTTPException(status_code=500, detail=f"AI generation failed: {error_msg}") from gemini_error
+            charge.record(rendered.text, content)
         
         # Parse JSON from response
         import json
         import re
         
-        # Clean the response - remove markdown code blocks if present
-        cleaned_content = content.strip()
-        if cleaned_content.startswith("```json"):
-            cleaned_content = cleaned_content[7:]
-        elif cleaned_content.startswith("```"):
-            cleaned_content = cleaned_content[3:]
-        if cleaned_content.endswith("```"):
-            cleaned_content = cleaned_content[:-3]
-        cleaned_content = cleaned_content.strip()
-        
-        # Extract JSON
-        json_match = re.search(r'\{[\s\S]*\}', cleaned_content)
-        if json_match:
-            try:
-                course_data = json.loads(json_match.group())
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                course_data = _create_fallback_course(topic, pace)
+        with span("parse"):
+            # Clean the response - remove markdown code blocks if present
+            cleaned_content = content.strip()
+            if cleaned_content.startswith("```json"):
+                cleaned_content = cleaned_content[7:]
+            elif cleaned_content.startswith("```"):
+                cleaned_content = cleaned_content[3:]
+            if cleaned_content.endswith("```"):
+                cleaned_content = cleaned_content[:-3]
+            cleaned_content = cleaned_content.strip()
+
+            # Extract JSON
+            course_data = None
+            json_match = re.search(r'\{[\s\S]*\}', cleaned_content)
+            if json_match:
+                try:
+                    course_data = json.loads(json_match.group())
+                except json.JSONDecodeError:
+                    course_data = None
+        prompt_registry.record(rendered, course_data is not None, time.perf_counter() - started, content)
+        if course_data is not None:
+            gemini_service.save_generated(course_key, course_data)
         else:
-            course_data = _create_fallback_course(topic, pace)
+            # Fallback if there is no JSON or parsing fails
+            with span("fallback"):
+                course_data = _create_fallback_course(topic, pace)
 
-        return {"course": course_data}
+        mark("handler_end")
+        return await _store_payload("course", {"course": course_data}, accept_encoding)
     except HTTPException:
         # Re-raise HTTP exceptions as-is
         raise
@@ -323,6 +758,47 @@ Make it practical, engaging, and tailored to {pace} pace learning!"""
         raise HTTPException(status_code=500, detail=f"Failed to generate course: {error_msg}") from exc
 
 
+OFFLINE_COURSE_MODULES = {
+    "blitz": ["simplify"],
+    "moderate": ["simplify", "standard"],
+    "deep": ["simplify", "standard", "deep_dive"],
+}
+OFFLINE_MODULE_TITLES = {"simplify": "The Essentials", "standard": "Core Concepts", "deep_dive": "Deep Dive"}
+
+
+def _offline_course(topic: str, pace: str) -> dict | None:
+    """
+    A course assembled from the offline library's lessons for the closest
+    topic (one module per lesson mode), or None when it has nothing close.
+    """
+    if offline_library is None:
+        return None
+    lessons = {}
+    library_topic = None
+    for mode in OFFLINE_COURSE_MODULES.get(pace, OFFLINE_COURSE_MODULES["moderate"]):
+        entry = offline_library.lookup(LESSON, topic, mode)
+        if entry is None or (library_topic is not None and entry.topic != library_topic):
+            continue
+        library_topic = entry.topic
+        lessons.setdefault(entry.variant, entry.text)
+    if not lessons:
+        return None
+    return {
+        "title": library_topic,
+        "description": f"A ready-made course on {library_topic}, served while course generation is unavailable.",
+        "difficulty": "intermediate",
+        "thumbnail_url": None,
+        "modules": [
+            {
+                "title": f"Module {i}: {OFFLINE_MODULE_TITLES[mode]}",
+                "description": f"{OFFLINE_MODULE_TITLES[mode]} of {library_topic}",
+                "lessons": [{"title": f"Lesson {i}.1: {library_topic}", "content": text}],
+            }
+            for i, (mode, text) in enumerate(lessons.items(), start=1)
+        ],
+    }
+
+
 def _create_fallback_course(topic: str, pace: str) -> dict:
     """Fallback course structure if AI generation fails"""
     module_count = {"blitz": 3, "moderate": 5, "deep": 8}.get(pace, 5)
@@ -350,21 +826,782 @@ def _create_fallback_course(topic: str, pace: str) -> dict:
 
 
 @app.post("/api/ai/personalize-saga", response_model=PersonalizeSagaResponse)
-async def personalize_saga(payload: PersonalizeSagaRequest):
+async def personalize_saga(
+    payload: PersonalizeSagaRequest,
+    request: Request,
+    accept_encoding: str | None = Header(default=None),
+    identity: Identity | None = Depends(current_identity),
+):
     """
     Generate a personalized Python programming saga journey based on student preferences.
+    The saga can be fetched again by its id from GET /api/ai/sagas/{id}.
+
+    Sagas built from recommendations are not charged to the AI quota.
     """
+    mark("handler_start")
     try:
-        chapters_data = await personalization_service.generate_personalized_saga(
-            python_skill_level=payload.python_skill_level,
-            learning_goals=payload.learning_goals,
-            preferred_pace=payload.preferred_pace,
-            interests=payload.interests,
-            learning_style=payload.learning_style
+        chapters_data = personalization_service.recommended_saga(
+            payload.completed_topics, payload.python_skill_level
         )
-        
+        if chapters_data is None:
+            preferences = " ".join([*payload.learning_goals, *payload.interests])
+            async with _metered(_quota_principals(identity, request.client), "saga", preferences) as charge:
+                chapters_data = await personalization_service.generate_personalized_saga(
+                    python_skill_level=payload.python_skill_level,
+                    learning_goals=payload.learning_goals,
+                    preferred_pace=payload.preferred_pace,
+                    interests=payload.interests,
+                    learning_style=payload.learning_style,
+                )
+                charge.record(preferences, str(chapters_data))
+
         chapters = [SagaChapter(**ch) for ch in chapters_data]
-        return PersonalizeSagaResponse(chapters=chapters)
+        document = PersonalizeSagaResponse(chapters=chapters).model_dump(exclude={"id"})
+        mark("handler_end")
+        return await _store_payload("saga", document, accept_encoding)
+    except HTTPException:
+        raise
     except Exception as exc:
         raise HTTPException(status_code=500, detail=f"Failed to generate personalized saga: {str(exc)}") from exc
 
+
+_STORED_PAYLOAD_CACHE = "private, max-age=31536000, immutable"
+
+
+@app.get("/api/ai/courses/{course_id}")
+async def get_course(
+    course_id: str,
+    accept_encoding: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    A previously generated course by id, without regenerating or
+    re-encoding it. Ids are content hashes, so the response never changes.
+    """
+    encoded = payload_store.get("course", course_id)
+    if encoded is None:
+        raise HTTPException(status_code=404, detail="Course not found.")
+    return _payload_response(encoded, accept_encoding, if_none_match, _STORED_PAYLOAD_CACHE)
+
+
+@app.get("/api/ai/sagas/{saga_id}")
+async def get_saga(
+    saga_id: str,
+    accept_encoding: str | None = Header(default=None),
+    if_none_match: str | None = Header(default=None),
+):
+    """
+    A previously generated saga by id (same caching as courses).
+    """
+    encoded = payload_store.get("saga", saga_id)
+    if encoded is None:
+        raise HTTPException(status_code=404, detail="Saga not found.")
+    return _payload_response(encoded, accept_encoding, if_none_match, _STORED_PAYLOAD_CACHE)
+
+
+@app.post("/api/ai/saga/next-chapters")
+async def next_saga_chapters(payload: NextChaptersRequest):
+    """
+    Chapters/topics similar students completed next. Empty when the
+    recommender is not built or has no signal for these completions; picks
+    scoring below RECOMMENDER_MIN_SCORE are left out, as for sagas.
+    """
+    recommender = personalization_service.recommender
+    if recommender is None:
+        return {"recommendations": []}
+    limit = max(1, min(payload.limit, 50))
+    return {
+        "recommendations": recommender.recommend(
+            payload.completed_topics, limit=limit, min_score=personalization_service.min_score
+        )
+    }
+
+
+def _require_progress_writer() -> ProgressWriter:
+    if progress_writer is None:
+        raise HTTPException(status_code=503, detail="Progress persistence is not configured (set PROGRESS_DB_PATH).")
+    return progress_writer
+
+
+@app.post("/api/saga/complete-chapter")
+async def complete_saga_chapter(payload: CompleteChapterRequest, identity: Identity = Depends(require_student)):
+    """
+    Completes a chapter for the signed-in student, unlocks the next one and
+    awards the chapter's XP from the chapter catalog.
+
+    Writes are batched with other completions; the response is sent once
+    this one is committed. Completing an already completed chapter is a
+    no-op.
+
+    Only chapters of the default catalog (saga_chapters) are handled.
+    Chapters of personalized sagas are not in it and get a 404.
+    """
+    writer = _require_progress_writer()
+    try:
+        chapter = await writer.chapter(payload.chapter_id)
+        if chapter is None:
+            raise HTTPException(status_code=404, detail="Chapter not found.")
+        await writer.complete_chapter(
+            identity.student_id,
+            payload.chapter_id,
+            xp_earned=chapter["xp_reward"],
+            time_spent_minutes=max(0, min(payload.time_spent_minutes, MAX_CHAPTER_MINUTES)),
+            next_chapter_id=chapter["next_chapter_id"],
+        )
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    return {
+        "status": "completed",
+        "student_id": identity.student_id,
+        "chapter_id": payload.chapter_id,
+        "xp_earned": chapter["xp_reward"],
+    }
+
+
+@app.post("/api/saga/xp", dependencies=[Depends(require_admin)])
+async def add_student_xp(payload: AddXPRequest):
+    """
+    Adds XP outside a chapter completion (batched with other writes);
+    returns once committed. Service-to-service only.
+    """
+    if not 0 < payload.amount <= MAX_XP_AWARD:
+        raise HTTPException(status_code=400, detail=f"amount must be between 1 and {MAX_XP_AWARD}.")
+    writer = _require_progress_writer()
+    try:
+        await writer.add_xp(payload.student_id, payload.amount)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+    return {"status": "ok"}
+
+
+@app.get("/api/saga/progress/{student_id}")
+async def get_saga_progress(student_id: str, identity: Identity = Depends(require_student)):
+    """Committed XP and chapter statuses of the signed-in student."""
+    _require_own_student(student_id, identity)
+    return await _require_progress_writer().progress(identity.student_id)
+
+
+@app.get("/api/admin/progress-writer", dependencies=[Depends(require_admin)])
+async def progress_writer_stats():
+    """Batching stats for saga progress / XP writes."""
+    return _require_progress_writer().stats()
+
+
+@app.get("/api/admin/offline-library", dependencies=[Depends(require_admin)])
+async def offline_library_stats():
+    """
+    Offline library size and how often it stood in for Gemini (exact vs. closest topic).
+    """
+    if offline_library is None:
+        return {"enabled": False}
+    return {"enabled": True, **offline_library.stats()}
+
+
+@app.get("/api/admin/payloads", dependencies=[Depends(require_admin)])
+async def payload_store_stats():
+    """
+    Stored course/saga payloads: size, compression, 304s and encodings served.
+    """
+    return payload_store.stats()
+
+
+@app.get("/api/admin/prompts", dependencies=[Depends(require_admin)])
+async def prompt_usage():
+    """
+    Estimated prompt/response tokens per route, and per template the full vs.
+    compact parse-success rate and latency (PROMPT_COMPACTION A/B).
+    """
+    return prompt_registry.stats()
+
+
+@app.post("/api/admin/profile", dependencies=[Depends(require_admin)])
+async def run_profiler(seconds: float = 10.0, interval_ms: float = 5.0):
+    """
+    Samples every thread's stack for `seconds` and returns collapsed stacks
+    (feed to flamegraph.pl / speedscope). One profile runs at a time.
+    """
+    if profiler.running:
+        raise HTTPException(status_code=409, detail="A profile is already running.")
+    try:
+        collapsed = await asyncio.to_thread(profiler.profile, seconds, max(0.001, interval_ms / 1000))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return PlainTextResponse(
+        collapsed, headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+    )
+
+
+@app.get("/api/admin/traces", dependencies=[Depends(require_admin)])
+async def request_traces(limit: int = 50, path: str | None = None):
+    """Recent sampled request traces and per-route stage p50/p95."""
+    return {
+        "sample_rate": request_tracer.sample_rate,
+        "sampled": request_tracer.sampled,
+        "stages": request_tracer.summary(),
+        "traces": request_tracer.recent(max(1, min(limit, 500)), path=path),
+    }
+
+
+@app.put("/api/admin/traces/sample-rate", dependencies=[Depends(require_admin)])
+async def set_trace_sample_rate(payload: TraceSampleRateRequest):
+    """Changes the share of requests traced by this worker (0 turns tracing off)."""
+    try:
+        request_tracer.set_rate(payload.rate)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"sample_rate": request_tracer.sample_rate}
+
+
+@app.get("/api/admin/quota", dependencies=[Depends(require_admin)])
+async def quota_stats():
+    """This worker's quota checks/rejections and the configured limits."""
+    if ai_quota is None:
+        return {"enabled": False}
+    return {"enabled": True, **ai_quota.stats()}
+
+
+@app.get("/api/admin/quota/{kind}/{principal_id}", dependencies=[Depends(require_admin)])
+async def quota_usage(kind: str, principal_id: str):
+    """Sliding-window usage of one student or org, shared across workers."""
+    if ai_quota is None:
+        raise HTTPException(status_code=503, detail="AI quota accounting is not configured (set QUOTA_PATH).")
+    if kind not in ai_quota.limits:
+        raise HTTPException(status_code=400, detail=f"Unknown principal kind: {kind}")
+    return {"kind": kind, "id": principal_id, "windows": ai_quota.usage(kind, principal_id)}
+
+
+@app.get("/api/admin/leaderboards", dependencies=[Depends(require_admin)])
+async def leaderboard_stats():
+    """Board sizes and retained weekly windows."""
+    return leaderboards.stats()
+
+
+@app.get("/api/admin/recommender", dependencies=[Depends(require_admin)])
+async def recommender_stats():
+    """Neighbour table size and how often sagas skipped the LLM."""
+    recommender = personalization_service.recommender
+    return {
+        "loaded": recommender is not None,
+        "table": recommender.stats() if recommender is not None else None,
+        "saga_sources": personalization_service.saga_sources,
+    }
+
+
+@app.get("/api/admin/models", dependencies=[Depends(require_admin)])
+async def list_registered_models():
+    """
+    Lists model versions in the registry, flagging the active and shadow ones.
+    """
+    return {"models": registry.list_models()}
+
+
+@app.post("/api/admin/models/activate", dependencies=[Depends(require_admin)])
+async def activate_model(payload: ModelActivateRequest):
+    """
+    Hot-swaps the served model. In-flight predictions finish on the old one.
+    """
+    try:
+        artifact = registry.activate(payload.version)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return {"active": artifact.version}
+
+
+@app.get("/api/admin/models/shadow", dependencies=[Depends(require_admin)])
+async def shadow_model_stats():
+    """
+    Agreement and latency stats for the shadow model, if one is configured.
+    """
+    shadow = registry.shadow
+    return {"shadow": shadow.stats() if shadow else None}
+
+
+@app.post("/api/admin/models/shadow", dependencies=[Depends(require_admin)])
+async def set_shadow_model(payload: ShadowModelRequest):
+    """
+    Scores a sampled fraction of live traffic with a candidate model, off the request path.
+    """
+    try:
+        shadow = registry.set_shadow(payload.version, payload.sample_rate)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return {"shadow": shadow.stats()}
+
+
+@app.delete("/api/admin/models/shadow", dependencies=[Depends(require_admin)])
+async def clear_shadow_model():
+    """
+    Stops shadow scoring and returns the final stats.
+    """
+    return {"shadow": registry.clear_shadow()}
+
+
+@app.get("/api/admin/drift", dependencies=[Depends(require_admin)])
+async def drift_report():
+    """
+    PSI/KS drift of live prediction inputs and outputs against the active
+    model's training reference profile.
+    """
+    artifact = registry.active
+    monitor = artifact.get_drift_monitor() if artifact is not None else None
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Active model has no reference profile.")
+    return {"version": artifact.version, **monitor.report()}
+
+
+@app.post("/api/admin/drift/reset", dependencies=[Depends(require_admin)])
+async def reset_drift():
+    """
+    Clears the live sketches, e.g. after a known upstream data change.
+    """
+    artifact = registry.active
+    monitor = artifact.get_drift_monitor() if artifact is not None else None
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Active model has no reference profile.")
+    monitor.reset()
+    return {"version": artifact.version, "reset": True}
+
+
+@app.get("/api/admin/ai/cache", dependencies=[Depends(require_admin)])
+async def ai_cache_stats():
+    """
+    Response-cache hit rates, speculative prefetch hits and wasted generations,
+    and how often visualize diagrams needed repair or a re-prompt.
+    """
+    prefetcher = gemini_service.prefetcher
+    return {
+        "cache": gemini_service.cache.stats(),
+        "prefetch": prefetcher.stats() if prefetcher is not None else None,
+        "diagrams": gemini_service.diagram_stats.snapshot(),
+        "assigned": gemini_service.assigned_cache.stats(),
+        "bulk_jobs": bulk_generation.stats(),
+    }
+
+
+@app.get("/api/admin/ai/content", dependencies=[Depends(require_admin)])
+async def ai_content_store_stats():
+    """
+    Content store size, compression and dedup ratios, and lookup latency.
+    """
+    if gemini_service.store is None:
+        return {"enabled": False}
+    return {"enabled": True, **gemini_service.store.stats()}
+
+
+def _byte_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single-range `Range: bytes=...` header into [start, end).
+
+    Raises:
+        HTTPException: 416 when the range is malformed or unsatisfiable.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    first, dash, last = spec.strip().partition("-")
+    try:
+        if unit.strip() != "bytes" or not dash or "," in spec:
+            raise ValueError(header)
+        if first:
+            start, end = int(first), (int(last) + 1 if last else size)
+        else:
+            start, end = max(0, size - int(last)), size
+    except ValueError as exc:
+        raise HTTPException(status_code=416, detail="Invalid Range header.") from exc
+    end = min(end, size)
+    if start >= end:
+        raise HTTPException(status_code=416, detail="Range not satisfiable.", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+
+@app.get("/api/search")
+async def search_content(q: str, kind: str | None = None, limit: int = 10):
+    """
+    BM25 search over generated courses and lessons, e.g. to find an existing
+    course on a topic before generating a new one. kind: 'course' | 'lesson'.
+    """
+    if kind is not None and kind not in ("course", "lesson"):
+        raise HTTPException(status_code=400, detail="kind must be 'course' or 'lesson'.")
+    results = search_index.search(q, limit=max(1, min(limit, 50)), kind=kind)
+    return {"query": q, "documents": len(search_index), "results": results}
+
+
+@app.get("/api/admin/search", dependencies=[Depends(require_admin)])
+async def search_index_stats():
+    """
+    Search index size and posting-list compactness.
+    """
+    return search_index.stats()
+
+
+@app.get("/api/content/{content_hash}")
+async def read_content(content_hash: str, range: str | None = Header(default=None)):
+    """
+    Streams stored generated content by hash; honours single byte ranges.
+    """
+    store = gemini_service.store
+    info = store.info(content_hash) if store is not None else None
+    if info is None:
+        raise HTTPException(status_code=404, detail="Content not found.")
+    size = info["size"]
+    byte_range = _byte_range(range, size)
+    start, end = byte_range or (0, size)
+    headers = {"Accept-Ranges": "bytes", "Content-Length": str(end - start), "ETag": f'"{content_hash}"'}
+    if byte_range is not None:
+        headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+    return StreamingResponse(
+        store.stream(content_hash, start, end),
+        status_code=206 if byte_range is not None else 200,
+        media_type=info["media_type"],
+        headers=headers,
+    )
+
+
+@app.get("/api/admin/ai/router", dependencies=[Depends(require_admin)])
+async def ai_router_stats():
+    """
+    Per-model circuit state and latency, plus hedge and failover counts.
+    """
+    return gemini_service.router.stats()
+
+
+@app.get("/api/admin/ai/socratic", dependencies=[Depends(require_admin)])
+async def socratic_session_stats():
+    """
+    Live Socratic session count, memory use and evictions.
+    """
+    return socratic_sessions.stats()
+
+
+@app.get("/api/admin/ai/cancellations", dependencies=[Depends(require_admin)])
+async def ai_cancellations():
+    """
+    Upstream AI calls cut short by request deadlines or client disconnects.
+    """
+    return cancellation_stats.snapshot()
+
+
+@app.put("/api/orgs/{org_id}/members", dependencies=[Depends(require_admin)])
+async def set_org_members(org_id: str, payload: OrgMembersRequest):
+    """
+    Replaces an organization's membership (mirrors `organization_members`).
+    With a progress DB the leaderboard membership is stored there, so every
+    worker picks it up.
+    """
+    cohort_risk.set_members(org_id, payload.student_ids)
+    if leaderboard_follower is not None:
+        await progress_writer.set_members(org_id, payload.student_ids)
+        await leaderboard_follower.poll()
+    else:
+        leaderboards.set_members(org_id, payload.student_ids)
+    return {"organization_id": org_id, "size": cohort_risk.size(org_id)}
+
+
+@app.get("/api/leaderboard")
+async def global_leaderboard(k: int = 10, window: str = ALL_TIME, offset: int = 0):
+    """
+    Top students by XP, all time or this week (window=week).
+    """
+    try:
+        board = leaderboards.top(max(1, min(k, 100)), window=window, offset=max(0, offset))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return {"window": window, **board}
+
+
+@app.get("/api/orgs/{org_id}/leaderboard")
+async def org_leaderboard(org_id: str, k: int = 10, window: str = ALL_TIME, offset: int = 0):
+    """
+    Top members of an organization by XP, all time or this week.
+    """
+    if window not in (ALL_TIME, WEEK):
+        raise HTTPException(status_code=400, detail=f"Unknown window: {window}")
+    try:
+        board = leaderboards.top(max(1, min(k, 100)), org_id=org_id, window=window, offset=max(0, offset))
+    except RuntimeError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return {"organization_id": org_id, "window": window, **board}
+
+
+@app.get("/api/students/{student_id}/rank")
+async def student_rank(student_id: str, org_id: str | None = None, window: str = ALL_TIME):
+    """
+    A student's rank among N (globally or within an organization).
+    """
+    if window not in (ALL_TIME, WEEK):
+        raise HTTPException(status_code=400, detail=f"Unknown window: {window}")
+    try:
+        rank = leaderboards.rank(student_id, org_id=org_id, window=window)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    if rank is None:
+        raise HTTPException(status_code=404, detail="Student is not on this leaderboard.")
+    return {"student_id": student_id, "organization_id": org_id, "window": window, **rank}
+
+
+@app.post("/api/orgs/{org_id}/bulk-generate", status_code=202, dependencies=[Depends(require_admin)])
+async def bulk_generate(org_id: str, payload: BulkGenerateRequest):
+    """
+    Precomputes lesson variants, a quiz bank and diagrams for a mentor's
+    assigned topics in one background job; poll the job for progress.
+    Every generation is charged to the organization's AI quota.
+
+    Needs CONTENT_STORE_PATH: jobs and the assigned cache live in the worker
+    that ran the job, and other workers only see its output through the
+    shared content store. The job itself can only be polled on that worker.
+    """
+    if gemini_service.store is None:
+        raise HTTPException(
+            status_code=503, detail="Bulk generation needs the shared content store (CONTENT_STORE_PATH)."
+        )
+    try:
+        job = bulk_generation.submit(
+            org_id,
+            payload.topics,
+            diagram_types=payload.diagram_types,
+            num_questions=payload.num_questions or 5,
+        )
+    except RuntimeError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    return job.describe()
+
+
+@app.get("/api/orgs/{org_id}/bulk-jobs", dependencies=[Depends(require_admin)])
+async def list_bulk_jobs(org_id: str):
+    """
+    Bulk generation jobs submitted for an organization, oldest first.
+    """
+    return {"organization_id": org_id, "jobs": [job.describe() for job in bulk_generation.jobs_for(org_id)]}
+
+
+@app.get("/api/orgs/{org_id}/bulk-jobs/{job_id}", dependencies=[Depends(require_admin)])
+async def get_bulk_job(org_id: str, job_id: str):
+    """
+    Progress of one bulk generation job.
+    """
+    job = bulk_generation.get(org_id, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Bulk job not found for this organization.")
+    return job.describe()
+
+
+@app.put("/api/students/{student_id}/risk", dependencies=[Depends(require_admin)])
+async def update_student_risk(student_id: str, payload: StudentRiskUpdateRequest):
+    """
+    Re-scores one student; only that student's entries in their orgs' indexes move.
+    """
+    risk_score = cohort_risk.update_student(
+        student_id,
+        interactions=payload.interactions,
+        last_score=payload.last_score,
+        days_overdue=payload.days_overdue,
+    )
+    return {"student_id": student_id, "risk_score": risk_score}
+
+
+@app.get("/api/orgs/{org_id}/at-risk", response_model=OrgRiskResponse, dependencies=[Depends(require_admin)])
+async def org_at_risk(org_id: str, k: int = 20, min_score: float | None = None):
+    """
+    The k most at-risk students in an organization, or, with min_score,
+    the students at or above that risk score (count plus the first k).
+    """
+    try:
+        if min_score is None:
+            students = cohort_risk.top(org_id, k)
+            count = None
+        else:
+            result = cohort_risk.at_least(org_id, min_score, limit=k)
+            students, count = result["students"], result["count"]
+        size = cohort_risk.size(org_id)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return OrgRiskResponse(organization_id=org_id, size=size, count=count, students=students)
+
+
+@app.get("/api/orgs/{org_id}/at-risk/{student_id}/percentile", dependencies=[Depends(require_admin)])
+async def org_risk_percentile(org_id: str, student_id: str):
+    """
+    Share of the organization with a strictly lower risk score than this student.
+    """
+    try:
+        percentile = cohort_risk.percentile(org_id, student_id)
+    except RuntimeError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    if percentile is None:
+        raise HTTPException(status_code=404, detail="Student has no risk score in this organization.")
+    return {"organization_id": org_id, "student_id": student_id, "percentile": percentile}
+
+
+@app.post("/api/quiz/answers")
+async def record_quiz_answers(payload: QuizAnswersRequest, identity: Identity = Depends(require_student)):
+    """
+    Grades the signed-in student's answers against the stored quiz items and
+    feeds the results into the knowledge tracer, in order.
+    """
+    items = [review_scheduler.get_item(event.item_id) for event in payload.events]
+    for event, item in zip(payload.events, items):
+        if item is None:
+            raise HTTPException(status_code=404, detail=f"Unknown quiz item: {event.item_id}")
+    correct = [is_correct_answer(item, event.answer) for event, item in zip(payload.events, items)]
+    applied = knowledge_tracer.apply_events(
+        [identity.student_id] * len(items),
+        [item.get("topic") or "" for item in items],
+        correct,
+    )
+    return {"applied": applied, "correct": correct}
+
+
+def _require_own_student(student_id: str, identity: Identity) -> None:
+    """Per-student reads are for that student only."""
+    if student_id != identity.student_id:
+        raise HTTPException(status_code=403, detail="Not your student record.")
+
+
+@app.get("/api/students/{student_id}/mastery")
+async def student_mastery(student_id: str, topic: str | None = None, identity: Identity = Depends(require_student)):
+    """
+    Traced mastery per topic, or for one topic with its struggle score and
+    the explanation mode the tutor would pick (signed-in student only).
+    """
+    _require_own_student(student_id, identity)
+    if topic is None:
+        return {"student_id": student_id, "mastery": knowledge_tracer.student_mastery(student_id)}
+    struggle = knowledge_tracer.struggle_score(student_id, topic)
+    if struggle is None:
+        raise HTTPException(status_code=404, detail="No quiz history for this student and topic.")
+    return {
+        "student_id": student_id,
+        "topic": topic,
+        "mastery": knowledge_tracer.mastery(student_id, topic),
+        "struggle_score": struggle,
+        "mode": AdaptiveTutor.mode_for_struggle(struggle),
+    }
+
+
+@app.post("/api/reviews/grades")
+async def record_review_grades(payload: ReviewGradesRequest, identity: Identity = Depends(require_student)):
+    """
+    Bulk-ingests the signed-in student's review grades (0-5) and reschedules
+    their cards. Only items already on their schedule can be graded.
+    """
+    try:
+        applied = review_scheduler.grade_many(
+            [identity.student_id] * len(payload.grades),
+            [g.item_id for g in payload.grades],
+            [g.grade for g in payload.grades],
+            create=False,
+        )
+    except RuntimeError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    return {"applied": applied}
+
+
+@app.get("/api/students/{student_id}/reviews/due")
+async def student_due_reviews(student_id: str, limit: int = 20, identity: Identity = Depends(require_student)):
+    """
+    The student's next due review cards, earliest first (signed-in student only).
+    """
+    _require_own_student(student_id, identity)
+    return {
+        "student_id": student_id,
+        "due_count": review_scheduler.due_count(student_id),
+        "cards": review_scheduler.due_cards(student_id, limit=limit),
+    }
+
+
+@app.get("/api/admin/reviews/overdue", dependencies=[Depends(require_admin)])
+async def overdue_reviews(limit: int = 100):
+    """
+    Students with overdue reviews, most overdue first.
+    """
+    return {
+        "students": review_scheduler.overdue_students(limit=limit),
+        **review_scheduler.stats(),
+    }
+
+
+@app.websocket("/ws/socratic")
+async def socratic_session(websocket: WebSocket):
+    """
+    Stateful Socratic tutoring over a WebSocket. JSON messages:
+
+      -> {"type": "start", "topic": "...", "session_id": "..." (optional, to resume)}
+      <- {"type": "session", "session_id": "...", "resumed": bool}
+      -> {"type": "message", "text": "..."}
+      <- {"type": "delta", "text": "..."} (streamed), then
+         {"type": "turn_end", "turn": n, "latency_ms": ..., "prompt_tokens": ...}
+      <- {"type": "error", "detail": "..."} on bad input, AI failure or quota
+
+    Each message turn is charged to the AI quota on its own.
+    """
+    try:
+        identity = current_identity(websocket.headers.get("authorization"))
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    principals = _quota_principals(identity, websocket.client)
+    await websocket.accept()
+    session = None
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            if len(raw) > MAX_SOCRATIC_FRAME_CHARS:
+                await websocket.send_json({"type": "error", "detail": "Message too large."})
+                continue
+            try:
+                data = json.loads(raw)
+            except ValueError:
+                await websocket.send_json({"type": "error", "detail": "Messages must be JSON objects."})
+                continue
+            kind = data.get("type") if isinstance(data, dict) else None
+
+            if kind == "start":
+                session = socratic_sessions.get(data["session_id"]) if data.get("session_id") else None
+                resumed = session is not None
+                if session is None:
+                    topic = (data.get("topic") or "").strip()[:MAX_SOCRATIC_TOPIC_CHARS]
+                    if not topic:
+                        await websocket.send_json({"type": "error", "detail": "A topic is required to start."})
+                        continue
+                    session = socratic_sessions.create(topic)
+                await websocket.send_json(
+                    {"type": "session", "session_id": session.session_id, "resumed": resumed}
+                )
+            elif kind == "message":
+                text = (data.get("text") or "").strip()[:MAX_SOCRATIC_MESSAGE_CHARS]
+                if session is None or not text:
+                    await websocket.send_json(
+                        {"type": "error", "detail": "Send a start message, then non-empty text."}
+                    )
+                    continue
+                prompt = session.build_prompt(text)
+                started = time.perf_counter()
+                reply = []
+                try:
+                    async with _metered(principals, "socratic", prompt) as charge:
+                        try:
+                            with deadline_scope(SOCRATIC_DEADLINE):
+                                async for delta in gemini_service.stream_generate(prompt):
+                                    reply.append(delta)
+                                    await websocket.send_json({"type": "delta", "text": delta})
+                        finally:
+                            if reply:
+                                charge.record(prompt, "".join(reply))
+                except HTTPException as exc:
+                    await websocket.send_json({"type": "error", "detail": exc.detail})
+                    continue
+                except RuntimeError as exc:
+                    await websocket.send_json({"type": "error", "detail": str(exc)})
+                    continue
+                session.record_turn(text, "".join(reply))
+                socratic_sessions.touch(session)
+                await websocket.send_json({
+                    "type": "turn_end",
+                    "turn": session.turn_count,
+                    "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "prompt_tokens": estimate_tokens(prompt),
+                })
+            else:
+                await websocket.send_json({"type": "error", "detail": f"Unknown message type: {kind}"})
+    except WebSocketDisconnect:
+        return
@@ -34,3 +34,20 @@ def generate_mock_student_status():
     }
 
 
+def generate_mock_student_frame(n: int, seed: int = 42):
+    """
+    Vectorized counterpart of generate_mock_student_status for n students,
+    with the same field distributions. Used by batch-scoring benchmarks.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "student_id": np.char.add("student-", np.arange(n).astype(str)),
+        "interactions": rng.integers(0, 31, n, dtype=np.int32),
+        "last_score": rng.integers(0, 101, n, dtype=np.int32),
+        "days_overdue": rng.choice(np.array([0, 0, 1, 2, 3], dtype=np.int32), n),
+        "studied_credits": rng.choice(np.array([0, 15, 30, 45, 60, 90, 120], dtype=np.int32), n),
+        "total_clicks": rng.integers(0, 501, n, dtype=np.int32),
+    })
@@ -3,11 +3,18 @@ from pydantic import BaseModel
 
 class AIExplainRequest(BaseModel):
     topic: str
-    struggle_score: int
+    # Ignored when the knowledge tracer has quiz history for the signed-in student.
+    struggle_score: int | None = None
 
 
 class AIExplainResponse(BaseModel):
     explanation: str
+    cached: bool = False  # served from the offline library while the AI is unavailable
+
+
+class FeatureContribution(BaseModel):
+    feature: str
+    contribution: float
 
 
 class StudentStatus(BaseModel):
@@ -20,6 +27,9 @@ class StudentStatus(BaseModel):
     studied_credits: int
     total_clicks: int
     predicted_final_result: int
+    risk_factors: list[FeatureContribution] = []
+    result_factors: list[FeatureContribution] = []
+    result_explained: bool = False  # False when the serving model has no explainer
 
 
 class GenerateContentRequest(BaseModel):
@@ -38,12 +48,14 @@ class AIGenerateLessonRequest(BaseModel):
 
 class AIGenerateLessonResponse(BaseModel):
     content: str
+    cached: bool = False  # served from the offline library while the AI is unavailable
 
 
 class StudyToolQuizItem(BaseModel):
     question: str
     options: list[str]
     correctAnswer: str
+    item_id: str | None = None  # set when scheduled for spaced repetition
 
 
 class StudyToolRequest(BaseModel):
@@ -61,6 +73,8 @@ class StudyToolResponse(BaseModel):
     mode: str
     content: str | None = None
     quiz: list[StudyToolQuizItem] | None = None
+    cached: bool = False  # served from the offline library while the AI is unavailable
+    cached_topic: str | None = None  # library topic that was served (may differ from the request)
 
 
 class PersonalizeSagaRequest(BaseModel):
@@ -69,6 +83,7 @@ class PersonalizeSagaRequest(BaseModel):
     preferred_pace: str  # 'slow' | 'moderate' | 'fast'
     interests: list[str]
     learning_style: str = "interactive"  # 'visual' | 'text' | 'interactive'
+    completed_topics: list[str] = []  # chapters/topics from saga_progress
 
 
 class SagaChapter(BaseModel):
@@ -84,6 +99,79 @@ class SagaChapter(BaseModel):
 
 
 class PersonalizeSagaResponse(BaseModel):
+    id: str | None = None  # fetch again from GET /api/ai/sagas/{id}
     chapters: list[SagaChapter]
 
 
+class NextChaptersRequest(BaseModel):
+    completed_topics: list[str]
+    limit: int = 5
+
+
+class CompleteChapterRequest(BaseModel):
+    chapter_id: str
+    time_spent_minutes: int = 0
+
+
+class AddXPRequest(BaseModel):
+    student_id: str
+    amount: int
+
+
+class ModelActivateRequest(BaseModel):
+    version: str
+
+
+class TraceSampleRateRequest(BaseModel):
+    rate: float  # 0 disables tracing; 1 traces every request
+
+
+class ShadowModelRequest(BaseModel):
+    version: str
+    sample_rate: float = 0.1
+
+
+class OrgMembersRequest(BaseModel):
+    student_ids: list[str]
+
+
+class BulkGenerateRequest(BaseModel):
+    topics: list[str]
+    diagram_types: list[str] | None = None  # defaults to ['flowchart']
+    num_questions: int | None = None  # quiz bank size; matches the study-tool default of 5
+
+
+class StudentRiskUpdateRequest(BaseModel):
+    interactions: int
+    last_score: int
+    days_overdue: int
+
+
+class RiskEntry(BaseModel):
+    student_id: str
+    risk_score: float
+
+
+class OrgRiskResponse(BaseModel):
+    organization_id: str
+    size: int
+    count: int | None = None
+    students: list[RiskEntry]
+
+
+class QuizAnswerEvent(BaseModel):
+    item_id: str  # StudyToolQuizItem.item_id of the question answered
+    answer: str  # the option the student picked
+
+
+class QuizAnswersRequest(BaseModel):
+    events: list[QuizAnswerEvent]
+
+
+class ReviewGrade(BaseModel):
+    item_id: str
+    grade: int  # SM-2 scale, 0-5
+
+
+class ReviewGradesRequest(BaseModel):
+    grades: list[ReviewGrade]
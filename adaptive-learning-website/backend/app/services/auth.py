@@ -0,0 +1,87 @@
+"""
+Student identity from Supabase access tokens.
+
+The frontend signs in with Supabase and sends the session's access token as
+`Authorization: Bearer <jwt>`. Supabase signs these with the project's JWT
+secret (HS256), so the API verifies them locally with AUTH_JWT_SECRET and no
+round trip. The token's `sub` is the auth user id, which is also the
+`students.id` primary key; an organization id, when present, comes from the
+server-controlled `app_metadata` claims, never from the request body.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Any, Dict, Optional
+
+
+class AuthError(RuntimeError):
+    """The token is malformed, forged, expired or for another audience."""
+
+
+class Identity:
+    """The authenticated student behind a request."""
+
+    __slots__ = ("student_id", "organization_id")
+
+    def __init__(self, student_id: str, organization_id: Optional[str] = None) -> None:
+        self.student_id = student_id
+        self.organization_id = organization_id
+
+
+def _b64decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def sign_access_token(claims: Dict[str, Any], secret: str) -> str:
+    """HS256 token for `claims`; used by tests and local tooling."""
+    header = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode("utf-8"))
+    body = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    signature = hmac.new(secret.encode("utf-8"), f"{header}.{body}".encode("ascii"), hashlib.sha256).digest()
+    return f"{header}.{body}.{_b64encode(signature)}"
+
+
+def verify_access_token(
+    token: str,
+    secret: str,
+    audience: str = "authenticated",
+    leeway: int = 30,
+    now: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Claims of an HS256 access token. Raises AuthError unless the signature,
+    expiry and audience all check out.
+    """
+    try:
+        header_b64, body_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64decode(header_b64))
+        claims = json.loads(_b64decode(body_b64))
+        signature = _b64decode(signature_b64)
+    except (ValueError, TypeError) as exc:
+        raise AuthError("Malformed access token.") from exc
+    if not isinstance(header, dict) or header.get("alg") != "HS256" or not isinstance(claims, dict):
+        raise AuthError("Unsupported access token.")
+    expected = hmac.new(secret.encode("utf-8"), f"{header_b64}.{body_b64}".encode("ascii"), hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise AuthError("Invalid access token signature.")
+    now = time.time() if now is None else now
+    exp = claims.get("exp")
+    if not isinstance(exp, (int, float)) or exp + leeway < now:
+        raise AuthError("Access token expired.")
+    aud = claims.get("aud")
+    if audience and audience != aud and not (isinstance(aud, list) and audience in aud):
+        raise AuthError("Access token is for another audience.")
+    if not claims.get("sub"):
+        raise AuthError("Access token has no subject.")
+    return claims
+
+
+def identity_from_claims(claims: Dict[str, Any]) -> Identity:
+    app_metadata = claims.get("app_metadata") or {}
+    organization_id = app_metadata.get("organization_id") if isinstance(app_metadata, dict) else None
+    return Identity(str(claims["sub"]), str(organization_id) if organization_id else None)
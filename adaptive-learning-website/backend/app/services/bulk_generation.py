@@ -0,0 +1,208 @@
+"""
+Class-wide precomputation of study content for mentor assignments.
+
+A mentor submits an organization and a list of topics. One background job
+then generates every lesson variant, a quiz bank and the requested diagrams
+for each topic into GeminiService's assigned cache. As a result, the
+students' own study-tool requests for those topics are cache hits instead of
+one generation per student.
+
+Generations from all jobs share one concurrency limit. With a SharedQuota
+every unit is charged to the organization's AI quota before it runs, and
+units that fail or are already cached get their reservation back. Each
+job reports progress as it goes, and a job stops early once the Gemini
+quota or the organization's quota runs out.
+"""
+import asyncio
+import contextvars
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .model_router import is_quota_error
+from .prefetch import LESSON_MODES
+from .quota import QuotaExceeded, estimate_request_tokens
+
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class BulkJob:
+    """Progress of one mentor's batch."""
+
+    def __init__(self, organization_id: str, topics: List[str], units: List[Tuple[str, str, Optional[str]]]) -> None:
+        self.job_id = uuid.uuid4().hex
+        self.organization_id = organization_id
+        self.topics = topics
+        self.units = units
+        self.status = QUEUED
+        self.generated = 0
+        self.already_cached = 0
+        self.failed = 0
+        self.errors: List[str] = []
+        self.aborted = False
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def finished_units(self) -> int:
+        return self.generated + self.already_cached + self.failed
+
+    def describe(self) -> Dict[str, Any]:
+        total = len(self.units)
+        return {
+            "job_id": self.job_id,
+            "organization_id": self.organization_id,
+            "status": self.status,
+            "topics": self.topics,
+            "total": total,
+            "generated": self.generated,
+            "already_cached": self.already_cached,
+            "failed": self.failed,
+            "progress": round(self.finished_units / total, 4) if total else 1.0,
+            "errors": self.errors,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class BulkGenerationService:
+    """
+    Schedules and tracks bulk precomputation jobs.
+
+    service must provide `precompute(tool, topic, variant, num_questions)`
+    (see GeminiService.precompute). quota, when given, is a SharedQuota
+    charged per unit under ("org", organization_id).
+    """
+
+    def __init__(
+        self,
+        service: Any,
+        concurrency: int = 4,
+        max_topics: int = 50,
+        max_jobs: int = 200,
+        quota: Optional[Any] = None,
+    ) -> None:
+        self._service = service
+        self.quota = quota
+        self.concurrency = concurrency
+        self.max_topics = max_topics
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, BulkJob]" = OrderedDict()
+        self._tasks: Set["asyncio.Task[Any]"] = set()
+        self._slot: Optional[asyncio.Semaphore] = None
+
+    def submit(
+        self,
+        organization_id: str,
+        topics: List[str],
+        diagram_types: Optional[List[str]] = None,
+        num_questions: int = 5,
+    ) -> BulkJob:
+        """
+        Queues a job for the topics; returns immediately.
+
+        Raises:
+            RuntimeError: if there are no topics or more than max_topics.
+        """
+        # Cache keys ignore case and spacing, so dedupe the same way.
+        by_key: Dict[str, str] = {}
+        for topic in topics:
+            cleaned = " ".join((topic or "").split())
+            if cleaned:
+                by_key.setdefault(cleaned.lower(), cleaned)
+        unique = list(by_key.values())
+        if not unique:
+            raise RuntimeError("Bulk generation needs at least one topic.")
+        if len(unique) > self.max_topics:
+            raise RuntimeError(f"Bulk generation accepts at most {self.max_topics} topics per job.")
+        diagrams = list(dict.fromkeys(d.lower() for d in (diagram_types or ["flowchart"]) if d))
+
+        units: List[Tuple[str, str, Optional[str]]] = []
+        for topic in unique:
+            units += [("explain", topic, mode) for mode in LESSON_MODES]
+            units.append(("quiz", topic, None))
+            units += [("visualize", topic, diagram) for diagram in diagrams]
+        job = BulkJob(organization_id, unique, units)
+        self._jobs[job.job_id] = job
+        self._trim()
+
+        # A fresh context: the batch must not inherit the request's deadline.
+        task = asyncio.get_running_loop().create_task(self._run(job, num_questions), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def _trim(self) -> None:
+        for job_id in list(self._jobs):
+            if len(self._jobs) <= self.max_jobs:
+                break
+            if self._jobs[job_id].status in (COMPLETED, FAILED):
+                del self._jobs[job_id]
+
+    async def _run(self, job: BulkJob, num_questions: int) -> None:
+        if self._slot is None:
+            self._slot = asyncio.Semaphore(self.concurrency)
+        job.status = RUNNING
+        await asyncio.gather(*(self._unit(job, unit, num_questions) for unit in job.units))
+        job.status = FAILED if job.aborted or (job.failed and not job.generated + job.already_cached) else COMPLETED
+        job.finished_at = time.time()
+        print(
+            f"📦 Bulk job {job.job_id} for org {job.organization_id}: {job.status} "
+            f"({job.generated} generated, {job.already_cached} cached, {job.failed} failed)"
+        )
+
+    async def _unit(self, job: BulkJob, unit: Tuple[str, str, Optional[str]], num_questions: int) -> None:
+        tool, topic, variant = unit
+        async with self._slot:
+            if job.aborted:
+                job.failed += 1
+                return
+            principals = [("org", job.organization_id)]
+            reserved = estimate_request_tokens(tool, topic, num_questions)
+            admitted = False
+            try:
+                if self.quota is not None:
+                    self.quota.admit(principals, reserved)
+                    admitted = True
+                generated = await self._service.precompute(tool, topic, variant, num_questions=num_questions)
+            except Exception as exc:
+                if admitted:
+                    # The unit failed: give its reservation back.
+                    self.quota.settle(principals, -reserved)
+                job.failed += 1
+                if len(job.errors) < 20:
+                    job.errors.append(f"{tool} '{topic}'{f' ({variant})' if variant else ''}: {exc}")
+                if isinstance(exc, QuotaExceeded) or is_quota_error(exc):
+                    # Every remaining unit would hit the same wall.
+                    job.aborted = True
+                return
+            if not generated and self.quota is not None:
+                # Served from cache: nothing reached the model.
+                self.quota.settle(principals, -reserved)
+        if generated:
+            job.generated += 1
+        else:
+            job.already_cached += 1
+
+    def get(self, organization_id: str, job_id: str) -> Optional[BulkJob]:
+        job = self._jobs.get(job_id)
+        return job if job is not None and job.organization_id == organization_id else None
+
+    def jobs_for(self, organization_id: str) -> List[BulkJob]:
+        return [job for job in self._jobs.values() if job.organization_id == organization_id]
+
+    async def drain(self) -> None:
+        """Wait for every running job (used by tests and shutdown)."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        by_status: Dict[str, int] = {}
+        for job in self._jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {"jobs": by_status, "concurrency": self.concurrency, "max_topics": self.max_topics}
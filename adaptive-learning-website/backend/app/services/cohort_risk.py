@@ -0,0 +1,167 @@
+"""
+Org-wide at-risk ranking backed by an incrementally maintained index.
+
+Each organization (see `organizations` / `organization_members` in
+db/org_schema.sql) keeps its members' risk scores in a sorted array with a
+position map. Updating one student's features re-scores that student and
+moves only their entries, so "top 20 most at-risk", percentile and
+threshold queries are a slice or a binary search instead of a full re-score
+and sort on every request.
+"""
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .predictor import predict_student_risk
+
+
+class OrgRiskIndex:
+    """
+    Risk scores of one organization, sorted most at-risk first.
+
+    Entries are keyed (-score, student_id) so the top-k is a prefix slice
+    and ties break deterministically by student id.
+    """
+
+    def __init__(self) -> None:
+        self._keys: List[Tuple[float, str]] = []
+        self._neg_scores: List[float] = []
+        self._scores: Dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, student_id: str) -> bool:
+        return student_id in self._scores
+
+    def upsert(self, student_id: str, score: float) -> None:
+        if student_id in self._scores:
+            if self._scores[student_id] == score:
+                return
+            self.remove(student_id)
+        key = (-float(score), student_id)
+        pos = bisect_left(self._keys, key)
+        self._keys.insert(pos, key)
+        self._neg_scores.insert(pos, key[0])
+        self._scores[student_id] = float(score)
+
+    def remove(self, student_id: str) -> None:
+        score = self._scores.pop(student_id, None)
+        if score is None:
+            return
+        pos = bisect_left(self._keys, (-score, student_id))
+        del self._keys[pos]
+        del self._neg_scores[pos]
+
+    def score(self, student_id: str) -> Optional[float]:
+        return self._scores.get(student_id)
+
+    def top(self, k: int) -> List[Dict[str, Any]]:
+        return [{"student_id": sid, "risk_score": -neg} for neg, sid in self._keys[:max(0, k)]]
+
+    def count_at_least(self, threshold: float) -> int:
+        return bisect_right(self._neg_scores, -float(threshold))
+
+    def at_least(self, threshold: float, limit: int) -> List[Dict[str, Any]]:
+        return self.top(min(limit, self.count_at_least(threshold)))
+
+    def percentile(self, student_id: str) -> Optional[float]:
+        """Share of the organization (0-100) with a strictly lower risk score."""
+        score = self._scores.get(student_id)
+        if score is None:
+            return None
+        lower = len(self._keys) - bisect_right(self._neg_scores, -score)
+        return round(100.0 * lower / len(self._keys), 2)
+
+
+class CohortRiskService:
+    """
+    Keeps every organization's OrgRiskIndex in sync with membership and
+    per-student feature updates. Thread-safe.
+
+    Queries raise RuntimeError for organizations with no loaded membership.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._indexes: Dict[str, OrgRiskIndex] = {}
+        self._student_orgs: Dict[str, Set[str]] = {}
+        self._org_members: Dict[str, Set[str]] = {}
+        self._scores: Dict[str, float] = {}
+
+    def load_memberships(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Bulk-load `organization_members` rows ({organization_id, student_id})."""
+        count = 0
+        with self._lock:
+            for record in records:
+                self.add_member(str(record["organization_id"]), str(record["student_id"]))
+                count += 1
+        return count
+
+    def add_member(self, org_id: str, student_id: str) -> None:
+        with self._lock:
+            self._indexes.setdefault(org_id, OrgRiskIndex())
+            self._org_members.setdefault(org_id, set()).add(student_id)
+            self._student_orgs.setdefault(student_id, set()).add(org_id)
+            score = self._scores.get(student_id)
+            if score is not None:
+                self._indexes[org_id].upsert(student_id, score)
+
+    def remove_member(self, org_id: str, student_id: str) -> None:
+        with self._lock:
+            self._student_orgs.get(student_id, set()).discard(org_id)
+            self._org_members.get(org_id, set()).discard(student_id)
+            index = self._indexes.get(org_id)
+            if index is not None:
+                index.remove(student_id)
+
+    def set_members(self, org_id: str, student_ids: Iterable[str]) -> None:
+        """Replace an organization's membership."""
+        wanted = set(student_ids)
+        with self._lock:
+            self._indexes.setdefault(org_id, OrgRiskIndex())
+            current = set(self._org_members.get(org_id, ()))
+            for sid in current - wanted:
+                self.remove_member(org_id, sid)
+            for sid in wanted - current:
+                self.add_member(org_id, sid)
+
+    def set_score(self, student_id: str, score: float) -> None:
+        with self._lock:
+            self._scores[student_id] = float(score)
+            for org_id in self._student_orgs.get(student_id, ()):
+                self._indexes[org_id].upsert(student_id, score)
+
+    def update_student(self, student_id: str, interactions: int, last_score: int, days_overdue: int) -> int:
+        """Re-score one student from fresh engagement features; touches only their entries."""
+        score = predict_student_risk(
+            interactions=interactions, last_score=last_score, days_overdue=days_overdue
+        )
+        self.set_score(student_id, score)
+        return score
+
+    def _index(self, org_id: str) -> OrgRiskIndex:
+        index = self._indexes.get(org_id)
+        if index is None:
+            raise RuntimeError(f"Unknown organization: {org_id}")
+        return index
+
+    def top(self, org_id: str, k: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            return self._index(org_id).top(k)
+
+    def at_least(self, org_id: str, threshold: float, limit: int = 100) -> Dict[str, Any]:
+        with self._lock:
+            index = self._index(org_id)
+            return {
+                "count": index.count_at_least(threshold),
+                "students": index.at_least(threshold, limit),
+            }
+
+    def percentile(self, org_id: str, student_id: str) -> Optional[float]:
+        with self._lock:
+            return self._index(org_id).percentile(student_id)
+
+    def size(self, org_id: str) -> int:
+        with self._lock:
+            return len(self._index(org_id))
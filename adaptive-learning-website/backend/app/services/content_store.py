@@ -0,0 +1,417 @@
+"""
+Content-addressed, compressed store for generated lessons, quizzes,
+diagrams and courses.
+
+Generated text is normalized (NFC, LF line endings, no trailing spaces) and
+hashed with SHA-256. Identical content is stored once, however many
+(topic, mode, model, prompt version) entries point at it. Blobs are cut into
+fixed-size chunks that are zlib-compressed independently, so a byte range
+can be read or streamed without inflating the whole blob. A preset
+dictionary trained on our own lessons (train_dictionary) can be activated so
+that short lessons compress well too.
+
+Everything lives in one SQLite file (WAL mode, so several workers can read
+while one writes).
+"""
+import hashlib
+import heapq
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+CHUNK_SIZE = 64 * 1024
+# zlib only looks back 32 KiB, so a larger preset dictionary is wasted.
+MAX_DICT_SIZE = 32 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dictionaries (
+    dict_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    samples INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    raw_size INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    chunks INTEGER NOT NULL,
+    dict_id TEXT,
+    media_type TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    hash TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (hash, seq)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entries (
+    topic TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (topic, mode, model, prompt_version)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entries_hash ON entries(hash);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def normalize_content(text: str) -> str:
+    text = unicodedata.normalize("NFC", text or "").replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.split("\n")).strip()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
+
+
+def train_dictionary(
+    samples: Iterable[bytes],
+    size: int = 16 * 1024,
+    k: int = 8,
+    segment: int = 64,
+    max_sample_bytes: int = 4 * 1024 * 1024,
+) -> bytes:
+    """
+    Builds a zlib preset dictionary from sample documents.
+
+    A simplified COVER selection: every k-byte substring is scored by the
+    number of documents it appears in, and segments are chosen greedily by
+    the total score of k-mers they cover that no chosen segment covers yet.
+    The best segments go last, where zlib reaches them with the shortest
+    distances.
+
+    Returns:
+        The dictionary bytes (at most `size`, capped at 32 KiB).
+    """
+    size = min(size, MAX_DICT_SIZE)
+    docs: List[bytes] = []
+    doc_freq: Counter = Counter()
+    total = 0
+    for sample in samples:
+        if total >= max_sample_bytes:
+            break
+        sample = sample[: max_sample_bytes - total]
+        docs.append(sample)
+        total += len(sample)
+        doc_freq.update({sample[i:i + k] for i in range(len(sample) - k + 1)})
+    if not docs:
+        return b""
+
+    def score(seg: bytes) -> int:
+        # k-mers seen in a single document do not help other documents.
+        return sum(
+            freq for freq in (doc_freq[seg[i:i + k]] for i in range(len(seg) - k + 1)) if freq > 1
+        )
+
+    heap: List[Tuple[int, int, bytes]] = []
+    for doc in docs:
+        for start in range(0, max(1, len(doc) - segment + 1), segment // 2):
+            seg = doc[start:start + segment]
+            seg_score = score(seg)
+            if seg_score:
+                heap.append((-seg_score, len(heap), seg))
+    heapq.heapify(heap)
+
+    chosen: List[bytes] = []
+    used = 0
+    while heap and used < size:
+        neg_score, order, seg = heapq.heappop(heap)
+        fresh = score(seg)
+        if fresh == 0:
+            continue
+        if heap and fresh < -heap[0][0]:
+            # Stale score: others covered some of its k-mers; requeue.
+            heapq.heappush(heap, (-fresh, order, seg))
+            continue
+        chosen.append(seg)
+        used += len(seg)
+        for i in range(len(seg) - k + 1):
+            doc_freq[seg[i:i + k]] = 0
+    return b"".join(reversed(chosen))[-size:]
+
+
+class ContentStore:
+    """
+    Deduplicating blob store with a (topic, mode, model, prompt_version) index.
+
+    Thread-safe; one SQLite connection guarded by a lock.
+    """
+
+    def __init__(self, path: str, chunk_size: int = CHUNK_SIZE, level: int = 9) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.level = level
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._dicts: Dict[str, bytes] = {}
+        self._blob_meta: Dict[str, Tuple[int, int, Optional[str]]] = {}
+        self._latencies: Deque[float] = deque(maxlen=2000)
+        self.lookups = 0
+        self.lookup_hits = 0
+        self.deduplicated = 0
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'active_dict'").fetchone()
+        self.active_dict: Optional[str] = row[0] if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # -- dictionaries -------------------------------------------------------
+
+    def _dictionary(self, dict_id: Optional[str]) -> Optional[bytes]:
+        if dict_id is None:
+            return None
+        if dict_id not in self._dicts:
+            row = self._conn.execute("SELECT data FROM dictionaries WHERE dict_id = ?", (dict_id,)).fetchone()
+            if row is None:
+                raise RuntimeError(f"Content store dictionary {dict_id} is missing.")
+            self._dicts[dict_id] = bytes(row[0])
+        return self._dicts[dict_id]
+
+    def add_dictionary(self, data: bytes, samples: int = 0, activate: bool = True) -> str:
+        """Registers a preset dictionary; new blobs use it when active."""
+        dict_id = hashlib.sha256(data).hexdigest()[:16]
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO dictionaries (dict_id, data, samples, created_at) VALUES (?, ?, ?, ?)",
+                (dict_id, data, samples, time.time()),
+            )
+            if activate:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('active_dict', ?)", (dict_id,)
+                )
+                self.active_dict = dict_id
+            self._dicts[dict_id] = data
+        return dict_id
+
+    def samples(self, limit: int = 2000) -> Iterator[bytes]:
+        """Most recent stored documents, decompressed (training input)."""
+        with self._lock:
+            hashes = [r[0] for r in self._conn.execute(
+                "SELECT hash FROM blobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            )]
+        for blob_hash in hashes:
+            yield self.read(blob_hash)
+
+    # -- writes -------------------------------------------------------------
+
+    def _compress(self, raw: bytes, dict_id: Optional[str]) -> List[bytes]:
+        zdict = self._dictionary(dict_id)
+        chunks = []
+        for start in range(0, max(1, len(raw)), self.chunk_size):
+            comp = zlib.compressobj(self.level, zdict=zdict) if zdict else zlib.compressobj(self.level)
+            chunks.append(comp.compress(raw[start:start + self.chunk_size]) + comp.flush())
+        return chunks
+
+    def put(
+        self,
+        text: str,
+        topic: str,
+        mode: str,
+        model: str,
+        prompt_version: str,
+        media_type: str = "text/markdown",
+    ) -> str:
+        """
+        Stores generated content (once per distinct text) and indexes it.
+
+        Returns:
+            The content hash.
+        """
+        raw = normalize_content(text).encode("utf-8")
+        blob_hash = hashlib.sha256(raw).hexdigest()
+        key = (" ".join(topic.lower().split()), mode, model, prompt_version)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("SELECT 1 FROM blobs WHERE hash = ?", (blob_hash,)).fetchone():
+                    self.deduplicated += 1
+                else:
+                    # Another process may have activated a dictionary since we last looked.
+                    row = self._conn.execute("SELECT value FROM meta WHERE key = 'active_dict'").fetchone()
+                    self.active_dict = row[0] if row else None
+                    chunks = self._compress(raw, self.active_dict)
+                    self._conn.executemany(
+                        "INSERT INTO chunks (hash, seq, data) VALUES (?, ?, ?)",
+                        [(blob_hash, seq, data) for seq, data in enumerate(chunks)],
+                    )
+                    self._conn.execute(
+                        "INSERT INTO blobs (hash, raw_size, stored_size, chunk_size, chunks, dict_id, media_type, created_at)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (blob_hash, len(raw), sum(len(c) for c in chunks), self.chunk_size, len(chunks),
+                         self.active_dict, media_type, time.time()),
+                    )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries (topic, mode, model, prompt_version, hash, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    key + (blob_hash, time.time()),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return blob_hash
+
+    def recompress(self, dict_id: Optional[str]) -> int:
+        """Re-encodes every blob with the given dictionary; returns how many changed."""
+        with self._lock:
+            hashes = [r[0] for r in self._conn.execute(
+                "SELECT hash FROM blobs WHERE dict_id IS NOT ?", (dict_id,)
+            )]
+        for blob_hash in hashes:
+            raw = self.read(blob_hash)
+            with self._lock:
+                chunks = self._compress(raw, dict_id)
+                self._conn.execute("BEGIN IMMEDIATE")
+                self._conn.execute("DELETE FROM chunks WHERE hash = ?", (blob_hash,))
+                self._conn.executemany(
+                    "INSERT INTO chunks (hash, seq, data) VALUES (?, ?, ?)",
+                    [(blob_hash, seq, data) for seq, data in enumerate(chunks)],
+                )
+                self._conn.execute(
+                    "UPDATE blobs SET stored_size = ?, chunk_size = ?, chunks = ?, dict_id = ? WHERE hash = ?",
+                    (sum(len(c) for c in chunks), self.chunk_size, len(chunks), dict_id, blob_hash),
+                )
+                self._conn.execute("COMMIT")
+                self._blob_meta.pop(blob_hash, None)
+        return len(hashes)
+
+    # -- reads --------------------------------------------------------------
+
+    def lookup(self, topic: str, mode: str, model: str, prompt_version: str) -> Optional[str]:
+        """Hash of the content indexed under the key, or None."""
+        started = time.perf_counter()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash FROM entries WHERE topic = ? AND mode = ? AND model = ? AND prompt_version = ?",
+                (" ".join(topic.lower().split()), mode, model, prompt_version),
+            ).fetchone()
+            self.lookups += 1
+            self.lookup_hits += row is not None
+            self._latencies.append(time.perf_counter() - started)
+        return row[0] if row else None
+
+    def get(self, topic: str, mode: str, model: str, prompt_version: str) -> Optional[str]:
+        blob_hash = self.lookup(topic, mode, model, prompt_version)
+        return None if blob_hash is None else self.read(blob_hash).decode("utf-8")
+
+    def entries_since(self, since: float) -> List[Dict[str, Any]]:
+        """Index entries created at or after `since`, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT topic, mode, model, prompt_version, hash, created_at FROM entries"
+                " WHERE created_at >= ? ORDER BY created_at",
+                (since,),
+            ).fetchall()
+        return [
+            {"topic": t, "mode": m, "model": mo, "prompt_version": v, "hash": h, "created_at": c}
+            for t, m, mo, v, h, c in rows
+        ]
+
+    def info(self, blob_hash: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT raw_size, stored_size, chunks, dict_id, media_type FROM blobs WHERE hash = ?", (blob_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"hash": blob_hash, "size": row[0], "stored_size": row[1], "chunks": row[2],
+                "dict_id": row[3], "media_type": row[4]}
+
+    def _meta(self, blob_hash: str) -> Tuple[int, int, Optional[str]]:
+        meta = self._blob_meta.get(blob_hash)
+        if meta is None:
+            row = self._conn.execute(
+                "SELECT raw_size, chunk_size, dict_id FROM blobs WHERE hash = ?", (blob_hash,)
+            ).fetchone()
+            if row is None:
+                raise KeyError(blob_hash)
+            meta = self._blob_meta[blob_hash] = (row[0], row[1], row[2])
+        return meta
+
+    def stream(self, blob_hash: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Yields the bytes [start, end) of a blob, inflating one chunk at a time.
+
+        Raises:
+            KeyError: if the blob does not exist.
+        """
+        with self._lock:
+            size, chunk_size, dict_id = self._meta(blob_hash)
+        end = size if end is None else min(end, size)
+        pos = start
+        stale = 0
+        while pos < end:
+            seq = pos // chunk_size
+            with self._lock:
+                # Chunk and encoding in one read: a recompress (possibly by another
+                # process) swaps both in one transaction.
+                row = self._conn.execute(
+                    "SELECT c.data, b.chunk_size, b.dict_id FROM chunks c JOIN blobs b ON b.hash = c.hash"
+                    " WHERE c.hash = ? AND c.seq = ?",
+                    (blob_hash, seq),
+                ).fetchone()
+                if row is None or (row[1], row[2]) != (chunk_size, dict_id):
+                    stale += 1
+                    if stale > 3:
+                        raise RuntimeError(f"Content blob {blob_hash} keeps changing while being read.")
+                    self._blob_meta.pop(blob_hash, None)
+                    size, chunk_size, dict_id = self._meta(blob_hash)
+                    continue
+                zdict = self._dictionary(dict_id)
+            stale = 0
+            decomp = zlib.decompressobj(zdict=zdict) if zdict else zlib.decompressobj()
+            data = decomp.decompress(row[0]) + decomp.flush()
+            base = seq * chunk_size
+            yield data[pos - base:end - base]
+            pos = min(end, base + chunk_size)
+
+    def read(self, blob_hash: str, start: int = 0, end: Optional[int] = None) -> bytes:
+        return b"".join(self.stream(blob_hash, start, end))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            blobs, raw, stored = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(stored_size), 0) FROM blobs"
+            ).fetchone()
+            entries, logical = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(b.raw_size), 0) FROM entries e JOIN blobs b ON b.hash = e.hash"
+            ).fetchone()
+            latencies = sorted(self._latencies)
+
+        def pct(q: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(1e6 * latencies[min(len(latencies) - 1, int(q * len(latencies)))], 1)
+
+        return {
+            "blobs": blobs,
+            "entries": entries,
+            "raw_bytes": raw,
+            "stored_bytes": stored,
+            "compression_ratio": round(raw / stored, 3) if stored else None,
+            # Bytes the index would hold without deduplication, per byte kept.
+            "dedup_ratio": round(logical / raw, 3) if raw else None,
+            "deduplicated_writes": self.deduplicated,
+            "active_dict": self.active_dict,
+            "lookups": self.lookups,
+            "lookup_hit_rate": round(self.lookup_hits / self.lookups, 4) if self.lookups else None,
+            "lookup_p50_us": pct(0.5),
+            "lookup_p95_us": pct(0.95),
+        }
@@ -0,0 +1,197 @@
+"""
+Per-request deadlines and cancellation of upstream AI calls.
+
+DeadlineMiddleware gives every configured route an absolute deadline (held
+in a contextvar, so it follows the request into the service layer) and
+cancels the request handler if the client disconnects. Upstream calls go
+through call_with_deadline(), which bounds them by the time left and turns
+an expiry into DeadlineExceeded; a disconnect cancels them outright.
+
+Route deadlines default to ROUTE_DEADLINES and can be overridden with
+REQUEST_DEADLINES="/api/ai/study-tool=20,/api/ai/generate-course=150".
+"""
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+
+# Seconds per route prefix; the longest matching prefix wins.
+ROUTE_DEADLINES: Dict[str, float] = {
+    "/api/ai/explain": 30.0,
+    "/api/ai/generate-course": 120.0,
+    "/api/ai/generate": 45.0,
+    "/api/ai/study-tool": 45.0,
+    "/api/ai/personalize-saga": 90.0,
+    "/api/generate": 45.0,
+}
+
+# Tighter budgets applied inside the service layer for fast, chatty modes.
+SOCRATIC_DEADLINE = float(os.getenv("SOCRATIC_DEADLINE_SECONDS", "15"))
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(RuntimeError):
+    """The request's deadline passed before the upstream call finished."""
+
+
+class CancellationStats:
+    """Counters for upstream work that was cut short."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.calls = 0
+            self.completed = 0
+            self.deadline_exceeded = 0
+            self.disconnect_cancelled = 0
+            self.cancelled_seconds = 0.0
+            self.requests_disconnected = 0
+
+    def record(self, field: str, seconds: float = 0.0) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+            self.cancelled_seconds += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "upstream_calls": self.calls,
+                "upstream_completed": self.completed,
+                "upstream_deadline_exceeded": self.deadline_exceeded,
+                "upstream_disconnect_cancelled": self.disconnect_cancelled,
+                "cancelled_upstream_seconds": round(self.cancelled_seconds, 3),
+                "requests_disconnected": self.requests_disconnected,
+            }
+
+
+stats = CancellationStats()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, or None if unbounded."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+@contextlib.contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[None]:
+    """Tighten (never extend) the current deadline for the enclosed block."""
+    if seconds is None:
+        yield
+        return
+    current = _deadline.get()
+    candidate = time.monotonic() + seconds
+    token = _deadline.set(candidate if current is None else min(current, candidate))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+async def call_with_deadline(awaitable: Awaitable[Any]) -> Any:
+    """
+    Await an upstream call within the current deadline.
+
+    Raises:
+        DeadlineExceeded: if the deadline passes first (the call is cancelled).
+    """
+    left = remaining()
+    stats.record("calls")
+    started = time.monotonic()
+    if left is not None and left <= 0:
+        # Close the coroutine without starting it.
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        stats.record("deadline_exceeded")
+        raise DeadlineExceeded("Request deadline exceeded before the AI call started.")
+    try:
+        result = await asyncio.wait_for(awaitable, timeout=left)
+    except asyncio.TimeoutError as exc:
+        stats.record("deadline_exceeded", time.monotonic() - started)
+        raise DeadlineExceeded("AI call exceeded the request deadline and was cancelled.") from exc
+    except asyncio.CancelledError:
+        stats.record("disconnect_cancelled", time.monotonic() - started)
+        raise
+    stats.record("completed")
+    return result
+
+
+def _route_deadlines() -> Dict[str, float]:
+    table = dict(ROUTE_DEADLINES)
+    for part in os.getenv("REQUEST_DEADLINES", "").split(","):
+        path, _, seconds = part.partition("=")
+        if path.strip() and seconds.strip():
+            table[path.strip()] = float(seconds)
+    return table
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware: sets the route's deadline and cancels the handler
+    when the client goes away. Routes without a deadline pass straight through.
+    """
+
+    def __init__(self, app: Callable, deadlines: Optional[Dict[str, float]] = None) -> None:
+        self.app = app
+        self.deadlines = deadlines if deadlines is not None else _route_deadlines()
+        # Longest prefix first.
+        self._prefixes = sorted(self.deadlines, key=len, reverse=True)
+
+    def _deadline_for(self, path: str) -> Optional[float]:
+        for prefix in self._prefixes:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return self.deadlines[prefix]
+        return None
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = self._deadline_for(scope.get("path", ""))
+        if seconds is None:
+            await self.app(scope, receive, send)
+            return
+
+        # One reader owns `receive`; the app reads from a queue, so the
+        # disconnect can be seen while the handler is busy upstream.
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        disconnected = asyncio.Event()
+
+        async def reader() -> None:
+            while True:
+                message = await receive()
+                await queue.put(message)
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        async def app_receive() -> Dict[str, Any]:
+            return await queue.get()
+
+        token = _deadline.set(time.monotonic() + seconds)
+        try:
+            handler = asyncio.ensure_future(self.app(scope, app_receive, send))
+            watcher = asyncio.ensure_future(reader())
+            disconnect_wait = asyncio.ensure_future(disconnected.wait())
+            try:
+                await asyncio.wait({handler, disconnect_wait}, return_when=asyncio.FIRST_COMPLETED)
+                if not handler.done():
+                    handler.cancel()
+                    stats.record("requests_disconnected")
+                    with contextlib.suppress(asyncio.CancelledError):
+                        await handler
+                    return
+                await handler
+            finally:
+                for task in (watcher, disconnect_wait):
+                    task.cancel()
+        finally:
+            _deadline.reset(token)
@@ -0,0 +1,235 @@
+"""
+Constant-memory drift monitoring for live prediction inputs and outputs.
+
+At training time a reference profile is stored in the artifact metadata:
+quantile bin edges and proportions for every numeric feature, category
+frequencies for every categorical feature, and the predicted-class mix on
+held-out data. At serving time each prediction updates one small sketch per
+feature (a fixed-bucket histogram plus a reservoir for quantiles, or a capped
+category counter), so an update is O(1) and memory does not grow with
+traffic. The report compares the live sketches with the reference using PSI
+and a binned Kolmogorov-Smirnov distance.
+"""
+import math
+import random
+import threading
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+# Numeric features are binned at up to this many reference quantiles.
+REFERENCE_BINS = 10
+# Categories kept per feature in the reference profile; the rest count as "other".
+MAX_REFERENCE_CATEGORIES = 50
+# Unseen live categories tracked by name before they are lumped into "other".
+MAX_NEW_CATEGORIES = 32
+RESERVOIR_SIZE = 512
+OTHER = "__other__"
+
+# Conventional PSI bands.
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+EPSILON = 1e-4
+
+
+def build_reference_profile(
+    columns: Dict[str, Any],
+    categorical: List[str],
+    predictions: Optional[List[Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Summarise training data into a JSON-serialisable reference profile.
+
+    columns maps feature name to its raw training values (strings for
+    categoricals, numbers otherwise).
+    """
+    features: Dict[str, Any] = {}
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if name in categorical:
+            features[name] = {"type": "categorical", **_category_profile(values.astype(str))}
+        else:
+            features[name] = {"type": "numeric", **_numeric_profile(values.astype(np.float64))}
+    profile: Dict[str, Any] = {"features": features, "n_rows": int(len(next(iter(columns.values()), [])))}
+    if predictions is not None:
+        profile["prediction"] = {"type": "categorical", **_category_profile(np.asarray(predictions).astype(str))}
+    return profile
+
+
+def _numeric_profile(values: np.ndarray) -> Dict[str, Any]:
+    quantiles = np.quantile(values, np.linspace(0, 1, REFERENCE_BINS + 1)[1:-1]) if len(values) else []
+    edges = sorted(set(float(q) for q in quantiles))
+    counts = np.bincount(np.searchsorted(edges, values, side="right"), minlength=len(edges) + 1)
+    return {
+        "edges": edges,
+        "proportions": (counts / max(1, counts.sum())).round(6).tolist(),
+        "quantiles": {
+            "p50": float(np.quantile(values, 0.5)) if len(values) else None,
+            "p90": float(np.quantile(values, 0.9)) if len(values) else None,
+        },
+    }
+
+
+def _category_profile(values: np.ndarray) -> Dict[str, Any]:
+    names, counts = np.unique(values, return_counts=True)
+    order = np.argsort(-counts)[:MAX_REFERENCE_CATEGORIES]
+    total = max(1, counts.sum())
+    proportions = {str(names[i]): round(float(counts[i] / total), 6) for i in order}
+    other = 1.0 - sum(proportions.values())
+    if other > EPSILON:
+        proportions[OTHER] = round(other, 6)
+    return {"proportions": proportions}
+
+
+def psi(expected: np.ndarray, actual: np.ndarray) -> float:
+    """Population stability index between two proportion vectors."""
+    e = np.clip(expected, EPSILON, None)
+    a = np.clip(actual, EPSILON, None)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def _status(value: float) -> str:
+    if value >= PSI_SIGNIFICANT:
+        return "significant"
+    if value >= PSI_MODERATE:
+        return "moderate"
+    return "stable"
+
+
+class NumericSketch:
+    """Fixed-bucket histogram on the reference edges plus a reservoir sample."""
+
+    def __init__(self, reference: Dict[str, Any]) -> None:
+        self.reference = reference
+        self.edges = list(reference["edges"])
+        self.counts = [0] * (len(self.edges) + 1)
+        self.reservoir: List[float] = []
+        self.seen = 0
+
+    def update(self, value: Any) -> None:
+        try:
+            x = float(value)
+        except (TypeError, ValueError):
+            return
+        if math.isnan(x):
+            return
+        # Edges are at most REFERENCE_BINS long, so this stays constant time.
+        bucket = 0
+        for edge in self.edges:
+            if x < edge:
+                break
+            bucket += 1
+        self.counts[bucket] += 1
+        self.seen += 1
+        if len(self.reservoir) < RESERVOIR_SIZE:
+            self.reservoir.append(x)
+        else:
+            slot = random.randrange(self.seen)
+            if slot < RESERVOIR_SIZE:
+                self.reservoir[slot] = x
+
+    def report(self) -> Dict[str, Any]:
+        expected = np.asarray(self.reference["proportions"], dtype=np.float64)
+        counts = np.asarray(self.counts, dtype=np.float64)
+        actual = counts / max(1.0, counts.sum())
+        value = psi(expected, actual)
+        ks = float(np.max(np.abs(np.cumsum(expected) - np.cumsum(actual)))) if self.seen else 0.0
+        sample = np.asarray(self.reservoir)
+        return {
+            "type": "numeric",
+            "count": self.seen,
+            "psi": round(value, 4),
+            "ks": round(ks, 4),
+            "status": _status(value) if self.seen else "no_data",
+            "live_quantiles": {
+                "p50": round(float(np.quantile(sample, 0.5)), 4) if len(sample) else None,
+                "p90": round(float(np.quantile(sample, 0.9)), 4) if len(sample) else None,
+            },
+            "reference_quantiles": self.reference.get("quantiles", {}),
+        }
+
+
+class CategoricalSketch:
+    """Frequency counter over reference categories with a capped set of new ones."""
+
+    def __init__(self, reference: Dict[str, Any]) -> None:
+        self.reference = reference["proportions"]
+        self.counts: Dict[str, int] = {name: 0 for name in self.reference}
+        self.counts.setdefault(OTHER, 0)
+        self.new_categories: Dict[str, int] = {}
+        self.seen = 0
+
+    def update(self, value: Any) -> None:
+        key = str(value)
+        self.seen += 1
+        if key in self.counts and key != OTHER:
+            self.counts[key] += 1
+            return
+        self.counts[OTHER] += 1
+        if key in self.new_categories or len(self.new_categories) < MAX_NEW_CATEGORIES:
+            self.new_categories[key] = self.new_categories.get(key, 0) + 1
+
+    def report(self) -> Dict[str, Any]:
+        names = list(self.counts)
+        expected = np.asarray([self.reference.get(n, 0.0) for n in names])
+        counts = np.asarray([self.counts[n] for n in names], dtype=np.float64)
+        actual = counts / max(1.0, counts.sum())
+        value = psi(expected, actual)
+        return {
+            "type": "categorical",
+            "count": self.seen,
+            "psi": round(value, 4),
+            "status": _status(value) if self.seen else "no_data",
+            "new_categories": dict(sorted(self.new_categories.items(), key=lambda kv: -kv[1])[:10]),
+        }
+
+
+class DriftMonitor:
+    """
+    Streaming sketches for every feature and the prediction, built from a
+    reference profile. Thread-safe; each observe() is O(features).
+    """
+
+    def __init__(self, profile: Dict[str, Any]) -> None:
+        self.profile = profile
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._features: Dict[str, Any] = {
+                name: self._sketch(spec) for name, spec in self.profile.get("features", {}).items()
+            }
+            prediction = self.profile.get("prediction")
+            self._prediction = CategoricalSketch(prediction) if prediction else None
+            self.observed = 0
+
+    @staticmethod
+    def _sketch(spec: Dict[str, Any]) -> Any:
+        return CategoricalSketch(spec) if spec["type"] == "categorical" else NumericSketch(spec)
+
+    def observe(self, row: Dict[str, Any], prediction: Any = None) -> None:
+        with self._lock:
+            self.observed += 1
+            for name, sketch in self._features.items():
+                if name in row:
+                    sketch.update(row[name])
+            if self._prediction is not None and prediction is not None:
+                self._prediction.update(prediction)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            features = {name: sketch.report() for name, sketch in self._features.items()}
+            prediction = self._prediction.report() if self._prediction is not None else None
+            observed = self.observed
+        drifted = sorted(
+            (name for name, r in features.items() if r["status"] in ("moderate", "significant")),
+            key=lambda name: -features[name]["psi"],
+        )
+        return {
+            "observed": observed,
+            "drifted_features": drifted,
+            "features": features,
+            "prediction": prediction,
+        }
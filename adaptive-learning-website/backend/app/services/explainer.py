@@ -0,0 +1,183 @@
+"""
+Per-prediction feature contributions for tree ensembles.
+
+Uses the path-based (Saabas) decomposition: walking a row down a tree, every
+split moves the node's class distribution from the parent's value to the
+child's, and that change is credited to the split feature. Summed over the
+path and averaged over the trees, the contributions plus the root value
+("bias") reproduce predict_proba exactly.
+
+All trees of the forest are packed into flat node arrays once, so explaining
+a batch is max_depth rounds of vectorized numpy indexing across every
+(row, tree) pair instead of a Python walk per tree.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class TreeExplainer:
+    """
+    Explains a fitted forest (RandomForest / ExtraTrees, including pruned copies).
+
+    Raises RuntimeError for models without decision-tree estimators; use
+    TreeExplainer.supports() to check first.
+    """
+
+    def __init__(self, model: Any, feature_names: List[str], cache_size: int = 4096) -> None:
+        if not self.supports(model):
+            raise RuntimeError(f"{type(model).__name__} is not a tree ensemble.")
+        self.feature_names = list(feature_names)
+        self.classes = [str(c) for c in model.classes_]
+        self._pack(model)
+        self._cache: "OrderedDict[bytes, Dict[str, np.ndarray]]" = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @staticmethod
+    def supports(model: Any) -> bool:
+        estimators = getattr(model, "estimators_", None)
+        return (
+            isinstance(estimators, list)
+            and len(estimators) > 0
+            and all(hasattr(est, "tree_") for est in estimators)
+            and hasattr(model, "classes_")
+        )
+
+    def _pack(self, model: Any) -> None:
+        left, right, feature, threshold, value, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for est in model.estimators_:
+            tree = est.tree_
+            n = tree.node_count
+            is_leaf = tree.children_left == -1
+            left.append(np.where(is_leaf, -1, tree.children_left + offset))
+            right.append(np.where(is_leaf, -1, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            # Normalise to class probabilities (older sklearn stores counts).
+            node_values = tree.value[:, 0, :].astype(np.float64)
+            totals = node_values.sum(axis=1, keepdims=True)
+            value.append(node_values / np.where(totals == 0, 1, totals))
+            roots.append(offset)
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        self._left = np.concatenate(left).astype(np.int64)
+        self._right = np.concatenate(right).astype(np.int64)
+        self._feature = np.concatenate(feature).astype(np.int64)
+        self._threshold = np.concatenate(threshold)
+        self._value = np.concatenate(value)
+        self._roots = np.asarray(roots, dtype=np.int64)
+        self._max_depth = max_depth
+        self.bias = self._value[self._roots].mean(axis=0)
+
+        # Per node: the value change from its parent and the parent's split
+        # feature, so a traversal only has to record which nodes it visited.
+        internal = np.flatnonzero(self._left != -1)
+        delta = np.zeros_like(self._value)
+        self._parent_feature = np.zeros(len(self._left), dtype=np.int64)
+        for children in (self._left[internal], self._right[internal]):
+            delta[children] = self._value[children] - self._value[internal]
+            self._parent_feature[children] = self._feature[internal]
+        # Class-major so each per-class gather reads one contiguous array.
+        self._delta = np.ascontiguousarray(delta.T)
+
+    def explain(self, X: np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Batch explanation.
+
+        Returns {"bias": (n_classes,), "contributions": (n_rows, n_features, n_classes),
+        "proba": (n_rows, n_classes)}.
+        """
+        # Trees compare float32 inputs against float64 thresholds.
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_rows = X.shape[0]
+        n_trees = len(self._roots)
+        n_classes = self._value.shape[1]
+        n_features = X.shape[1]
+        flat_x = X.ravel()
+        rows = np.repeat(np.arange(n_rows), n_trees)
+        row_base = rows * n_features
+        node = np.tile(self._roots, n_rows)
+        visited_rows: List[np.ndarray] = []
+        visited_nodes: List[np.ndarray] = []
+
+        for _ in range(self._max_depth):
+            left = self._left[node]
+            internal = left != -1
+            if not internal.any():
+                break
+            # Only rows still inside a tree move on, so each step shrinks.
+            node, left, row_base, rows = node[internal], left[internal], row_base[internal], rows[internal]
+            go_left = flat_x[row_base + self._feature[node]] <= self._threshold[node]
+            node = np.where(go_left, left, self._right[node])
+            visited_rows.append(rows)
+            visited_nodes.append(node)
+
+        flat = np.zeros((n_rows * n_features, n_classes))
+        if visited_nodes:
+            nodes = np.concatenate(visited_nodes)
+            slots = np.concatenate(visited_rows) * n_features + self._parent_feature[nodes]
+            for c in range(n_classes):
+                flat[:, c] = np.bincount(slots, weights=self._delta[c][nodes], minlength=n_rows * n_features)
+
+        contributions = flat.reshape(n_rows, n_features, n_classes) / n_trees
+        return {
+            "bias": self.bias,
+            "contributions": contributions,
+            "proba": self.bias + contributions.sum(axis=1),
+        }
+
+    def explain_row(self, x: np.ndarray) -> Dict[str, np.ndarray]:
+        """Single-row explanation, cached on the encoded feature vector."""
+        x = np.asarray(x, dtype=np.float32).reshape(1, -1)
+        key = x.tobytes()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+                return cached
+            self.cache_misses += 1
+
+        result = self.explain(x)
+        entry = {
+            "bias": result["bias"],
+            "contributions": result["contributions"][0],
+            "proba": result["proba"][0],
+        }
+        with self._lock:
+            self._cache[key] = entry
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return entry
+
+    def top_features(
+        self,
+        contributions: np.ndarray,
+        class_label: Optional[str] = None,
+        k: int = 3,
+    ) -> List[Dict[str, Any]]:
+        """
+        The k features with the largest absolute contribution to one class.
+
+        contributions is one row of explain()["contributions"]; class_label
+        defaults to the most probable class.
+        """
+        if class_label is None or class_label not in self.classes:
+            class_index = int(np.argmax(self.bias + contributions.sum(axis=0)))
+        else:
+            class_index = self.classes.index(class_label)
+        column = contributions[:, class_index]
+        order = np.argsort(-np.abs(column))[:k]
+        return [
+            {"feature": self.feature_names[i], "contribution": round(float(column[i]), 4)}
+            for i in order
+            if column[i] != 0
+        ]
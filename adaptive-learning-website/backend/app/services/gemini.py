@@ -1,6 +1,25 @@
+import asyncio
 import os
 import json
-from typing import List, Optional, Tuple, Any
+import time
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from .deadlines import (
+    SOCRATIC_DEADLINE,
+    DeadlineExceeded,
+    call_with_deadline,
+    deadline_scope,
+    remaining,
+)
+from .content_store import ContentStore
+from .knowledge_tracing import KnowledgeTracer
+from .mermaid import DiagramStats, MermaidResult, diagram_cache_key, repair_mermaid
+from .model_router import ModelRouter
+from .prefetch import LessonPrefetcher, lesson_cache_key
+from .profiling import span
+from .prompts import PromptRegistry, default_registry
+from .response_cache import ResponseCache
+from .search_index import SearchIndex
 
 try:
     import google.generativeai as genai
@@ -31,6 +50,32 @@ def _ensure_gemini_configured() -> str:
     return model_id
 
 
+# Bump a kind's version when its prompt changes, so stored content generated
+# from the old prompt is no longer served.
+PROMPT_VERSIONS = {"lesson": "1", "quiz": "1", "mermaid": "1", "course": "1"}
+# Kinds whose values are JSON documents rather than markdown.
+JSON_KINDS = {"quiz", "course"}
+# Generated kinds that go into the search index.
+SEARCHABLE_KINDS = ("lesson", "course")
+
+
+def resolve_explain_mode(difficulty: Optional[int], explain_mode: Optional[str] = None) -> str:
+    """Lesson mode for the explain tool: an explicit mode wins over the difficulty slider."""
+    if explain_mode is not None:
+        return explain_mode
+    if difficulty is None:
+        return "standard"
+    if difficulty <= 30:
+        return "simplify"
+    if difficulty <= 70:
+        return "standard"
+    return "deep_dive"
+
+
+def quiz_cache_key(topic: str, num_questions: int) -> Tuple[str, str, int]:
+    return ("quiz", " ".join((topic or "").lower().split()), int(num_questions))
+
+
 class GeminiService:
     """
     Thin wrapper around Google Gemini for lesson and content generation.
@@ -39,16 +84,247 @@ class GeminiService:
     can translate them into HTTP 500 with a clean message.
     """
 
-    def __init__(self, model_id: Optional[str] = None) -> None:
+    def __init__(
+        self,
+        model_id: Optional[str] = None,
+        cache: Optional[ResponseCache] = None,
+        prefetch: Optional[bool] = None,
+        store: Optional[ContentStore] = None,
+        search_index: Optional[SearchIndex] = None,
+        prompts: Optional[PromptRegistry] = None,
+    ) -> None:
         self._model_id = model_id or os.getenv("GEMINI_MODEL_ID", "gemini-1.5-flash")
+        # Opt-in: speculatively generate adjacent explain variants.
+        if prefetch is None:
+            prefetch = os.getenv("GEMINI_PREFETCH", "").lower() in ("1", "true", "yes")
+        # Opt-in request cache (GEMINI_CACHE=1); prefetch needs it to hand variants over.
+        cached = prefetch or os.getenv("GEMINI_CACHE", "").lower() in ("1", "true", "yes")
+        self.cache = cache if cache is not None else ResponseCache(
+            max_entries=int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "512")) if cached else 0,
+            ttl_seconds=float(os.getenv("GEMINI_CACHE_TTL_SECONDS", "3600")),
+        )
+        self.prefetcher: Optional[LessonPrefetcher] = None
+        if prefetch:
+            self.prefetcher = LessonPrefetcher(
+                self._generate_lesson,
+                self.cache,
+                budget_per_minute=float(os.getenv("GEMINI_PREFETCH_BUDGET_PER_MINUTE", "20")),
+            )
+        # Content precomputed for mentor assignments: larger and longer-lived
+        # than the request cache, and consulted first on every read.
+        self.assigned_cache = ResponseCache(
+            max_entries=int(os.getenv("GEMINI_ASSIGNED_CACHE_MAX_ENTRIES", "20000")),
+            ttl_seconds=float(os.getenv("GEMINI_ASSIGNED_CACHE_TTL_SECONDS", str(14 * 24 * 3600))),
+        )
+        self.diagram_stats = DiagramStats()
+        # Durable, deduplicated copy of everything generated (opt-in).
+        store_path = os.getenv("CONTENT_STORE_PATH")
+        self.store = store if store is not None else (ContentStore(store_path) if store_path else None)
+        self.search_index = search_index
+        self.prompts = prompts or default_registry(os.getenv("PROMPT_COMPACTION", "off"))
+        # Ordered fallbacks after the primary, e.g. GEMINI_MODEL_IDS=gemini-1.5-flash,gemini-1.5-pro
+        fallbacks = [m.strip() for m in os.getenv("GEMINI_MODEL_IDS", "").split(",") if m.strip()]
+        self.router = ModelRouter(
+            [self._model_id] + fallbacks,
+            self._call_model,
+            hedge_percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0.95")),
+            failure_threshold=int(os.getenv("GEMINI_CIRCUIT_FAILURES", "3")),
+            cooldown=float(os.getenv("GEMINI_CIRCUIT_COOLDOWN_SECONDS", "30")),
+        )
+
+    def _cache_get(self, key: Tuple[Any, ...]) -> Optional[Any]:
+        if key in self.assigned_cache:
+            value = self.assigned_cache.get(key)
+            if value is not None:
+                return value
+        value = self.cache.get(key)
+        if value is None:
+            value = self.load_stored(key)
+            if value is not None:
+                self.cache.put(key, value)
+        return value
+
+    def _store_index(self, key: Tuple[Any, ...]) -> Tuple[str, str, str, str]:
+        kind, topic, variant = key
+        return topic, f"{kind}:{variant}", self._model_id, PROMPT_VERSIONS[kind]
+
+    def load_stored(self, key: Tuple[Any, ...]) -> Optional[Any]:
+        """
+        Previously generated content for a cache key from the content store,
+        or None (also when the store is disabled or unreadable).
+        """
+        if self.store is None:
+            return None
+        try:
+            text = self.store.get(*self._store_index(key))
+        except Exception as exc:
+            print(f"⚠️ Content store read failed for {key}: {exc}")
+            return None
+        if text is None:
+            return None
+        return json.loads(text) if key[0] in JSON_KINDS else text
+
+    def save_generated(self, key: Tuple[Any, ...], value: Any) -> None:
+        """
+        Keeps generated content in the content store and makes lessons and
+        courses searchable; never fails the request.
+        """
+        source = ""
+        if self.store is not None:
+            is_json = key[0] in JSON_KINDS
+            try:
+                source = self.store.put(
+                    json.dumps(value) if is_json else value,
+                    *self._store_index(key),
+                    media_type="application/json" if is_json else "text/markdown",
+                )
+            except Exception as exc:
+                print(f"⚠️ Content store write failed for {key}: {exc}")
+        if self.search_index is not None and key[0] in SEARCHABLE_KINDS:
+            try:
+                self._index(key, value, source)
+                # Off the request path: the .npz write runs on a background thread.
+                self.search_index.maybe_snapshot(background=True)
+            except Exception as exc:
+                print(f"⚠️ Search indexing failed for {key}: {exc}")
+
+    def _index(self, key: Tuple[Any, ...], value: Any, source: str = "") -> None:
+        kind, topic, variant = key
+        if kind == "course":
+            self.search_index.add_course(f"course:{topic}:{variant}", value, topic=topic, source=source)
+        else:
+            self.search_index.add(f"lesson:{topic}:{variant}", topic, body=value, topic=topic, source=source)
+
+    def index_stored(self, overlap: float = 5.0) -> int:
+        """
+        Indexes lessons and courses that any worker saved to the content
+        store since the last call; returns how many documents changed.
+
+        Entries up to `overlap` seconds older than the last one seen are read
+        again, because a slower writer may commit them late. Content that is
+        already indexed is skipped.
+        """
+        if self.store is None or self.search_index is None:
+            return 0
+        since = self.search_index.synced_through
+        entries = self.store.entries_since(max(0.0, since - overlap))
+        indexed = 0
+        for entry in entries:
+            kind, _, variant = entry["mode"].partition(":")
+            key = (kind, entry["topic"], variant)
+            if kind not in SEARCHABLE_KINDS:
+                continue
+            if self.search_index.source(f"{kind}:{entry['topic']}:{variant}") == entry["hash"]:
+                continue
+            try:
+                text = self.store.read(entry["hash"]).decode("utf-8")
+                self._index(key, json.loads(text) if kind in JSON_KINDS else text, entry["hash"])
+            except Exception as exc:
+                print(f"⚠️ Search indexing failed for {key}: {exc}")
+                continue
+            indexed += 1
+        if entries:
+            self.search_index.synced_through = max(since, entries[-1]["created_at"])
+        return indexed
+
+    def _remember(self, key: Tuple[Any, ...], value: Any) -> None:
+        self.cache.put(key, value)
+        self.save_generated(key, value)
+
+    async def precompute(
+        self,
+        tool: str,
+        topic: str,
+        variant: Optional[str] = None,
+        num_questions: int = 5,
+    ) -> bool:
+        """
+        Generates one piece of assigned content into the assigned cache.
+
+        tool: 'explain' (variant = lesson mode) | 'quiz' | 'visualize'
+            (variant = diagram type).
+
+        Returns False when it was already cached (nothing generated).
 
-    def _get_model(self):
-        model_id = _ensure_gemini_configured()
+        Raises:
+            RuntimeError: if generation fails or the tool is unknown.
+        """
+        key = self._precompute_key(tool, topic, variant, num_questions)
+        if key in self.assigned_cache:
+            return False
+        value = self.cache.get(key) if key in self.cache else self.load_stored(key)
+        if value is None:
+            if tool == "explain":
+                value = await self._generate_lesson(topic, key[2])
+            elif tool == "quiz":
+                value = await self._generate_quiz(topic, num_questions, route="precompute")
+            else:
+                result = await self._generate_visualization(topic, key[2])
+                if not result.valid:
+                    raise RuntimeError(f"Could not produce a valid {key[2]} diagram for '{topic}'.")
+                value = result.render()
+            self.save_generated(key, value)
+        self.assigned_cache.put(key, value)
+        return True
+
+    def precomputed(self, tool: str, topic: str, variant: Optional[str] = None, num_questions: int = 5) -> Optional[Any]:
+        """The assigned content precompute() left for a unit, or None (not run, failed or evicted)."""
+        return self.assigned_cache.get(self._precompute_key(tool, topic, variant, num_questions))
+
+    @staticmethod
+    def _precompute_key(tool: str, topic: str, variant: Optional[str], num_questions: int) -> Tuple[Any, ...]:
+        if tool == "explain":
+            return lesson_cache_key(topic, variant or "standard")
+        if tool == "quiz":
+            return quiz_cache_key(topic, num_questions)
+        if tool == "visualize":
+            return diagram_cache_key(topic, variant)
+        raise RuntimeError(f"Cannot precompute tool '{tool}'.")
+
+    def _get_model(self, model_id: Optional[str] = None):
+        configured_id = _ensure_gemini_configured()
         # Always prefer configured id, but fall back to instance override if given.
-        if self._model_id:
-            model_id = self._model_id
+        model_id = model_id or self._model_id or configured_id
         return genai.GenerativeModel(model_id)
 
+    async def _call_model(self, model_id: str, prompt: str) -> Any:
+        return await self._get_model(model_id).generate_content_async(prompt)
+
+    async def _generate(self, prompt: str) -> Any:
+        """
+        Single upstream call site: routed across models (hedging, failover,
+        circuit breaking), bounded by the request deadline and cancelled
+        with it (see services.deadlines).
+        """
+        with span("upstream"):
+            return await call_with_deadline(self.router.generate(prompt))
+
+    async def stream_generate(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Streams the response text chunk by chunk from the primary model.
+
+        Each chunk is bounded by the current deadline. Hedging does not
+        apply: a partially streamed answer can't be raced.
+        """
+        try:
+            model = self._get_model()
+            response = await call_with_deadline(model.generate_content_async(prompt, stream=True))
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=remaining())
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError as exc:
+                    raise DeadlineExceeded("AI stream exceeded the request deadline and was cancelled.") from exc
+                text = getattr(chunk, "text", None)
+                if text:
+                    yield text
+        except RuntimeError:
+            raise
+        except Exception as exc:  # pragma: no cover
+            raise RuntimeError(f"Gemini stream failed: {exc}") from exc
+
     async def generate_content(self, topic: str, difficulty: str) -> str:
         """
         Generic content generator used by the earlier /api/generate route.
@@ -65,8 +341,7 @@ class GeminiService:
             prompt = f"Provide a concise, clear explanation of {topic} suitable for a university student."
 
         try:
-            model = self._get_model()
-            response = await model.generate_content_async(prompt)
+            response = await self._generate(prompt)
             text = getattr(response, "text", None) or ""
             if not text:
                 raise RuntimeError("Gemini returned an empty response.")
@@ -81,32 +356,60 @@ class GeminiService:
                 raise RuntimeError(f"Gemini API quota exceeded. Please try again later. Details: {error_msg}")
             raise RuntimeError(f"Gemini generate_content failed: {error_msg}") from exc
 
-    async def generate_lesson(self, topic: str, mode: str) -> str:
+    async def generate_lesson(self, topic: str, mode: str, speculate: bool = False) -> str:
         """
         Lesson generator used by /api/ai/generate.
 
         mode: 'simplify' | 'standard' | 'deep_dive'
+        speculate: when prefetch is enabled, warm the adjacent variants in
+            the background after this one is served.
         """
-        mode_norm = (mode or "").lower()
-        if mode_norm == "simplify":
-            prompt = (
-                f"Explain {topic} to a struggling student using very simple analogies. "
-                "Keep it under 100 words and give one concrete example."
-            )
-        elif mode_norm == "deep_dive":
-            prompt = (
-                f"Provide a comprehensive, advanced summary of {topic}. "
-                "Include one complex challenge question at the end."
-            )
-        else:
-            prompt = (
-                f"Teach {topic} at a standard university level. "
-                "Include a short explanation and one quick check-your-understanding question."
-            )
+        key = lesson_cache_key(topic, mode)
+        text = self._cache_get(key)
+        if text is None and self.prefetcher is not None:
+            pending = self.prefetcher.pending(key)
+            if pending is not None:
+                # Join the in-flight prefetch rather than generating twice.
+                try:
+                    await asyncio.wait_for(asyncio.shield(pending), timeout=remaining())
+                except Exception:
+                    pass
+                text = self.cache.get(key)
+        if text is None:
+            if self.prefetcher is not None:
+                self.prefetcher.foreground_inflight += 1
+            try:
+                text = await self._generate_lesson(topic, mode)
+            finally:
+                if self.prefetcher is not None:
+                    self.prefetcher.foreground_inflight -= 1
+            self._remember(key, text)
+        # Assigned topics already have every variant precomputed.
+        if speculate and self.prefetcher is not None and key not in self.assigned_cache:
+            self.prefetcher.schedule(topic, mode)
+        return text
+
+    async def _generate_lesson(self, topic: str, mode: str) -> str:
+        with span("prompt_build"):
+            mode_norm = (mode or "").lower()
+            if mode_norm == "simplify":
+                prompt = (
+                    f"Explain {topic} to a struggling student using very simple analogies. "
+                    "Keep it under 100 words and give one concrete example."
+                )
+            elif mode_norm == "deep_dive":
+                prompt = (
+                    f"Provide a comprehensive, advanced summary of {topic}. "
+                    "Include one complex challenge question at the end."
+                )
+            else:
+                prompt = (
+                    f"Teach {topic} at a standard university level. "
+                    "Include a short explanation and one quick check-your-understanding question."
+                )
 
         try:
-            model = self._get_model()
-            response = await model.generate_content_async(prompt)
+            response = await self._generate(prompt)
             text = getattr(response, "text", None) or ""
             if not text:
                 raise RuntimeError("Gemini returned an empty response.")
@@ -116,6 +419,102 @@ class GeminiService:
         except Exception as exc:  # pragma: no cover
             raise RuntimeError(f"Gemini generate_lesson failed: {exc}") from exc
 
+    async def _generate_quiz(self, topic: str, num_questions: int, route: str = "/api/ai/study-tool") -> List[dict]:
+        rendered = self.prompts.render("quiz", route, num_questions=num_questions, topic=topic)
+        try:
+            started = time.perf_counter()
+            response = await self._generate(rendered.text)
+            latency = time.perf_counter() - started
+            raw = getattr(response, "text", None) or ""
+            if not raw:
+                raise RuntimeError("Gemini returned an empty quiz payload.")
+
+            with span("parse"):
+                # Strip markdown fences if model wrapped JSON
+                cleaned = raw.strip()
+                if cleaned.startswith("```"):
+                    cleaned = cleaned.strip("`")
+                    # Remove potential language hint like json\n
+                    first_newline = cleaned.find("\n")
+                    if first_newline != -1:
+                        cleaned = cleaned[first_newline + 1 :].strip()
+                    if cleaned.endswith("```"):
+                        cleaned = cleaned[: -3].strip()
+
+                try:
+                    quiz_items: Any = json.loads(cleaned)
+                except json.JSONDecodeError:
+                    self.prompts.record(rendered, False, latency, raw)
+                    raise
+            self.prompts.record(rendered, isinstance(quiz_items, list), latency, raw)
+            if not isinstance(quiz_items, list):
+                raise RuntimeError("Quiz JSON was not an array.")
+            return quiz_items
+        except RuntimeError:
+            raise
+        except Exception as exc:  # pragma: no cover
+            raise RuntimeError(f"Gemini quiz generation failed: {exc}") from exc
+
+    async def _generate_diagram(self, prompt: str) -> str:
+        response = await self._generate(prompt)
+        text = getattr(response, "text", None) or ""
+        if not text:
+            raise RuntimeError("Gemini returned an empty visualization payload.")
+        return text
+
+    async def _generate_visualization(self, topic: str, diagram: str) -> MermaidResult:
+        """
+        Generates a diagram, repairs it locally and re-prompts once (with the
+        parser's errors) only when local repair fails.
+        """
+        # Hard cap topic length to keep prompt small and protect rate/quotas
+        safe_topic = (topic or "")[:300]
+        if diagram == "flowchart":
+            # Highly optimized prompt: ask ONLY for mermaid code, no prose.
+            prompt = (
+                "You are a diagram engine. Generate a simple Mermaid.js FLOWCHART for this topic.\n"
+                "Respond with ONLY a ```mermaid code block and nothing else (no text before or after).\n\n"
+                f"TOPIC: {safe_topic}"
+            )
+        else:
+            # Other diagram types can still include a tiny summary if the model chooses.
+            prompt = (
+                "Generate a concise Mermaid.js diagram for the topic below.\n"
+                f"Preferred diagram type: {diagram}.\n"
+                "Start with a ```mermaid code block containing ONLY the diagram code. "
+                "Optionally, you may add one short sentence of summary after the code block.\n\n"
+                f"TOPIC: {safe_topic}"
+            )
+        try:
+            raw = await self._generate_diagram(prompt)
+            with span("parse"):
+                result = repair_mermaid(raw, diagram)
+            self.diagram_stats.record("generated")
+            if not result.checked:
+                self.diagram_stats.record("unchecked")
+            elif result.valid:
+                self.diagram_stats.record("repaired" if result.repaired else "valid_as_generated")
+            else:
+                # Repair could not fix it: one re-prompt with the parser's errors.
+                self.diagram_stats.record("reprompted")
+                retry_prompt = (
+                    f"{prompt}\n\nYour previous diagram had these Mermaid syntax errors:\n"
+                    + "\n".join(f"- {error}" for error in result.unfixed[:10])
+                    + "\nReturn a corrected diagram."
+                )
+                raw = await self._generate_diagram(retry_prompt)
+                with span("parse"):
+                    retry = repair_mermaid(raw, diagram)
+                if retry.valid:
+                    result = retry
+                else:
+                    self.diagram_stats.record("failed")
+            return result
+        except RuntimeError:
+            raise
+        except Exception as exc:  # pragma: no cover
+            raise RuntimeError(f"Gemini visualize mode failed: {exc}") from exc
+
     async def generate_study_tool(
         self,
         tool_type: str,
@@ -126,13 +525,18 @@ class GeminiService:
         num_questions: Optional[int] = 5,
         level: Optional[str] = None,
         detail: Optional[str] = None,
+        explain_mode: Optional[str] = None,
     ) -> Tuple[str, Optional[str], Optional[List[dict]]]:
         """
         Multi-tool generator backing the Study Room 2.0.
 
+        explain_mode, when given (e.g. from the knowledge tracer), overrides
+        the difficulty slider for the explain tool.
+
         Returns (mode, content, quiz_items) where:
-          - mode: 'explain' | 'summarize' | 'quiz' | 'socratic'
-          - content: markdown/text for non-quiz tools
+          - mode: 'explain' | 'summarize' | 'quiz' | 'socratic' | 'visualize'
+          - content: markdown/text for non-quiz tools; for 'visualize' a
+            validated (and if needed repaired) ```mermaid block
           - quiz_items: list of quiz dicts for 'quiz' mode
         """
         mode = (tool_type or "explain").lower()
@@ -146,8 +550,7 @@ class GeminiService:
                 f"TEXT:\n{input_text}"
             )
             try:
-                model = self._get_model()
-                response = await model.generate_content_async(prompt)
+                response = await self._generate(prompt)
                 text = getattr(response, "text", None) or ""
                 if not text:
                     raise RuntimeError("Gemini returned an empty summary.")
@@ -160,46 +563,13 @@ class GeminiService:
         if mode == "quiz":
             if not topic:
                 raise RuntimeError("Quiz generator requires a topic.")
-            prompt = (
-
-                f"Generate {num_questions or 5} multiple-choice questions about the following topic. "
-                "Return ONLY raw JSON (no commentary, no markdown) in this format:\n"
-                "[\n"
-                "  {\n"
-                '    "id": 1,\n'
-                '    "question": "string",\n'
-                '    "options": ["option A", "option B", "option C", "option D"],\n'
-                '    "correctAnswer": "The exact string of the correct option"\n'
-                "  }\n"
-                "]\n\n"
-                f"TOPIC: {topic}"
-            )
-            try:
-                model = self._get_model()
-                response = await model.generate_content_async(prompt)
-                raw = getattr(response, "text", None) or ""
-                if not raw:
-                    raise RuntimeError("Gemini returned an empty quiz payload.")
-
-                # Strip markdown fences if model wrapped JSON
-                cleaned = raw.strip()
-                if cleaned.startswith("```"):
-                    cleaned = cleaned.strip("`")
-                    # Remove potential language hint like json\n
-                    first_newline = cleaned.find("\n")
-                    if first_newline != -1:
-                        cleaned = cleaned[first_newline + 1 :].strip()
-                    if cleaned.endswith("```"):
-                        cleaned = cleaned[: -3].strip()
-
-                quiz_items: Any = json.loads(cleaned)
-                if not isinstance(quiz_items, list):
-                    raise RuntimeError("Quiz JSON was not an array.")
-                return "quiz", None, quiz_items
-            except RuntimeError:
-                raise
-            except Exception as exc:  # pragma: no cover
-                raise RuntimeError(f"Gemini quiz generation failed: {exc}") from exc
+            key = quiz_cache_key(topic, num_questions or 5)
+            quiz_items = self._cache_get(key)
+            if quiz_items is None:
+                quiz_items = await self._generate_quiz(topic, num_questions or 5)
+                self._remember(key, quiz_items)
+            # Callers decorate items (e.g. item_id); keep the cached copy clean.
+            return "quiz", None, [dict(item) for item in quiz_items]
 
         if mode == "socratic":
             if not topic:
@@ -211,8 +581,9 @@ class GeminiService:
                 f"TOPIC OR QUESTION: {topic}"
             )
             try:
-                model = self._get_model()
-                response = await model.generate_content_async(prompt)
+                # Socratic turns are short; don't hold the route's full budget.
+                with deadline_scope(SOCRATIC_DEADLINE):
+                    response = await self._generate(prompt)
                 text = getattr(response, "text", None) or ""
                 if not text:
                     raise RuntimeError("Gemini returned an empty Socratic prompt.")
@@ -225,50 +596,21 @@ class GeminiService:
         if mode == "visualize":
             if not topic:
                 raise RuntimeError("Visualizer requires a topic.")
-            # Hard cap topic length to keep prompt small and protect rate/quotas
-            safe_topic = (topic or "")[:300]
             diagram = (diagram_type or "flowchart").lower()
-
-            if diagram == "flowchart":
-                # Highly optimized prompt: ask ONLY for mermaid code, no prose.
-                prompt = (
-                    "You are a diagram engine. Generate a simple Mermaid.js FLOWCHART for this topic.\n"
-                    "Respond with ONLY a ```mermaid code block and nothing else (no text before or after).\n\n"
-                    f"TOPIC: {safe_topic}"
-                )
-            else:
-                # Other diagram types can still include a tiny summary if the model chooses.
-                prompt = (
-                    "Generate a concise Mermaid.js diagram for the topic below.\n"
-                    f"Preferred diagram type: {diagram}.\n"
-                    "Start with a ```mermaid code block containing ONLY the diagram code. "
-                    "Optionally, you may add one short sentence of summary after the code block.\n\n"
-                    f"TOPIC: {safe_topic}"
-                )
-            try:
-                model = self._get_model()
-                response = await model.generate_content_async(prompt)
-                text = getattr(response, "text", None) or ""
-                if not text:
-                    raise RuntimeError("Gemini returned an empty visualization payload.")
-                return "visualize", text, None
-            except RuntimeError:
-                raise
-            except Exception as exc:  # pragma: no cover
-                raise RuntimeError(f"Gemini visualize mode failed: {exc}") from exc
+            key = diagram_cache_key(topic, diagram)
+            cached = self._cache_get(key)
+            if cached is not None:
+                self.diagram_stats.record("cache_hits")
+                return "visualize", cached, None
+            result = await self._generate_visualization(topic, diagram)
+            text = result.render()
+            if result.valid:
+                self._remember(key, text)
+            return "visualize", text, None
 
         # Default / explain path – reuse difficulty slider if provided
-        if difficulty is not None:
-            if difficulty <= 30:
-                explain_mode = "simplify"
-            elif difficulty <= 70:
-                explain_mode = "standard"
-            else:
-                explain_mode = "deep_dive"
-        else:
-            explain_mode = "standard"
-
-        text = await self.generate_lesson(topic or "", explain_mode)
+        explain_mode = resolve_explain_mode(difficulty, explain_mode)
+        text = await self.generate_lesson(topic or "", explain_mode, speculate=True)
         return "explain", text, None
 
 
@@ -276,22 +618,62 @@ class AdaptiveTutor:
     """
     Higher-level adaptive tutor wrapper used by /api/ai/explain.
     Decides how to pitch the explanation based on a struggle score.
+
+    With a KnowledgeTracer attached, the score for a known student comes from
+    their quiz history; a client-supplied score is only used when the tracer
+    has no evidence for that (student, topic).
     """
 
-    def __init__(self, service: Optional[GeminiService] = None) -> None:
+    def __init__(
+        self,
+        service: Optional[GeminiService] = None,
+        tracer: Optional[KnowledgeTracer] = None,
+    ) -> None:
         self._service = service or GeminiService()
+        self._tracer = tracer
 
-    async def get_adaptive_explanation(self, topic: str, struggle_score: int) -> str:
+    @staticmethod
+    def mode_for_struggle(struggle_score: int) -> str:
+        if struggle_score >= 70:
+            return "simplify"
+        if struggle_score <= 30:
+            return "deep_dive"
+        return "standard"
+
+    def resolve_struggle_score(
+        self,
+        topic: str,
+        student_id: Optional[str] = None,
+        struggle_score: Optional[int] = None,
+    ) -> int:
         """
-        struggle_score: 0–100. Higher means student is struggling more.
+        Server-side score when available, else the client's, else neutral (50).
         """
-        if struggle_score >= 70:
-            mode = "simplify"
-        elif struggle_score <= 30:
-            mode = "deep_dive"
-        else:
-            mode = "standard"
+        if self._tracer is not None and student_id:
+            traced = self._tracer.struggle_score(student_id, topic)
+            if traced is not None:
+                return traced
+        return struggle_score if struggle_score is not None else 50
+
+    def resolve_mode(
+        self,
+        topic: str,
+        student_id: Optional[str] = None,
+        struggle_score: Optional[int] = None,
+    ) -> str:
+        return self.mode_for_struggle(self.resolve_struggle_score(topic, student_id, struggle_score))
 
+    async def get_adaptive_explanation(
+        self,
+        topic: str,
+        struggle_score: Optional[int] = None,
+        student_id: Optional[str] = None,
+    ) -> str:
+        """
+        struggle_score: 0–100. Higher means student is struggling more.
+        student_id: looks the score up in the knowledge tracer instead.
+        """
+        mode = self.resolve_mode(topic, student_id, struggle_score)
         return await self._service.generate_lesson(topic=topic, mode=mode)
 
 
@@ -0,0 +1,303 @@
+"""
+Bayesian knowledge tracing (BKT) for server-side struggle scores.
+
+Mastery P(known) is kept for every (student, topic) pair in one dense NumPy
+array that grows by doubling. Quiz answers are applied in vectorized
+batches; answers for the same pair inside one batch are applied in order,
+one "round" per repeat, so a batch gives the same result as one-by-one
+updates.
+
+Per-topic parameters (p_init, p_transit, p_slip, p_guess) are fit offline
+with EM (Baum-Welch on the two-state BKT HMM) over historical responses; see
+app.cli.fit_bkt. The struggle score the tutor uses is 100 * (1 - mastery).
+"""
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+DEFAULT_PARAMS = {"p_init": 0.3, "p_transit": 0.1, "p_slip": 0.1, "p_guess": 0.2}
+PARAM_NAMES = list(DEFAULT_PARAMS)
+
+# Guess/slip above this make "known" and "unknown" indistinguishable.
+MAX_GUESS_SLIP = 0.4
+MIN_PROB = 1e-3
+
+
+def normalize_topic(topic: str) -> str:
+    return " ".join((topic or "").lower().split())
+
+
+class KnowledgeTracer:
+    """
+    Thread-safe BKT state for all students and topics.
+    """
+
+    def __init__(self, initial_students: int = 1024, initial_topics: int = 64) -> None:
+        self._lock = threading.Lock()
+        self._students: Dict[str, int] = {}
+        self._topics: Dict[str, int] = {}
+        # NaN means "no evidence yet": read as the topic's p_init.
+        self._mastery = np.full((initial_students, initial_topics), np.nan, dtype=np.float32)
+        self._params = {
+            name: np.full(initial_topics, value, dtype=np.float64)
+            for name, value in DEFAULT_PARAMS.items()
+        }
+        self._fitted_params: Dict[str, Dict[str, float]] = {}
+
+    # -- id management -------------------------------------------------
+
+    def _grow(self, students: int, topics: int) -> None:
+        rows, cols = self._mastery.shape
+        if students <= rows and topics <= cols:
+            return
+        new_rows = max(rows, 1)
+        while new_rows < students:
+            new_rows *= 2
+        new_cols = max(cols, 1)
+        while new_cols < topics:
+            new_cols *= 2
+        grown = np.full((new_rows, new_cols), np.nan, dtype=np.float32)
+        grown[:rows, :cols] = self._mastery
+        self._mastery = grown
+        if new_cols > cols:
+            for name, values in self._params.items():
+                extra = np.full(new_cols - cols, DEFAULT_PARAMS[name], dtype=np.float64)
+                self._params[name] = np.concatenate([values, extra])
+
+    def _index(self, mapping: Dict[str, int], keys: Sequence[str]) -> np.ndarray:
+        indices = np.empty(len(keys), dtype=np.int64)
+        for i, key in enumerate(keys):
+            idx = mapping.get(key)
+            if idx is None:
+                idx = mapping[key] = len(mapping)
+            indices[i] = idx
+        return indices
+
+    def _topic_index(self, topics: Sequence[str]) -> np.ndarray:
+        before = len(self._topics)
+        indices = self._index(self._topics, [normalize_topic(t) for t in topics])
+        if len(self._topics) > before:
+            self._grow(len(self._students), len(self._topics))
+            for topic, idx in self._topics.items():
+                if idx >= before and topic in self._fitted_params:
+                    for name, value in self._fitted_params[topic].items():
+                        if name in self._params:
+                            self._params[name][idx] = value
+        return indices
+
+    # -- parameters ----------------------------------------------------
+
+    def set_params(self, params: Dict[str, Dict[str, float]]) -> None:
+        """
+        Install fitted per-topic params ({topic: {p_init, p_transit, p_slip,
+        p_guess}}). Other keys (fit diagnostics) are ignored.
+        """
+        with self._lock:
+            self._fitted_params.update({
+                normalize_topic(t): {name: float(p[name]) for name in PARAM_NAMES if name in p}
+                for t, p in params.items()
+            })
+            for topic, values in self._fitted_params.items():
+                idx = self._topics.get(topic)
+                if idx is not None:
+                    for name, value in values.items():
+                        self._params[name][idx] = value
+
+    def load_params(self, path: str) -> int:
+        with open(path, "r", encoding="utf-8") as f:
+            params = json.load(f)
+        self.set_params(params)
+        return len(params)
+
+    # -- online updates ------------------------------------------------
+
+    def apply_events(
+        self,
+        student_ids: Sequence[str],
+        topics: Sequence[str],
+        correct: Sequence[Any],
+    ) -> int:
+        """
+        Apply a batch of quiz answers in order. Returns the number applied.
+        """
+        if not len(student_ids):
+            return 0
+        with self._lock:
+            s_idx = self._index(self._students, [str(s) for s in student_ids])
+            t_idx = self._topic_index(topics)
+            self._grow(len(self._students), len(self._topics))
+            obs = np.asarray(correct, dtype=bool)
+
+            # Rank each event among earlier events for the same pair.
+            pair = s_idx * self._mastery.shape[1] + t_idx
+            order = np.argsort(pair, kind="stable")
+            sorted_pair = pair[order]
+            new_group = np.r_[True, sorted_pair[1:] != sorted_pair[:-1]]
+            group_start = np.flatnonzero(new_group)[np.cumsum(new_group) - 1]
+            ranks = np.empty_like(pair)
+            ranks[order] = np.arange(len(pair)) - group_start
+
+            for r in range(int(ranks.max()) + 1):
+                sel = ranks == r
+                self._update(s_idx[sel], t_idx[sel], obs[sel])
+        return len(pair)
+
+    def _update(self, s: np.ndarray, t: np.ndarray, obs: np.ndarray) -> None:
+        p_init, transit = self._params["p_init"][t], self._params["p_transit"][t]
+        slip, guess = self._params["p_slip"][t], self._params["p_guess"][t]
+        prior = self._mastery[s, t].astype(np.float64)
+        prior = np.where(np.isnan(prior), p_init, prior)
+
+        known = np.where(obs, prior * (1 - slip), prior * slip)
+        unknown = np.where(obs, (1 - prior) * guess, (1 - prior) * (1 - guess))
+        posterior = known / np.maximum(known + unknown, 1e-12)
+        self._mastery[s, t] = posterior + (1 - posterior) * transit
+
+    # -- lookups -------------------------------------------------------
+
+    def mastery(self, student_id: str, topic: str) -> Optional[float]:
+        """P(known) for the pair, or None if the student has no evidence on the topic."""
+        s = self._students.get(str(student_id))
+        t = self._topics.get(normalize_topic(topic))
+        if s is None or t is None:
+            return None
+        value = self._mastery[s, t]
+        return None if np.isnan(value) else float(value)
+
+    def struggle_score(self, student_id: str, topic: str) -> Optional[int]:
+        """0-100, higher means struggling more; None without evidence."""
+        value = self.mastery(student_id, topic)
+        return None if value is None else int(round(100 * (1 - value)))
+
+    def student_mastery(self, student_id: str) -> Dict[str, float]:
+        s = self._students.get(str(student_id))
+        if s is None:
+            return {}
+        row = self._mastery[s]
+        return {
+            topic: round(float(row[t]), 4)
+            for topic, t in self._topics.items()
+            if not np.isnan(row[t])
+        }
+
+
+def _forward_backward(
+    obs: np.ndarray,
+    mask: np.ndarray,
+    params: Dict[str, float],
+) -> Dict[str, Any]:
+    """
+    Scaled forward-backward over padded sequences (n_seq, max_len).
+
+    State 0 is "unknown", state 1 is "known"; learning is one-way.
+    """
+    n, length = obs.shape
+    L0, T, S, G = params["p_init"], params["p_transit"], params["p_slip"], params["p_guess"]
+    A = np.array([[1 - T, T], [0.0, 1.0]])
+    # Emission probabilities per step; padded steps emit 1 for both states.
+    emit = np.stack([np.where(obs, G, 1 - G), np.where(obs, 1 - S, S)], axis=-1)
+    emit = np.where(mask[..., None], emit, 1.0)
+
+    alpha = np.zeros((n, length, 2))
+    scale = np.ones((n, length))
+    alpha[:, 0] = np.array([1 - L0, L0]) * emit[:, 0]
+    scale[:, 0] = alpha[:, 0].sum(axis=1)
+    alpha[:, 0] /= scale[:, 0, None]
+    for t in range(1, length):
+        moved = alpha[:, t - 1] @ A
+        step = np.where(mask[:, t, None], moved, alpha[:, t - 1]) * emit[:, t]
+        scale[:, t] = step.sum(axis=1)
+        alpha[:, t] = step / scale[:, t, None]
+
+    beta = np.ones((n, length, 2))
+    for t in range(length - 2, -1, -1):
+        weighted = emit[:, t + 1] * beta[:, t + 1]
+        back = (weighted @ A.T) / scale[:, t + 1, None]
+        beta[:, t] = np.where(mask[:, t + 1, None], back, beta[:, t + 1])
+
+    gamma = alpha * beta
+    gamma /= np.maximum(gamma.sum(axis=2, keepdims=True), 1e-300)
+
+    # Expected unknown -> known transitions between consecutive real steps.
+    both = mask[:, 1:] & mask[:, :-1]
+    learn = (
+        alpha[:, :-1, 0] * T * emit[:, 1:, 1] * beta[:, 1:, 1] / scale[:, 1:]
+    )
+    return {
+        "gamma": gamma,
+        "learn": np.where(both, learn, 0.0),
+        "both": both,
+        "loglik": float(np.log(np.where(mask, scale, 1.0)).sum()),
+    }
+
+
+def fit_topic(
+    sequences: List[Sequence[int]],
+    n_iter: int = 50,
+    tol: float = 1e-4,
+    initial: Optional[Dict[str, float]] = None,
+) -> Dict[str, Any]:
+    """
+    EM fit of BKT params for one topic from per-student answer sequences
+    (each a time-ordered list of 0/1). Returns the params plus log-likelihood.
+    """
+    sequences = [list(seq) for seq in sequences if len(seq)]
+    if not sequences:
+        return {**(initial or DEFAULT_PARAMS), "loglik": 0.0, "iterations": 0}
+    length = max(len(seq) for seq in sequences)
+    obs = np.zeros((len(sequences), length), dtype=bool)
+    mask = np.zeros((len(sequences), length), dtype=bool)
+    for i, seq in enumerate(sequences):
+        obs[i, :len(seq)] = np.asarray(seq, dtype=bool)
+        mask[i, :len(seq)] = True
+
+    params = dict(initial or DEFAULT_PARAMS)
+    previous = -np.inf
+    iterations = 0
+    for iterations in range(1, n_iter + 1):
+        fb = _forward_backward(obs, mask, params)
+        gamma, learn = fb["gamma"], fb["learn"]
+        unknown = np.where(mask, gamma[..., 0], 0.0)
+        known = np.where(mask, gamma[..., 1], 0.0)
+        unknown_before = np.where(fb["both"], gamma[:, :-1, 0], 0.0)
+
+        params = {
+            "p_init": float(gamma[:, 0, 1].mean()),
+            "p_transit": float(learn.sum() / max(unknown_before.sum(), 1e-12)),
+            "p_guess": float((unknown * obs).sum() / max(unknown.sum(), 1e-12)),
+            "p_slip": float((known * ~obs).sum() / max(known.sum(), 1e-12)),
+        }
+        params = {
+            "p_init": min(max(params["p_init"], MIN_PROB), 1 - MIN_PROB),
+            "p_transit": min(max(params["p_transit"], MIN_PROB), 1 - MIN_PROB),
+            "p_guess": min(max(params["p_guess"], MIN_PROB), MAX_GUESS_SLIP),
+            "p_slip": min(max(params["p_slip"], MIN_PROB), MAX_GUESS_SLIP),
+        }
+        if fb["loglik"] - previous < tol:
+            break
+        previous = fb["loglik"]
+    return {**{k: round(v, 6) for k, v in params.items()}, "loglik": round(previous, 4), "iterations": iterations}
+
+
+def fit_params(
+    responses: Iterable[Dict[str, Any]],
+    n_iter: int = 50,
+    min_sequences: int = 5,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Fit per-topic params from time-ordered response records
+    ({student_id, topic, correct}). Topics with fewer than min_sequences
+    students keep the defaults and are omitted.
+    """
+    grouped: Dict[str, Dict[str, List[int]]] = {}
+    for record in responses:
+        topic = normalize_topic(str(record["topic"]))
+        grouped.setdefault(topic, {}).setdefault(str(record["student_id"]), []).append(int(bool(record["correct"])))
+    return {
+        topic: fit_topic(list(by_student.values()), n_iter=n_iter)
+        for topic, by_student in grouped.items()
+        if len(by_student) >= min_sequences
+    }
@@ -0,0 +1,472 @@
+"""
+XP leaderboards: global, per organization, and weekly windows.
+
+Each board counts members per score bucket in a Fenwick tree. Both "how
+many students are above this score" (rank) and "which bucket holds the
+r-th best student" (top-k) are O(log buckets). Updates move one member
+between two buckets. Members of the same bucket are kept in a dict, so
+with the default bucket size of 1 XP, ranks are exact. Scores are stored
+as given, negative ones included (XP can be taken back); those share
+bucket 0 and are ordered within it. The tree grows
+by doubling when a score passes its capacity, so small org boards stay
+small.
+
+Weekly boards are keyed by ISO week. The first XP of a new week simply
+starts empty boards, so windows roll over without rescoring anyone, and
+only the last `keep_weeks` weeks are kept.
+
+snapshot()/load() persist every board as one .npz (no pickle).
+
+With several workers, every worker keeps its own boards. LeaderboardFollower
+keeps them equal: it feeds each worker from the progress DB's committed XP
+log and memberships, not from that worker's own commits.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+
+ALL_TIME = "all"
+WEEK = "week"
+
+
+def week_of(at: Optional[float] = None) -> str:
+    """ISO week id, e.g. '2024-W07', of a unix timestamp (now by default)."""
+    return time.strftime("%G-W%V", time.gmtime(time.time() if at is None else at))
+
+
+class _Fenwick:
+    """Counts per bucket with O(log n) prefix sums and order-statistic search."""
+
+    __slots__ = ("size", "tree")
+
+    def __init__(self, size: int, counts: Optional[np.ndarray] = None) -> None:
+        self.size = size
+        if counts is None:
+            self.tree = array("q", bytes(8 * (size + 1)))
+            return
+        # tree[i] covers buckets (i - lowbit(i), i]: a difference of prefix sums.
+        cumulative = np.zeros(size + 1, dtype=np.int64)
+        cumulative[1:len(counts) + 1] = np.cumsum(counts)
+        cumulative[len(counts) + 1:] = cumulative[len(counts)]
+        index = np.arange(size + 1)
+        tree = cumulative - cumulative[index - (index & -index)]
+        self.tree = array("q", tree.tobytes())
+
+    def add(self, bucket: int, delta: int) -> None:
+        i = bucket + 1
+        tree, size = self.tree, self.size
+        while i <= size:
+            tree[i] += delta
+            i += i & -i
+
+    def prefix(self, bucket: int) -> int:
+        """Members in buckets 0..bucket."""
+        total, i, tree = 0, min(bucket + 1, self.size), self.tree
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def search(self, k: int) -> int:
+        """Smallest bucket whose prefix count reaches k (1-based k)."""
+        pos, step, tree = 0, 1 << (self.size.bit_length() - 1), self.tree
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and tree[nxt] < k:
+                pos = nxt
+                k -= tree[nxt]
+            step >>= 1
+        return pos
+
+
+class Leaderboard:
+    """
+    One board of member -> score (integers).
+    """
+
+    def __init__(self, bucket_size: int = 1, capacity: int = 1024) -> None:
+        self.bucket_size = bucket_size
+        self._tree = _Fenwick(capacity)
+        self._scores: Dict[str, int] = {}
+        self._buckets: Dict[int, Dict[str, int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, member: str) -> bool:
+        return member in self._scores
+
+    @classmethod
+    def from_scores(cls, members: List[str], scores: np.ndarray, bucket_size: int = 1) -> "Leaderboard":
+        """Bulk-builds a board in linear time."""
+        scores = np.asarray(scores, dtype=np.int64)
+        buckets = np.maximum(scores, 0) // bucket_size
+        top = int(buckets.max()) if len(buckets) else 0
+        board = cls(bucket_size=bucket_size, capacity=1 << max(10, top.bit_length()))
+        board._tree = _Fenwick(board._tree.size, np.bincount(buckets, minlength=1))
+        board._scores = dict(zip(members, scores.tolist()))
+        for member, score, bucket in zip(members, scores.tolist(), buckets.tolist()):
+            board._buckets.setdefault(bucket, {})[member] = score
+        return board
+
+    def score(self, member: str) -> Optional[int]:
+        return self._scores.get(member)
+
+    def _bucket(self, score: int) -> int:
+        return max(0, score) // self.bucket_size
+
+    def set(self, member: str, score: int) -> None:
+        score = int(score)
+        old = self._scores.get(member)
+        if old == score:
+            return
+        if old is not None:
+            self._discard(member, old)
+        bucket = self._bucket(score)
+        if bucket >= self._tree.size:
+            self._grow(bucket)
+        self._scores[member] = score
+        self._buckets.setdefault(bucket, {})[member] = score
+        self._tree.add(bucket, 1)
+
+    def add(self, member: str, delta: int) -> int:
+        score = self._scores.get(member, 0) + int(delta)
+        self.set(member, score)
+        return score
+
+    def remove(self, member: str) -> None:
+        score = self._scores.pop(member, None)
+        if score is not None:
+            self._discard(member, score)
+
+    def _discard(self, member: str, score: int) -> None:
+        bucket = self._bucket(score)
+        members = self._buckets[bucket]
+        del members[member]
+        if not members:
+            del self._buckets[bucket]
+        self._tree.add(bucket, -1)
+        self._scores.pop(member, None)
+
+    def _grow(self, bucket: int) -> None:
+        size = self._tree.size
+        while size <= bucket:
+            size *= 2
+        counts = np.zeros(size, dtype=np.int64)
+        for b, members in self._buckets.items():
+            counts[b] = len(members)
+        self._tree = _Fenwick(size, counts)
+
+    def rank(self, member: str) -> Optional[int]:
+        """1-based rank (ties share a rank), or None for non-members."""
+        score = self._scores.get(member)
+        if score is None:
+            return None
+        bucket = self._bucket(score)
+        above = len(self._scores) - self._tree.prefix(bucket)
+        if self.bucket_size > 1 or bucket == 0:
+            above += sum(1 for s in self._buckets[bucket].values() if s > score)
+        return above + 1
+
+    def top(self, k: int = 10, offset: int = 0) -> List[Dict[str, Any]]:
+        """Members ranked offset+1 .. offset+k, best first; ties by member id."""
+        total = len(self._scores)
+        result: List[Dict[str, Any]] = []
+        position = offset + 1
+        while len(result) < k and position <= total:
+            bucket = self._tree.search(total - position + 1)
+            above = total - self._tree.prefix(bucket)
+            members = sorted(self._buckets[bucket].items(), key=lambda item: (-item[1], item[0]))
+            for member, score in members[position - above - 1:]:
+                if len(result) == k:
+                    break
+                result.append({"rank": self.rank(member), "student_id": member, "xp": score})
+                position += 1
+        return result
+
+    def items(self) -> Iterable[Tuple[str, int]]:
+        return self._scores.items()
+
+
+class LeaderboardService:
+    """
+    Keeps the global, per-organization and weekly boards in sync with XP
+    events and membership. Thread-safe.
+
+    Organization queries raise RuntimeError for organizations with no
+    loaded membership.
+    """
+
+    def __init__(self, keep_weeks: int = 2, bucket_size: int = 1) -> None:
+        self.keep_weeks = keep_weeks
+        self.bucket_size = bucket_size
+        self._lock = threading.RLock()
+        self._global = Leaderboard(bucket_size)
+        self._weeks: Dict[str, Leaderboard] = {}
+        self._orgs: Dict[str, Leaderboard] = {}
+        self._org_weeks: Dict[Tuple[str, str], Leaderboard] = {}
+        self._org_members: Dict[str, Set[str]] = {}
+        self._student_orgs: Dict[str, Set[str]] = {}
+        self.events = 0
+
+    # -- updates --------------------------------------------------------------
+
+    def load_scores(self, records: Iterable[Dict[str, Any]]) -> int:
+        """Bulk-load all-time XP from `students` rows ({id, xp_points})."""
+        rows = [(str(r["id"]), int(r.get("xp_points") or 0)) for r in records]
+        with self._lock:
+            self._global = Leaderboard.from_scores([r[0] for r in rows], np.array([r[1] for r in rows]), self.bucket_size)
+            for org_id in self._orgs:
+                self._orgs[org_id] = self._seed(self._global, self._org_members[org_id])
+        return len(rows)
+
+    def record_xp(self, student_id: str, delta: int, at: Optional[float] = None) -> None:
+        """Applies XP earned by one student to every board they are on."""
+        with self._lock:
+            self.events += 1
+            self._global.add(student_id, delta)
+            for org_id in self._student_orgs.get(student_id, ()):
+                self._orgs[org_id].add(student_id, delta)
+            self._record_weekly(student_id, delta, at)
+
+    def _record_weekly(self, student_id: str, delta: int, at: Optional[float]) -> None:
+        week = week_of(at)
+        self._week(week).add(student_id, delta)
+        for org_id in self._student_orgs.get(student_id, ()):
+            self._org_week(org_id, week).add(student_id, delta)
+
+    def load_weeks(self, events: Iterable[Tuple[str, int, float]]) -> int:
+        """Rebuild the weekly boards from timestamped (student_id, delta, at) XP events."""
+        count = 0
+        with self._lock:
+            self._weeks = {}
+            self._org_weeks = {}
+            for student_id, delta, at in events:
+                self._record_weekly(student_id, delta, at)
+                count += 1
+        return count
+
+    def record_batch(self, xp: Dict[str, int], at: Optional[float] = None) -> None:
+        """record_xp for {student_id: delta} (e.g. one ProgressWriter commit)."""
+        with self._lock:
+            for student_id, delta in xp.items():
+                self.record_xp(student_id, delta, at)
+
+    def set_members(self, org_id: str, student_ids: Iterable[str]) -> None:
+        """Replace an organization's membership."""
+        wanted = set(student_ids)
+        with self._lock:
+            for sid in self._org_members.get(org_id, set()) - wanted:
+                self._student_orgs.get(sid, set()).discard(org_id)
+            for sid in wanted:
+                self._student_orgs.setdefault(sid, set()).add(org_id)
+            self._org_members[org_id] = wanted
+            self._orgs[org_id] = self._seed(self._global, wanted)
+            for week, board in self._weeks.items():
+                self._org_weeks[(org_id, week)] = self._seed(board, wanted)
+
+    def _seed(self, source: Leaderboard, members: Set[str]) -> Leaderboard:
+        ids = [m for m in members if m in source]
+        return Leaderboard.from_scores(ids, np.array([source.score(m) for m in ids], dtype=np.int64), self.bucket_size)
+
+    def _week(self, week: str) -> Leaderboard:
+        board = self._weeks.get(week)
+        if board is None:
+            board = self._weeks[week] = Leaderboard(self.bucket_size)
+            for old in sorted(self._weeks)[:-self.keep_weeks]:
+                del self._weeks[old]
+                for key in [key for key in self._org_weeks if key[1] == old]:
+                    del self._org_weeks[key]
+        return board
+
+    def _org_week(self, org_id: str, week: str) -> Leaderboard:
+        board = self._org_weeks.get((org_id, week))
+        if board is None:
+            board = self._org_weeks[(org_id, week)] = Leaderboard(self.bucket_size)
+        return board
+
+    # -- queries --------------------------------------------------------------
+
+    def _board(self, org_id: Optional[str], window: str, at: Optional[float]) -> Leaderboard:
+        if window not in (ALL_TIME, WEEK):
+            raise RuntimeError(f"Unknown window: {window}")
+        if org_id is not None and org_id not in self._orgs:
+            raise RuntimeError(f"Unknown organization: {org_id}")
+        if window == ALL_TIME:
+            return self._global if org_id is None else self._orgs[org_id]
+        week = week_of(at)
+        if org_id is None:
+            return self._weeks.get(week) or Leaderboard(self.bucket_size)
+        return self._org_weeks.get((org_id, week)) or Leaderboard(self.bucket_size)
+
+    def top(self, k: int = 10, org_id: Optional[str] = None, window: str = ALL_TIME,
+            offset: int = 0, at: Optional[float] = None) -> Dict[str, Any]:
+        with self._lock:
+            board = self._board(org_id, window, at)
+            return {"size": len(board), "students": board.top(k, offset)}
+
+    def rank(self, student_id: str, org_id: Optional[str] = None, window: str = ALL_TIME,
+             at: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """{rank, of, xp} for one student, or None when they are not on the board."""
+        with self._lock:
+            board = self._board(org_id, window, at)
+            rank = board.rank(student_id)
+            if rank is None:
+                return None
+            return {"rank": rank, "of": len(board), "xp": board.score(student_id)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "members": len(self._global),
+                "organizations": len(self._orgs),
+                "weeks": sorted(self._weeks),
+                "events": self.events,
+            }
+
+    # -- persistence ----------------------------------------------------------
+
+    def snapshot(self, path: str) -> None:
+        """Writes every board and the memberships atomically to `path` (.npz)."""
+        with self._lock:
+            boards = [("global", None, None, self._global)]
+            boards += [("week", None, week, board) for week, board in self._weeks.items()]
+            boards += [("org", org_id, None, board) for org_id, board in self._orgs.items()]
+            boards += [("org_week", org_id, week, board) for (org_id, week), board in self._org_weeks.items()]
+            ids: List[str] = []
+            scores: List[int] = []
+            meta = []
+            for kind, org_id, week, board in boards:
+                members = list(board.items())
+                meta.append({"kind": kind, "org": org_id, "week": week, "count": len(members)})
+                ids += [m for m, _ in members]
+                scores += [s for _, s in members]
+            header = json.dumps({
+                "bucket_size": self.bucket_size,
+                "keep_weeks": self.keep_weeks,
+                "boards": meta,
+                "ids": ids,
+                "orgs": {org_id: sorted(members) for org_id, members in self._org_members.items()},
+            })
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    header=np.frombuffer(header.encode("utf-8"), dtype=np.uint8),
+                    scores=np.array(scores, dtype=np.int64),
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "LeaderboardService":
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(bytes(data["header"]).decode("utf-8"))
+            scores = data["scores"]
+        service = cls(keep_weeks=header["keep_weeks"], bucket_size=header["bucket_size"])
+        ids = header["ids"]
+        for org_id, members in header["orgs"].items():
+            service._org_members[org_id] = set(members)
+            for sid in members:
+                service._student_orgs.setdefault(sid, set()).add(org_id)
+        start = 0
+        for meta in header["boards"]:
+            stop = start + meta["count"]
+            board = Leaderboard.from_scores(ids[start:stop], scores[start:stop], service.bucket_size)
+            start = stop
+            if meta["kind"] == "global":
+                service._global = board
+            elif meta["kind"] == "week":
+                service._weeks[meta["week"]] = board
+            elif meta["kind"] == "org":
+                service._orgs[meta["org"]] = board
+            else:
+                service._org_weeks[(meta["org"], meta["week"])] = board
+        return service
+
+
+class LeaderboardFollower:
+    """
+    Feeds a LeaderboardService from the progress DB shared by all workers.
+
+    writer is a ProgressWriter. start() seeds all-time XP from `students`,
+    memberships from `org_members` and the weekly boards from the XP log.
+    poll() then applies the log entries committed since, by any worker.
+    poke() asks the running loop to poll right away (e.g. after this
+    worker's own commit).
+    """
+
+    def __init__(self, service: LeaderboardService, writer: Any, interval: float = 1.0) -> None:
+        self.service = service
+        self.writer = writer
+        self.interval = interval
+        self.last_seq = 0
+        self.versions: Dict[str, int] = {}
+        self.polls = 0
+        self._wake: Optional[asyncio.Event] = None
+
+    async def start(self) -> int:
+        """Seeds the boards; returns the number of students loaded."""
+        await self._sync_members()
+        scores, self.last_seq = await self.writer.scores_at()
+        seeded = self.service.load_scores(scores)
+        since = time.time() - 7 * 86400 * (self.service.keep_weeks + 1)
+        events, after = [], 0
+        while True:
+            rows = await self.writer.xp_events(after=after, since=since)
+            events += [row for row in rows if row[0] <= self.last_seq]
+            if not rows or rows[-1][0] >= self.last_seq:
+                break
+            after = rows[-1][0]
+        self.service.load_weeks((sid, amount, at) for _, sid, amount, at in events)
+        return seeded
+
+    async def poll(self) -> int:
+        """Applies memberships and XP committed since the last poll; returns the events applied."""
+        self.polls += 1
+        await self._sync_members()
+        applied = 0
+        while True:
+            rows = await self.writer.xp_events(after=self.last_seq)
+            if not rows:
+                return applied
+            for seq, student_id, amount, at in rows:
+                self.service.record_xp(student_id, amount, at)
+                self.last_seq = seq
+            applied += len(rows)
+
+    async def _sync_members(self) -> None:
+        for org_id, (version, members) in (await self.writer.memberships(self.versions)).items():
+            self.service.set_members(org_id, members)
+            self.versions[org_id] = version
+
+    def poke(self, *_: Any) -> None:
+        if self._wake is not None:
+            self._wake.set()
+
+    async def run(self) -> None:
+        """Polls every `interval` seconds (or when poked) until cancelled."""
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.poll()
+            except Exception as exc:
+                print(f"⚠️ Leaderboard poll failed: {exc}")
@@ -0,0 +1,609 @@
+"""
+Validation and repair of Mermaid diagrams returned by the visualize tool.
+
+Gemini's Mermaid is usually almost right: prose around the fence, an arrow
+borrowed from another diagram type, a label with parentheses that needs
+quoting, a missing `end` or `}`. This module parses the common diagram types
+(flowchart, sequence, class) line by line, fixes those mistakes in place and
+reports whatever it could not fix, so the service only re-prompts for output
+that is genuinely broken. Other diagram types are extracted and passed
+through unchecked.
+"""
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+FLOWCHART = "flowchart"
+SEQUENCE = "sequence"
+CLASS = "class"
+
+HEADERS = {FLOWCHART: "flowchart TD", SEQUENCE: "sequenceDiagram", CLASS: "classDiagram"}
+
+# Leading keyword of every diagram type; used to find unfenced diagrams.
+_DIAGRAM_KEYWORDS = {
+    "flowchart", "graph", "sequencediagram", "classdiagram", "classdiagram-v2",
+    "statediagram", "statediagram-v2", "erdiagram", "journey", "gantt", "pie",
+    "mindmap", "timeline", "gitgraph", "quadrantchart",
+}
+
+_FENCE = re.compile(r"```[ \t]*(?:mermaid)?[ \t]*\n(.*?)(?:```|\Z)", re.S | re.I)
+_SENTENCE = re.compile(r"^[A-Z][^\[\]{}();|>]*[.!?]$")
+
+
+def diagram_kind(diagram_type: Optional[str]) -> Optional[str]:
+    """Checked kind for a requested diagram type, or None when unchecked."""
+    name = (diagram_type or FLOWCHART).lower()
+    if "flow" in name or name == "graph":
+        return FLOWCHART
+    if "sequence" in name:
+        return SEQUENCE
+    if "class" in name:
+        return CLASS
+    return None
+
+
+def diagram_cache_key(topic: str, diagram_type: Optional[str]) -> Tuple[str, str, str]:
+    return ("mermaid", " ".join((topic or "")[:300].lower().split()), (diagram_type or FLOWCHART).lower())
+
+
+def _header_kind(line: str) -> Tuple[Optional[str], bool]:
+    """(kind, is_header) for the first line of a diagram."""
+    word = line.split(None, 1)[0].lower() if line.strip() else ""
+    if word in ("flowchart", "graph"):
+        return FLOWCHART, True
+    if word in ("sequencediagram", "sequence"):
+        return SEQUENCE, True
+    if word in ("classdiagram", "classdiagram-v2"):
+        return CLASS, True
+    return None, word in _DIAGRAM_KEYWORDS
+
+
+def extract_mermaid(text: str) -> Tuple[str, str]:
+    """
+    Split a model response into (diagram code, trailing summary).
+
+    Prefers a fenced block (an unterminated fence runs to the end); otherwise
+    takes everything from the first diagram keyword, stopping at a blank line
+    followed by a plain sentence.
+    """
+    match = _FENCE.search(text or "")
+    if match:
+        return match.group(1).strip("\n"), text[match.end():].strip()
+    lines = (text or "").strip().splitlines()
+    start = next((i for i, line in enumerate(lines) if _header_kind(line)[1]), 0)
+    for i in range(start + 1, len(lines) - 1):
+        if not lines[i].strip() and _SENTENCE.match(lines[i + 1].strip()):
+            return "\n".join(lines[start:i]), "\n".join(lines[i + 1:]).strip()
+    return "\n".join(lines[start:]), ""
+
+
+class MermaidResult:
+    """Outcome of repair_mermaid()."""
+
+    def __init__(
+        self,
+        code: str,
+        kind: Optional[str],
+        errors: List[str],
+        unfixed: List[str],
+        fixes: int,
+        summary: str = "",
+    ) -> None:
+        self.code = code
+        self.kind = kind
+        self.errors = errors
+        self.unfixed = unfixed
+        self.fixes = fixes
+        self.summary = summary
+
+    @property
+    def checked(self) -> bool:
+        return self.kind is not None
+
+    @property
+    def valid(self) -> bool:
+        return bool(self.code.strip()) and not self.unfixed
+
+    @property
+    def repaired(self) -> bool:
+        return self.fixes > 0
+
+    def render(self) -> str:
+        body = f"```mermaid\n{self.code}\n```"
+        return f"{body}\n\n{self.summary}" if self.summary else body
+
+
+class _Checker:
+    """Collects problems; fixable ones are applied to the output as found."""
+
+    def __init__(self) -> None:
+        self.errors: List[str] = []
+        self.unfixed: List[str] = []
+        self.fixes = 0
+
+    def fixed(self, lineno: int, message: str) -> None:
+        self.errors.append(f"line {lineno}: {message}")
+        self.fixes += 1
+
+    def broken(self, lineno: int, message: str) -> None:
+        self.errors.append(f"line {lineno}: {message}")
+        self.unfixed.append(f"line {lineno}: {message}")
+
+
+def _is_passthrough(stripped: str) -> bool:
+    return not stripped or stripped.startswith("%%")
+
+
+# --------------------------------------------------------------------------
+# Flowchart
+# --------------------------------------------------------------------------
+
+_FLOW_DIRECTIONS = {"TB", "TD", "BT", "RL", "LR"}
+_FLOW_KEYWORDS = {"classDef", "class", "style", "linkStyle", "click", "direction"}
+_NODE_ID = re.compile(r"\w+")
+# (opener, closer); longest opener first so "((" wins over "(".
+_SHAPES = [
+    ("(((", ")))"), ("((", "))"), ("([", "])"), ("[[", "]]"), ("[(", ")]"),
+    ("[/", "/]"), ("[\\", "\\]"), ("{{", "}}"), ("[", "]"), ("(", ")"), ("{", "}"), (">", "]"),
+]
+_OPENING = {")": "(", "]": "[", "}": "{"}
+_LABEL_SPECIALS = set("()[]{}\";")
+_FLOW_LINK = re.compile(
+    r"<?(?:"
+    r"--\s+[^-|>\n]+?\s+--+>|--\s+[^-|>\n]+?\s+---+"
+    r"|==\s+[^=|>\n]+?\s+==+>|==\s+[^=|>\n]+?\s+===+"
+    r"|-\.\s+[^.|>\n]+?\s+\.-+>|-\.\s+[^.|>\n]+?\s+\.-"
+    r"|--+>(?!>)|---+|--+[ox](?=\s)|==+>(?!>)|===+|-\.+->(?!>)|-\.+-|~~~+"
+    r")(?:\s*\|[^|\n]*\|)?"
+)
+_FLOW_BAD_LINK = re.compile(r"(-->>|->>?|=+>>|=>|⇒|→|⟶|—>|–>)(\s*\|[^|\n]*\|)?")
+
+
+def _split_statements(line: str) -> List[str]:
+    """Split on ';' outside quotes and brackets."""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, ch in enumerate(line):
+        if ch == '"':
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif ch in "([{":
+            depth += 1
+        elif ch in ")]}":
+            depth = max(0, depth - 1)
+        elif ch == ";" and depth == 0:
+            parts.append(line[start:i])
+            start = i + 1
+    parts.append(line[start:])
+    return parts
+
+
+def _find_closer(s: str, start: int, end: int, closer: str) -> int:
+    """Index of the matching closer in s[start:end], or -1."""
+    close_ch = closer[0]
+    open_ch = _OPENING.get(close_ch)
+    depth, quoted = 0, False
+    for i in range(start, end):
+        ch = s[i]
+        if ch == '"':
+            quoted = not quoted
+            continue
+        if quoted:
+            continue
+        if depth == 0 and s.startswith(closer, i):
+            return i
+        if open_ch is not None and ch == open_ch:
+            depth += 1
+        elif ch == close_ch and depth > 0:
+            depth -= 1
+    # Unbalanced brackets inside the label: take the last closer.
+    return s.rfind(closer, start, end)
+
+
+class _FlowStatement:
+    """Parses one flowchart statement, collecting (start, end, text) edits."""
+
+    def __init__(self, s: str, lineno: int, checker: _Checker) -> None:
+        self.s = s
+        self.lineno = lineno
+        self.checker = checker
+        self.edits: List[Tuple[int, int, str]] = []
+
+    def _skip_ws(self, pos: int) -> int:
+        while pos < len(self.s) and self.s[pos].isspace():
+            pos += 1
+        return pos
+
+    def _next_link(self, pos: int) -> int:
+        quoted = False
+        for i in range(pos, len(self.s)):
+            if self.s[i] == '"':
+                quoted = not quoted
+            elif not quoted and self.s[i] in "-=~<→⇒⟶—–" and (
+                _FLOW_LINK.match(self.s, i) or _FLOW_BAD_LINK.match(self.s, i)
+            ):
+                return i
+        return len(self.s)
+
+    def _node(self, pos: int) -> Optional[int]:
+        s = self.s
+        match = _NODE_ID.match(s, pos)
+        if not match:
+            self.checker.broken(self.lineno, f"expected a node id at '{s[pos:pos + 20].strip()}'")
+            return None
+        if match.group(0) == "end":
+            self.edits.append((match.start(), match.end(), "End"))
+            self.checker.fixed(self.lineno, "'end' is reserved as a node id")
+        pos = match.end()
+        for opener, closer in _SHAPES:
+            if not s.startswith(opener, pos):
+                continue
+            label_start = pos + len(opener)
+            region_end = self._next_link(label_start)
+            close_at = _find_closer(s, label_start, region_end, closer)
+            if close_at < 0:
+                label = s[label_start:region_end].rstrip()
+                label_end = label_start + len(label)
+                self.edits.append((label_start, label_end, self._label(label) + closer))
+                self.checker.fixed(self.lineno, f"unclosed '{opener}' on node {match.group(0)}")
+                pos = label_end
+            else:
+                label = s[label_start:close_at]
+                fixed_label = self._label(label)
+                if fixed_label != label:
+                    self.edits.append((label_start, close_at, fixed_label))
+                pos = close_at + len(closer)
+            break
+        if s.startswith(":::", pos):
+            cls = _NODE_ID.match(s, pos + 3)
+            pos = cls.end() if cls else pos + 3
+        return pos
+
+    def _label(self, label: str) -> str:
+        stripped = label.strip()
+        if len(stripped) >= 2 and stripped[0] == '"' and stripped[-1] == '"' and '"' not in stripped[1:-1]:
+            return label
+        if not stripped:
+            self.checker.fixed(self.lineno, "empty node label")
+            return '" "'
+        if any(ch in _LABEL_SPECIALS for ch in stripped):
+            self.checker.fixed(self.lineno, f"label needs quoting: {stripped[:40]}")
+            return '"' + stripped.replace('"', "#quot;") + '"'
+        return label
+
+    def _group(self, pos: int) -> Optional[int]:
+        while True:
+            pos = self._node(self._skip_ws(pos))
+            if pos is None:
+                return None
+            after = self._skip_ws(pos)
+            if after < len(self.s) and self.s[after] == "&":
+                pos = after + 1
+                continue
+            return pos
+
+    def parse(self) -> str:
+        s = self.s
+        pos = self._group(0)
+        while pos is not None:
+            pos = self._skip_ws(pos)
+            if pos >= len(s):
+                break
+            link = _FLOW_LINK.match(s, pos)
+            if link is None:
+                bad = _FLOW_BAD_LINK.match(s, pos)
+                if bad is None:
+                    self.checker.broken(self.lineno, f"expected an arrow at '{s[pos:pos + 20].strip()}'")
+                    break
+                arrow = "==>" if bad.group(1)[0] in "=⇒" else "-->"
+                self.edits.append((bad.start(1), bad.end(1), arrow))
+                self.checker.fixed(self.lineno, f"invalid arrow '{bad.group(1)}'")
+                link = bad
+            pos = self._skip_ws(link.end())
+            if pos >= len(s):
+                self.checker.broken(self.lineno, "arrow without a target node")
+                break
+            pos = self._group(pos)
+        out = s
+        for start, end, text in sorted(self.edits, reverse=True):
+            out = out[:start] + text + out[end:]
+        return out
+
+
+def _check_flowchart(lines: List[str], checker: _Checker) -> List[str]:
+    out: List[str] = []
+    depth = 0
+    for lineno, line in enumerate(lines, start=2):
+        statements = []
+        for stmt in _split_statements(line):
+            stripped = stmt.strip()
+            word = stripped.split(None, 1)[0] if stripped else ""
+            if _is_passthrough(stripped) or word in _FLOW_KEYWORDS:
+                statements.append(stmt)
+            elif word == "subgraph":
+                depth += 1
+                statements.append(stmt)
+            elif stripped == "end":
+                if depth == 0:
+                    checker.fixed(lineno, "'end' without a subgraph")
+                    continue
+                depth -= 1
+                statements.append(stmt)
+            else:
+                indent = stmt[: len(stmt) - len(stmt.lstrip())]
+                statements.append(indent + _FlowStatement(stripped, lineno, checker).parse())
+        if statements:
+            out.append(";".join(statements))
+    for _ in range(depth):
+        checker.fixed(len(lines) + 1, "subgraph without 'end'")
+        out.append("end")
+    return out
+
+
+def _flowchart_header(line: str, lineno: int, checker: _Checker) -> str:
+    parts = line.split()
+    keyword = parts[0].lower()
+    direction = parts[1] if len(parts) > 1 else None
+    header = line
+    if keyword != parts[0]:
+        checker.fixed(lineno, f"header keyword should be '{keyword}'")
+        header = " ".join([keyword] + parts[1:])
+    if direction is not None and direction.upper() not in _FLOW_DIRECTIONS:
+        checker.fixed(lineno, f"unknown direction '{direction}'")
+        header = f"{keyword} TD"
+    elif direction is not None and direction != direction.upper():
+        checker.fixed(lineno, f"direction should be '{direction.upper()}'")
+        header = f"{keyword} {direction.upper()}"
+    return header
+
+
+# --------------------------------------------------------------------------
+# Sequence diagram
+# --------------------------------------------------------------------------
+
+_SEQ_ACTOR = r"[^\-<>:+,;\n]+?"
+_SEQ_MESSAGE = re.compile(
+    rf"^(?P<src>{_SEQ_ACTOR})\s*(?P<arrow><<-->>|<<->>|-->>|->>|--x|-x|--\)|-\)|-->|->)"
+    rf"(?P<act>[+-]?)\s*(?P<dst>{_SEQ_ACTOR})\s*(?::(?P<text>.*))?$"
+)
+_SEQ_BAD_MESSAGE = re.compile(
+    rf"^(?P<src>{_SEQ_ACTOR})\s*(?P<arrow>-{{3,}}>{{1,2}}|->{{3,}}|=+>{{1,2}}|-?>>|→|⇒|⟶|—>|–>)"
+    rf"(?P<act>[+-]?)\s*(?P<dst>{_SEQ_ACTOR})\s*(?::(?P<text>.*))?$"
+)
+_SEQ_NOTE = re.compile(r"^note\s+(?:left of|right of|over)\s+", re.I)
+_SEQ_OPEN = {"loop", "alt", "opt", "par", "rect", "critical", "break", "box"}
+_SEQ_MID = {"else": "alt", "and": "par", "option": "critical"}
+_SEQ_KEYWORDS = {
+    "participant", "actor", "autonumber", "activate", "deactivate", "title",
+    "create", "destroy", "link", "links", "properties", "details",
+}
+
+
+def _message(match: "re.Match[str]", arrow: str, lineno: int, checker: _Checker) -> str:
+    text = match.group("text")
+    dst = match.group("dst").strip()
+    if text is None:
+        dst, _, rest = dst.partition(" ")
+        text = " " + rest.strip() if rest.strip() else " "
+        checker.fixed(lineno, "message without ':'")
+    return f"{match.group('src').strip()}{arrow}{match.group('act')}{dst}:{text}"
+
+
+def _check_sequence(lines: List[str], checker: _Checker) -> List[str]:
+    out: List[str] = []
+    blocks: List[str] = []
+    for lineno, line in enumerate(lines, start=2):
+        stripped = line.strip()
+        indent = line[: len(line) - len(line.lstrip())]
+        word = stripped.split(None, 1)[0].lower() if stripped else ""
+        if _is_passthrough(stripped) or word in _SEQ_KEYWORDS:
+            out.append(line)
+        elif word in _SEQ_OPEN:
+            blocks.append(word)
+            out.append(line)
+        elif word in _SEQ_MID:
+            if _SEQ_MID[word] not in blocks:
+                checker.broken(lineno, f"'{word}' outside a '{_SEQ_MID[word]}' block")
+            out.append(line)
+        elif word == "end":
+            if not blocks:
+                checker.fixed(lineno, "'end' without an open block")
+                continue
+            blocks.pop()
+            out.append(line)
+        elif _SEQ_NOTE.match(stripped):
+            if ":" not in stripped:
+                head = _SEQ_NOTE.match(stripped).end()
+                target, _, rest = stripped[head:].partition(" ")
+                checker.fixed(lineno, "note without ':'")
+                line = f"{indent}{stripped[:head]}{target}: {rest.strip()}"
+            out.append(line)
+        else:
+            match = _SEQ_MESSAGE.match(stripped)
+            if match is not None:
+                arrow = match.group("arrow")
+            else:
+                match = _SEQ_BAD_MESSAGE.match(stripped)
+                if match is None:
+                    checker.broken(lineno, f"unrecognised statement '{stripped[:40]}'")
+                    out.append(line)
+                    continue
+                arrow = "->>"
+                checker.fixed(lineno, f"invalid arrow '{match.group('arrow')}'")
+            fixed = indent + _message(match, arrow, lineno, checker)
+            out.append(fixed if fixed.strip() != stripped else line)
+    for block in reversed(blocks):
+        checker.fixed(len(lines) + 1, f"'{block}' without 'end'")
+        out.append("end")
+    return out
+
+
+# --------------------------------------------------------------------------
+# Class diagram
+# --------------------------------------------------------------------------
+
+_CLASS_NAME = r"\w+(?:~[^~\n]+~)?"
+_CLASS_DECL = re.compile(
+    rf'^class\s+({_CLASS_NAME})(?:\s*\["[^"]*"\])?\s*(?::::\w+)?\s*(\{{)?\s*(\}})?$'
+)
+_CLASS_REL = re.compile(
+    rf'^({_CLASS_NAME})\s*(?:"[^"]*"\s*)?((?:<\||\*|o|<)?(?:--|\.\.)(?:\|>|\*|o|>)?)'
+    rf'\s*(?:"[^"]*"\s*)?({_CLASS_NAME})\s*(?::.*)?$'
+)
+_CLASS_BAD_REL = re.compile(rf'^({_CLASS_NAME}(?:\s*"[^"]*")?)\s*(<-(?!-)|-{{3,}}>?|->|=+>|→|⇒|⟶)\s*(.+)$')
+_CLASS_MEMBER = re.compile(rf"^{_CLASS_NAME}\s*:\s*\S")
+_CLASS_ANNOTATION = re.compile(rf"^<<[^>]+>>\s*{_CLASS_NAME}$")
+_CLASS_NAMESPACE = re.compile(r"^namespace\s+[\w.]+\s*\{$")
+_CLASS_KEYWORDS = {"note", "direction", "style", "classDef", "cssClass", "callback", "click", "link"}
+
+
+def _check_class(lines: List[str], checker: _Checker) -> List[str]:
+    out: List[str] = []
+    blocks: List[str] = []
+    for lineno, line in enumerate(lines, start=2):
+        stripped = line.strip()
+        word = stripped.split(None, 1)[0] if stripped else ""
+        if blocks and blocks[-1] == "class":
+            if stripped == "}":
+                blocks.pop()
+                out.append(line)
+                continue
+            if not (_CLASS_DECL.match(stripped) or _CLASS_NAMESPACE.match(stripped)):
+                out.append(line)  # member line
+                continue
+            checker.fixed(lineno, "class body without '}'")
+            blocks.pop()
+            out.append("}")
+        if _is_passthrough(stripped) or word in _CLASS_KEYWORDS:
+            out.append(line)
+        elif stripped == "}":
+            if not blocks:
+                checker.fixed(lineno, "'}' without an open block")
+                continue
+            blocks.pop()
+            out.append(line)
+        elif _CLASS_NAMESPACE.match(stripped):
+            blocks.append("namespace")
+            out.append(line)
+        elif word == "class":
+            decl = _CLASS_DECL.match(stripped)
+            if decl is None:
+                checker.broken(lineno, f"malformed class declaration '{stripped[:40]}'")
+            elif decl.group(2) and not decl.group(3):
+                blocks.append("class")
+            out.append(line)
+        elif _CLASS_REL.match(stripped) or _CLASS_MEMBER.match(stripped) or _CLASS_ANNOTATION.match(stripped):
+            out.append(line)
+        else:
+            bad = _CLASS_BAD_REL.match(stripped)
+            if bad is not None:
+                arrow = "<--" if bad.group(2).startswith("<") else "-->"
+                candidate = f"{bad.group(1)} {arrow} {bad.group(3)}"
+                if _CLASS_REL.match(candidate):
+                    checker.fixed(lineno, f"invalid relation '{bad.group(2)}'")
+                    out.append(line[: len(line) - len(line.lstrip())] + candidate)
+                    continue
+            checker.broken(lineno, f"unrecognised statement '{stripped[:40]}'")
+            out.append(line)
+    for _ in blocks:
+        checker.fixed(len(lines) + 1, "block without '}'")
+        out.append("}")
+    return out
+
+
+_CHECKERS = {FLOWCHART: _check_flowchart, SEQUENCE: _check_sequence, CLASS: _check_class}
+
+
+def repair_mermaid(text: str, diagram_type: Optional[str] = None) -> MermaidResult:
+    """
+    Extract, validate and repair the diagram in a model response.
+
+    The header decides the diagram kind; a missing header is added for the
+    requested type. Unchecked kinds (mindmap, gantt, ...) come back as-is.
+
+    Args:
+        text: Raw model output.
+        diagram_type: Type the student asked for, e.g. "flowchart".
+
+    Returns:
+        MermaidResult; `valid` is False when something could not be fixed.
+    """
+    code, summary = extract_mermaid(text)
+    checker = _Checker()
+    lines = [line.rstrip() for line in code.splitlines()]
+    # Skip front matter and leading comments/blank lines.
+    start = 0
+    if lines and lines[0].strip() == "---":
+        start = next((i + 1 for i in range(1, len(lines)) if lines[i].strip() == "---"), 0)
+    while start < len(lines) and _is_passthrough(lines[start].strip()):
+        start += 1
+    if start >= len(lines):
+        checker.broken(1, "no diagram found")
+        return MermaidResult(code, diagram_kind(diagram_type), checker.errors, checker.unfixed, 0, summary)
+
+    kind, is_header = _header_kind(lines[start])
+    if not is_header:
+        kind = diagram_kind(diagram_type)
+        if kind is None:
+            return MermaidResult(code, None, [], [], 0, summary)
+        checker.fixed(start + 1, "missing diagram header")
+        header = HEADERS[kind]
+        body = lines[start:]
+    elif kind is None:
+        return MermaidResult(code, None, [], [], 0, summary)
+    else:
+        header = lines[start].strip()
+        if kind == FLOWCHART:
+            # "graph TD; A-->B;" keeps statements on the header line.
+            header, _, rest = header.partition(";")
+            header = _flowchart_header(header.strip(), start + 1, checker)
+            if rest.strip():
+                checked = _check_flowchart([rest], checker)
+                header = ";".join([header] + checked)
+        elif header != HEADERS[kind] and header != "classDiagram-v2":
+            checker.fixed(start + 1, f"header should be '{HEADERS[kind]}'")
+            header = HEADERS[kind]
+        body = lines[start + 1:]
+
+    checked = _CHECKERS[kind](body, checker)
+    fixed_code = "\n".join(lines[:start] + [header] + checked)
+    if not checker.fixes:
+        fixed_code = code
+    return MermaidResult(fixed_code, kind, checker.errors, checker.unfixed, checker.fixes, summary)
+
+
+def validate_mermaid(text: str, diagram_type: Optional[str] = None) -> List[str]:
+    """Every problem in the diagram, fixable or not (empty when valid as-is)."""
+    return repair_mermaid(text, diagram_type).errors
+
+
+class DiagramStats:
+    """Counters for the visualize tool's validate/repair/re-prompt pipeline."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.valid_as_generated = 0
+        self.repaired = 0
+        self.reprompted = 0
+        self.failed = 0
+        self.unchecked = 0
+        self.cache_hits = 0
+
+    def record(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "generated": self.generated,
+                "valid_as_generated": self.valid_as_generated,
+                "repaired": self.repaired,
+                "reprompted": self.reprompted,
+                "failed": self.failed,
+                "unchecked": self.unchecked,
+                "cache_hits": self.cache_hits,
+                "reprompt_rate": round(self.reprompted / self.generated, 4) if self.generated else None,
+            }
@@ -0,0 +1,172 @@
+"""
+Versioned model artifacts for the student final-result model.
+
+An artifact is a directory named after its version that bundles the fitted
+estimator, the categorical encoders and the training metadata in one pickle
+(`artifact.pkl`), plus a human-readable copy of the metadata
+(`metadata.json`) so tooling can list artifacts without unpickling them.
+"""
+import json
+import os
+import pickle
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+ARTIFACT_FILENAME = "artifact.pkl"
+METADATA_FILENAME = "metadata.json"
+
+# Feature order expected by every model produced by app.cli.train.
+CATEGORICAL_FEATURES = [
+    "code_module",
+    "code_presentation",
+    "gender",
+    "region",
+    "highest_education",
+    "imd_band",
+    "age_band",
+    "disability",
+]
+NUMERIC_FEATURES = [
+    "num_of_prev_attempts",
+    "studied_credits",
+    "total_clicks",
+    "total_vle_interactions",
+]
+FEATURE_COLUMNS = CATEGORICAL_FEATURES + NUMERIC_FEATURES
+
+# Code used for categories that were never seen during training.
+UNKNOWN_CODE = -1
+
+
+class ModelArtifact:
+    """
+    A fitted model together with the encoders and metadata needed to serve it.
+
+    encoders maps each categorical feature to the ordered list of classes seen
+    during training; a value is encoded as its index in that list.
+    """
+
+    def __init__(
+        self,
+        model: Any,
+        encoders: Dict[str, List[str]],
+        metadata: Dict[str, Any],
+    ) -> None:
+        self.model = model
+        self.encoders = encoders
+        self.metadata = metadata
+        self.features: List[str] = list(metadata.get("features", FEATURE_COLUMNS))
+        self._lookup = {
+            col: {value: code for code, value in enumerate(classes)}
+            for col, classes in encoders.items()
+        }
+        self._explainer: Any = None
+        self._explainer_checked = False
+        self._drift_monitor: Any = None
+
+    @property
+    def version(self) -> str:
+        return str(self.metadata.get("version", "unversioned"))
+
+    def encode_value(self, column: str, value: Any) -> float:
+        lookup = self._lookup.get(column)
+        if lookup is None:
+            try:
+                return float(value or 0)
+            except (TypeError, ValueError):
+                return 0.0
+        return float(lookup.get(str(value), UNKNOWN_CODE))
+
+    def encode(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        """Encode raw feature dicts into the float matrix the model was fit on."""
+        matrix = np.empty((len(rows), len(self.features)), dtype=np.float32)
+        for i, row in enumerate(rows):
+            for j, col in enumerate(self.features):
+                matrix[i, j] = self.encode_value(col, row.get(col))
+        return matrix
+
+    def encode_frame(self, frame: Any) -> np.ndarray:
+        """
+        Vectorized encode for a pandas DataFrame of raw features; missing
+        columns encode as 0 (numeric) or unknown (categorical). Serving
+        fills them with the single-row defaults first (see
+        predictor.predict_final_result_batch).
+        """
+        matrix = np.zeros((len(frame), len(self.features)), dtype=np.float32)
+        for j, col in enumerate(self.features):
+            lookup = self._lookup.get(col)
+            if col not in frame.columns:
+                if lookup is not None:
+                    matrix[:, j] = UNKNOWN_CODE
+                continue
+            if lookup is None:
+                matrix[:, j] = np.nan_to_num(frame[col].to_numpy(dtype=np.float32, na_value=0))
+            else:
+                codes = frame[col].astype(str).map(lookup)
+                matrix[:, j] = codes.fillna(UNKNOWN_CODE).to_numpy(dtype=np.float32)
+        return matrix
+
+    def predict(self, rows: List[Dict[str, Any]]) -> List[Any]:
+        return list(self.model.predict(self.encode(rows)))
+
+    def get_explainer(self) -> Any:
+        """Lazily build a TreeExplainer; None when the model is not a tree ensemble."""
+        if not self._explainer_checked:
+            from .explainer import TreeExplainer
+
+            if TreeExplainer.supports(self.model):
+                self._explainer = TreeExplainer(self.model, self.features)
+            self._explainer_checked = True
+        return self._explainer
+
+    def get_drift_monitor(self) -> Any:
+        """Lazily build a DriftMonitor from the reference profile; None if there is none."""
+        if self._drift_monitor is None and self.metadata.get("reference_profile"):
+            from .drift import DriftMonitor
+
+            self._drift_monitor = DriftMonitor(self.metadata["reference_profile"])
+        return self._drift_monitor
+
+    def save(self, root: str) -> str:
+        """Write the artifact under root/<version>/ and return that directory."""
+        target = os.path.join(root, self.version)
+        os.makedirs(target, exist_ok=True)
+
+        # Write to temp files first so a half-written artifact is never picked up.
+        bundle_path = os.path.join(target, ARTIFACT_FILENAME)
+        tmp_bundle = bundle_path + ".tmp"
+        with open(tmp_bundle, "wb") as f:
+            pickle.dump(
+                {"model": self.model, "encoders": self.encoders, "metadata": self.metadata},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_bundle, bundle_path)
+
+        meta_path = os.path.join(target, METADATA_FILENAME)
+        tmp_meta = meta_path + ".tmp"
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(self.metadata, f, indent=2, default=str)
+        os.replace(tmp_meta, meta_path)
+        return target
+
+    @classmethod
+    def load(cls, path: str) -> "ModelArtifact":
+        """Load an artifact from its directory (or directly from artifact.pkl)."""
+        if os.path.isdir(path):
+            path = os.path.join(path, ARTIFACT_FILENAME)
+        with open(path, "rb") as f:
+            bundle = pickle.load(f)
+        return cls(bundle["model"], bundle["encoders"], bundle["metadata"])
+
+
+def read_metadata(artifact_dir: str) -> Optional[Dict[str, Any]]:
+    """Return the metadata.json of an artifact directory, or None if missing."""
+    meta_path = os.path.join(artifact_dir, METADATA_FILENAME)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
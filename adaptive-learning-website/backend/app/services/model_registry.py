@@ -0,0 +1,265 @@
+"""
+Versioned model registry with atomic hot-swap and optional shadow scoring.
+
+The registry root is a directory of artifacts written by app.cli.train
+(one sub-directory per version) plus an `ACTIVE` pointer file holding the
+version currently served. Activating a version loads it fully before swapping
+a single reference, so requests that already grabbed the previous artifact
+finish on it and new requests see the new one; nothing is dropped.
+
+Every worker can watch the pointer file, so promoting a model through the
+admin endpoint on one worker rolls it out to all of them.
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from .model_artifact import ARTIFACT_FILENAME, ModelArtifact, read_metadata
+
+
+ACTIVE_POINTER = "ACTIVE"
+
+# Latency samples kept per model for the shadow report.
+LATENCY_WINDOW = 1000
+
+
+def _percentile(samples: List[float], pct: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return round(ordered[index], 3)
+
+
+class ShadowScorer:
+    """
+    Scores a sampled fraction of live traffic with a candidate model.
+
+    Shadow predictions run on a single background thread so they never add
+    latency to the request; when the thread falls behind, samples are dropped
+    rather than queued without bound.
+    """
+
+    def __init__(self, artifact: ModelArtifact, sample_rate: float, max_pending: int = 64) -> None:
+        self.artifact = artifact
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self._max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow-model")
+        self._primary_ms: deque = deque(maxlen=LATENCY_WINDOW)
+        self._shadow_ms: deque = deque(maxlen=LATENCY_WINDOW)
+        self.sampled = 0
+        self.dropped = 0
+        self.compared = 0
+        self.agreements = 0
+        self.errors = 0
+
+    def observe(self, row: Dict[str, Any], primary_prediction: Any, primary_ms: float) -> None:
+        if random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            self.sampled += 1
+            self._primary_ms.append(primary_ms)
+            if self._pending >= self._max_pending:
+                self.dropped += 1
+                return
+            self._pending += 1
+        self._executor.submit(self._score, row, primary_prediction)
+
+    def _score(self, row: Dict[str, Any], primary_prediction: Any) -> None:
+        try:
+            started = time.perf_counter()
+            prediction = self.artifact.predict([row])[0]
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.compared += 1
+                self.agreements += int(prediction == primary_prediction)
+                self._shadow_ms.append(elapsed_ms)
+        except Exception as exc:  # pragma: no cover - defensive
+            with self._lock:
+                self.errors += 1
+            print(f"⚠️ Shadow model {self.artifact.version} failed: {exc}")
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            primary = list(self._primary_ms)
+            shadow = list(self._shadow_ms)
+            return {
+                "version": self.artifact.version,
+                "sample_rate": self.sample_rate,
+                "sampled": self.sampled,
+                "dropped": self.dropped,
+                "compared": self.compared,
+                "errors": self.errors,
+                "agreement_rate": round(self.agreements / self.compared, 4) if self.compared else None,
+                "primary_latency_ms": {"p50": _percentile(primary, 50), "p95": _percentile(primary, 95)},
+                "shadow_latency_ms": {"p50": _percentile(shadow, 50), "p95": _percentile(shadow, 95)},
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class ModelRegistry:
+    """
+    Directory-backed registry of model artifacts.
+
+    All methods raise RuntimeError for unknown or unloadable versions so the
+    FastAPI layer can translate them into HTTP errors.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._active: Optional[ModelArtifact] = None
+        self._shadow: Optional[ShadowScorer] = None
+        self._swap_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+
+    @property
+    def active(self) -> Optional[ModelArtifact]:
+        return self._active
+
+    @property
+    def shadow(self) -> Optional[ShadowScorer]:
+        return self._shadow
+
+    def _pointer_path(self) -> str:
+        return os.path.join(self.root, ACTIVE_POINTER)
+
+    def _version_dir(self, version: str) -> str:
+        # Versions are plain directory names; refuse anything path-like.
+        if not version or os.path.basename(version) != version or version.startswith("."):
+            raise RuntimeError(f"Invalid model version: {version!r}")
+        return os.path.join(self.root, version)
+
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            name for name in os.listdir(self.root)
+            if os.path.isfile(os.path.join(self.root, name, ARTIFACT_FILENAME))
+        )
+
+    def list_models(self) -> List[Dict[str, Any]]:
+        active_version = self._active.version if self._active else None
+        shadow_version = self._shadow.artifact.version if self._shadow else None
+        models = []
+        for version in self.versions():
+            metadata = read_metadata(self._version_dir(version)) or {}
+            models.append({
+                "version": version,
+                "created_at": metadata.get("created_at"),
+                "model_type": metadata.get("model_type"),
+                "metrics": metadata.get("metrics", {}),
+                "active": version == active_version,
+                "shadow": version == shadow_version,
+            })
+        return models
+
+    def read_pointer(self) -> Optional[str]:
+        try:
+            with open(self._pointer_path(), "r", encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _write_pointer(self, version: str) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self._pointer_path()}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(version)
+        os.replace(tmp_path, self._pointer_path())
+
+    def load(self, version: str) -> ModelArtifact:
+        path = self._version_dir(version)
+        try:
+            return ModelArtifact.load(path)
+        except Exception as exc:
+            raise RuntimeError(f"Failed to load model {version}: {exc}") from exc
+
+    def activate(self, version: str, persist: bool = True) -> ModelArtifact:
+        """
+        Load `version` and make it the served model.
+
+        The artifact is fully loaded before the swap, so a bad version leaves
+        the current model in place.
+        """
+        with self._swap_lock:
+            artifact = self.load(version)
+            # Precompute explanation arrays so the first request does not pay for it.
+            artifact.get_explainer()
+            if persist:
+                self._write_pointer(version)
+            self._active = artifact
+        print(f"✅ Active model is now {artifact.version}")
+        return artifact
+
+    def load_initial(self) -> Optional[ModelArtifact]:
+        """Activate the pointed-to version, or the newest one if there is no pointer."""
+        version = self.read_pointer()
+        if version is None:
+            versions = self.versions()
+            if not versions:
+                return None
+            version = versions[-1]
+        try:
+            return self.activate(version, persist=False)
+        except RuntimeError as exc:
+            print(f"⚠️ {exc}")
+            return None
+
+    def reload_if_changed(self) -> bool:
+        """Follow the ACTIVE pointer if another process moved it."""
+        version = self.read_pointer()
+        if version is None or (self._active is not None and self._active.version == version):
+            return False
+        try:
+            self.activate(version, persist=False)
+        except RuntimeError as exc:
+            print(f"⚠️ Ignoring ACTIVE pointer: {exc}")
+            return False
+        return True
+
+    def start_watcher(self, interval_seconds: float = 5.0) -> None:
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop_watching.clear()
+
+        def _watch() -> None:
+            while not self._stop_watching.wait(interval_seconds):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=_watch, name="model-registry-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop_watching.set()
+
+    def set_shadow(self, version: str, sample_rate: float) -> ShadowScorer:
+        artifact = self.load(version)
+        previous, self._shadow = self._shadow, ShadowScorer(artifact, sample_rate)
+        if previous is not None:
+            previous.shutdown()
+        return self._shadow
+
+    def clear_shadow(self) -> Optional[Dict[str, Any]]:
+        previous, self._shadow = self._shadow, None
+        if previous is None:
+            return None
+        previous.shutdown()
+        return previous.stats()
+
+    def observe(self, row: Dict[str, Any], prediction: Any, latency_ms: float) -> None:
+        """Hand a served prediction to the shadow scorer, if one is configured."""
+        shadow = self._shadow
+        if shadow is not None:
+            shadow.observe(row, prediction, latency_ms)
@@ -0,0 +1,285 @@
+"""
+Hedged, multi-model routing for Gemini generations.
+
+Takes an ordered list of model ids (GEMINI_MODEL_IDS). Each request goes to
+the first healthy model; if it has not answered by that model's recent
+latency percentile, a hedged request is sent to the next healthy model and
+whichever answers first wins (the other is cancelled). Quota, transport,
+timeout and 5xx errors fail over to the next model immediately; client
+errors (400 invalid argument, 403, 404, blocked prompts) come from the
+request itself and are re-raised without touching the model's health.
+
+Each model has a circuit breaker: after `failure_threshold` consecutive
+failures it is skipped for `cooldown` seconds, then a single probe request
+decides whether it closes again.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from .deadlines import DeadlineExceeded
+
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Below this many samples the hedge delay falls back to the default.
+MIN_LATENCY_SAMPLES = 20
+
+
+def is_quota_error(exc: BaseException) -> bool:
+    message = str(exc).lower()
+    return "429" in message or "quota" in message or "resource exhausted" in message or "rate limit" in message
+
+
+# Statuses that say the model/service is unhealthy rather than the request bad.
+_UPSTREAM_HTTP_STATUSES = {408, 429}
+_UPSTREAM_GRPC_CODES = {"UNAVAILABLE", "DEADLINE_EXCEEDED", "INTERNAL", "RESOURCE_EXHAUSTED", "ABORTED", "UNKNOWN"}
+_UPSTREAM_MARKERS = ("500", "502", "503", "504", "unavailable", "timed out", "timeout", "internal error", "overloaded", "connection")
+
+
+def is_upstream_error(exc: BaseException) -> bool:
+    """
+    Whether an error reflects on the model's health (quota, transport,
+    timeout, 5xx) as opposed to a client error caused by the request.
+    """
+    if is_quota_error(exc) or isinstance(exc, (TimeoutError, OSError)):
+        return True
+    code = getattr(exc, "code", None)
+    if callable(code):
+        # grpc.RpcError exposes code() -> StatusCode.
+        try:
+            name = getattr(code(), "name", None)
+        except Exception:
+            name = None
+        if name:
+            return name in _UPSTREAM_GRPC_CODES
+    elif isinstance(code, int) and code > 0:
+        # google.api_core exceptions carry the HTTP status as `code`.
+        return code >= 500 or code in _UPSTREAM_HTTP_STATUSES
+    message = str(exc).lower()
+    return any(marker in message for marker in _UPSTREAM_MARKERS)
+
+
+class UpstreamUnavailable(RuntimeError):
+    """Every model failed, is over quota or is circuit-open (nothing was generated)."""
+
+
+class ModelHealth:
+    """Latency window and circuit breaker for one model id."""
+
+    def __init__(self, model_id: str, failure_threshold: int, cooldown: float, window: int = 200) -> None:
+        self.model_id = model_id
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.quota_errors = 0
+
+    def available(self, now: float) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and now - self.opened_at >= self.cooldown:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            return True
+        return False
+
+    def begin(self) -> None:
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = True
+
+    def success(self, latency: float) -> None:
+        self.latencies.append(latency)
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.probe_in_flight = False
+
+    def failure(self, quota: bool = False) -> None:
+        self.failures += 1
+        self.quota_errors += int(quota)
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def abandon(self) -> None:
+        """No verdict on the model's health (cancelled hedge loser, client error)."""
+        self.probe_in_flight = False
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < MIN_LATENCY_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "model_id": self.model_id,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "quota_errors": self.quota_errors,
+            "p50_ms": round(1000 * self.percentile(0.5), 1) if self.percentile(0.5) is not None else None,
+            "p95_ms": round(1000 * self.percentile(0.95), 1) if self.percentile(0.95) is not None else None,
+        }
+
+
+class ModelRouter:
+    """
+    Routes one prompt across the configured models.
+
+    call(model_id, prompt) performs the upstream request. RuntimeError
+    (configuration problems), DeadlineExceeded and client errors propagate
+    immediately; upstream errors (is_upstream_error) count against the
+    model and fail over.
+
+    Raises:
+        UpstreamUnavailable: when every model failed or is circuit-open.
+    """
+
+    def __init__(
+        self,
+        model_ids: List[str],
+        call: Callable[[str, str], Awaitable[Any]],
+        hedge_percentile: float = 0.95,
+        default_hedge_delay: float = 2.0,
+        min_hedge_delay: float = 0.2,
+        max_hedge_delay: float = 10.0,
+        failure_threshold: int = 3,
+        cooldown: float = 30.0,
+    ) -> None:
+        if not model_ids:
+            raise RuntimeError("ModelRouter needs at least one model id.")
+        self.model_ids = list(dict.fromkeys(model_ids))
+        self._call = call
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.health = {m: ModelHealth(m, failure_threshold, cooldown) for m in self.model_ids}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.client_errors = 0
+
+    def hedge_delay(self, model_id: str) -> float:
+        observed = self.health[model_id].percentile(self.hedge_percentile)
+        delay = self.default_hedge_delay if observed is None else observed
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, delay))
+
+    def _next_model(self, tried: List[str]) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            for model_id in self.model_ids:
+                if model_id not in tried and self.health[model_id].available(now):
+                    self.health[model_id].begin()
+                    return model_id
+        return None
+
+    async def _attempt(self, model_id: str, prompt: str) -> Any:
+        started = time.monotonic()
+        try:
+            result = await self._call(model_id, prompt)
+        except asyncio.CancelledError:
+            with self._lock:
+                self.health[model_id].abandon()
+            raise
+        except (DeadlineExceeded, RuntimeError):
+            with self._lock:
+                self.health[model_id].abandon()
+            raise
+        except Exception as exc:
+            with self._lock:
+                if is_upstream_error(exc):
+                    self.health[model_id].failure(quota=is_quota_error(exc))
+                else:
+                    self.health[model_id].abandon()
+                    self.client_errors += 1
+            raise
+        with self._lock:
+            self.health[model_id].success(time.monotonic() - started)
+        return result
+
+    async def generate(self, prompt: str) -> Any:
+        with self._lock:
+            self.requests += 1
+        tried: List[str] = []
+        running: Dict["asyncio.Task[Any]", str] = {}
+        hedged: List["asyncio.Task[Any]"] = []
+        last_error: Optional[BaseException] = None
+        try:
+            while True:
+                if not running:
+                    model_id = self._next_model(tried)
+                    if model_id is None:
+                        break
+                    tried.append(model_id)
+                    running[asyncio.ensure_future(self._attempt(model_id, prompt))] = model_id
+
+                # Hedge only while a single request is outstanding.
+                timeout = self.hedge_delay(next(iter(running.values()))) if len(running) == 1 else None
+                done, _ = await asyncio.wait(set(running), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedge = self._next_model(tried)
+                    if hedge is None:
+                        # Nothing to hedge to: keep waiting on the primary.
+                        done, _ = await asyncio.wait(set(running), return_when=asyncio.FIRST_COMPLETED)
+                    else:
+                        tried.append(hedge)
+                        task = asyncio.ensure_future(self._attempt(hedge, prompt))
+                        running[task] = hedge
+                        hedged.append(task)
+                        with self._lock:
+                            self.hedges += 1
+                        continue
+
+                for task in done:
+                    model_id = running.pop(task)
+                    exc = task.exception()
+                    if exc is None:
+                        if task in hedged:
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result()
+                    if isinstance(exc, (DeadlineExceeded, RuntimeError)) or not is_upstream_error(exc):
+                        # Another model would reject the same request.
+                        raise exc
+                    last_error = exc
+                    with self._lock:
+                        self.failovers += 1
+        finally:
+            for task in running:
+                task.cancel()
+
+        if last_error is not None:
+            if is_quota_error(last_error):
+                raise UpstreamUnavailable(f"Gemini API quota exceeded on every model. Details: {last_error}") from last_error
+            raise UpstreamUnavailable(f"Gemini generation failed on every model: {last_error}") from last_error
+        raise UpstreamUnavailable("All Gemini models are temporarily unavailable (circuit open).")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "models": [self.health[m].snapshot() for m in self.model_ids],
+                "requests": self.requests,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "failovers": self.failovers,
+                "client_errors": self.client_errors,
+                "hedge_delay_ms": {m: round(1000 * self.hedge_delay(m), 1) for m in self.model_ids},
+            }
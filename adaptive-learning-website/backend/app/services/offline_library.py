@@ -0,0 +1,271 @@
+"""
+Pre-rendered study content served when Gemini is unavailable.
+
+app.cli.build_offline_library generates lessons (all three modes), a quiz
+bank and diagrams for the saga chapter topics and popular topics, then
+packs them into one file:
+
+    header   magic, version, entry count, meta length
+    meta     JSON: topics, build time, counts
+    index    entries sorted by a 64-bit key hash
+             (hash, offset, length, topic id)
+    data     UTF-8 bodies
+
+The API memory-maps the file (OFFLINE_LIBRARY_PATH). A lookup hashes the
+key, binary-searches the index and slices the body out of the mapping.
+Nothing is parsed up front except the topic list. Topics that don't match
+exactly fall back to the closest library topic by word overlap.
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .prefetch import LESSON_MODES
+
+
+MAGIC = b"OFFLIB01"
+VERSION = 1
+_HEADER = struct.Struct("<8sIIQ")
+_INDEX_DTYPE = np.dtype([("hash", "<u8"), ("offset", "<u8"), ("length", "<u4"), ("topic", "<u4")])
+
+LESSON = "lesson"
+QUIZ = "quiz"
+DIAGRAM = "diagram"
+
+# Words that say nothing about which topic is meant.
+_STOPWORDS = {"a", "an", "and", "the", "of", "to", "in", "for", "with", "on", "how", "what", "is", "introduction", "intro"}
+
+
+def normalize_topic(topic: str) -> str:
+    """Same folding as the generation cache keys: lower case, single spaces."""
+    return " ".join((topic or "").lower().split())
+
+
+def _tokens(topic: str) -> frozenset:
+    return frozenset(w for w in re.findall(r"[a-z0-9+#]+", topic.lower()) if w not in _STOPWORDS)
+
+
+def _key_hash(kind: str, topic: str, variant: str) -> int:
+    key = f"{kind}\0{variant}\0{normalize_topic(topic)}".encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+def write_library(path: str, entries: Iterable[Tuple[str, str, str, str]], meta: Optional[Dict[str, Any]] = None) -> int:
+    """
+    Packs (kind, topic, variant, text) entries into a library file at
+    `path`, atomically. Later duplicates of a key replace earlier ones.
+    Returns the number of entries written.
+    """
+    topics: Dict[str, int] = {}
+    names: List[str] = []
+    bodies: Dict[int, Tuple[bytes, int]] = {}
+    counts: Dict[str, int] = {}
+    for kind, topic, variant, text in entries:
+        norm = normalize_topic(topic)
+        if not norm or not text:
+            continue
+        if norm not in topics:
+            topics[norm] = len(names)
+            names.append(" ".join(topic.split()))
+        key = _key_hash(kind, norm, variant or "")
+        if key not in bodies:
+            counts[kind] = counts.get(kind, 0) + 1
+        bodies[key] = (text.encode("utf-8"), topics[norm])
+
+    header_meta = json.dumps({
+        **(meta or {}),
+        "topics": names,
+        "counts": counts,
+        "built_at": time.time(),
+    }).encode("utf-8")
+    index = np.zeros(len(bodies), dtype=_INDEX_DTYPE)
+    index_start = _HEADER.size + len(header_meta)
+    index_start += -index_start % 8
+    offset = index_start + index.nbytes
+    for i, key in enumerate(sorted(bodies)):
+        body, topic_id = bodies[key]
+        index[i] = (key, offset, len(body), topic_id)
+        offset += len(body)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".lib.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(bodies), len(header_meta)))
+            f.write(header_meta)
+            f.write(b"\0" * (index_start - _HEADER.size - len(header_meta)))
+            f.write(index.tobytes())
+            for key in sorted(bodies):
+                f.write(bodies[key][0])
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return len(bodies)
+
+
+class OfflineEntry:
+    __slots__ = ("kind", "topic", "variant", "text", "exact")
+
+    def __init__(self, kind: str, topic: str, variant: str, text: str, exact: bool) -> None:
+        self.kind = kind
+        self.topic = topic
+        self.variant = variant
+        self.text = text
+        self.exact = exact
+
+
+class OfflineLibrary:
+    """
+    Read-only view of a library file.
+
+    Args:
+        path: File written by write_library.
+        min_similarity: Word-overlap (Jaccard) a different topic needs to
+            stand in for the requested one.
+    """
+
+    def __init__(self, path: str, min_similarity: float = 0.34) -> None:
+        self.path = path
+        self.min_similarity = min_similarity
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, meta_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mm.close()
+            raise RuntimeError(f"{path} is not an offline library (version {VERSION}).")
+        self.meta = json.loads(self._mm[_HEADER.size:_HEADER.size + meta_len].decode("utf-8"))
+        index_start = _HEADER.size + meta_len
+        index_start += -index_start % 8
+        self._index = np.frombuffer(self._mm, dtype=_INDEX_DTYPE, count=count, offset=index_start)
+        self._hashes = self._index["hash"]
+        self._offsets = self._index["offset"]
+        self._lengths = self._index["length"]
+        self.topics: List[str] = self.meta["topics"]
+        self._topic_ids = {normalize_topic(t): i for i, t in enumerate(self.topics)}
+        self._topic_tokens = [_tokens(t) for t in self.topics]
+        self._by_token: Dict[str, List[int]] = {}
+        for i, tokens in enumerate(self._topic_tokens):
+            for token in tokens:
+                self._by_token.setdefault(token, []).append(i)
+        self._closest: Dict[str, List[int]] = {}
+        self.counters = {"exact": 0, "closest": 0, "misses": 0}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def _body(self, key: int) -> Optional[str]:
+        # A plain int key would make numpy cast the whole uint64 column first.
+        i = int(np.searchsorted(self._hashes, np.uint64(key)))
+        if i == len(self._hashes) or self._hashes[i].item() != key:
+            return None
+        start = self._offsets[i].item()
+        return self._mm[start:start + self._lengths[i].item()].decode("utf-8")
+
+    def _candidates(self, norm: str) -> List[int]:
+        """Library topics ranked by word overlap with `norm`, best first."""
+        ranked = self._closest.get(norm)
+        if ranked is not None:
+            return ranked
+        query = _tokens(norm)
+        # Candidates come from the query's rarer words; a word most topics share
+        # ("python") still counts in the score but does not make everything a candidate.
+        postings = sorted((self._by_token[t] for t in query if t in self._by_token), key=len)
+        limit = max(64, len(self.topics) // 20)
+        candidates = {i for posting in postings if len(posting) <= limit for i in posting}
+        if not candidates and postings:
+            candidates = set(postings[0])
+        scores = {}
+        for i in candidates:
+            tokens = self._topic_tokens[i]
+            scores[i] = len(query & tokens) / len(query | tokens)
+        ranked = [i for i, s in sorted(scores.items(), key=lambda x: (-x[1], x[0])) if s >= self.min_similarity]
+        if len(self._closest) >= 4096:
+            del self._closest[next(iter(self._closest))]
+        self._closest[norm] = ranked
+        return ranked
+
+    def _find(self, kind: str, topic_id: int, variants: List[str]) -> Optional[Tuple[str, str]]:
+        name = self.topics[topic_id]
+        for variant in variants:
+            text = self._body(_key_hash(kind, name, variant))
+            if text is not None:
+                return variant, text
+        return None
+
+    def lookup(self, kind: str, topic: str, variant: str = "") -> Optional[OfflineEntry]:
+        """
+        The entry for (kind, topic, variant); otherwise the closest topic
+        that has one. Lessons also accept a neighbouring mode of the same
+        topic before moving to another topic.
+        """
+        norm = normalize_topic(topic)
+        variants = [variant]
+        if kind == LESSON and variant in LESSON_MODES:
+            at = LESSON_MODES.index(variant)
+            variants += sorted((m for m in LESSON_MODES if m != variant), key=lambda m: abs(LESSON_MODES.index(m) - at))
+        exact_id = self._topic_ids.get(norm)
+        if exact_id is not None:
+            found = self._find(kind, exact_id, variants)
+            if found is not None:
+                exact = found[0] == variant
+                self.counters["exact" if exact else "closest"] += 1
+                return OfflineEntry(kind, self.topics[exact_id], found[0], found[1], exact)
+        for topic_id in self._candidates(norm):
+            if topic_id == exact_id:
+                continue
+            found = self._find(kind, topic_id, variants)
+            if found is not None:
+                self.counters["closest"] += 1
+                return OfflineEntry(kind, self.topics[topic_id], found[0], found[1], False)
+        self.counters["misses"] += 1
+        return None
+
+    def study_tool(
+        self, tool_type: str, topic: str, explain_mode: str, diagram_type: Optional[str], num_questions: int
+    ) -> Optional[Tuple[str, Optional[str], Optional[List[dict]], OfflineEntry]]:
+        """(mode, content, quiz_items, entry) for a study-tool request, or None."""
+        mode = (tool_type or "explain").lower()
+        if mode == "quiz":
+            entry = self.lookup(QUIZ, topic)
+            return (mode, None, json.loads(entry.text)[:num_questions], entry) if entry else None
+        if mode == "visualize":
+            entry = self.lookup(DIAGRAM, topic, (diagram_type or "flowchart").lower())
+            return (mode, entry.text, None, entry) if entry else None
+        if mode == "explain":
+            entry = self.lookup(LESSON, topic, explain_mode)
+            return ("explain", entry.text, None, entry) if entry else None
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "entries": len(self),
+            "topics": len(self.topics),
+            "bytes": len(self._mm),
+            "built_at": self.meta.get("built_at"),
+            "counts": self.meta.get("counts"),
+            **self.counters,
+        }
+
+    def close(self) -> None:
+        self._index = self._hashes = self._offsets = self._lengths = None
+        self._mm.close()
+
+
+def load_offline_library(path: Optional[str]) -> Optional[OfflineLibrary]:
+    """The library at `path`, or None when it is not configured/built yet."""
+    if not path or not os.path.exists(path):
+        return None
+    library = OfflineLibrary(path)
+    print(f"✅ Loaded offline library with {len(library)} entries for {len(library.topics)} topics")
+    return library
@@ -0,0 +1,264 @@
+"""
+Serialize-once storage for large JSON responses (generated courses and sagas).
+
+A payload is serialized to JSON bytes once, when it is generated. The
+bytes are kept with a gzip and (when the `brotli` package is installed) a
+brotli copy compressed at the highest level, since the cost is paid once
+and not per request. The id is a hash of the serialized document, so
+identical payloads share one entry, and the id doubles as a strong ETag:
+the bytes for an id never change. Each encoding gets its own tag
+("<id>", "<id>-gzip", "<id>-br") since its bytes differ; If-None-Match
+ignores the suffix, so a cached copy in any encoding revalidates.
+
+Entries live in a byte-bounded in-memory LRU. With PAYLOAD_DIR set they are
+also written to disk as <kind>-<id>.json / .json.gz / .json.br, so other
+workers and restarts can serve them by id without regenerating or
+re-encoding anything.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - environment-specific
+    brotli = None  # type: ignore[assignment]
+
+
+# Compression does not pay for itself below this size.
+MIN_COMPRESS_BYTES = 1024
+_SUFFIXES = {"identity": ".json", "gzip": ".json.gz", "br": ".json.br"}
+
+
+def _parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding.strip().lower()] = q
+    return weights
+
+
+_ENCODING_TAG_SUFFIXES = ('-gzip"', '-br"')
+
+
+def _opaque_tag(tag: str) -> str:
+    """An entity tag without W/ and without its encoding suffix."""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in _ENCODING_TAG_SUFFIXES:
+        if tag.endswith(suffix):
+            return tag[:-len(suffix)] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    If-None-Match comparison: weak, as RFC 9110 requires for this header,
+    and across the encodings of one payload.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    bare = _opaque_tag(etag)
+    return any(_opaque_tag(tag) == bare for tag in if_none_match.split(","))
+
+
+class EncodedPayload:
+    """One serialized payload and its precompressed variants."""
+
+    __slots__ = ("kind", "id", "identity", "gzip", "br", "created_at")
+
+    def __init__(
+        self, kind: str, payload_id: str, identity: bytes, gzip: Optional[bytes], br: Optional[bytes]
+    ) -> None:
+        self.kind = kind
+        self.id = payload_id
+        self.identity = identity
+        self.gzip = gzip
+        self.br = br
+        self.created_at = time.time()
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.id}"'
+
+    def etag_for(self, encoding: Optional[str]) -> str:
+        """ETag of one encoded variant (the plain id for identity)."""
+        return f'"{self.id}-{encoding}"' if encoding else self.etag
+
+    @property
+    def size(self) -> int:
+        return len(self.identity) + len(self.gzip or b"") + len(self.br or b"")
+
+    def select(self, accept_encoding: Optional[str]) -> Tuple[Optional[str], bytes]:
+        """(Content-Encoding or None, body) for the client's Accept-Encoding."""
+        weights = _parse_accept_encoding(accept_encoding)
+        wildcard = weights.get("*", 0.0)
+        for coding, body in (("br", self.br), ("gzip", self.gzip)):
+            if body is not None and weights.get(coding, wildcard) > 0:
+                return coding, body
+        return None, self.identity
+
+
+class PayloadStore:
+    """
+    Byte-bounded LRU of EncodedPayloads, optionally backed by a directory.
+
+    Args:
+        directory: Where payloads are persisted (None keeps them in memory only).
+        max_bytes: Memory budget across all variants of all entries.
+        gzip_level / brotli_quality: Compression settings (used once per payload).
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        gzip_level: int = 9,
+        brotli_quality: int = 11,
+    ) -> None:
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._entries: "OrderedDict[Tuple[str, str], EncodedPayload]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.counters = {"stored": 0, "deduplicated": 0, "hits": 0, "disk_hits": 0, "misses": 0, "not_modified": 0}
+        self.served = {"identity": 0, "gzip": 0, "br": 0}
+        self.encode_seconds = 0.0
+
+    def put(self, kind: str, document: Dict[str, Any]) -> EncodedPayload:
+        """
+        Serializes `document` with an "id" field first and stores it.
+
+        The id is the hash of the document's own serialization, so the same
+        document always gets the same id and is encoded only once.
+        """
+        started = time.perf_counter()
+        raw = json.dumps(document, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        payload_id = hashlib.sha256(kind.encode("utf-8") + b"\0" + raw).hexdigest()[:32]
+        existing = self.get(kind, payload_id, count=False)
+        if existing is not None:
+            with self._lock:
+                self.counters["deduplicated"] += 1
+            return existing
+        rest = b"," + raw[1:] if len(raw) > 2 else b"}"
+        identity = b'{"id":"' + payload_id.encode("ascii") + b'"' + rest
+        gz = br = None
+        if len(identity) >= MIN_COMPRESS_BYTES:
+            gz = gzip.compress(identity, compresslevel=self.gzip_level, mtime=0)
+            if brotli is not None:
+                br = brotli.compress(identity, quality=self.brotli_quality)
+        encoded = EncodedPayload(kind, payload_id, identity, gz, br)
+        if self.directory:
+            self._write(encoded)
+        with self._lock:
+            self.encode_seconds += time.perf_counter() - started
+            self.counters["stored"] += 1
+            self._remember(encoded)
+        return encoded
+
+    def get(self, kind: str, payload_id: str, count: bool = True) -> Optional[EncodedPayload]:
+        """The stored payload, from memory or disk, or None."""
+        key = (kind, payload_id)
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                if count:
+                    self.counters["hits"] += 1
+                return encoded
+        encoded = self._read(kind, payload_id)
+        with self._lock:
+            if encoded is not None:
+                self._remember(encoded)
+            if count:
+                self.counters["disk_hits" if encoded is not None else "misses"] += 1
+        return encoded
+
+    def record_served(self, encoding: Optional[str], not_modified: bool = False) -> None:
+        with self._lock:
+            if not_modified:
+                self.counters["not_modified"] += 1
+            else:
+                self.served[encoding or "identity"] += 1
+
+    def _remember(self, encoded: EncodedPayload) -> None:
+        key = (encoded.kind, encoded.id)
+        if key in self._entries:
+            return
+        self._entries[key] = encoded
+        self._bytes += encoded.size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def _path(self, kind: str, payload_id: str, encoding: str) -> str:
+        return os.path.join(self.directory, f"{kind}-{payload_id}{_SUFFIXES[encoding]}")
+
+    def _write(self, encoded: EncodedPayload) -> None:
+        # Compressed variants first: the .json file marks a complete entry.
+        for encoding, body in (("gzip", encoded.gzip), ("br", encoded.br), ("identity", encoded.identity)):
+            if body is None:
+                continue
+            path = self._path(encoded.kind, encoded.id, encoding)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(body)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+
+    def _read(self, kind: str, payload_id: str) -> Optional[EncodedPayload]:
+        if not self.directory or not payload_id.isalnum():
+            return None
+        bodies: Dict[str, Optional[bytes]] = {}
+        for encoding in ("identity", "gzip", "br"):
+            try:
+                with open(self._path(kind, payload_id, encoding), "rb") as f:
+                    bodies[encoding] = f.read()
+            except FileNotFoundError:
+                bodies[encoding] = None
+        if bodies["identity"] is None:
+            return None
+        return EncodedPayload(kind, payload_id, bodies["identity"], bodies["gzip"], bodies["br"])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = list(self._entries.values())
+            identity = sum(len(e.identity) for e in entries if e.gzip is not None)
+            compressed = sum(len(e.gzip) for e in entries if e.gzip is not None)
+            return {
+                "entries": len(entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "directory": self.directory,
+                "brotli": brotli is not None,
+                "gzip_ratio": round(identity / compressed, 2) if compressed else None,
+                "encode_ms_total": round(self.encode_seconds * 1000, 1),
+                **self.counters,
+                "served": dict(self.served),
+            }
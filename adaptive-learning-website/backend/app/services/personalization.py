@@ -2,15 +2,34 @@
 AI-powered personalization service for creating personalized learning journeys.
 """
 import json
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 from .gemini import GeminiService
+from .profiling import span
+from .prompts import PromptRegistry
+from .recommender import ChapterRecommender, item_key
+
+
+# Recommended chapters needed before the saga is built without an LLM call.
+MIN_RECOMMENDED_CHAPTERS = 3
+# A pick's score is its summed (shrunk cosine) similarity to the completed
+# chapters; below this it rests on one weak link and the LLM does better.
+DEFAULT_RECOMMENDER_MIN_SCORE = 0.1
 
 
 class PersonalizationService:
     """Service for generating personalized saga chapters based on student preferences."""
     
-    def __init__(self):
-        self.gemini_service = GeminiService()
+    def __init__(
+        self,
+        recommender: Optional[ChapterRecommender] = None,
+        prompts: Optional[PromptRegistry] = None,
+        min_score: float = DEFAULT_RECOMMENDER_MIN_SCORE,
+    ):
+        self.gemini_service = GeminiService(prompts=prompts)
+        self.recommender = recommender
+        self.min_score = min_score
+        self.saga_sources = {"recommender": 0, "llm": 0}
     
     async def generate_personalized_saga(
         self,
@@ -18,10 +37,15 @@ class PersonalizationService:
         learning_goals: List[str],
         preferred_pace: str,
         interests: List[str],
-        learning_style: str = "interactive"
+        learning_style: str = "interactive",
+        completed_topics: Optional[List[str]] = None
     ) -> List[Dict[str, Any]]:
         """
         Generate a personalized Python programming saga journey.
+
+        Students with completion history get chapters from the
+        recommender when it has enough confident picks; only the long tail
+        (new students, rare topics) goes to the LLM.
         
         Args:
             python_skill_level: 'beginner', 'intermediate', or 'advanced'
@@ -29,74 +53,35 @@ class PersonalizationService:
             preferred_pace: 'slow', 'moderate', or 'fast'
             interests: List of interests
             learning_style: 'visual', 'text', or 'interactive'
+            completed_topics: Chapters/topics the student already completed
         
         Returns:
             List of saga chapter dictionaries
         """
+        recommended = self.recommended_saga(completed_topics, python_skill_level)
+        if recommended is not None:
+            return recommended
+        self.saga_sources["llm"] += 1
         
-        # Build the prompt for AI
-        prompt = f"""You are an expert Python programming instructor creating a personalized, gamified learning journey.
-
-Student Profile:
-- Python Skill Level: {python_skill_level}
-- Learning Goals: {', '.join(learning_goals)}
-- Preferred Pace: {preferred_pace}
-- Interests: {', '.join(interests)}
-- Learning Style: {learning_style}
-
-Create a personalized Python programming saga journey with 5-7 chapters. Each chapter should:
-1. Have an epic, gamified title (like "The Awakening", "The First Trial", "Boss Battle: Functions")
-2. Focus on Python programming concepts appropriate for {python_skill_level} level
-3. Align with their goals: {', '.join(learning_goals)}
-4. Match their pace: {preferred_pace} (adjust time estimates accordingly)
-5. Include their interests: {', '.join(interests)}
-
-For each chapter, provide:
-- chapter_number: sequential number starting from 1
-- title: Epic, gamified title
-- subtitle: Specific Python topic/concept
-- xp_reward: Based on difficulty (beginner: 300-500, intermediate: 600-1000, advanced: 1200-2000)
-- estimated_time_minutes: Based on pace (slow: 60-90min, moderate: 30-60min, fast: 15-30min)
-- type: 'video', 'quiz', or 'boss_fight'
-- action_type: 'course', 'quiz', or 'study'
-- action_url: '/dashboard/courses' for videos, '/dashboard/study' for quizzes/study
-- action_params: JSON object with mode, topic, difficulty based on type
-
-Return ONLY a valid JSON array of chapter objects, no markdown, no explanation.
-Example format:
-[
-  {{
-    "chapter_number": 1,
-    "title": "The Awakening",
-    "subtitle": "Python Basics: Variables and Data Types",
-    "xp_reward": 500,
-    "estimated_time_minutes": 45,
-    "type": "video",
-    "action_type": "course",
-    "action_url": "/dashboard/courses",
-    "action_params": {{"highlight": "python-basics"}}
-  }},
-  {{
-    "chapter_number": 2,
-    "title": "The First Trial",
-    "subtitle": "Control Flow: If Statements and Loops",
-    "xp_reward": 750,
-    "estimated_time_minutes": 60,
-    "type": "quiz",
-    "action_type": "quiz",
-    "action_url": "/dashboard/study",
-    "action_params": {{"mode": "quiz", "topic": "Control Flow", "difficulty": "standard"}}
-  }}
-]
-
-Make it engaging, progressive, and tailored to their profile!"""
+        rendered = self.gemini_service.prompts.render(
+            "saga",
+            "/api/ai/personalize-saga",
+            skill_level=python_skill_level,
+            goals=', '.join(learning_goals),
+            pace=preferred_pace,
+            interests=', '.join(interests),
+            learning_style=learning_style,
+        )
 
+        response = None
         try:
             # Use Gemini to generate the personalized saga
+            started = time.perf_counter()
             response = await self.gemini_service.generate_content(
-                topic=prompt,
+                topic=rendered.text,
                 difficulty="standard"
             )
+            latency = time.perf_counter() - started
             
             # Parse the JSON response
             # Remove markdown code blocks if present
@@ -110,6 +95,8 @@ Make it engaging, progressive, and tailored to their profile!"""
             content = content.strip()
             
             chapters = json.loads(content)
+            if not isinstance(chapters, list):
+                raise ValueError("Saga response is not a list of chapters.")
             
             # Validate and ensure proper structure
             validated_chapters = []
@@ -126,16 +113,86 @@ Make it engaging, progressive, and tailored to their profile!"""
                     "action_params": chapter.get("action_params", {})
                 }
                 validated_chapters.append(validated_chapter)
+            self.gemini_service.prompts.record(rendered, True, latency, response)
             
             return validated_chapters
             
         except json.JSONDecodeError as e:
+            self.gemini_service.prompts.record(rendered, False, latency, response)
             # Fallback to default Python journey if AI fails
-            return self._get_default_python_journey(python_skill_level)
+            with span("fallback"):
+                return self._get_default_python_journey(python_skill_level)
         except Exception as e:
             print(f"Error generating personalized saga: {e}")
-            return self._get_default_python_journey(python_skill_level)
+            if response is not None:
+                # The model answered, but not with usable chapters.
+                self.gemini_service.prompts.record(rendered, False, latency, response)
+            with span("fallback"):
+                return self._get_default_python_journey(python_skill_level)
     
+    def recommended_saga(
+        self,
+        completed_topics: Optional[List[str]],
+        skill_level: str = "beginner",
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        The saga the recommender alone can build, or None when it has fewer
+        than MIN_RECOMMENDED_CHAPTERS confident picks and the LLM is needed.
+        """
+        if not completed_topics:
+            return None
+        recommended = self.recommend_chapters(completed_topics, skill_level)
+        if len(recommended) < MIN_RECOMMENDED_CHAPTERS:
+            return None
+        self.saga_sources["recommender"] += 1
+        return recommended
+
+    def recommend_chapters(
+        self,
+        completed_topics: List[str],
+        skill_level: str = "beginner",
+        limit: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Next saga chapters from what similar students completed.
+
+        Known topics reuse the default journey's chapter; others become a
+        study chapter for that topic. Empty when there is no recommender or
+        no signal for this student.
+        """
+        if self.recommender is None:
+            return []
+        catalog = {}
+        for level in ("advanced", "intermediate", "beginner"):
+            for chapter in self._get_default_python_journey(level):
+                catalog[item_key(chapter["subtitle"])] = chapter
+        xp = {"beginner": 500, "intermediate": 1000}.get(skill_level, 1500)
+        chapters = []
+        for i, pick in enumerate(self.recommender.recommend(completed_topics, limit=limit, min_score=self.min_score), start=1):
+            chapter = dict(catalog.get(pick["topic"]) or {
+                "title": pick["topic"].title(),
+                "subtitle": pick["topic"].title(),
+                "xp_reward": xp,
+                "estimated_time_minutes": 45,
+                "type": "video",
+                "action_type": "study",
+                "action_url": "/dashboard/study",
+                "action_params": {"mode": "explain", "topic": pick["topic"]}
+            })
+            chapter["chapter_number"] = i
+            chapters.append(chapter)
+        return chapters
+
+    def seed_topics(self) -> List[str]:
+        """Topics of the default journeys' chapters (subtitles and quiz topics), all levels."""
+        topics: Dict[str, str] = {}
+        for level in ("beginner", "intermediate", "advanced"):
+            for chapter in self._get_default_python_journey(level):
+                for topic in (chapter["subtitle"], chapter.get("action_params", {}).get("topic")):
+                    if topic:
+                        topics.setdefault(item_key(topic), topic)
+        return list(topics.values())
+
     def _get_default_python_journey(self, skill_level: str) -> List[Dict[str, Any]]:
         """Fallback default Python journey based on skill level."""
         if skill_level == "beginner":
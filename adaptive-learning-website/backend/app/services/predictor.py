@@ -1,3 +1,9 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
 def predict_student_risk(interactions: int, last_score: int, days_overdue: int) -> int:
     """
     Simple rule-based fallback "model" so the frontend can work before a real ML model exists.
@@ -20,21 +26,221 @@ def predict_student_risk(interactions: int, last_score: int, days_overdue: int)
     return min(risk_score, 100)
 
 
+def predict_student_risk_batch(
+    interactions: np.ndarray,
+    last_score: np.ndarray,
+    days_overdue: np.ndarray,
+) -> np.ndarray:
+    """
+    Vectorized predict_student_risk over whole columns; same rules and cap.
+    """
+    risk = (
+        np.where(np.asarray(interactions) < 10, 40, 0)
+        + np.where(np.asarray(last_score) < 50, 30, 0)
+        + np.where(np.asarray(days_overdue) > 0, 20, 0)
+    )
+    return np.minimum(risk, 100).astype(np.int16)
+
+
+def explain_student_risk(interactions: int, last_score: int, days_overdue: int) -> List[Dict[str, Any]]:
+    """
+    The heuristic rules that fired for predict_student_risk, largest first.
+    """
+    factors = []
+    if interactions < 10:
+        factors.append({"feature": "interactions", "contribution": 40.0})
+    if last_score < 50:
+        factors.append({"feature": "last_score", "contribution": 30.0})
+    if days_overdue > 0:
+        factors.append({"feature": "days_overdue", "contribution": 20.0})
+    return factors
+
+
 import os
 import pickle
-import pandas as pd
-import numpy as np
+import time
 
-# Load model relative to this file
+from .model_registry import ModelRegistry
+
+# Versioned artifacts written by app.cli.train; preferred over the legacy pickle.
+MODEL_REGISTRY_DIR = os.getenv(
+    "MODEL_REGISTRY_DIR",
+    os.path.join(os.path.dirname(__file__), "..", "..", "models"),
+)
+registry = ModelRegistry(MODEL_REGISTRY_DIR)
+registry.load_initial()
+
+# Legacy notebook model, loaded relative to this file
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "..", "student_progress_model.pkl")
 
-try:
-    with open(MODEL_PATH, "rb") as f:
-        _ml_model = pickle.load(f)
-    print(f"✅ ML Model loaded from {MODEL_PATH}")
-except Exception as e:
-    print(f"⚠️ Failed to load ML model: {e}")
-    _ml_model = None
+_ml_model = None
+if registry.active is None:
+    try:
+        with open(MODEL_PATH, "rb") as f:
+            _ml_model = pickle.load(f)
+        print(f"✅ ML Model loaded from {MODEL_PATH}")
+    except Exception as e:
+        print(f"⚠️ Failed to load ML model: {e}")
+        _ml_model = None
+
+# Score reported for each final_result class.
+RESULT_SCORES = {"Distinction": 90, "Pass": 60, "Fail": 30, "Withdrawn": 0}
+
+
+def build_feature_row(
+    credits: int,
+    clicks: int,
+    code_module: str = "AAA",
+    code_presentation: str = "2013J",
+    gender: str = "M",
+    region: str = "East Anglian Region",
+    highest_education: str = "HE Qualification",
+    imd_band: str = "90-100%",
+    age_band: str = "0-35",
+    num_of_prev_attempts: int = 0,
+    disability: str = "N",
+    total_vle_interactions: int = 0,
+) -> Dict[str, Any]:
+    """
+    Raw model input for one student, keyed by training feature name.
+    """
+    return {
+        "code_module": code_module,
+        "code_presentation": code_presentation,
+        "gender": gender,
+        "region": region,
+        "highest_education": highest_education,
+        "imd_band": imd_band,
+        "age_band": age_band,
+        "num_of_prev_attempts": num_of_prev_attempts,
+        "studied_credits": credits,
+        "disability": disability,
+        "total_clicks": clicks,   # Ensure this name matches what we saw in the notebook output if slightly different
+        "total_vle_interactions": total_vle_interactions or clicks, # Use clicks as proxy if interaction breakdown is missing
+    }
+
+
+def _feature_frame(frame: pd.DataFrame) -> pd.DataFrame:
+    """
+    build_feature_row for a whole DataFrame: missing columns and blank values
+    take the same defaults, so a batch row scores like the single call.
+    """
+    features = pd.DataFrame(index=frame.index)
+    for col, default in build_feature_row(0, 0).items():
+        if col != "total_vle_interactions":
+            features[col] = frame[col].fillna(default) if col in frame.columns else default
+    # Same proxy as build_feature_row when the breakdown is missing or zero.
+    interactions = frame["total_vle_interactions"] if "total_vle_interactions" in frame.columns else None
+    features["total_vle_interactions"] = (
+        features["total_clicks"]
+        if interactions is None
+        else interactions.where(interactions.fillna(0) != 0, features["total_clicks"])
+    )
+    return features
+
+
+def predict_final_result_batch(frame: pd.DataFrame) -> np.ndarray:
+    """
+    Vectorized predict_final_result for a DataFrame of students.
+
+    Expects studied_credits and total_clicks; other model features are used
+    when present and default like predict_final_result otherwise. Uses the
+    active registry model, else the legacy pickle, else the heuristic.
+    """
+    credits = frame["studied_credits"].to_numpy(dtype=np.float64, na_value=0)
+    clicks = frame["total_clicks"].to_numpy(dtype=np.float64, na_value=0)
+    fallback = np.clip(credits * 2.5 + clicks * 0.1, 0, 100).astype(np.int16)
+
+    artifact = registry.active
+    if artifact is None and _ml_model is None:
+        return fallback
+    features = _feature_frame(frame)
+    try:
+        if artifact is not None:
+            predictions = np.asarray(artifact.model.predict(artifact.encode_frame(features)))
+        else:
+            predictions = np.asarray(_ml_model.predict(features))
+    except Exception as e:
+        print(f"❌ Batch prediction error ({artifact.version if artifact is not None else 'legacy'}): {e}")
+        return fallback
+    if artifact is None and predictions.dtype.kind in "iuf":
+        # A legacy regressor's output is the score itself.
+        return predictions.astype(np.int16)
+    scores = pd.Series(predictions.astype(str)).map(RESULT_SCORES).to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.where(np.isnan(scores), fallback, scores).astype(np.int16)
+
+
+def _record_prediction(artifact: Any, row: Dict[str, Any], prediction: Any, started: float) -> None:
+    """Feed a served prediction to the shadow scorer and the drift monitor."""
+    registry.observe(row, prediction, (time.perf_counter() - started) * 1000)
+    monitor = artifact.get_drift_monitor()
+    if monitor is not None:
+        monitor.observe(row, str(prediction))
+
+
+def _fallback_result(credits: int, clicks: int) -> int:
+    return max(0, min(100, int((credits * 2.5) + (clicks * 0.1))))
+
+
+def explain_final_results(
+    rows: List[Dict[str, Any]],
+    top_k: int = 3,
+) -> List[Tuple[int, List[Dict[str, Any]], bool]]:
+    """
+    Batch form of predict_final_result for cohorts.
+
+    rows are dicts from build_feature_row. Returns one (score, factors,
+    explained) triple per row, where factors are the top_k features pushing
+    the model towards the predicted class (contribution in probability
+    points). When the serving model cannot be explained (legacy pickle,
+    non-tree model, explainer error) the score is still returned, with no
+    factors and explained=False.
+    """
+    artifact = registry.active
+    explainer = artifact.get_explainer() if artifact is not None else None
+    if explainer is not None:
+        try:
+            return _explain_rows(artifact, explainer, rows, top_k)
+        except Exception as e:
+            print(f"❌ Explanation error ({artifact.version}): {e}")
+    return [
+        (_predict_row(row, _fallback_result(row["studied_credits"], row["total_clicks"])), [], False)
+        for row in rows
+    ]
+
+
+def _explain_rows(
+    artifact: Any, explainer: Any, rows: List[Dict[str, Any]], top_k: int
+) -> List[Tuple[int, List[Dict[str, Any]], bool]]:
+    started = time.perf_counter()
+    X = artifact.encode(rows)
+    if len(rows) == 1:
+        single = explainer.explain_row(X[0])
+        probas, contributions = single["proba"][None, :], single["contributions"][None, :]
+        label = explainer.classes[int(probas[0].argmax())]
+        _record_prediction(artifact, rows[0], label, started)
+    else:
+        batch = explainer.explain(X)
+        probas, contributions = batch["proba"], batch["contributions"]
+
+    results = []
+    for row, proba, contrib in zip(rows, probas, contributions):
+        label = explainer.classes[int(proba.argmax())]
+        fallback = _fallback_result(row["studied_credits"], row["total_clicks"])
+        results.append((RESULT_SCORES.get(label, fallback), explainer.top_features(contrib, label, top_k), True))
+    return results
+
+
+def explain_final_result(
+    credits: int, clicks: int, top_k: int = 3, **features: Any
+) -> Tuple[int, List[Dict[str, Any]], bool]:
+    """
+    predict_final_result plus the top contributing features and whether
+    the model could be explained at all.
+
+    Accepts the same keyword features as predict_final_result.
+    """
+    return explain_final_results([build_feature_row(credits, clicks, **features)], top_k)[0]
 
 
 def predict_final_result(
@@ -57,7 +263,37 @@ def predict_final_result(
     Falls back to heuristic if model fails or is missing.
     """
     # Fallback heuristic
-    fallback = max(0, min(100, int((credits * 2.5) + (clicks * 0.1))))
+    fallback = _fallback_result(credits, clicks)
+
+    row = build_feature_row(
+        credits,
+        clicks,
+        code_module=code_module,
+        code_presentation=code_presentation,
+        gender=gender,
+        region=region,
+        highest_education=highest_education,
+        imd_band=imd_band,
+        age_band=age_band,
+        num_of_prev_attempts=num_of_prev_attempts,
+        disability=disability,
+        total_vle_interactions=total_vle_interactions,
+    )
+    return _predict_row(row, fallback)
+
+
+def _predict_row(row: Dict[str, Any], fallback: int) -> int:
+    # Grab the artifact once so a concurrent hot-swap cannot change it mid-request.
+    artifact = registry.active
+    if artifact is not None:
+        try:
+            started = time.perf_counter()
+            prediction = artifact.predict([row])[0]
+            _record_prediction(artifact, row, prediction, started)
+            return RESULT_SCORES.get(str(prediction), fallback)
+        except Exception as e:
+            print(f"❌ Prediction error ({artifact.version}): {e}")
+            return fallback
 
     if _ml_model is None:
         return fallback
@@ -65,20 +301,7 @@ def predict_final_result(
     try:
         # Construct DataFrame matching training data
         # Note: We use the feature list derived from analysis
-        input_data = pd.DataFrame([{
-            "code_module": code_module,
-            "code_presentation": code_presentation,
-            "gender": gender,
-            "region": region,
-            "highest_education": highest_education,
-            "imd_band": imd_band,
-            "age_band": age_band,
-            "num_of_prev_attempts": num_of_prev_attempts,
-            "studied_credits": credits,
-            "disability": disability,
-            "total_clicks": clicks,   # Ensure this name matches what we saw in the notebook output if slightly different
-            "total_vle_interactions": total_vle_interactions or clicks, # Use clicks as proxy if interaction breakdown is missing
-        }])
+        input_data = pd.DataFrame([row])
         
         # Predict
         # Depending on model type (Regressor vs Classifier). 
@@ -90,8 +313,7 @@ def predict_final_result(
         
         # If prediction is string (Distinction/Pass/Fail), map to score
         if isinstance(prediction, str):
-            mapping = {"Distinction": 90, "Pass": 60, "Fail": 30, "Withdrawn": 0}
-            return mapping.get(prediction, fallback)
+            return RESULT_SCORES.get(prediction, fallback)
         
         # If prediction is number, return it
         return int(prediction)
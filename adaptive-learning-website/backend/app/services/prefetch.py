@@ -0,0 +1,128 @@
+"""
+Speculative prefetch of adjacent lesson variants.
+
+After a student is served one explain variant (simplify / standard /
+deep_dive) of a topic, the neighbouring variants on the difficulty slider are
+generated in the background and parked in the response cache, so moving the
+slider one step is usually a cache hit.
+
+Prefetches are low priority: they wait for foreground generations to finish
+(up to a short bound), run one at a time, and are capped by a per-minute
+budget so speculation cannot eat the Gemini quota.
+"""
+import asyncio
+import contextvars
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .response_cache import ResponseCache
+
+
+LESSON_MODES = ["simplify", "standard", "deep_dive"]
+
+
+def lesson_cache_key(topic: str, mode: str) -> Tuple[str, str, str]:
+    mode_norm = (mode or "").lower()
+    if mode_norm not in LESSON_MODES:
+        mode_norm = "standard"
+    return ("lesson", " ".join((topic or "").lower().split()), mode_norm)
+
+
+def adjacent_modes(mode: str) -> List[str]:
+    index = LESSON_MODES.index(lesson_cache_key("", mode)[2])
+    return [LESSON_MODES[i] for i in (index - 1, index + 1) if 0 <= i < len(LESSON_MODES)]
+
+
+class LessonPrefetcher:
+    """
+    Schedules background generations of adjacent lesson variants.
+
+    generate(topic, mode) must produce the lesson text without consulting
+    the cache.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[str, str], Awaitable[str]],
+        cache: ResponseCache,
+        budget_per_minute: float = 20.0,
+        max_idle_wait: float = 2.0,
+    ) -> None:
+        self._generate = generate
+        self._cache = cache
+        self._budget = float(budget_per_minute)
+        self._tokens = float(budget_per_minute)
+        self._refilled = time.monotonic()
+        self._max_idle_wait = max_idle_wait
+        self._pending: Dict[Tuple[str, str, str], "asyncio.Task[Any]"] = {}
+        self._tasks: Set["asyncio.Task[Any]"] = set()
+        self._slot: Optional[asyncio.Semaphore] = None
+        self.foreground_inflight = 0
+        self.scheduled = 0
+        self.skipped_budget = 0
+        self.failed = 0
+
+    def _take_budget(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self._budget, self._tokens + (now - self._refilled) * self._budget / 60.0)
+        self._refilled = now
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    def pending(self, key: Tuple[str, str, str]) -> Optional["asyncio.Task[Any]"]:
+        return self._pending.get(key)
+
+    def schedule(self, topic: str, mode: str) -> int:
+        """Queue the variants adjacent to `mode`; returns how many were queued."""
+        queued = 0
+        for neighbour in adjacent_modes(mode):
+            key = lesson_cache_key(topic, neighbour)
+            if key in self._pending or key in self._cache:
+                continue
+            if not self._take_budget():
+                self.skipped_budget += 1
+                continue
+            # A fresh context: prefetches must not inherit the request's deadline.
+            task = asyncio.get_running_loop().create_task(
+                self._run(key, topic, neighbour), context=contextvars.Context()
+            )
+            self._pending[key] = task
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            self.scheduled += 1
+            queued += 1
+        return queued
+
+    async def _run(self, key: Tuple[str, str, str], topic: str, mode: str) -> None:
+        if self._slot is None:
+            self._slot = asyncio.Semaphore(1)
+        try:
+            async with self._slot:
+                # Yield to foreground generations first.
+                waited = 0.0
+                while self.foreground_inflight > 0 and waited < self._max_idle_wait:
+                    await asyncio.sleep(0.05)
+                    waited += 0.05
+                text = await self._generate(topic, mode)
+                self._cache.put(key, text, prefetched=True)
+        except Exception as exc:
+            self.failed += 1
+            print(f"⚠️ Lesson prefetch failed for {key}: {exc}")
+        finally:
+            self._pending.pop(key, None)
+
+    async def drain(self) -> None:
+        """Wait for every queued prefetch (used by tests and shutdown)."""
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "scheduled": self.scheduled,
+            "in_flight": len(self._pending),
+            "skipped_budget": self.skipped_budget,
+            "failed": self.failed,
+            "budget_per_minute": self._budget,
+        }
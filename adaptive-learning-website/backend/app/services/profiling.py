@@ -0,0 +1,254 @@
+"""
+On-demand sampling profiler and sampled per-request stage traces.
+
+SamplingProfiler runs a background thread for N seconds. It snapshots
+every other thread's Python stack (sys._current_frames) at a fixed
+interval and folds the snapshots into collapsed stacks
+("thread;outer;inner count" lines), which flamegraph.pl, speedscope and
+inferno read directly. Nothing is instrumented, so the cost while
+profiling is one stack walk per interval, and nothing runs when it is
+off.
+
+RequestTracer traces a sampled fraction of requests. TraceMiddleware
+puts a Trace in a context var. Code marks its stages with
+`with span("upstream"):` and the route marks handler start and end, so
+validation (routing + body parsing + pydantic) and serialization fall
+out as the gaps around the handler. When a request is not sampled,
+span() is one ContextVar lookup that returns a shared no-op context
+manager.
+"""
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc: Any) -> bool:
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """Stage timings of one sampled request."""
+
+    __slots__ = ("method", "path", "started", "wall", "spans", "marks", "status", "total")
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.wall = time.time()
+        self.spans: List[Tuple[str, float, float]] = []
+        self.marks: Dict[str, float] = {}
+        self.status: Optional[int] = None
+        self.total: Optional[float] = None
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "at": self.wall,
+            "total_ms": round(self.total * 1000, 3) if self.total is not None else None,
+            "spans": [
+                {"name": name, "start_ms": round(start * 1000, 3), "ms": round(duration * 1000, 3)}
+                for name, start, duration in self.spans
+            ],
+        }
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace: Trace, name: str) -> None:
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc: Any) -> bool:
+        end = time.perf_counter()
+        self.trace.spans.append((self.name, self.start - self.trace.started, end - self.start))
+        return False
+
+
+_current: ContextVar[Optional[Trace]] = ContextVar("request_trace", default=None)
+
+
+def span(name: str):
+    """Times a stage of the current request if it is being traced."""
+    trace = _current.get()
+    if trace is None:
+        return _NULL_SPAN
+    return _Span(trace, name)
+
+
+def mark(name: str) -> None:
+    """Records a point in time (e.g. handler_start / handler_end) on the current trace."""
+    trace = _current.get()
+    if trace is not None:
+        trace.marks[name] = time.perf_counter() - trace.started
+
+
+class RequestTracer:
+    """
+    Samples requests and keeps recent traces plus per-route stage stats.
+    """
+
+    def __init__(self, sample_rate: float = 0.0, max_traces: int = 500, max_samples: int = 2000) -> None:
+        self.sample_rate = sample_rate
+        self._traces: Deque[Trace] = deque(maxlen=max_traces)
+        self._max_samples = max_samples
+        self._stages: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+        self.sampled = 0
+
+    def set_rate(self, rate: float) -> None:
+        if not 0.0 <= rate <= 1.0:
+            raise RuntimeError("Sample rate must be between 0 and 1.")
+        self.sample_rate = rate
+
+    def should_sample(self) -> bool:
+        rate = self.sample_rate
+        return rate > 0.0 and (rate >= 1.0 or random.random() < rate)
+
+    def finish(self, trace: Trace) -> None:
+        """Derives validation/serialization from the handler marks and stores the trace."""
+        start, end = trace.marks.get("handler_start"), trace.marks.get("handler_end")
+        if start is not None:
+            trace.spans.insert(0, ("validation", 0.0, start))
+        if end is not None and "response_start" in trace.marks:
+            trace.spans.append(("serialization", end, trace.marks["response_start"] - end))
+        trace.spans.sort(key=lambda s: s[1])
+        with self._lock:
+            self.sampled += 1
+            self._traces.append(trace)
+            for name, _, duration in trace.spans + [("total", 0.0, trace.total or 0.0)]:
+                samples = self._stages.get((trace.path, name))
+                if samples is None:
+                    samples = self._stages[(trace.path, name)] = deque(maxlen=self._max_samples)
+                samples.append(duration * 1000)
+
+    def recent(self, limit: int = 50, path: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = [t for t in self._traces if path is None or t.path == path]
+        return [t.describe() for t in traces[-limit:]][::-1]
+
+    def summary(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """p50/p95/count per stage for each traced path."""
+        result: Dict[str, Dict[str, Dict[str, float]]] = {}
+        with self._lock:
+            items = [(key, sorted(samples)) for key, samples in self._stages.items()]
+        for (path, name), ordered in items:
+            result.setdefault(path, {})[name] = {
+                "count": len(ordered),
+                "p50_ms": round(ordered[len(ordered) // 2], 3),
+                "p95_ms": round(ordered[int(len(ordered) * 0.95)], 3),
+            }
+        return result
+
+
+class TraceMiddleware:
+    """
+    Pure ASGI middleware: starts a Trace for sampled HTTP requests.
+    Unsampled requests pass straight through.
+    """
+
+    def __init__(self, app: Callable, tracer: RequestTracer) -> None:
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or not self.tracer.should_sample():
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(scope.get("method", ""), scope.get("path", ""))
+
+        async def traced_send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                trace.status = message.get("status")
+                trace.marks["response_start"] = time.perf_counter() - trace.started
+            await send(message)
+
+        token = _current.set(trace)
+        try:
+            await self.app(scope, receive, traced_send)
+        finally:
+            _current.reset(token)
+            trace.total = time.perf_counter() - trace.started
+            self.tracer.finish(trace)
+
+
+class SamplingProfiler:
+    """
+    Collects collapsed stacks of all other threads for a fixed duration.
+
+    One profile at a time; profile() while one is running raises RuntimeError.
+    """
+
+    def __init__(self, interval: float = 0.005, max_seconds: float = 60.0) -> None:
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._busy = threading.Lock()
+        self._labels: Dict[Any, str] = {}
+        self.samples = 0
+
+    @property
+    def running(self) -> bool:
+        return self._busy.locked()
+
+    def _label(self, code: Any) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (
+                f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            )
+        return label
+
+    def profile(self, seconds: float, interval: Optional[float] = None) -> str:
+        """Blocks for `seconds` while sampling; returns collapsed stacks."""
+        if seconds <= 0 or seconds > self.max_seconds:
+            raise RuntimeError(f"Profile duration must be between 0 and {self.max_seconds:g} seconds.")
+        if not self._busy.acquire(blocking=False):
+            raise RuntimeError("A profile is already running.")
+        try:
+            return self._sample(seconds, interval or self.interval)
+        finally:
+            self._busy.release()
+
+    def _sample(self, seconds: float, interval: float) -> str:
+        me = threading.get_ident()
+        stacks: Counter = Counter()
+        deadline = time.perf_counter() + seconds
+        samples = 0
+        while True:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            samples += 1
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+        self.samples += samples
+        return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
@@ -0,0 +1,444 @@
+"""
+Pooled async persistence for saga progress and XP with write batching.
+
+The database side of a chapter completion mirrors complete_saga_chapter
+(db/fix_complete_saga_chapter.sql): it marks the chapter completed,
+unlocks the next chapter, and adds the XP to students.xp_points. The XP
+and the next chapter come from saga_chapters (chapter(), seeded like
+db/saga_schema.sql), never from the client. Only that default catalog is
+covered; personalized saga chapters have no row there. Calling the
+function once per completion means one round trip per click.
+ProgressWriter instead queues completions and XP increments and flushes
+them together every `flush_interval` seconds (or sooner once `max_batch`
+ops are waiting):
+
+- duplicate completions of the same chapter in a batch collapse to one;
+- XP increments are summed per student into one UPDATE each;
+- completions are idempotent. A chapter that is already completed is not
+  completed again and does not award its XP again, so retries and
+  double-clicks are safe.
+
+Ordering guarantees: a single flusher applies the batches in submission
+order, one transaction per batch. A caller's await returns only after the
+batch holding its op has committed. If a batch fails, it is rolled back
+as a whole, every caller in it gets the error, and later batches still go
+through in order. `on_commit` receives each committed batch's XP per
+student (after dedupe).
+
+Every committed XP delta is also appended to `xp_events` in the same
+transaction, and organization memberships live in `org_members`. Workers
+that share the database follow both (see leaderboard.LeaderboardFollower)
+instead of only seeing their own commits. Events older than
+`event_retention` seconds are pruned as batches commit.
+
+ConnectionPool is the stand-in backend: a fixed set of SQLite connections
+(WAL mode, so reads proceed during a flush) used from worker threads.
+"""
+import asyncio
+import contextvars
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS students (
+    id TEXT PRIMARY KEY,
+    xp_points INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS saga_chapters (
+    id TEXT PRIMARY KEY,
+    xp_reward INTEGER NOT NULL DEFAULT 500,
+    next_chapter_id TEXT
+);
+INSERT OR IGNORE INTO saga_chapters (id, xp_reward, next_chapter_id) VALUES
+    ('chapter-1', 500, 'chapter-2'),
+    ('chapter-2', 750, 'chapter-3'),
+    ('chapter-3', 1000, 'chapter-4'),
+    ('chapter-4', 1250, 'chapter-5'),
+    ('chapter-5', 1500, NULL);
+CREATE TABLE IF NOT EXISTS saga_progress (
+    student_id TEXT NOT NULL,
+    chapter_id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'locked' CHECK (status IN ('completed', 'active', 'locked')),
+    completed_at REAL,
+    xp_earned INTEGER DEFAULT 0,
+    time_spent_minutes INTEGER DEFAULT 0,
+    updated_at REAL,
+    PRIMARY KEY (student_id, chapter_id)
+);
+CREATE TABLE IF NOT EXISTS xp_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id TEXT NOT NULL,
+    amount INTEGER NOT NULL,
+    at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS xp_events_at ON xp_events (at);
+CREATE TABLE IF NOT EXISTS org_members (
+    org_id TEXT NOT NULL,
+    student_id TEXT NOT NULL,
+    PRIMARY KEY (org_id, student_id)
+);
+CREATE TABLE IF NOT EXISTS org_versions (
+    org_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Long enough to rebuild every kept weekly leaderboard after a restart.
+DEFAULT_EVENT_RETENTION = 15 * 86400
+
+
+class ConnectionPool:
+    """
+    Fixed-size pool of SQLite connections shared by async callers.
+
+    Each connection is used by one thread at a time; statements run in the
+    default executor so the event loop never blocks on disk.
+    """
+
+    def __init__(self, path: str, size: int = 4) -> None:
+        self.path = path
+        self.size = size
+        self._connections: List[sqlite3.Connection] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._lock = threading.Lock()
+        for _ in range(size):
+            conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._connections.append(conn)
+        self._connections[0].executescript(SCHEMA)
+
+    @asynccontextmanager
+    async def connection(self):
+        with self._lock:
+            if self._idle is None:
+                self._idle = asyncio.Queue()
+                for conn in self._connections:
+                    self._idle.put_nowait(conn)
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+    async def run(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Runs fn(conn) on a pooled connection in a worker thread."""
+        async with self.connection() as conn:
+            return await asyncio.to_thread(fn, conn)
+
+    def close(self) -> None:
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+
+_Op = Tuple[str, tuple, asyncio.Future]
+
+
+class ProgressWriter:
+    """
+    Coalesces chapter completions and XP increments into batched writes.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        flush_interval: float = 0.05,
+        max_batch: int = 500,
+        on_commit: Optional[Callable[[Dict[str, int]], None]] = None,
+        event_retention: float = DEFAULT_EVENT_RETENTION,
+    ) -> None:
+        self.pool = pool
+        self.on_commit = on_commit
+        self.event_retention = event_retention
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._pending: List[_Op] = []
+        self._wake: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._closed = False
+        self.ops = 0
+        self.batches = 0
+        self.statements = 0
+        self.failed_batches = 0
+        self.duplicate_completions = 0
+        self._flush_ms: List[float] = []
+
+    # -- submission -----------------------------------------------------------
+
+    async def complete_chapter(
+        self,
+        student_id: str,
+        chapter_id: str,
+        xp_earned: int = 0,
+        time_spent_minutes: int = 0,
+        next_chapter_id: Optional[str] = None,
+    ) -> None:
+        """Records a completion; returns once it is committed."""
+        await self._submit("complete", (student_id, chapter_id, int(xp_earned), int(time_spent_minutes), next_chapter_id))
+
+    async def add_xp(self, student_id: str, amount: int) -> None:
+        """Adds XP outside a chapter completion; returns once it is committed."""
+        await self._submit("xp", (student_id, int(amount)))
+
+    async def _submit(self, kind: str, args: tuple) -> None:
+        if self._closed:
+            raise RuntimeError("Progress writer is closed.")
+        loop = asyncio.get_running_loop()
+        if self._flusher is None or self._flusher.done():
+            self._wake = asyncio.Event()
+            self._idle = asyncio.Event()
+            self._idle.set()
+            self._flusher = loop.create_task(self._run(), context=contextvars.Context())
+        future = loop.create_future()
+        self._pending.append((kind, args, future))
+        self.ops += 1
+        self._idle.clear()
+        self._wake.set()
+        await future
+
+    # -- flushing -------------------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if len(self._pending) < self.max_batch and not self._closed:
+                # Let the burst pile up; a full batch goes out right away.
+                try:
+                    await asyncio.wait_for(self._full(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            while self._pending:
+                batch, self._pending = self._pending[:self.max_batch], self._pending[self.max_batch:]
+                await self._flush(batch)
+            self._idle.set()
+            if self._closed:
+                return
+
+    async def _full(self) -> None:
+        while len(self._pending) < self.max_batch and not self._closed:
+            self._wake.clear()
+            await self._wake.wait()
+
+    async def _flush(self, batch: List[_Op]) -> None:
+        started = time.perf_counter()
+        try:
+            statements, xp = await self.pool.run(lambda conn: self._apply(conn, batch))
+        except Exception as exc:
+            self.failed_batches += 1
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        self.batches += 1
+        self.statements += statements
+        self._flush_ms.append((time.perf_counter() - started) * 1000)
+        del self._flush_ms[:-1000]
+        if self.on_commit is not None and xp:
+            try:
+                self.on_commit(xp)
+            except Exception as exc:
+                print(f"⚠️ Progress on_commit hook failed: {exc}")
+        for _, _, future in batch:
+            if not future.done():
+                future.set_result(None)
+
+    def _apply(self, conn: sqlite3.Connection, batch: List[_Op]) -> Tuple[int, Dict[str, int]]:
+        """Writes one batch in one transaction; returns (statements executed, XP per student)."""
+        completions: Dict[Tuple[str, str], tuple] = {}
+        xp: Dict[str, int] = {}
+        for kind, args, _ in batch:
+            if kind == "xp":
+                xp[args[0]] = xp.get(args[0], 0) + args[1]
+            else:
+                key = (args[0], args[1])
+                if key in completions:
+                    self.duplicate_completions += 1
+                completions[key] = args
+        now = time.time()
+        statements = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if completions:
+                keys = list(completions)
+                done = set()
+                for start in range(0, len(keys), 400):
+                    chunk = keys[start:start + 400]
+                    rows = conn.execute(
+                        "SELECT student_id, chapter_id FROM saga_progress WHERE status = 'completed' "
+                        "AND (student_id, chapter_id) IN (VALUES " + ",".join(["(?, ?)"] * len(chunk)) + ")",
+                        [v for key in chunk for v in key],
+                    ).fetchall()
+                    done.update(rows)
+                    statements += 1
+                fresh = [completions[key] for key in keys if key not in done]
+                conn.executemany(
+                    "INSERT INTO saga_progress "
+                    "(student_id, chapter_id, status, completed_at, xp_earned, time_spent_minutes, updated_at) "
+                    "VALUES (?, ?, 'completed', ?, ?, ?, ?) "
+                    "ON CONFLICT (student_id, chapter_id) DO UPDATE SET status = 'completed', "
+                    "completed_at = excluded.completed_at, xp_earned = excluded.xp_earned, "
+                    "time_spent_minutes = excluded.time_spent_minutes, updated_at = excluded.updated_at",
+                    [(s, c, now, x, t, now) for s, c, x, t, _ in fresh],
+                )
+                # Only unlock chapters still locked, so a completion later in the
+                # same batch is never overwritten by its predecessor's unlock.
+                conn.executemany(
+                    "INSERT INTO saga_progress (student_id, chapter_id, status, updated_at) "
+                    "VALUES (?, ?, 'active', ?) "
+                    "ON CONFLICT (student_id, chapter_id) DO UPDATE SET status = 'active', "
+                    "updated_at = excluded.updated_at WHERE saga_progress.status = 'locked'",
+                    [(s, n, now) for s, _, _, _, n in fresh if n],
+                )
+                statements += 2
+                for s, _, x, _, _ in fresh:
+                    xp[s] = xp.get(s, 0) + x
+            if xp:
+                conn.executemany(
+                    "INSERT INTO students (id, xp_points) VALUES (?, ?) "
+                    "ON CONFLICT (id) DO UPDATE SET xp_points = COALESCE(students.xp_points, 0) + excluded.xp_points",
+                    [(s, amount) for s, amount in xp.items() if amount],
+                )
+                conn.executemany(
+                    "INSERT INTO xp_events (student_id, amount, at) VALUES (?, ?, ?)",
+                    [(s, amount, now) for s, amount in xp.items() if amount],
+                )
+                conn.execute("DELETE FROM xp_events WHERE at < ?", (now - self.event_retention,))
+                statements += 3
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return statements, {s: amount for s, amount in xp.items() if amount}
+
+    async def flush(self) -> None:
+        """Waits until everything submitted so far is committed."""
+        if self._flusher is None or self._idle is None:
+            return
+        self._wake.set()
+        await self._idle.wait()
+
+    async def close(self) -> None:
+        """Flushes what is pending and stops the flusher."""
+        self._closed = True
+        if self._flusher is not None and not self._flusher.done():
+            self._wake.set()
+            await self._flusher
+
+    # -- reads ----------------------------------------------------------------
+
+    async def scores(self) -> List[Dict[str, Any]]:
+        """Committed XP of every student as `students` rows ({id, xp_points})."""
+        def read(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+            return [{"id": i, "xp_points": xp} for i, xp in conn.execute("SELECT id, xp_points FROM students")]
+
+        return await self.pool.run(read)
+
+    async def xp_events(
+        self, after: int = 0, since: float = 0.0, limit: int = 10000
+    ) -> List[Tuple[int, str, int, float]]:
+        """Committed XP deltas as (seq, student_id, amount, at), oldest first."""
+        def read(conn: sqlite3.Connection) -> List[Tuple[int, str, int, float]]:
+            return conn.execute(
+                "SELECT seq, student_id, amount, at FROM xp_events WHERE seq > ? AND at >= ? ORDER BY seq LIMIT ?",
+                (after, since, limit),
+            ).fetchall()
+
+        return await self.pool.run(read)
+
+    async def scores_at(self) -> Tuple[List[Dict[str, Any]], int]:
+        """scores() plus the sequence number of the last XP delta they include, read together."""
+        def read(conn: sqlite3.Connection) -> Tuple[List[Dict[str, Any]], int]:
+            conn.execute("BEGIN")
+            try:
+                seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM xp_events").fetchone()[0]
+                rows = [{"id": i, "xp_points": xp} for i, xp in conn.execute("SELECT id, xp_points FROM students")]
+            finally:
+                conn.execute("COMMIT")
+            return rows, seq
+
+        return await self.pool.run(read)
+
+    async def set_members(self, org_id: str, student_ids: List[str]) -> int:
+        """Replaces an organization's membership; returns its new version."""
+        def write(conn: sqlite3.Connection) -> int:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM org_members WHERE org_id = ?", (org_id,))
+                conn.executemany(
+                    "INSERT OR IGNORE INTO org_members (org_id, student_id) VALUES (?, ?)",
+                    [(org_id, sid) for sid in student_ids],
+                )
+                conn.execute(
+                    "INSERT INTO org_versions (org_id, version) VALUES (?, 1) "
+                    "ON CONFLICT (org_id) DO UPDATE SET version = org_versions.version + 1",
+                    (org_id,),
+                )
+                version = conn.execute("SELECT version FROM org_versions WHERE org_id = ?", (org_id,)).fetchone()[0]
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return version
+
+        return await self.pool.run(write)
+
+    async def memberships(self, known: Optional[Dict[str, int]] = None) -> Dict[str, Tuple[int, List[str]]]:
+        """{org_id: (version, members)} for organizations whose version differs from `known`."""
+        known = known or {}
+
+        def read(conn: sqlite3.Connection) -> Dict[str, Tuple[int, List[str]]]:
+            changed = {}
+            for org_id, version in conn.execute("SELECT org_id, version FROM org_versions").fetchall():
+                if known.get(org_id) != version:
+                    members = conn.execute("SELECT student_id FROM org_members WHERE org_id = ?", (org_id,)).fetchall()
+                    changed[org_id] = (version, [m for (m,) in members])
+            return changed
+
+        return await self.pool.run(read)
+
+    async def chapter(self, chapter_id: str) -> Optional[Dict[str, Any]]:
+        """XP reward and next chapter of a saga chapter, or None if it is unknown."""
+        def read(conn: sqlite3.Connection) -> Optional[Dict[str, Any]]:
+            row = conn.execute(
+                "SELECT xp_reward, next_chapter_id FROM saga_chapters WHERE id = ?", (chapter_id,)
+            ).fetchone()
+            return {"chapter_id": chapter_id, "xp_reward": row[0], "next_chapter_id": row[1]} if row else None
+
+        return await self.pool.run(read)
+
+    async def progress(self, student_id: str) -> Dict[str, Any]:
+        """Committed XP and chapter statuses for one student."""
+        def read(conn: sqlite3.Connection) -> Dict[str, Any]:
+            row = conn.execute("SELECT xp_points FROM students WHERE id = ?", (student_id,)).fetchone()
+            chapters = conn.execute(
+                "SELECT chapter_id, status, xp_earned FROM saga_progress WHERE student_id = ? ORDER BY chapter_id",
+                (student_id,),
+            ).fetchall()
+            return {
+                "student_id": student_id,
+                "xp_points": row[0] if row else 0,
+                "chapters": [{"chapter_id": c, "status": s, "xp_earned": x} for c, s, x in chapters],
+            }
+
+        return await self.pool.run(read)
+
+    def stats(self) -> Dict[str, Any]:
+        ordered = sorted(self._flush_ms)
+        return {
+            "ops": self.ops,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "statements": self.statements,
+            "ops_per_batch": round(self.ops / self.batches, 2) if self.batches else None,
+            "duplicate_completions": self.duplicate_completions,
+            "flush_p50_ms": round(ordered[len(ordered) // 2], 3) if ordered else None,
+            "flush_p95_ms": round(ordered[int(len(ordered) * 0.95)], 3) if ordered else None,
+        }
@@ -0,0 +1,359 @@
+"""
+Prompt templates with local token accounting and measured compaction.
+
+The long generation prompts (course, saga, quiz) are registered once as
+PromptTemplates. Each template is split into literal text and fields when
+it is registered, so a render is a join, and the template's fixed
+instruction tokens are counted once rather than on every call.
+
+Every render returns a RenderedPrompt carrying the estimated input tokens
+and an output estimate (the running mean of what the template actually
+returned, or its declared default until there is data). The registry
+counts both per route, so GET /api/admin/prompts shows what each route
+spends on instructions vs. student input.
+
+Parts of a template wrapped in Removable (worked examples, restated rules,
+pep talk) are dropped in its compact variant. Compaction modes
+(PROMPT_COMPACTION):
+
+    off   always the full prompt (default)
+    ab    split traffic between full and compact, forever, to measure
+    auto  full until it parses reliably; then an A/B trial of compact;
+          compact is promoted if its parse rate holds up and is dropped
+          again if it later degrades
+
+Callers report each call's parse outcome and upstream latency with
+record(), which feeds both the per-variant A/B stats and the auto policy.
+"""
+import random
+import re
+import string
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple, Union
+
+from .socratic_sessions import estimate_tokens
+
+
+COMPACTION_MODES = ("off", "ab", "auto")
+FULL = "full"
+COMPACT = "compact"
+
+
+class Removable(str):
+    """Template text that the compact variant leaves out."""
+
+
+class _Compiled:
+    """A format string split once into literal chunks and field names."""
+
+    __slots__ = ("text", "parts", "fields", "static_tokens")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.parts: List[Tuple[str, Optional[str]]] = [
+            (literal, field) for literal, field, _, _ in string.Formatter().parse(text)
+        ]
+        self.fields = {field for _, field in self.parts if field}
+        self.static_tokens = estimate_tokens("".join(literal for literal, _ in self.parts))
+
+    def render(self, values: Dict[str, Any]) -> str:
+        return "".join(literal + (str(values[field]) if field else "") for literal, field in self.parts)
+
+
+class PromptTemplate:
+    """
+    One prompt, in a full and a compact variant.
+
+    Args:
+        name: Registry key, e.g. "course".
+        sections: Template text in str.format syntax; Removable sections
+            are omitted from the compact variant.
+        output_tokens: Expected response size until real responses are seen.
+    """
+
+    def __init__(self, name: str, sections: Sequence[Union[str, Removable]], output_tokens: int) -> None:
+        self.name = name
+        self.output_tokens = output_tokens
+        full = "".join(sections)
+        compact = "".join(s for s in sections if not isinstance(s, Removable))
+        # Indentation and blank-line runs cost tokens and carry nothing.
+        compact = re.sub(r"\n[ \t]+", "\n", compact)
+        compact = re.sub(r"\n{3,}", "\n\n", compact).strip()
+        self.variants = {FULL: _Compiled(full), COMPACT: _Compiled(compact)}
+        if self.variants[COMPACT].fields - self.variants[FULL].fields:
+            raise RuntimeError(f"Prompt {name!r}: compact variant uses fields the full one lacks.")
+
+
+class RenderedPrompt:
+    __slots__ = ("template", "variant", "route", "text", "input_tokens", "output_tokens")
+
+    def __init__(self, template: str, variant: str, route: str, text: str, output_tokens: int) -> None:
+        self.template = template
+        self.variant = variant
+        self.route = route
+        self.text = text
+        self.input_tokens = estimate_tokens(text)
+        self.output_tokens = output_tokens
+
+
+class _VariantStats:
+    __slots__ = ("calls", "parsed", "outcomes", "latencies", "input_tokens", "output_tokens", "responses")
+
+    def __init__(self, window: int) -> None:
+        self.calls = 0
+        self.parsed = 0
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.responses = 0
+
+    def success_rate(self) -> Optional[float]:
+        return sum(self.outcomes) / len(self.outcomes) if self.outcomes else None
+
+    def describe(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        rate = self.success_rate()
+        return {
+            "calls": self.calls,
+            "recorded": len(self.outcomes),
+            "parse_success_rate": round(rate, 4) if rate is not None else None,
+            "latency_p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "latency_p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+            "avg_input_tokens": round(self.input_tokens / self.calls, 1) if self.calls else None,
+            "avg_output_tokens": round(self.output_tokens / self.responses, 1) if self.responses else None,
+        }
+
+
+class PromptRegistry:
+    """
+    Renders registered templates, counts tokens per route and runs the
+    compaction A/B.
+
+    Args:
+        compaction: 'off' | 'ab' | 'auto'.
+        min_trials: Recorded calls a variant needs before the auto policy
+            judges it (also the size of the rolling window it is judged on).
+        min_success: Parse-success rate the full prompt must reach before
+            compact is trialled, and that compact must keep once promoted.
+        tolerance: How far below the full prompt's parse rate compact may
+            fall and still be promoted.
+    """
+
+    def __init__(
+        self,
+        compaction: str = "off",
+        min_trials: int = 50,
+        min_success: float = 0.95,
+        tolerance: float = 0.02,
+        seed: Optional[int] = None,
+    ) -> None:
+        if compaction not in COMPACTION_MODES:
+            raise RuntimeError(f"Prompt compaction must be one of {', '.join(COMPACTION_MODES)}.")
+        self.compaction = compaction
+        self.min_trials = min_trials
+        self.min_success = min_success
+        self.tolerance = tolerance
+        self._random = random.Random(seed)
+        self.templates: Dict[str, PromptTemplate] = {}
+        self._stats: Dict[Tuple[str, str], _VariantStats] = {}
+        # Per template under 'auto': 'full' -> 'trial' -> 'compact' (or back to 'full').
+        self.phase: Dict[str, str] = {}
+        self.routes: Dict[str, Dict[str, int]] = {}
+
+    def register(self, template: PromptTemplate) -> None:
+        self.templates[template.name] = template
+        self.phase[template.name] = FULL
+        for variant in (FULL, COMPACT):
+            self._stats[(template.name, variant)] = _VariantStats(self.min_trials)
+
+    def _variant(self, name: str) -> str:
+        if self.compaction == "off":
+            return FULL
+        if self.compaction == "ab" or self.phase[name] == "trial":
+            return COMPACT if self._random.random() < 0.5 else FULL
+        return self.phase[name]
+
+    def render(self, name: str, route: str, **fields: Any) -> RenderedPrompt:
+        """Builds the prompt for one call and counts its input tokens against `route`."""
+        template = self.templates[name]
+        variant = self._variant(name)
+        stats = self._stats[(name, variant)]
+        output_tokens = (
+            round(stats.output_tokens / stats.responses) if stats.responses else template.output_tokens
+        )
+        rendered = RenderedPrompt(name, variant, route, template.variants[variant].render(fields), output_tokens)
+        stats.calls += 1
+        stats.input_tokens += rendered.input_tokens
+        usage = self.routes.setdefault(
+            route, {"calls": 0, "input_tokens": 0, "instruction_tokens": 0, "output_tokens": 0}
+        )
+        usage["calls"] += 1
+        usage["input_tokens"] += rendered.input_tokens
+        usage["instruction_tokens"] += template.variants[variant].static_tokens
+        return rendered
+
+    def record(self, rendered: RenderedPrompt, parsed: bool, latency: float, output: Optional[str] = None) -> None:
+        """Reports whether the response parsed, the upstream latency and the response text."""
+        stats = self._stats[(rendered.template, rendered.variant)]
+        stats.parsed += int(parsed)
+        stats.outcomes.append(parsed)
+        stats.latencies.append(latency)
+        if output is not None:
+            tokens = estimate_tokens(output)
+            stats.responses += 1
+            stats.output_tokens += tokens
+            self.routes[rendered.route]["output_tokens"] += tokens
+        if self.compaction == "auto":
+            self._advance(rendered.template)
+
+    def _advance(self, name: str) -> None:
+        full, compact = self._stats[(name, FULL)], self._stats[(name, COMPACT)]
+        phase = self.phase[name]
+        full_rate = full.success_rate()
+        if phase == FULL and len(full.outcomes) >= self.min_trials and full_rate >= self.min_success:
+            if len(compact.outcomes) < self.min_trials:
+                self.phase[name] = "trial"
+        elif phase == "trial" and len(compact.outcomes) >= self.min_trials:
+            compact_rate = compact.success_rate()
+            promoted = compact_rate >= self.min_success and compact_rate >= full_rate - self.tolerance
+            self.phase[name] = COMPACT if promoted else FULL
+            if not promoted:
+                print(f"⚠️ Compact '{name}' prompt parsed {compact_rate:.1%} vs {full_rate:.1%}; keeping full")
+        elif phase == COMPACT and len(compact.outcomes) >= self.min_trials and compact.success_rate() < self.min_success:
+            print(f"⚠️ Compact '{name}' prompt dropped to {compact.success_rate():.1%} parse success; reverting")
+            self.phase[name] = FULL
+
+    def stats(self) -> Dict[str, Any]:
+        templates = {}
+        for name, template in self.templates.items():
+            templates[name] = {
+                "phase": self.phase[name] if self.compaction == "auto" else self.compaction,
+                "instruction_tokens": {v: c.static_tokens for v, c in template.variants.items()},
+                **{variant: self._stats[(name, variant)].describe() for variant in (FULL, COMPACT)},
+            }
+        return {"compaction": self.compaction, "templates": templates, "routes": self.routes}
+
+
+COURSE_PACE_INSTRUCTIONS = {
+    "blitz": "Create 3-4 concise summary modules with key concepts only. Each module should be 15-20 minutes. Focus on essentials.",
+    "moderate": "Create 5-6 balanced modules with practice exercises. Each module should be 30-45 minutes. Include hands-on examples.",
+    "deep": "Create 7-10 detailed modules with quizzes, projects, and deep dives. Each module should be 60-90 minutes. Include comprehensive exercises and assessments."
+}
+
+COURSE_TEMPLATE = PromptTemplate(
+    "course",
+    [
+        "You are an expert course creator. Create a comprehensive, engaging course on: {topic}\n\n"
+        "Student Pace: {pace}\n"
+        "{pace_instruction}\n\n"
+        "Return ONLY a valid JSON object (no markdown, no explanation) with this exact structure:\n"
+        "{{\n"
+        '  "title": "Course title (engaging and specific)",\n'
+        '  "description": "Detailed course description (2-3 sentences)",\n'
+        '  "difficulty": "beginner|intermediate|advanced",\n'
+        '  "thumbnail_url": null,\n'
+        '  "modules": [\n'
+        "    {{\n"
+        '      "title": "Module title",\n'
+        '      "description": "Module description",\n'
+        '      "lessons": [\n'
+        "        {{\n"
+        '          "title": "Lesson title",\n'
+        '          "content": "Detailed lesson content with explanations, examples, and key takeaways"\n'
+        "        }}\n"
+        "      ]\n"
+        "    }}\n"
+        "  ]\n"
+        "}}",
+        Removable("\n\nMake it practical, engaging, and tailored to {pace} pace learning!"),
+    ],
+    output_tokens=3000,
+)
+
+SAGA_TEMPLATE = PromptTemplate(
+    "saga",
+    [
+        "You are an expert Python programming instructor creating a personalized, gamified learning journey.\n\n"
+        "Student Profile:\n"
+        "- Python Skill Level: {skill_level}\n"
+        "- Learning Goals: {goals}\n"
+        "- Preferred Pace: {pace}\n"
+        "- Interests: {interests}\n"
+        "- Learning Style: {learning_style}\n\n"
+        "Create a personalized Python programming saga journey with 5-7 chapters. Each chapter should:\n"
+        '1. Have an epic, gamified title (like "The Awakening", "The First Trial", "Boss Battle: Functions")\n'
+        "2. Focus on Python programming concepts appropriate for {skill_level} level\n",
+        Removable(
+            "3. Align with their goals: {goals}\n"
+            "4. Match their pace: {pace} (adjust time estimates accordingly)\n"
+            "5. Include their interests: {interests}\n"
+        ),
+        "\nFor each chapter, provide:\n"
+        "- chapter_number: sequential number starting from 1\n"
+        "- title: Epic, gamified title\n"
+        "- subtitle: Specific Python topic/concept\n"
+        "- xp_reward: Based on difficulty (beginner: 300-500, intermediate: 600-1000, advanced: 1200-2000)\n"
+        "- estimated_time_minutes: Based on pace (slow: 60-90min, moderate: 30-60min, fast: 15-30min)\n"
+        "- type: 'video', 'quiz', or 'boss_fight'\n"
+        "- action_type: 'course', 'quiz', or 'study'\n"
+        "- action_url: '/dashboard/courses' for videos, '/dashboard/study' for quizzes/study\n"
+        "- action_params: JSON object with mode, topic, difficulty based on type\n\n"
+        "Return ONLY a valid JSON array of chapter objects, no markdown, no explanation.",
+        Removable(
+            "\nExample format:\n"
+            "[\n"
+            "  {{\n"
+            '    "chapter_number": 1,\n'
+            '    "title": "The Awakening",\n'
+            '    "subtitle": "Python Basics: Variables and Data Types",\n'
+            '    "xp_reward": 500,\n'
+            '    "estimated_time_minutes": 45,\n'
+            '    "type": "video",\n'
+            '    "action_type": "course",\n'
+            '    "action_url": "/dashboard/courses",\n'
+            '    "action_params": {{"highlight": "python-basics"}}\n'
+            "  }},\n"
+            "  {{\n"
+            '    "chapter_number": 2,\n'
+            '    "title": "The First Trial",\n'
+            '    "subtitle": "Control Flow: If Statements and Loops",\n'
+            '    "xp_reward": 750,\n'
+            '    "estimated_time_minutes": 60,\n'
+            '    "type": "quiz",\n'
+            '    "action_type": "quiz",\n'
+            '    "action_url": "/dashboard/study",\n'
+            '    "action_params": {{"mode": "quiz", "topic": "Control Flow", "difficulty": "standard"}}\n'
+            "  }}\n"
+            "]\n\n"
+            "Make it engaging, progressive, and tailored to their profile!"
+        ),
+    ],
+    output_tokens=900,
+)
+
+QUIZ_TEMPLATE = PromptTemplate(
+    "quiz",
+    [
+        "Generate {num_questions} multiple-choice questions about the following topic. "
+        "Return ONLY raw JSON (no commentary, no markdown) in this format:\n"
+        "[\n"
+        "  {{\n"
+        '    "id": 1,\n'
+        '    "question": "string",\n'
+        '    "options": ["option A", "option B", "option C", "option D"],\n'
+        '    "correctAnswer": "The exact string of the correct option"\n'
+        "  }}\n"
+        "]\n\n"
+        "TOPIC: {topic}"
+    ],
+    output_tokens=750,
+)
+
+
+def default_registry(compaction: str = "off", **kwargs: Any) -> PromptRegistry:
+    """Registry with the course, saga and quiz templates."""
+    registry = PromptRegistry(compaction=compaction, **kwargs)
+    for template in (COURSE_TEMPLATE, SAGA_TEMPLATE, QUIZ_TEMPLATE):
+        registry.register(template)
+    return registry
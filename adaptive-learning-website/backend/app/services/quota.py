@@ -0,0 +1,297 @@
+"""
+Per-student and per-organization AI usage accounting shared by all workers.
+
+Every uvicorn worker maps the same file (QUOTA_PATH) into memory. The file
+is a fixed hash table of principals ("student:<id>", "org:<id>",
+"client:<address>") split into stripes. Each slot holds, for every configured window, a ring of sub-window
+buckets with request and estimated-token counts, so a window's usage is
+the sum of the buckets that are still inside it. This is a sliding window
+with window/buckets granularity and no background cleanup.
+
+A check locks only the stripes of the principals involved. The lock is a
+thread lock plus a one-byte fcntl record lock, so the other processes are
+excluded too. With the lock held, the check reads and bumps a few
+counters in the mapped memory. That costs microseconds and needs no
+external service.
+
+admit() runs before the upstream call and rejects with QuotaExceeded
+(nothing is counted) when any principal is over any limit. settle()
+corrects the token estimate once the real response size is known.
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+MAGIC = b"AIQUOTA1"
+HEADER_BYTES = 4096
+_INIT_LOCK_BYTE = HEADER_BYTES - 1
+
+# Expected response sizes per AI tool/route, reserved up front and settled after.
+TOOL_OUTPUT_TOKENS = {
+    "explain": 900,
+    "summarize": 400,
+    "quiz": 150,  # per question
+    "socratic": 300,
+    "visualize": 400,
+    "course": 4000,
+    "saga": 1500,
+}
+CHARS_PER_TOKEN = 4
+
+
+def estimate_request_tokens(tool_type: str, text: str, num_questions: Optional[int] = None) -> int:
+    """Prompt tokens (≈4 chars each) plus the tool's expected output."""
+    output = TOOL_OUTPUT_TOKENS.get(tool_type, 500)
+    if tool_type == "quiz":
+        output *= num_questions or 5
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN + output
+
+
+class Limit:
+    """At most `requests` requests and `tokens` estimated tokens per `window_seconds`."""
+
+    def __init__(self, window_seconds: int, requests: Optional[int] = None, tokens: Optional[int] = None) -> None:
+        self.window_seconds = window_seconds
+        self.requests = requests
+        self.tokens = tokens
+
+    def describe(self) -> Dict[str, Optional[int]]:
+        return {"window_seconds": self.window_seconds, "requests": self.requests, "tokens": self.tokens}
+
+
+class QuotaExceeded(RuntimeError):
+    def __init__(self, principal: str, limit: Limit, retry_after: float) -> None:
+        super().__init__(
+            f"AI usage limit reached for {principal}: {limit.requests} requests / "
+            f"{limit.tokens} tokens per {limit.window_seconds}s"
+        )
+        self.principal = principal
+        self.limit = limit
+        self.retry_after = max(1, int(retry_after + 0.999))
+
+
+class SharedQuota:
+    """
+    Sliding-window usage counters in a memory-mapped file.
+
+    Args:
+        path: File shared by every worker on the host.
+        limits: Windows per principal kind, e.g. {"student": [...], "org": [...]}.
+        stripes: Lock/hash partitions; principals only contend within one.
+        slots: Principals per stripe; the least recently seen is evicted
+            when a stripe is full.
+        buckets: Sub-windows per window (granularity of the slide).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        limits: Dict[str, List[Limit]],
+        stripes: int = 256,
+        slots: int = 64,
+        buckets: int = 12,
+    ) -> None:
+        self.path = path
+        self.limits = limits
+        self.stripes = stripes
+        self.slots = slots
+        self.buckets = buckets
+        self.windows = max((len(v) for v in limits.values()), default=0)
+        cells = stripes * slots
+        self._bucket_cells = cells * self.windows * buckets
+        self._key_off = HEADER_BYTES
+        self._seen_off = self._key_off + 8 * cells
+        self._epoch_off = self._seen_off + 4 * cells
+        self._req_off = self._epoch_off + 4 * self._bucket_cells
+        self._tok_off = self._req_off + 4 * self._bucket_cells
+        self.size = self._tok_off + 8 * self._bucket_cells
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._init_file()
+        self._mm = mmap.mmap(self._fd, self.size)
+        view = memoryview(self._mm)
+        self._keys = view[self._key_off:self._seen_off].cast("Q")
+        self._seen = view[self._seen_off:self._epoch_off].cast("I")
+        self._epochs = view[self._epoch_off:self._req_off].cast("I")
+        self._reqs = view[self._req_off:self._tok_off].cast("I")
+        self._toks = view[self._tok_off:self.size].cast("q")
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        # Where this process last found each principal; re-checked against the
+        # shared key on every use since another worker may have evicted it.
+        self._slot_cache: Dict[int, int] = {}
+        self.checks = 0
+        self.rejected = 0
+
+    def _layout(self) -> bytes:
+        return MAGIC + struct.pack("<5I", self.stripes, self.slots, self.windows, self.buckets, self.size)
+
+    def _init_file(self) -> None:
+        """Creates or resets the file when its layout does not match ours."""
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, _INIT_LOCK_BYTE)
+        try:
+            header = os.pread(self._fd, len(self._layout()), 0)
+            if header != self._layout() or os.fstat(self._fd).st_size != self.size:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, self._layout(), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, _INIT_LOCK_BYTE)
+
+    # -- locking --------------------------------------------------------------
+
+    def _lock(self, stripes: Sequence[int]) -> None:
+        for stripe in stripes:
+            self._locks[stripe].acquire()
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+
+    def _unlock(self, stripes: Sequence[int]) -> None:
+        for stripe in reversed(stripes):
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+            self._locks[stripe].release()
+
+    # -- slots ----------------------------------------------------------------
+
+    @staticmethod
+    def _hash(principal: str) -> int:
+        return int.from_bytes(hashlib.blake2b(principal.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+    def _slot(self, stripe: int, key: int, now: int, create: bool) -> Optional[int]:
+        """Slot index of `key` in its stripe (evicting the stalest if needed)."""
+        keys, seen = self._keys, self._seen
+        cached = self._slot_cache.get(key)
+        if cached is not None and keys[cached] == key:
+            return cached
+        if len(self._slot_cache) > 4 * self.stripes * self.slots:
+            self._slot_cache.clear()
+        base = stripe * self.slots
+        empty = oldest = None
+        for slot in range(base, base + self.slots):
+            current = keys[slot]
+            if current == key:
+                self._slot_cache[key] = slot
+                return slot
+            if current == 0:
+                if empty is None:
+                    empty = slot
+            elif oldest is None or seen[slot] < seen[oldest]:
+                oldest = slot
+        if not create:
+            return None
+        slot = empty if empty is not None else oldest
+        keys[slot] = key
+        seen[slot] = now
+        self._slot_cache[key] = slot
+        start = slot * self.windows * self.buckets
+        for cell in range(start, start + self.windows * self.buckets):
+            self._epochs[cell] = 0
+            self._reqs[cell] = 0
+            self._toks[cell] = 0
+        return slot
+
+    def _window(self, slot: int, w: int, limit: Limit, now: float, advance: bool) -> Tuple[int, int, int, int]:
+        """(requests, tokens, current cell, oldest live epoch) for one window."""
+        width = limit.window_seconds / self.buckets
+        epoch = int(now // width) + 1  # 0 marks an unused bucket
+        start = (slot * self.windows + w) * self.buckets
+        current = start + epoch % self.buckets
+        if advance and self._epochs[current] != epoch:
+            self._epochs[current] = epoch
+            self._reqs[current] = 0
+            self._toks[current] = 0
+        stop = start + self.buckets
+        low = epoch - self.buckets
+        live = [i for i, e in enumerate(self._epochs[start:stop].tolist()) if low < e <= epoch]
+        reqs, toks = self._reqs[start:stop].tolist(), self._toks[start:stop].tolist()
+        requests = sum(reqs[i] for i in live)
+        tokens = sum(toks[i] for i in live)
+        oldest = min((self._epochs[start + i] for i in live), default=epoch)
+        return requests, tokens, current, oldest
+
+    # -- public API -----------------------------------------------------------
+
+    def admit(self, principals: Sequence[Tuple[str, str]], tokens: int, now: Optional[float] = None) -> None:
+        """
+        Counts one request of ~`tokens` for every (kind, id) principal, or
+        raises QuotaExceeded without counting anything if any is over a limit.
+        """
+        now = time.time() if now is None else now
+        entries = [(kind, pid, self._hash(f"{kind}:{pid}")) for kind, pid in principals if pid]
+        stripes = sorted({h % self.stripes for _, _, h in entries})
+        self._lock(stripes)
+        try:
+            self.checks += 1
+            pending = []
+            for kind, pid, h in entries:
+                slot = self._slot(h % self.stripes, h, int(now), create=True)
+                self._seen[slot] = int(now)
+                for w, limit in enumerate(self.limits.get(kind, ())):
+                    used_requests, used_tokens, cell, oldest = self._window(slot, w, limit, now, advance=True)
+                    if (limit.requests is not None and used_requests + 1 > limit.requests) or (
+                        limit.tokens is not None and used_tokens + tokens > limit.tokens
+                    ):
+                        self.rejected += 1
+                        width = limit.window_seconds / self.buckets
+                        raise QuotaExceeded(f"{kind} {pid}", limit, (oldest - 1 + self.buckets) * width - now)
+                    pending.append(cell)
+            for cell in pending:
+                self._reqs[cell] += 1
+                self._toks[cell] += tokens
+        finally:
+            self._unlock(stripes)
+
+    def settle(self, principals: Sequence[Tuple[str, str]], tokens: int, now: Optional[float] = None) -> None:
+        """Adds (or, if negative, gives back) tokens after the response is known."""
+        if not tokens:
+            return
+        now = time.time() if now is None else now
+        entries = [(kind, self._hash(f"{kind}:{pid}")) for kind, pid in principals if pid]
+        stripes = sorted({h % self.stripes for _, h in entries})
+        self._lock(stripes)
+        try:
+            for kind, h in entries:
+                slot = self._slot(h % self.stripes, h, int(now), create=False)
+                if slot is None:
+                    continue
+                for w, limit in enumerate(self.limits.get(kind, ())):
+                    _, _, cell, _ = self._window(slot, w, limit, now, advance=True)
+                    self._toks[cell] = self._toks[cell] + tokens
+        finally:
+            self._unlock(stripes)
+
+    def usage(self, kind: str, principal_id: str, now: Optional[float] = None) -> List[Dict[str, Optional[int]]]:
+        """Current usage of one principal in each of its windows."""
+        now = time.time() if now is None else now
+        h = self._hash(f"{kind}:{principal_id}")
+        stripe = h % self.stripes
+        self._lock([stripe])
+        try:
+            slot = self._slot(stripe, h, int(now), create=False)
+            result = []
+            for w, limit in enumerate(self.limits.get(kind, ())):
+                used = self._window(slot, w, limit, now, advance=False)[:2] if slot is not None else (0, 0)
+                result.append({**limit.describe(), "used_requests": used[0], "used_tokens": max(0, used[1])})
+            return result
+        finally:
+            self._unlock([stripe])
+
+    def stats(self) -> Dict[str, object]:
+        """This worker's counters plus the shared table's size."""
+        return {
+            "path": self.path,
+            "checks": self.checks,
+            "rejected": self.rejected,
+            "capacity": self.stripes * self.slots,
+            "limits": {kind: [l.describe() for l in limits] for kind, limits in self.limits.items()},
+        }
+
+    def close(self) -> None:
+        for name in ("_keys", "_seen", "_epochs", "_reqs", "_toks"):
+            getattr(self, name).release()
+        self._mm.close()
+        os.close(self._fd)
@@ -0,0 +1,205 @@
+"""
+Next-chapter recommendations from saga completion data.
+
+Offline, completed `saga_progress` rows become a sparse binary
+student x chapter/topic matrix. Item-item co-completion counts come from
+one sparse product X^T X (computed in row blocks to bound memory), are
+turned into shrunk cosine similarities, and only the top-k neighbours of
+each item are kept. Serving a student then only reads the neighbour rows
+of the chapters they completed - no matrix work at request time.
+
+The neighbour table persists as one .npz (no pickle); build it with
+app/cli/build_recommender.py and point RECOMMENDER_PATH at it.
+"""
+import json
+import os
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def item_key(value: str) -> str:
+    """Normalized chapter/topic key shared by training data and lookups."""
+    return " ".join(str(value).lower().split())
+
+
+def completion_matrix(students: Sequence, items: Sequence):
+    """
+    Binary CSR matrix of completions.
+
+    Returns:
+        (matrix, item_names) where rows are students and columns are
+        item_names in first-seen order.
+    """
+    student_codes, _ = pd.factorize(pd.Series(students), sort=False)
+    item_codes, item_names = pd.factorize(pd.Series([item_key(i) for i in items]), sort=False)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(item_codes), dtype=np.float32), (student_codes, item_codes)),
+        shape=(int(student_codes.max()) + 1 if len(student_codes) else 0, len(item_names)),
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1.0
+    return matrix, [str(name) for name in item_names]
+
+
+def build_neighbors(
+    students: Sequence,
+    items: Sequence,
+    k: int = 20,
+    shrinkage: float = 10.0,
+    min_support: int = 2,
+    block_size: int = 1024,
+) -> "ChapterRecommender":
+    """
+    Fits the top-k item-item neighbour table.
+
+    Args:
+        students: Student id per completion record.
+        items: Completed chapter id or topic per record (same length).
+        k: Neighbours kept per item.
+        shrinkage: Damps similarities backed by few co-completions
+            (sim *= co / (co + shrinkage)).
+        min_support: Minimum co-completions for a pair to count.
+        block_size: Items per X^T X block.
+    """
+    matrix, names = completion_matrix(students, items)
+    n_items = len(names)
+    counts = np.asarray(matrix.getnnz(axis=0), dtype=np.float64)
+    neighbors = np.full((n_items, k), -1, dtype=np.int32)
+    scores = np.zeros((n_items, k), dtype=np.float32)
+    by_item = matrix.T.tocsr()
+
+    for start in range(0, n_items, block_size):
+        stop = min(start + block_size, n_items)
+        co = (by_item[start:stop] @ matrix).tocoo()
+        rows, cols, together = co.row + start, co.col, co.data.astype(np.float64)
+        keep = (rows != cols) & (together >= min_support)
+        rows, cols, together = rows[keep], cols[keep], together[keep]
+        sims = together / np.sqrt(counts[rows] * counts[cols]) * (together / (together + shrinkage))
+        # Best first within each row, then keep each row's first k.
+        order = np.lexsort((cols, -sims, rows))
+        rows, cols, sims = rows[order], cols[order], sims[order]
+        first = np.searchsorted(rows, rows, side="left")
+        rank = np.arange(len(rows)) - first
+        top = rank < k
+        neighbors[rows[top], rank[top]] = cols[top]
+        scores[rows[top], rank[top]] = sims[top]
+
+    return ChapterRecommender(names, neighbors, scores, counts.astype(np.int64), students=matrix.shape[0])
+
+
+class ChapterRecommender:
+    """
+    Serves "next best chapter" from a precomputed neighbour table.
+    """
+
+    def __init__(
+        self,
+        items: List[str],
+        neighbors: np.ndarray,
+        scores: np.ndarray,
+        counts: np.ndarray,
+        students: int = 0,
+    ) -> None:
+        self.items = items
+        self.neighbors = neighbors
+        self.scores = scores
+        self.counts = counts
+        self.students = students
+        self._index = {name: i for i, name in enumerate(items)}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, item: str) -> bool:
+        return item_key(item) in self._index
+
+    def recommend(
+        self,
+        completed: Iterable[str],
+        limit: int = 5,
+        exclude: Iterable[str] = (),
+        min_score: float = 0.0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Chapters to do next, best first.
+
+        Each candidate scores the sum of its similarity to the completed
+        chapters. Completed chapters the table has never seen are ignored;
+        an empty list means the recommender has nothing to say (cold start
+        or long tail) and the caller should fall back to generation.
+        """
+        done = {self._index[key] for key in map(item_key, completed) if key in self._index}
+        if not done or limit <= 0:
+            return []
+        known = np.fromiter(done, dtype=np.int64)
+        ids = self.neighbors[known].ravel()
+        sims = self.scores[known].ravel()
+        valid = ids >= 0
+        totals = np.bincount(ids[valid], weights=sims[valid], minlength=len(self.items))
+        blocked = known.tolist() + [self._index[key] for key in map(item_key, exclude) if key in self._index]
+        totals[blocked] = 0.0
+        candidates = np.flatnonzero(totals > min_score)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-totals[candidates], limit - 1)[:limit]]
+        order = candidates[np.lexsort((candidates, -totals[candidates]))]
+        return [{"topic": self.items[i], "score": round(float(totals[i]), 4)} for i in order]
+
+    def similar(self, item: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Nearest neighbours of one chapter/topic."""
+        i = self._index.get(item_key(item))
+        if i is None:
+            return []
+        return [
+            {"topic": self.items[j], "score": round(float(s), 4)}
+            for j, s in zip(self.neighbors[i][:limit], self.scores[i][:limit])
+            if j >= 0
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        filled = int((self.neighbors >= 0).sum())
+        return {
+            "items": len(self.items),
+            "students": self.students,
+            "neighbors_per_item": int(self.neighbors.shape[1]) if self.neighbors.ndim == 2 else 0,
+            "neighbor_fill": round(filled / self.neighbors.size, 3) if self.neighbors.size else None,
+            "table_bytes": int(self.neighbors.nbytes + self.scores.nbytes),
+        }
+
+    def save(self, path: str) -> None:
+        """Writes the neighbour table atomically to `path` (.npz)."""
+        header = json.dumps({"items": self.items, "students": self.students})
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    header=np.frombuffer(header.encode("utf-8"), dtype=np.uint8),
+                    neighbors=self.neighbors,
+                    scores=self.scores,
+                    counts=self.counts,
+                )
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path: str) -> "ChapterRecommender":
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(bytes(data["header"]).decode("utf-8"))
+            return cls(header["items"], data["neighbors"], data["scores"], data["counts"], header["students"])
+
+
+def load_recommender(path: Optional[str]) -> Optional[ChapterRecommender]:
+    """The neighbour table at `path`, or None when it is not configured/built yet."""
+    if not path or not os.path.exists(path):
+        return None
+    recommender = ChapterRecommender.load(path)
+    print(f"✅ Loaded chapter recommender with {len(recommender)} chapters/topics")
+    return recommender
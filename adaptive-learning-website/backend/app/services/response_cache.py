@@ -0,0 +1,101 @@
+"""
+In-process TTL + LRU cache for generated AI responses.
+
+Entries written speculatively (prefetch) are tagged, so the cache can tell
+how many of them were later served ("prefetch hits") and how many expired or
+were evicted unread ("wasted" generations).
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache with a per-entry TTL. max_entries=0 disables it:
+    puts are dropped and every get is a miss.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 3600.0) -> None:
+        self._entries: "OrderedDict[Hashable, Dict[str, Any]]" = OrderedDict()
+        self._max_entries = max_entries
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.prefetch_hits = 0
+        self.prefetch_stored = 0
+        self.prefetch_wasted = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry["expires"] > time.monotonic()
+
+    def _drop(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        if entry["prefetched"] and not entry["read"]:
+            self.prefetch_wasted += 1
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires"] <= time.monotonic():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if entry["prefetched"] and not entry["read"]:
+                self.prefetch_hits += 1
+            entry["read"] = True
+            return entry["value"]
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def put(self, key: Hashable, value: Any, prefetched: bool = False) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = {
+                "value": value,
+                "expires": time.monotonic() + self._ttl,
+                "prefetched": prefetched,
+                "read": False,
+            }
+            if prefetched:
+                self.prefetch_stored += 1
+            while len(self._entries) > self._max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "prefetch_stored": self.prefetch_stored,
+                "prefetch_hits": self.prefetch_hits,
+                "prefetch_wasted": self.prefetch_wasted,
+                "prefetch_hit_rate": (
+                    round(self.prefetch_hits / self.prefetch_stored, 4) if self.prefetch_stored else None
+                ),
+            }
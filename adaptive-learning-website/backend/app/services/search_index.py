@@ -0,0 +1,364 @@
+"""
+In-process BM25 search over generated courses and lessons.
+
+Documents get increasing internal ids as they are added, so each term's
+posting list is append-only and stored as doc-id gaps (delta encoding) in
+the narrowest unsigned array that fits (uint8 -> uint16 -> uint32, widened
+only when a larger gap shows up), with term frequencies alongside. Queries
+decode a posting list with one numpy cumsum and score with BM25 over
+weighted fields (title > description > body).
+
+Re-adding a document id replaces it: the old internal id is tombstoned and
+skipped at query time. snapshot()/load() persist the whole index as one
+.npz file (no pickle). Periodic snapshots run on a background thread, and
+only one process at a time (the holder of an flock on <path>.lock) writes
+snapshot_path, so workers sharing SEARCH_INDEX_PATH do not overwrite each
+other.
+
+Each worker indexes what it generates itself. Content generated by the
+others reaches it through the shared content store: every worker indexes new
+store entries on load and on refresh (GeminiService.index_stored). The
+snapshot records how far that went (synced_through).
+"""
+import fcntl
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+FIELD_WEIGHTS = {"title": 3, "description": 2, "body": 1}
+SNIPPET_CHARS = 200
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the this to was "
+    "were what when which will with you your can do does".split()
+)
+_WIDER = {"B": "H", "H": "I"}
+_LIMITS = {"B": 0xFF, "H": 0xFFFF, "I": 0xFFFFFFFF}
+_CODES = {1: "B", 2: "H", 4: "I"}
+
+
+def _stem(token: str) -> str:
+    # Light plural folding only; aggressive stemming hurts short technical queries.
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(t) for t in _TOKEN.findall((text or "").lower()) if t not in _STOPWORDS]
+
+
+class _Postings:
+    """Append-only (doc gap, tf) list for one term."""
+
+    __slots__ = ("gaps", "tfs", "last")
+
+    def __init__(self) -> None:
+        self.gaps = array("B")
+        self.tfs = array("H")
+        self.last = -1
+
+    def append(self, doc: int, tf: int) -> None:
+        gap = doc - self.last if self.last >= 0 else doc
+        if gap > _LIMITS[self.gaps.typecode]:
+            code = self.gaps.typecode
+            while gap > _LIMITS[code]:
+                code = _WIDER[code]
+            self.gaps = array(code, self.gaps)
+        self.gaps.append(gap)
+        self.tfs.append(min(tf, 0xFFFF))
+        self.last = doc
+
+    def decode(self) -> Tuple[np.ndarray, np.ndarray]:
+        gaps = np.frombuffer(self.gaps, dtype=np.dtype(self.gaps.typecode))
+        return np.cumsum(gaps, dtype=np.int64), np.frombuffer(self.tfs, dtype=np.uint16)
+
+    @property
+    def nbytes(self) -> int:
+        return self.gaps.itemsize * len(self.gaps) + self.tfs.itemsize * len(self.tfs)
+
+
+class SearchIndex:
+    """
+    Thread-safe BM25 index with incremental adds and replace-by-id.
+    """
+
+    def __init__(
+        self,
+        k1: float = 1.2,
+        b: float = 0.75,
+        snapshot_path: Optional[str] = None,
+        snapshot_every: int = 50,
+    ) -> None:
+        self.k1 = k1
+        self.b = b
+        self.snapshot_path = snapshot_path
+        self.snapshot_every = snapshot_every
+        self._lock = threading.Lock()
+        # Serializes whole snapshots so an older one never replaces a newer one.
+        self._snapshot_lock = threading.Lock()
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._writer_fd: Optional[int] = None
+        self._postings: Dict[str, _Postings] = {}
+        self._lengths = array("f")
+        self._alive = array("B")
+        self._kinds = array("B")
+        self._kind_codes: Dict[str, int] = {}
+        self._docs: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, int] = {}
+        self._total_length = 0.0
+        self.adds_since_snapshot = 0
+        # created_at of the newest content store entry indexed so far.
+        self.synced_through = 0.0
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def add(self, doc_id: str, title: str, description: str = "", body: str = "", kind: str = "lesson",
+            topic: str = "", source: str = "") -> None:
+        """
+        Indexes a document, replacing any earlier version with the same id.
+        source identifies the indexed content (e.g. its content store hash).
+        """
+        tf: Dict[str, int] = {}
+        length = 0
+        for field, text in (("title", title), ("description", description), ("body", body)):
+            weight = FIELD_WEIGHTS[field]
+            for token in tokenize(text):
+                tf[token] = tf.get(token, 0) + weight
+                length += weight
+        meta = {
+            "id": doc_id,
+            "kind": kind,
+            "title": title,
+            "topic": topic,
+            "snippet": " ".join((description or body or "").split())[:SNIPPET_CHARS],
+            "source": source,
+        }
+        with self._lock:
+            previous = self._by_id.get(doc_id)
+            if previous is not None:
+                self._alive[previous] = 0
+                self._total_length -= self._lengths[previous]
+            internal = len(self._docs)
+            self._docs.append(meta)
+            self._lengths.append(float(length))
+            self._alive.append(1)
+            self._kinds.append(self._kind_codes.setdefault(kind, len(self._kind_codes)))
+            self._by_id[doc_id] = internal
+            self._total_length += length
+            for token, count in tf.items():
+                postings = self._postings.get(token)
+                if postings is None:
+                    postings = self._postings[token] = _Postings()
+                postings.append(internal, count)
+            self.adds_since_snapshot += 1
+
+    def source(self, doc_id: str) -> Optional[str]:
+        """The source a live document was indexed from, or None if it is not indexed."""
+        with self._lock:
+            internal = self._by_id.get(doc_id)
+            return None if internal is None else self._docs[internal].get("source", "")
+
+    def add_course(self, doc_id: str, course: Dict[str, Any], topic: str = "", source: str = "") -> None:
+        """Indexes a generated course: title, description, modules and lessons."""
+        parts: List[str] = []
+        for module in course.get("modules") or []:
+            parts += [module.get("title") or "", module.get("description") or ""]
+            for lesson in module.get("lessons") or []:
+                parts += [lesson.get("title") or "", lesson.get("content") or ""]
+        self.add(doc_id, course.get("title") or topic, course.get("description") or "", "\n".join(parts),
+                 kind="course", topic=topic, source=source)
+
+    def search(self, query: str, limit: int = 10, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Top documents for the query by BM25, best first.
+
+        Args:
+            query: Free text; tokenized like the documents.
+            limit: Max results.
+            kind: Only 'course' or 'lesson' documents when given.
+
+        Returns:
+            Document metadata dicts with a `score` field.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            n_docs = len(self._docs)
+            live = len(self._by_id)
+            if not terms or not live:
+                return []
+            avg_len = max(self._total_length / live, 1e-9)
+            lengths = np.frombuffer(self._lengths, dtype=np.float32, count=n_docs)
+            alive = np.frombuffer(self._alive, dtype=np.uint8, count=n_docs)
+            # Dense accumulator: a term lists each doc at most once, so fancy-index += is exact.
+            acc = np.zeros(n_docs, dtype=np.float32)
+            matched = False
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                docs, tfs = postings.decode()
+                df = len(docs)
+                idf = math.log(1.0 + (live - df + 0.5) / (df + 0.5))
+                tf = tfs.astype(np.float32)
+                norm = self.k1 * (1.0 - self.b + self.b * lengths[docs] / avg_len)
+                acc[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+                matched = True
+            if not matched:
+                return []
+            ids = np.flatnonzero(acc)
+            scores = acc[ids]
+            keep = alive[ids] == 1
+            if kind is not None:
+                kinds = np.frombuffer(self._kinds, dtype=np.uint8, count=n_docs)
+                keep &= kinds[ids] == self._kind_codes.get(kind, -1)
+            ids, scores = ids[keep], scores[keep]
+            if len(ids) > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+                ids, scores = ids[top], scores[top]
+            order = np.argsort(-scores, kind="stable")
+            return [{**self._docs[ids[i]], "score": round(float(scores[i]), 4)} for i in order]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            postings = sum(len(p.tfs) for p in self._postings.values())
+            stored = sum(p.nbytes for p in self._postings.values())
+            return {
+                "documents": len(self._by_id),
+                "tombstoned": len(self._docs) - len(self._by_id),
+                "terms": len(self._postings),
+                "postings": postings,
+                "postings_bytes": stored,
+                # vs. uint32 doc ids + uint32 tfs without delta encoding
+                "postings_compression": round(8 * postings / stored, 2) if stored else None,
+                "adds_since_snapshot": self.adds_since_snapshot,
+            }
+
+    # -- persistence ----------------------------------------------------------
+
+    def snapshot(self, path: str) -> None:
+        """
+        Writes the index atomically to `path` (.npz). The index lock is held
+        only while the arrays are copied, not while the file is written.
+        """
+        with self._snapshot_lock:
+            with self._lock:
+                terms = list(self._postings)
+                counts = np.array([len(self._postings[t].tfs) for t in terms], dtype=np.int64)
+                widths = np.array([self._postings[t].gaps.itemsize for t in terms], dtype=np.uint8)
+                gaps = np.frombuffer(b"".join(self._postings[t].gaps.tobytes() for t in terms), dtype=np.uint8)
+                tfs = np.concatenate(
+                    [np.frombuffer(self._postings[t].tfs, dtype=np.uint16) for t in terms]
+                ) if terms else np.zeros(0, dtype=np.uint16)
+                lengths = np.array(self._lengths, dtype=np.float32)
+                alive = np.array(self._alive, dtype=np.uint8)
+                docs = list(self._docs)
+                pending = self.adds_since_snapshot
+                synced_through = self.synced_through
+            header = json.dumps(
+                {"k1": self.k1, "b": self.b, "terms": terms, "docs": docs, "synced_through": synced_through}
+            )
+            arrays = {
+                "header": np.frombuffer(header.encode("utf-8"), dtype=np.uint8),
+                "counts": counts,
+                "widths": widths,
+                "gaps": gaps,
+                "tfs": tfs,
+                "lengths": lengths,
+                "alive": alive,
+            }
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=directory, suffix=".npz.tmp")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, **arrays)
+                os.replace(tmp, path)
+            except BaseException:
+                os.unlink(tmp)
+                raise
+            with self._lock:
+                self.adds_since_snapshot -= pending
+
+    def _is_writer(self) -> bool:
+        """Whether this process holds (or just took) the snapshot_path writer lock."""
+        if self._writer_fd is None:
+            fd = os.open(f"{self.snapshot_path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            self._writer_fd = fd
+        return True
+
+    def _snapshot_quietly(self) -> None:
+        try:
+            self.snapshot(self.snapshot_path)
+        except Exception as exc:
+            print(f"⚠️ Search index snapshot failed: {exc}")
+
+    def maybe_snapshot(self, force: bool = False, background: bool = False) -> bool:
+        """
+        Snapshots to snapshot_path once enough adds piled up (or when forced),
+        if this process is the path's writer. With background=True the write
+        runs on a thread (at most one at a time) and this returns at once.
+        """
+        if self.snapshot_path is None or self.adds_since_snapshot == 0:
+            return False
+        if not force and self.adds_since_snapshot < self.snapshot_every:
+            return False
+        if not self._is_writer():
+            return False
+        if not background:
+            self.snapshot(self.snapshot_path)
+            return True
+        if self._snapshot_thread is not None and self._snapshot_thread.is_alive():
+            return False
+        self._snapshot_thread = threading.Thread(target=self._snapshot_quietly, name="search-snapshot", daemon=True)
+        self._snapshot_thread.start()
+        return True
+
+    def wait_for_snapshot(self, timeout: Optional[float] = None) -> None:
+        """Blocks until a background snapshot in progress has finished."""
+        thread = self._snapshot_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    @classmethod
+    def load(cls, path: str, **kwargs: Any) -> "SearchIndex":
+        with np.load(path, allow_pickle=False) as data:
+            header = json.loads(bytes(data["header"]).decode("utf-8"))
+            counts, widths, gaps, tfs = data["counts"], data["widths"], data["gaps"], data["tfs"]
+            lengths, alive = data["lengths"], data["alive"]
+            index = cls(k1=header["k1"], b=header["b"], **kwargs)
+            index._docs = header["docs"]
+            index.synced_through = float(header.get("synced_through", 0.0))
+            index._lengths = array("f", lengths.tobytes())
+            index._alive = array("B", alive.tobytes())
+            index._by_id = {doc["id"]: i for i, doc in enumerate(index._docs) if alive[i]}
+            for doc in index._docs:
+                index._kinds.append(index._kind_codes.setdefault(doc["kind"], len(index._kind_codes)))
+            index._total_length = float(lengths[alive == 1].sum())
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+            byte_offsets = np.concatenate([[0], np.cumsum(counts * widths)])
+            raw = gaps.tobytes()
+            for i, term in enumerate(header["terms"]):
+                postings = _Postings()
+                postings.gaps = array(_CODES[int(widths[i])], raw[byte_offsets[i]:byte_offsets[i + 1]])
+                postings.tfs = array("H", tfs[offsets[i]:offsets[i + 1]].tobytes())
+                postings.last = int(postings.decode()[0][-1]) if postings.gaps else -1
+                index._postings[term] = postings
+        return index
@@ -0,0 +1,205 @@
+"""
+Server-side state for multi-turn Socratic tutoring sessions.
+
+Each session keeps the topic, a rolling synopsis of older turns and a window
+of recent turns. After every turn the oldest turns are folded into the
+synopsis (extractively: the first sentence of each), and the synopsis itself
+is trimmed from the front, so the prompt stays under a fixed token budget no
+matter how long the session runs.
+
+Sessions live in an LRU store with an idle TTL, a session cap and a total
+memory cap; whichever is hit first evicts the least recently used sessions.
+"""
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+
+# Rough English token estimate; good enough for budgeting prompts.
+CHARS_PER_TOKEN = 4
+
+SOCRATIC_INSTRUCTIONS = (
+    "Act as a Socratic tutor. Do NOT give the final answer. Respond with one or two "
+    "guiding questions that build on what the student just said and push them to think."
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _first_sentence(text: str, limit: int = 160) -> str:
+    text = " ".join(text.split())
+    match = re.match(r"(.+?[.?!])(\s|$)", text)
+    sentence = match.group(1) if match else text
+    return sentence if len(sentence) <= limit else sentence[:limit - 1].rstrip() + "…"
+
+
+class SocraticSession:
+    """One tutoring conversation: topic, rolling synopsis and recent turns."""
+
+    def __init__(
+        self,
+        topic: str,
+        prompt_budget: int = 1500,
+        synopsis_budget: int = 300,
+        session_id: Optional[str] = None,
+    ) -> None:
+        self.session_id = session_id or uuid.uuid4().hex
+        self.topic = topic
+        self.prompt_budget = prompt_budget
+        self.synopsis_budget = synopsis_budget
+        self.synopsis: List[str] = []
+        self.turns: Deque[Tuple[str, str]] = deque()
+        self.turn_count = 0
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+
+    @property
+    def size_bytes(self) -> int:
+        return (
+            len(self.topic)
+            + sum(len(line) for line in self.synopsis)
+            + sum(len(text) for _, text in self.turns)
+        )
+
+    def _fixed_prompt(self, student_message: str) -> str:
+        return f"{SOCRATIC_INSTRUCTIONS}\n\nTOPIC: {self.topic}\n\nSTUDENT: {student_message}\nTUTOR:"
+
+    def build_prompt(self, student_message: str) -> str:
+        """Prompt for the next tutor turn, within the token budget."""
+        parts = [f"{SOCRATIC_INSTRUCTIONS}\n\nTOPIC: {self.topic}"]
+        if self.synopsis:
+            parts.append("CONVERSATION SO FAR (summary):\n" + "\n".join(self.synopsis))
+        if self.turns:
+            parts.append("RECENT TURNS:\n" + "\n".join(f"{role.upper()}: {text}" for role, text in self.turns))
+        parts.append(f"STUDENT: {student_message}\nTUTOR:")
+        return "\n\n".join(parts)
+
+    def record_turn(self, student_message: str, tutor_reply: str) -> None:
+        self.turns.append(("student", student_message))
+        self.turns.append(("tutor", tutor_reply))
+        self.turn_count += 1
+        self.last_active = time.monotonic()
+        self._compact()
+
+    def _compact(self) -> None:
+        # Room for recent turns: whatever the fixed parts and synopsis leave,
+        # keeping headroom for a student message of similar size.
+        fixed = estimate_tokens(self._fixed_prompt("")) + self.synopsis_budget
+        window_budget = max(0, (self.prompt_budget - fixed) // 2)
+        window = sum(estimate_tokens(text) + 3 for _, text in self.turns)
+        while window > window_budget and self.turns:
+            role, text = self.turns.popleft()
+            window -= estimate_tokens(text) + 3
+            self.synopsis.append(f"- {role}: {_first_sentence(text)}")
+        # Rolling synopsis: drop the oldest lines beyond its budget.
+        total = sum(estimate_tokens(line) + 1 for line in self.synopsis)
+        while total > self.synopsis_budget and self.synopsis:
+            total -= estimate_tokens(self.synopsis.pop(0)) + 1
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "topic": self.topic,
+            "turns": self.turn_count,
+            "recent_turns": len(self.turns),
+            "synopsis_lines": len(self.synopsis),
+            "size_bytes": self.size_bytes,
+        }
+
+
+class SocraticSessionStore:
+    """
+    Thread-safe LRU of sessions with idle TTL, session cap and memory cap.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 1800.0,
+        max_sessions: int = 2000,
+        max_bytes: int = 32 * 1024 * 1024,
+        prompt_budget: int = 1500,
+        synopsis_budget: int = 300,
+    ) -> None:
+        self._sessions: "OrderedDict[str, SocraticSession]" = OrderedDict()
+        # Last measured size per session, so the memory cap check is O(1).
+        self._sizes: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.prompt_budget = prompt_budget
+        self.synopsis_budget = synopsis_budget
+        self.evicted_ttl = 0
+        self.evicted_capacity = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, topic: str) -> SocraticSession:
+        session = SocraticSession(topic, self.prompt_budget, self.synopsis_budget)
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._resize(session)
+            self._evict()
+        return session
+
+    def get(self, session_id: str) -> Optional[SocraticSession]:
+        with self._lock:
+            self._evict()
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_active = time.monotonic()
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def touch(self, session: SocraticSession) -> None:
+        """Re-check caps after a session grew."""
+        with self._lock:
+            if session.session_id in self._sessions:
+                self._sessions.move_to_end(session.session_id)
+                self._resize(session)
+            self._evict()
+
+    def drop(self, session_id: str) -> None:
+        with self._lock:
+            if self._sessions.pop(session_id, None) is not None:
+                self._bytes -= self._sizes.pop(session_id, 0)
+
+    def _resize(self, session: SocraticSession) -> None:
+        size = session.size_bytes
+        self._bytes += size - self._sizes.get(session.session_id, 0)
+        self._sizes[session.session_id] = size
+
+    def _pop_oldest(self) -> None:
+        session_id, _ = self._sessions.popitem(last=False)
+        self._bytes -= self._sizes.pop(session_id, 0)
+
+    def _evict(self) -> None:
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if oldest.last_active >= cutoff:
+                break
+            self._pop_oldest()
+            self.evicted_ttl += 1
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            self._pop_oldest()
+            self.evicted_capacity += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict()
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "max_sessions": self.max_sessions,
+                "max_bytes": self.max_bytes,
+                "evicted_ttl": self.evicted_ttl,
+                "evicted_capacity": self.evicted_capacity,
+            }
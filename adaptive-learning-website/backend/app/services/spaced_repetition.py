@@ -0,0 +1,334 @@
+"""
+Spaced-repetition scheduling (SM-2) for quiz items.
+
+Review state for every (student, item) card lives in parallel NumPy arrays
+(ease, interval, repetitions, lapses, due, last review) that grow by
+doubling, so a million cards cost a few tens of MB instead of a dict each.
+
+Two indexes keep the hot queries logarithmic:
+
+- per student, a sorted list of (due, card) so "next N due cards" is a
+  bisect plus a slice;
+- globally, a min-heap of (earliest due, student) with lazy invalidation, so
+  "students with overdue reviews" walks the heap best-first and touches only
+  the entries it returns (plus stale ones).
+
+Grades use the SM-2 0-5 scale; a grade below 3 is a lapse.
+"""
+import hashlib
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+DAY_SECONDS = 86_400
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+PASSING_GRADE = 3
+
+
+def item_id_for(question: str, correct_answer: str = "") -> str:
+    """Stable id for a generated quiz question, so re-generated duplicates share a card."""
+    digest = hashlib.sha1(f"{question.strip()}\x00{correct_answer.strip()}".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def is_correct_answer(item: Dict[str, Any], answer: str) -> bool:
+    """Whether `answer` is the item's correct option (case and spacing ignored)."""
+    correct = " ".join(str(item.get("correctAnswer", "")).split()).casefold()
+    return bool(correct) and " ".join((answer or "").split()).casefold() == correct
+
+
+def sm2(
+    ease: np.ndarray,
+    interval: np.ndarray,
+    reps: np.ndarray,
+    grade: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized SM-2 step. Returns (ease, interval_days, reps, lapsed).
+    """
+    grade = np.clip(grade, 0, 5).astype(np.float64)
+    lapsed = grade < PASSING_GRADE
+    new_reps = np.where(lapsed, 0, reps + 1)
+    grown = np.maximum(1.0, np.round(interval * ease))
+    new_interval = np.where(new_reps <= 1, 1.0, np.where(new_reps == 2, 6.0, grown))
+    miss = 5 - grade
+    new_ease = np.maximum(MIN_EASE, ease + 0.1 - miss * (0.08 + miss * 0.02))
+    return new_ease, new_interval, new_reps, lapsed
+
+
+class SpacedRepetitionScheduler:
+    """
+    Cards, quiz items and due indexes for all students. Thread-safe.
+
+    Grading an unknown item raises RuntimeError; register items first.
+    """
+
+    def __init__(self, initial_cards: int = 1024) -> None:
+        self._lock = threading.Lock()
+        self._students: Dict[str, int] = {}
+        self._student_ids: List[str] = []
+        self._items: Dict[str, int] = {}
+        self._item_ids: List[str] = []
+        self._item_content: List[Optional[Dict[str, Any]]] = []
+        self._cards: Dict[Tuple[int, int], int] = {}
+        self._size = 0
+        self._alloc(initial_cards)
+        # Per-student [(due, card)] sorted; global lazy heap of (min due, student).
+        self._queues: List[List[Tuple[int, int]]] = []
+        self._heap: List[Tuple[int, int]] = []
+
+    def _alloc(self, capacity: int) -> None:
+        self.student = np.zeros(capacity, dtype=np.int32)
+        self.item = np.zeros(capacity, dtype=np.int32)
+        self.ease = np.full(capacity, INITIAL_EASE, dtype=np.float32)
+        self.interval = np.zeros(capacity, dtype=np.float32)
+        self.reps = np.zeros(capacity, dtype=np.int16)
+        self.lapses = np.zeros(capacity, dtype=np.int16)
+        self.due = np.zeros(capacity, dtype=np.int64)
+        self.last_review = np.zeros(capacity, dtype=np.int64)
+
+    def _grow(self, needed: int) -> None:
+        capacity = len(self.due)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ("student", "item", "ease", "interval", "reps", "lapses", "due", "last_review"):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            if name == "ease":
+                new[:] = INITIAL_EASE
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def __len__(self) -> int:
+        return self._size
+
+    # -- ids -----------------------------------------------------------
+
+    def _student_index(self, student_id: str) -> int:
+        idx = self._students.get(student_id)
+        if idx is None:
+            idx = self._students[student_id] = len(self._student_ids)
+            self._student_ids.append(student_id)
+            self._queues.append([])
+        return idx
+
+    def _item_index(self, item_id: str, content: Optional[Dict[str, Any]] = None) -> int:
+        idx = self._items.get(item_id)
+        if idx is None:
+            idx = self._items[item_id] = len(self._item_ids)
+            self._item_ids.append(item_id)
+            self._item_content.append(content)
+        elif content is not None and self._item_content[idx] is None:
+            self._item_content[idx] = content
+        return idx
+
+    # -- due index -----------------------------------------------------
+
+    def _reindex(self, card: int, old_due: Optional[int]) -> None:
+        s = int(self.student[card])
+        queue = self._queues[s]
+        before = queue[0][0] if queue else None
+        if old_due is not None:
+            pos = bisect_left(queue, (old_due, card))
+            if pos < len(queue) and queue[pos] == (old_due, card):
+                del queue[pos]
+        insort(queue, (int(self.due[card]), card))
+        if queue[0][0] != before:
+            heapq.heappush(self._heap, (queue[0][0], s))
+        # Drop stale heap entries once they dominate.
+        if len(self._heap) > 2 * len(self._queues) + 1024:
+            self._heap = [(q[0][0], i) for i, q in enumerate(self._queues) if q]
+            heapq.heapify(self._heap)
+
+    # -- writes --------------------------------------------------------
+
+    def _card(self, s: int, i: int, now_s: int) -> int:
+        """The card for (student, item), created due now if missing."""
+        card = self._cards.get((s, i))
+        if card is None:
+            card = self._size
+            self._grow(card + 1)
+            self._size += 1
+            self._cards[(s, i)] = card
+            self.student[card], self.item[card] = s, i
+            self.due[card] = now_s
+            self._reindex(card, None)
+        return card
+
+    def register_items(
+        self,
+        student_id: str,
+        items: Sequence[Dict[str, Any]],
+        now: Optional[float] = None,
+    ) -> List[str]:
+        """
+        Add quiz items ({question, options, correctAnswer, ...}) as new cards
+        due immediately. Returns their item ids; existing cards are untouched.
+        """
+        now_s = int(now if now is not None else time.time())
+        ids: List[str] = []
+        with self._lock:
+            s = self._student_index(student_id)
+            for content in items:
+                item_id = content.get("item_id") or item_id_for(
+                    str(content.get("question", "")), str(content.get("correctAnswer", ""))
+                )
+                ids.append(item_id)
+                i = self._item_index(item_id, {**content, "item_id": item_id})
+                self._card(s, i, now_s)
+        return ids
+
+    def grade_many(
+        self,
+        student_ids: Sequence[str],
+        item_ids: Sequence[str],
+        grades: Sequence[int],
+        now: Optional[float] = None,
+        create: bool = True,
+    ) -> int:
+        """
+        Apply a batch of review grades (0-5) in order. Cards are created on
+        first grade unless `create` is False, in which case every graded
+        item must already be on that student's schedule. Returns the number
+        of grades applied.
+        """
+        if not len(student_ids):
+            return 0
+        now_s = int(now if now is not None else time.time())
+        with self._lock:
+            unknown = [iid for iid in item_ids if iid not in self._items]
+            if not create:
+                unknown += [
+                    iid for sid, iid in zip(student_ids, item_ids)
+                    if iid in self._items
+                    and (self._students.get(str(sid)), self._items[iid]) not in self._cards
+                ]
+            if unknown:
+                raise RuntimeError(f"Unknown quiz item: {unknown[0]}")
+            cards = np.empty(len(student_ids), dtype=np.int64)
+            for n, (sid, iid) in enumerate(zip(student_ids, item_ids)):
+                i = self._items[iid]
+                cards[n] = self._card(self._student_index(str(sid)), i, now_s)
+            grades_arr = np.asarray(grades, dtype=np.int64)
+
+            # Repeated cards in one batch are applied in rounds, in order.
+            order = np.argsort(cards, kind="stable")
+            sorted_cards = cards[order]
+            new_group = np.r_[True, sorted_cards[1:] != sorted_cards[:-1]]
+            group_start = np.flatnonzero(new_group)[np.cumsum(new_group) - 1]
+            ranks = np.empty_like(cards)
+            ranks[order] = np.arange(len(cards)) - group_start
+            for r in range(int(ranks.max()) + 1):
+                sel = cards[ranks == r]
+                old_due = self.due[sel].copy()
+                ease, interval, reps, lapsed = sm2(
+                    self.ease[sel], self.interval[sel], self.reps[sel], grades_arr[ranks == r]
+                )
+                self.ease[sel] = ease
+                self.interval[sel] = interval
+                self.reps[sel] = reps
+                self.lapses[sel] += lapsed.astype(np.int16)
+                self.last_review[sel] = now_s
+                self.due[sel] = now_s + (interval * DAY_SECONDS).astype(np.int64)
+                for card, due in zip(sel.tolist(), old_due.tolist()):
+                    self._reindex(card, due)
+        return len(cards)
+
+    # -- queries -------------------------------------------------------
+
+    def get_item(self, item_id: str) -> Optional[Dict[str, Any]]:
+        """The stored content of a registered quiz item, or None."""
+        with self._lock:
+            idx = self._items.get(item_id)
+            content = self._item_content[idx] if idx is not None else None
+        return dict(content) if content is not None else None
+
+    def _card_dict(self, card: int) -> Dict[str, Any]:
+        content = self._item_content[int(self.item[card])] or {}
+        return {
+            **content,
+            "item_id": self._item_ids[int(self.item[card])],
+            "due": int(self.due[card]),
+            "interval_days": float(self.interval[card]),
+            "ease": round(float(self.ease[card]), 3),
+            "repetitions": int(self.reps[card]),
+            "lapses": int(self.lapses[card]),
+        }
+
+    def due_cards(
+        self,
+        student_id: str,
+        limit: int = 20,
+        now: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """The student's next `limit` cards due at or before now, earliest first."""
+        now_s = int(now if now is not None else time.time())
+        with self._lock:
+            s = self._students.get(student_id)
+            if s is None:
+                return []
+            queue = self._queues[s]
+            end = min(bisect_right(queue, (now_s, float("inf"))), max(0, limit))
+            return [self._card_dict(card) for _, card in queue[:end]]
+
+    def due_count(self, student_id: str, now: Optional[float] = None) -> int:
+        now_s = int(now if now is not None else time.time())
+        with self._lock:
+            s = self._students.get(student_id)
+            if s is None:
+                return 0
+            return bisect_right(self._queues[s], (now_s, float("inf")))
+
+    def overdue_students(
+        self,
+        now: Optional[float] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        Students with at least one review due at or before now, most overdue
+        first. Walks the due heap best-first and stops after `limit` students,
+        so the cost is O(limit log limit) plus any stale entries passed over.
+        """
+        now_s = int(now if now is not None else time.time())
+        found: List[Tuple[int, int]] = []
+        seen = set()
+        with self._lock:
+            heap = self._heap
+            frontier = [(heap[0], 0)] if heap else []
+            while frontier and len(found) < limit:
+                (due, s), pos = heapq.heappop(frontier)
+                if due > now_s:
+                    break
+                queue = self._queues[s]
+                # Stale entries point at a due the student no longer has first.
+                if s not in seen and queue and queue[0][0] == due:
+                    seen.add(s)
+                    found.append((s, due))
+                for child in (2 * pos + 1, 2 * pos + 2):
+                    if child < len(heap) and heap[child][0] <= now_s:
+                        heapq.heappush(frontier, (heap[child], child))
+            return [
+                {
+                    "student_id": self._student_ids[s],
+                    "oldest_due": due,
+                    "due_count": bisect_right(self._queues[s], (now_s, float("inf"))),
+                }
+                for s, due in found
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cards": self._size,
+                "students": len(self._student_ids),
+                "items": len(self._item_ids),
+                "heap_entries": len(self._heap),
+            }
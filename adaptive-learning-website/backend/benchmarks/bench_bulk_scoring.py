@@ -0,0 +1,45 @@
+"""
+Bulk scoring throughput at 1M synthetic students across worker counts.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_bulk_scoring [n_students]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from app.cli.score_students import score_students
+from app.mock_data import generate_mock_student_frame
+from app.services.predictor import predict_student_risk
+
+
+def main(n_students: int = 1_000_000) -> None:
+    frame = generate_mock_student_frame(n_students)
+
+    sample = frame.head(100_000)
+    started = time.perf_counter()
+    for row in sample.itertuples(index=False):
+        predict_student_risk(row.interactions, row.last_score, row.days_overdue)
+    per_row_rate = len(sample) / (time.perf_counter() - started)
+    print(f"per-row heuristic loop: {per_row_rate:,.0f} students/s")
+
+    cores = os.cpu_count() or 1
+    worker_counts = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "students.parquet")
+        frame.to_parquet(input_path, index=False)
+        baseline = None
+        for workers in worker_counts:
+            summary = score_students(input_path, os.path.join(tmp, f"scores-{workers}.parquet"), workers=workers)
+            rate = summary["students_per_second"]
+            baseline = baseline or rate
+            print(
+                f"workers={workers:<3} {summary['seconds']:7.2f} s  {rate:>12,.0f} students/s  "
+                f"speedup {rate / baseline:4.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
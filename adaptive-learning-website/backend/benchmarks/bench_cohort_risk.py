@@ -0,0 +1,47 @@
+"""
+Cohort risk index latency for a large organization.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_cohort_risk [n_students]
+"""
+import random
+import sys
+import time
+
+from app.services.cohort_risk import CohortRiskService
+
+
+def _per_call_us(fn, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main(n_students: int = 50_000) -> None:
+    rng = random.Random(42)
+    service = CohortRiskService()
+    students = [f"student-{i}" for i in range(n_students)]
+
+    started = time.perf_counter()
+    service.load_memberships({"organization_id": "org", "student_id": sid} for sid in students)
+    for sid in students:
+        service.update_student(sid, rng.randint(0, 30), rng.randint(0, 100), rng.choice([0, 0, 1, 3]))
+    print(f"build {n_students} students: {time.perf_counter() - started:.2f} s")
+
+    def update(i: int) -> None:
+        service.update_student(students[rng.randrange(n_students)], rng.randint(0, 30), rng.randint(0, 100), 0)
+
+    results = {
+        "single-student update": _per_call_us(update, 20_000),
+        "top-20": _per_call_us(lambda i: service.top("org", 20), 20_000),
+        "percentile": _per_call_us(lambda i: service.percentile("org", students[i % n_students]), 20_000),
+        "threshold >= 70": _per_call_us(lambda i: service.at_least("org", 70, limit=20), 20_000),
+    }
+    for name, us in results.items():
+        print(f"{name:<22} {us:8.1f} us/call")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50_000)
@@ -0,0 +1,105 @@
+"""
+Content store compression, dedup and lookup latency on a lesson-like corpus.
+
+Generates n lessons from shared templates (the way one prompt produces
+similar structure across topics), with a share of exact repeats across
+keys, then reports the compression ratio with plain zlib and with a
+dictionary trained on a sample, the dedup ratio, and lookup / full-read /
+range-read latency. Run from the backend directory:
+
+    python -m benchmarks.bench_content_store [n_lessons]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+from app.services.content_store import ContentStore, train_dictionary
+
+
+SUBJECTS = ["loops", "recursion", "sorting", "graphs", "hashing", "pointers", "SQL joins", "closures"]
+TEMPLATES = [
+    "## {t}\n\nImagine {t} like a {a}. Each step repeats until the goal is reached.\n\n"
+    "**Example:** {e}\n\n**Check your understanding:** What happens to {t} when the input is empty?",
+    "# Understanding {t}\n\nAt a standard university level, {t} is a core idea in computer science. "
+    "Key points:\n\n- Definition of {t}\n- When to use it\n- Common mistakes\n\nExample: {e}\n\n"
+    "Quick check: explain {t} in your own words.",
+    "### {t}: a deep dive\n\nThis comprehensive summary covers the theory behind {t}, its complexity "
+    "and trade-offs.\n\n1. Formal definition\n2. Complexity analysis\n3. Edge cases\n\n"
+    "**Challenge question:** design an algorithm that uses {t} to solve {e}",
+]
+ANALOGIES = ["recipe", "assembly line", "set of nesting dolls", "library index", "relay race"]
+
+
+def _per_call_us(fn, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def build_corpus(n: int, duplicate_rate: float = 0.2, seed: int = 3):
+    rng = random.Random(seed)
+    lessons = []
+    for i in range(n):
+        if lessons and rng.random() < duplicate_rate:
+            lessons.append(rng.choice(lessons))
+            continue
+        topic = f"{rng.choice(SUBJECTS)} {i}"
+        lessons.append(rng.choice(TEMPLATES).format(
+            t=topic, a=rng.choice(ANALOGIES), e=f"case {rng.randint(1, 10_000)} with {rng.randint(2, 50)} items"
+        ))
+    return lessons
+
+
+def _load(path: str, lessons, dictionary: bytes = b"") -> ContentStore:
+    store = ContentStore(path)
+    if dictionary:
+        store.add_dictionary(dictionary)
+    for i, text in enumerate(lessons):
+        store.put(text, f"topic {i}", "lesson:standard", "gemini-1.5-flash", "1")
+    return store
+
+
+def main(n: int = 20_000) -> None:
+    lessons = build_corpus(n)
+    workdir = tempfile.mkdtemp(prefix="content_store_bench_")
+
+    started = time.perf_counter()
+    plain = _load(os.path.join(workdir, "plain.db"), lessons)
+    put_us = (time.perf_counter() - started) / n * 1e6
+
+    started = time.perf_counter()
+    dictionary = train_dictionary((t.encode("utf-8") for t in lessons[:1000]), size=16 * 1024)
+    train_s = time.perf_counter() - started
+    trained = _load(os.path.join(workdir, "dict.db"), lessons, dictionary)
+
+    rng = random.Random(1)
+    keys = [rng.randrange(n) for _ in range(5000)]
+    lookup_us = _per_call_us(
+        lambda i: trained.lookup(f"topic {keys[i]}", "lesson:standard", "gemini-1.5-flash", "1"), len(keys)
+    )
+    get_us = _per_call_us(
+        lambda i: trained.get(f"topic {keys[i]}", "lesson:standard", "gemini-1.5-flash", "1"), len(keys)
+    )
+    big = trained.put("\n\n".join(lessons[:400]), "course", "course:deep", "gemini-1.5-flash", "1")
+    size = trained.info(big)["size"]
+    range_us = _per_call_us(lambda i: trained.read(big, (i * 997) % (size - 4096), (i * 997) % (size - 4096) + 4096), 2000)
+    full_us = _per_call_us(lambda i: trained.read(big), 200)
+
+    p, t = plain.stats(), trained.stats()
+    print(f"corpus: {n} lessons, {sum(len(x) for x in lessons) / 1e6:.1f} MB logical; dictionary trained in {train_s:.1f}s")
+    print(f"{'metric':<44}{'value':>12}")
+    print(f"{'dedup ratio (logical / unique bytes)':<44}{t['dedup_ratio']:>12}")
+    print(f"{'compression ratio, plain zlib':<44}{p['compression_ratio']:>12}")
+    print(f"{'compression ratio, trained dictionary':<44}{t['compression_ratio']:>12}")
+    print(f"{'put, us/lesson':<44}{put_us:>12.1f}")
+    print(f"{'lookup (index only), us':<44}{lookup_us:>12.1f}")
+    print(f"{'get (lookup + inflate), us':<44}{get_us:>12.1f}")
+    print(f"{'4 KiB range read of a {0} KiB blob, us'.format(size // 1024):<44}{range_us:>12.1f}")
+    print(f"{'full read of the same blob, us':<44}{full_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
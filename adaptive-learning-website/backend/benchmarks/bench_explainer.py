@@ -0,0 +1,59 @@
+"""
+Explanation latency versus plain inference.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_explainer
+"""
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from app.services.explainer import TreeExplainer
+
+
+def _best_ms(fn, repeats: int = 20) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return best
+
+
+def main() -> None:
+    rng = np.random.default_rng(42)
+    X = rng.integers(0, 20, size=(20_000, 12)).astype(np.float32)
+    y = rng.choice(["Distinction", "Pass", "Fail", "Withdrawn"], size=len(X))
+    # Same shape as the production forest: 300 trees, depth 10.
+    model = RandomForestClassifier(
+        n_estimators=300, max_depth=10, min_samples_split=4, min_samples_leaf=2, random_state=42, n_jobs=-1
+    ).fit(X, y)
+    model.set_params(n_jobs=1)
+
+    started = time.perf_counter()
+    explainer = TreeExplainer(model, [f"f{i}" for i in range(X.shape[1])])
+    print(f"precompute node arrays: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    row = X[:1]
+    cohort = X[:1000]
+    rows = {
+        "single row": (lambda: model.predict_proba(row), lambda: explainer.explain(row)),
+        "cohort of 1000": (lambda: model.predict_proba(cohort), lambda: explainer.explain(cohort)),
+    }
+    for label, (predict, explain) in rows.items():
+        predict_ms = _best_ms(predict)
+        explain_ms = _best_ms(explain, repeats=5)
+        print(
+            f"{label:<16} predict {predict_ms:8.2f} ms  explain {explain_ms:8.2f} ms  "
+            f"ratio {explain_ms / predict_ms:5.2f}x"
+        )
+
+    explainer.explain_row(X[0])
+    cached_ms = _best_ms(lambda: explainer.explain_row(X[0]))
+    print(f"cached single row explain: {cached_ms * 1000:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Leaderboard update, rank and top-k latency at 1M members.
+
+Loads n students with a long-tailed XP distribution, then compares the
+Fenwick-tree board with the current approach (a full scan of
+students.xp_points, here a numpy array) for rank-of-one and top-10.
+Also times XP events across the global, weekly and organization boards
+and snapshot save/load. Run from the backend directory:
+
+    python -m benchmarks.bench_leaderboard [n_members]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.leaderboard import WEEK, LeaderboardService
+
+
+def _per_call_us(fn, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main(n: int = 1_000_000) -> None:
+    rng = np.random.default_rng(3)
+    xp = rng.lognormal(7, 1.2, size=n).astype(np.int64)
+    ids = [f"student-{i}" for i in range(n)]
+
+    service = LeaderboardService()
+    started = time.perf_counter()
+    service.load_scores({"id": sid, "xp_points": int(x)} for sid, x in zip(ids, xp))
+    build_s = time.perf_counter() - started
+    for org in range(200):
+        service.set_members(f"org-{org}", ids[org * 250:(org + 1) * 250])
+
+    picks = rng.integers(0, n, size=20_000)
+    deltas = rng.integers(10, 500, size=20_000)
+    update_us = _per_call_us(lambda i: service.record_xp(ids[picks[i]], int(deltas[i])), len(picks))
+    rank_us = _per_call_us(lambda i: service.rank(ids[picks[i]]), 20_000)
+    top_us = _per_call_us(lambda i: service.top(10), 2_000)
+    deep_us = _per_call_us(lambda i: service.top(10, offset=int(picks[i] % 100_000)), 2_000)
+    week_us = _per_call_us(lambda i: service.top(10, window=WEEK), 2_000)
+    org_us = _per_call_us(lambda i: service.rank(ids[int(picks[i]) % 50_000], org_id=f"org-{int(picks[i]) % 50_000 // 250}"), 20_000)
+
+    scores = xp.copy()
+    scan_rank_us = _per_call_us(lambda i: int((scores > scores[picks[i]]).sum()) + 1, 200)
+    scan_top_us = _per_call_us(lambda i: np.argsort(-scores[np.argpartition(-scores, 10)[:10]]), 200)
+
+    path = os.path.join(tempfile.mkdtemp(prefix="leaderboard_bench_"), "boards.npz")
+    t0 = time.perf_counter()
+    service.snapshot(path)
+    save_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    LeaderboardService.load(path)
+    load_s = time.perf_counter() - t0
+
+    print(f"members: {n:,} (200 orgs of 250), bulk load {build_s:.1f}s")
+    print(f"{'operation':<44}{'fenwick us':>12}{'full scan us':>14}")
+    print(f"{'rank of one student (global)':<44}{rank_us:>12.1f}{scan_rank_us:>14.0f}")
+    print(f"{'top 10 (global)':<44}{top_us:>12.1f}{scan_top_us:>14.0f}")
+    print(f"{'10 at rank offset up to 100k':<44}{deep_us:>12.1f}{'':>14}")
+    print(f"{'top 10 this week':<44}{week_us:>12.1f}{'':>14}")
+    print(f"{'rank within an org':<44}{org_us:>12.1f}{'':>14}")
+    print(f"{'XP event (global + week + orgs)':<44}{update_us:>12.1f}{'':>14}")
+    print(f"snapshot: {os.path.getsize(path) / 1e6:.1f} MB, save {save_s:.2f}s, load {load_s:.2f}s")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
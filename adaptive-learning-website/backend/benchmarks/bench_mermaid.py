@@ -0,0 +1,146 @@
+"""
+Mermaid repair pass against a corpus of model-style mistakes.
+
+Builds valid flowchart / sequence / class diagrams, corrupts each one with
+the mistakes Gemini typically makes (prose around the fence, wrong arrows,
+unquoted parentheses, missing `end` / `}` / `:` / header, plus some output
+that no local fix can save), then compares the regeneration rate without
+repair (every invalid diagram is re-prompted) with the rate after repair.
+Run from the backend directory:
+
+    python -m benchmarks.bench_mermaid [n_diagrams]
+"""
+import random
+import sys
+import time
+
+from app.services.mermaid import repair_mermaid, validate_mermaid
+
+
+WORDS = ["Input", "Parse", "Validate", "Store", "Render", "Review", "Retry", "Done", "Cache", "Score"]
+
+
+def _flowchart(rng: random.Random) -> str:
+    n = rng.randint(4, 9)
+    lines = [f"flowchart {rng.choice(['TD', 'LR'])}"]
+    for i in range(1, n):
+        shape = rng.choice(["[{}]", "({})", "{{{}}}", "(({}))"])
+        label = shape.format(rng.choice(WORDS))
+        lines.append(f"  N{i - 1} --> N{i}{label}")
+    if rng.random() < 0.5:
+        lines[2:2] = ["  subgraph Stage"]
+        lines.append("  end")
+    return "\n".join(lines)
+
+
+def _sequence(rng: random.Random) -> str:
+    actors = ["Student", "Tutor", "Server"]
+    lines = ["sequenceDiagram"] + [f"  participant {a}" for a in actors]
+    for _ in range(rng.randint(3, 8)):
+        a, b = rng.sample(actors, 2)
+        lines.append(f"  {a}{rng.choice(['->>', '-->>'])}{b}: {rng.choice(WORDS).lower()} request")
+    if rng.random() < 0.5:
+        lines.insert(5, "  loop Every answer")
+        lines.append("  end")
+    return "\n".join(lines)
+
+
+def _class(rng: random.Random) -> str:
+    lines = ["classDiagram"]
+    names = rng.sample(WORDS, 4)
+    for name in names:
+        lines += [f"  class {name} {{", "    +String id", "    +run()", "  }"]
+    for a, b in zip(names, names[1:]):
+        lines.append(f"  {a} {rng.choice(['<|--', '*--', '-->', '..>'])} {b}")
+    return "\n".join(lines)
+
+
+def _replace_first(code: str, old: str, new: str) -> str:
+    return code.replace(old, new, 1)
+
+
+def _drop_last_line(code: str, closer: str) -> str:
+    lines = code.splitlines()
+    for i in range(len(lines) - 1, -1, -1):
+        if lines[i].strip() == closer:
+            del lines[i]
+            break
+    return "\n".join(lines)
+
+
+CORRUPTIONS = {
+    "flowchart": [
+        lambda c, r: _replace_first(c, "-->", "->"),
+        lambda c, r: _replace_first(c, "-->", "=>"),
+        lambda c, r: _replace_first(c, "]", " (draft)]"),
+        lambda c, r: c.replace("]", "", 1) if "]" in c else c + "\n  X --> Y[Start",
+        lambda c, r: _drop_last_line(c, "end") if "subgraph" in c else c.replace("-->", "-->>", 1),
+        lambda c, r: "\n".join(c.splitlines()[1:]),
+        lambda c, r: c + "\n  N0 --> ",
+        lambda c, r: c + "\n  then the student reviews it",
+    ],
+    "sequence": [
+        lambda c, r: c.replace(": ", " ", 1),
+        lambda c, r: _replace_first(c, "->>", "=>"),
+        lambda c, r: _replace_first(c, "->>", "--->"),
+        lambda c, r: _drop_last_line(c, "end") if "loop" in c else c + "\n  end",
+        lambda c, r: "\n".join(c.splitlines()[1:]),
+        lambda c, r: c + "\n  Tutor explains the answer",
+    ],
+    "class": [
+        lambda c, r: _drop_last_line(c, "}"),
+        lambda c, r: _replace_first(c, "  }\n  class", "  class"),
+        lambda c, r: c + "\n  Score -> Cache",
+        lambda c, r: c + "\n  }",
+        lambda c, r: "\n".join(c.splitlines()[1:]),
+        lambda c, r: c + "\n  Score has many Cache",
+    ],
+}
+
+BUILDERS = {"flowchart": _flowchart, "sequence": _sequence, "class": _class}
+WRAPPERS = [
+    lambda c: f"```mermaid\n{c}\n```",
+    lambda c: f"Here is your diagram:\n\n```mermaid\n{c}\n```\n\nIt shows the main steps.",
+    lambda c: c,
+    lambda c: f"```\n{c}\n```",
+]
+
+
+def build_corpus(n: int, corrupt_rate: float = 0.6, seed: int = 7):
+    rng = random.Random(seed)
+    corpus = []
+    kinds = list(BUILDERS)
+    for i in range(n):
+        kind = kinds[i % len(kinds)]
+        code = BUILDERS[kind](rng)
+        if rng.random() < corrupt_rate:
+            for _ in range(rng.choice([1, 1, 2])):
+                code = rng.choice(CORRUPTIONS[kind])(code, rng)
+        corpus.append((kind, rng.choice(WRAPPERS)(code)))
+    return corpus
+
+
+def main(n: int = 3000) -> None:
+    corpus = build_corpus(n)
+
+    started = time.perf_counter()
+    baseline_invalid = sum(1 for kind, text in corpus if validate_mermaid(text, kind))
+    validate_us = (time.perf_counter() - started) / n * 1e6
+
+    started = time.perf_counter()
+    results = [repair_mermaid(text, kind) for kind, text in corpus]
+    repair_us = (time.perf_counter() - started) / n * 1e6
+    repaired = sum(1 for r in results if r.valid and r.repaired)
+    still_invalid = sum(1 for r in results if not r.valid)
+
+    print(f"corpus: {n} diagrams (flowchart/sequence/class), ~60% with model-style mistakes")
+    print(f"{'metric':<40}{'value':>12}")
+    print(f"{'regeneration rate, validate only':<40}{baseline_invalid / n:>11.1%}")
+    print(f"{'regeneration rate, with local repair':<40}{still_invalid / n:>11.1%}")
+    print(f"{'repaired locally':<40}{repaired:>12}")
+    print(f"{'validate, us/diagram':<40}{validate_us:>12.1f}")
+    print(f"{'repair, us/diagram':<40}{repair_us:>12.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,75 @@
+"""
+Latency the offline library adds when it stands in for Gemini.
+
+Packs a synthetic library (lessons in all modes, a quiz and a diagram per
+topic), memory-maps it and times exact lookups, lookups that fall back to
+a neighbouring lesson mode, and closest-topic lookups (first sight and
+repeated). Run from the backend directory:
+
+    python -m benchmarks.bench_offline_library [n_topics]
+"""
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from app.services.offline_library import DIAGRAM, LESSON, QUIZ, OfflineLibrary, write_library
+from app.services.prefetch import LESSON_MODES
+
+SUBJECTS = ["python", "graphs", "sorting", "recursion", "databases", "networking", "statistics", "algebra"]
+ASPECTS = ["basics", "functions", "loops", "performance", "testing", "design", "patterns", "errors"]
+
+
+def _topic(i: int) -> str:
+    return f"{SUBJECTS[i % 8].title()} {ASPECTS[(i // 8) % 8]} part {i}"
+
+
+def _latencies_us(fn, queries):
+    timings = []
+    for query in queries:
+        t0 = time.perf_counter()
+        fn(query)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+
+def main(n_topics: int = 5000) -> None:
+    lesson = "A worked explanation with an example and a check question. " * 40
+    quiz = json.dumps([{"id": i, "question": "Q?", "options": ["a", "b", "c", "d"], "correctAnswer": "a"} for i in range(10)])
+    entries = []
+    for i in range(n_topics):
+        topic = _topic(i)
+        entries += [(LESSON, topic, mode, lesson) for mode in LESSON_MODES if not (i % 4 == 0 and mode == "deep_dive")]
+        entries += [(QUIZ, topic, "", quiz), (DIAGRAM, topic, "flowchart", "```mermaid\nflowchart TD\nA-->B\n```")]
+    path = os.path.join(tempfile.mkdtemp(prefix="offline_bench_"), "offline.bin")
+    started = time.perf_counter()
+    written = write_library(path, entries)
+    build_s = time.perf_counter() - started
+    started = time.perf_counter()
+    library = OfflineLibrary(path)
+    load_ms = (time.perf_counter() - started) * 1000
+    print(f"{written} entries, {os.path.getsize(path) / 2**20:.1f} MiB, packed in {build_s:.2f}s, opened in {load_ms:.1f} ms")
+
+    n = 2000
+    exact = [_topic(i * 7 % n_topics) for i in range(n)]
+    missing_mode = [_topic(i * 4 % n_topics) for i in range(n)]
+    fuzzy = [f"{ASPECTS[(j // 8) % 8]} of {SUBJECTS[j % 8]}, part {j}" for j in (i * 13 % n_topics for i in range(n))]
+    print(f"{'lookup':<40}{'p50 us':>10}{'p95 us':>10}")
+    for label, fn, queries in (
+        ("exact lesson, cold pages", lambda q: library.lookup(LESSON, q, "standard"), exact),
+        ("exact lesson, warm pages", lambda q: library.lookup(LESSON, q, "standard"), exact),
+        ("exact quiz (study_tool, parsed)", lambda q: library.study_tool("quiz", q, "standard", None, 5), exact),
+        ("lesson, neighbouring mode", lambda q: library.lookup(LESSON, q, "deep_dive"), missing_mode),
+        ("closest topic, first sight", lambda q: library.lookup(LESSON, q, "standard"), fuzzy),
+        ("closest topic, repeated", lambda q: library.lookup(LESSON, q, "standard"), fuzzy),
+    ):
+        p50, p95 = _latencies_us(fn, queries)
+        print(f"{label:<40}{p50:>10.1f}{p95:>10.1f}")
+    print(library.stats())
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,62 @@
+"""
+Per-request cost of sending a large course payload: serializing and
+gzipping it on every request vs. serving the stored precompressed bytes.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_payloads [n_modules]
+"""
+import gzip
+import json
+import sys
+import time
+
+from app.services.payloads import PayloadStore
+
+
+def _per_call_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def _course(n_modules: int) -> dict:
+    lesson = "Detailed lesson content with explanations, examples, and key takeaways. " * 6
+    return {
+        "course": {
+            "title": "Graph Theory",
+            "description": "A practical course.",
+            "difficulty": "intermediate",
+            "thumbnail_url": None,
+            "modules": [
+                {
+                    "title": f"Module {m}",
+                    "description": f"Module {m} description",
+                    "lessons": [{"title": f"Lesson {m}.{l}", "content": f"{lesson} ({m}.{l})"} for l in range(4)],
+                }
+                for m in range(n_modules)
+            ],
+        }
+    }
+
+
+def main(n_modules: int = 10) -> None:
+    document = _course(n_modules)
+    store = PayloadStore()
+    started = time.perf_counter()
+    encoded = store.put("course", document)
+    encode_ms = (time.perf_counter() - started) * 1000
+    n = 500
+    print(f"payload {len(encoded.identity) / 1024:.1f} KiB, gzip {len(encoded.gzip) / 1024:.1f} KiB, "
+          f"brotli {'%.1f KiB' % (len(encoded.br) / 1024) if encoded.br else 'n/a'}, one-time encode {encode_ms:.1f} ms")
+    print(f"{'per request':<44}{'us':>10}")
+    print(f"{'json.dumps every request':<44}{_per_call_us(lambda: json.dumps(document), n):>10.1f}")
+    print(f"{'json.dumps + gzip(6) every request':<44}"
+          f"{_per_call_us(lambda: gzip.compress(json.dumps(document).encode()), n):>10.1f}")
+    print(f"{'stored bytes (lookup + negotiate)':<44}"
+          f"{_per_call_us(lambda: store.get('course', encoded.id).select('gzip, deflate, br'), n):>10.1f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,64 @@
+"""
+Overhead of request tracing on the hot path.
+
+Times span() when the request is not sampled (the production default)
+and when it is, plus a full TraceMiddleware pass over a trivial ASGI app
+at sample rates 0 and 1. Run from the backend directory:
+
+    python -m benchmarks.bench_profiling [n_calls]
+"""
+import asyncio
+import sys
+import time
+
+from app.services.profiling import RequestTracer, Trace, TraceMiddleware, _current, span
+
+
+def _per_call_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def _enter_span() -> None:
+    with span("upstream"):
+        pass
+
+
+async def _app(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _send(message) -> None:
+    return None
+
+
+def _middleware_us(rate: float, n: int) -> float:
+    middleware = TraceMiddleware(_app, RequestTracer(sample_rate=rate))
+    scope = {"type": "http", "method": "GET", "path": "/api/student/status"}
+
+    async def run() -> float:
+        started = time.perf_counter()
+        for _ in range(n):
+            await middleware(scope, None, _send)
+        return (time.perf_counter() - started) / n * 1e6
+
+    return asyncio.run(run())
+
+
+def main(n: int = 200_000) -> None:
+    print(f"{'scenario':<40}{'us/call':>10}")
+    print(f"{'span(), request not sampled':<40}{_per_call_us(_enter_span, n):>10.3f}")
+    token = _current.set(Trace("GET", "/bench"))
+    try:
+        print(f"{'span(), request sampled':<40}{_per_call_us(_enter_span, n):>10.3f}")
+    finally:
+        _current.reset(token)
+    for rate in (0.0, 1.0):
+        print(f"{f'middleware, sample rate {rate:g}':<40}{_middleware_us(rate, n // 10):>10.3f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
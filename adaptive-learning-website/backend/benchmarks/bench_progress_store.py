@@ -0,0 +1,73 @@
+"""
+Throughput of saga completion storms: one write per completion vs batching.
+
+Fires n concurrent chapter completions (with next-chapter unlocks and XP)
+from many students at once, the way a class finishing a timed chapter
+does. The baseline commits each completion on its own through the same
+pool, like one complete_saga_chapter RPC per click. Batched runs go
+through ProgressWriter. Run from the backend directory:
+
+    python -m benchmarks.bench_progress_store [n_completions]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from functools import partial
+
+from app.services.progress_store import ConnectionPool, ProgressWriter
+
+
+def _completions(n: int):
+    students = max(1, n // 5)
+    return [(f"student-{i % students}", f"chapter-{i // students + 1}", 250) for i in range(n)]
+
+
+async def _timed(coro, latencies):
+    started = time.perf_counter()
+    await coro
+    latencies.append(time.perf_counter() - started)
+
+
+async def _storm(writer: ProgressWriter, n: int, one_by_one: bool):
+    latencies = []
+    ops = []
+    for student, chapter, xp in _completions(n):
+        next_chapter = f"chapter-{int(chapter.split('-')[1]) + 1}"
+        if one_by_one:
+            # One transaction per completion, still through the pool.
+            batch = [("complete", (student, chapter, xp, 10, next_chapter), None)]
+            ops.append(_timed(writer.pool.run(partial(writer._apply, batch=batch)), latencies))
+        else:
+            ops.append(_timed(writer.complete_chapter(student, chapter, xp, 10, next_chapter), latencies))
+    started = time.perf_counter()
+    await asyncio.gather(*ops)
+    elapsed = time.perf_counter() - started
+    await writer.close()
+    return elapsed, sorted(latencies)
+
+
+def _run(label: str, n: int, one_by_one: bool = False, **kwargs) -> None:
+    path = os.path.join(tempfile.mkdtemp(prefix="progress_bench_"), "progress.db")
+    writer = ProgressWriter(ConnectionPool(path, size=4), **kwargs)
+    elapsed, latencies = asyncio.run(_storm(writer, n, one_by_one))
+    stats = writer.stats()
+    batches = stats["batches"] if not one_by_one else n
+    print(
+        f"{label:<34}{n / elapsed:>12,.0f}{batches:>10,}"
+        f"{statistics.median(latencies) * 1000:>10.1f}{latencies[int(len(latencies) * 0.95)] * 1000:>10.1f}"
+    )
+
+
+def main(n: int = 20_000) -> None:
+    print(f"storm: {n:,} completions from {max(1, n // 5):,} students")
+    print(f"{'mode':<34}{'ops/s':>12}{'commits':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    _run("one commit per completion", n, one_by_one=True)
+    for interval_ms, batch in ((5, 500), (50, 500), (50, 2000)):
+        _run(f"batched, {interval_ms} ms / max {batch}", n, flush_interval=interval_ms / 1000, max_batch=batch)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
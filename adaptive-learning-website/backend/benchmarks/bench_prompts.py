@@ -0,0 +1,48 @@
+"""
+Prompt size and render cost per template, full vs. compact.
+
+Prints the estimated input tokens of each default template in both
+variants, and the cost of a registry render (including its token
+accounting) next to a bare str.format of the same prompt. Run from the backend directory:
+
+    python -m benchmarks.bench_prompts [n_renders]
+"""
+import sys
+import time
+
+from app.services.prompts import COURSE_PACE_INSTRUCTIONS, default_registry
+from app.services.socratic_sessions import estimate_tokens
+
+FIELDS = {
+    "course": {"topic": "Graph theory", "pace": "deep", "pace_instruction": COURSE_PACE_INSTRUCTIONS["deep"]},
+    "saga": {
+        "skill_level": "beginner",
+        "goals": "web_dev, data_science",
+        "pace": "moderate",
+        "interests": "games, music",
+        "learning_style": "interactive",
+    },
+    "quiz": {"num_questions": 5, "topic": "Python loops"},
+}
+
+
+def _per_call_us(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - started) / n * 1e6
+
+
+def main(n: int = 50_000) -> None:
+    registry = default_registry()
+    print(f"{'template':<10}{'full tok':>10}{'compact tok':>13}{'saved':>8}{'render us':>11}{'format us':>11}")
+    for name, fields in FIELDS.items():
+        template = registry.templates[name]
+        full, compact = (estimate_tokens(template.variants[v].render(fields)) for v in ("full", "compact"))
+        render_us = _per_call_us(lambda: registry.render(name, "bench", **fields), n)
+        format_us = _per_call_us(lambda: template.variants["full"].text.format(**fields), n)
+        print(f"{name:<10}{full:>10}{compact:>13}{1 - compact / full:>8.0%}{render_us:>11.2f}{format_us:>11.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
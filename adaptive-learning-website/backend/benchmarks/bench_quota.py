@@ -0,0 +1,70 @@
+"""
+Cost of the shared AI quota check per request.
+
+Times admit() for a student + org pair in one process (spread over many
+principals, and hammering a single hot org), then runs several worker
+processes against the same file to show throughput under cross-process
+contention. Run from the backend directory:
+
+    python -m benchmarks.bench_quota [n_checks]
+"""
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from app.services.quota import Limit, QuotaExceeded, SharedQuota
+
+
+LIMITS = {
+    "student": [Limit(60, requests=10**9), Limit(3600, tokens=10**15)],
+    "org": [Limit(60, requests=10**9), Limit(3600, tokens=10**15)],
+}
+
+
+def _latencies_us(quota: SharedQuota, n: int, students: int, orgs: int):
+    timings = []
+    for i in range(n):
+        principals = [("student", f"s{i % students}"), ("org", f"o{i % orgs}")]
+        t0 = time.perf_counter()
+        quota.admit(principals, 1200)
+        timings.append((time.perf_counter() - t0) * 1e6)
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.95)]
+
+
+def _worker(path: str, n: int, results) -> None:
+    quota = SharedQuota(path, LIMITS)
+    started = time.perf_counter()
+    for i in range(n):
+        try:
+            quota.admit([("student", f"s{os.getpid()}-{i % 500}"), ("org", "hot-org")], 1200)
+        except QuotaExceeded:
+            pass
+    results.put(n / (time.perf_counter() - started))
+
+
+def main(n: int = 50_000) -> None:
+    path = os.path.join(tempfile.mkdtemp(prefix="quota_bench_"), "quota.bin")
+    quota = SharedQuota(path, LIMITS)
+    print(f"{'scenario':<46}{'p50 us':>10}{'p95 us':>10}")
+    for label, students, orgs in (("10k students, 200 orgs", 10_000, 200), ("one student, one org", 1, 1)):
+        p50, p95 = _latencies_us(quota, n, students, orgs)
+        print(f"{label:<46}{p50:>10.1f}{p95:>10.1f}")
+
+    ctx = multiprocessing.get_context("fork")
+    for workers in (1, 4):
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(path, n // workers, results)) for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        for proc in procs:
+            proc.join()
+        rates = [results.get() for _ in procs]
+        print(f"{workers} worker(s) sharing one hot org: {sum(rates):,.0f} checks/s total")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,76 @@
+"""
+Chapter recommender build time and serving latency on synthetic sagas.
+
+Simulates students following one of several learning tracks (ordered topic
+sequences over a shared catalogue, with some off-track completions), stops
+at ~n completion records, builds the neighbour table and reports build
+time, table size, recommend() p50/p95 and hit@5 for each student's held-out
+next chapter against a most-popular baseline. Run from the backend
+directory:
+
+    python -m benchmarks.bench_recommender [n_records]
+"""
+import statistics
+import sys
+import time
+
+import numpy as np
+
+from app.services.recommender import build_neighbors
+
+
+N_TOPICS = 2000
+N_TRACKS = 60
+TRACK_LENGTH = 40
+
+
+def build_records(n: int, seed: int = 5):
+    rng = np.random.default_rng(seed)
+    tracks = [rng.choice(N_TOPICS, size=TRACK_LENGTH, replace=False) for _ in range(N_TRACKS)]
+    students, items, held_out = [], [], {}
+    student = 0
+    while len(items) < n:
+        track = tracks[rng.integers(N_TRACKS)]
+        done = int(rng.integers(3, TRACK_LENGTH))
+        completed = [f"topic {t}" for t in track[:done]]
+        completed += [f"topic {t}" for t in rng.choice(N_TOPICS, size=int(rng.integers(0, 4)))]
+        students += [student] * len(completed)
+        items += completed
+        held_out[student] = (completed[:done], f"topic {track[done]}")
+        student += 1
+    return np.array(students), np.array(items), held_out
+
+
+def main(n: int = 1_000_000) -> None:
+    students, items, held_out = build_records(n)
+    started = time.perf_counter()
+    recommender = build_neighbors(students, items, k=20)
+    build_s = time.perf_counter() - started
+    stats = recommender.stats()
+
+    rng = np.random.default_rng(1)
+    sample = rng.choice(len(held_out), size=2000, replace=False)
+    popular = [recommender.items[i] for i in np.argsort(-recommender.counts)]
+    timings, hits, baseline = [], 0, 0
+    for s in sample:
+        completed, target = held_out[int(s)]
+        keys = set(completed)
+        t0 = time.perf_counter()
+        picks = recommender.recommend(completed, limit=5)
+        timings.append(time.perf_counter() - t0)
+        hits += target in {p["topic"] for p in picks}
+        baseline += target in [p for p in popular if p not in keys][:5]
+    ordered = sorted(timings)
+
+    print(f"corpus: {len(items):,} completions, {stats['students']:,} students, {stats['items']:,} topics")
+    print(f"{'metric':<44}{'value':>12}")
+    print(f"{'build (matrix + X^T X + top-k), s':<44}{build_s:>12.2f}")
+    print(f"{'neighbour table KB':<44}{stats['table_bytes'] / 1024:>12.0f}")
+    print(f"{'recommend p50, us':<44}{statistics.median(ordered) * 1e6:>12.0f}")
+    print(f"{'recommend p95, us':<44}{ordered[int(len(ordered) * 0.95)] * 1e6:>12.0f}")
+    print(f"{'hit@5 next chapter, item-item':<44}{hits / len(sample):>12.2f}")
+    print(f"{'hit@5 next chapter, most popular':<44}{baseline / len(sample):>12.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,80 @@
+"""
+BM25 search index build time, postings size and query latency.
+
+Indexes n synthetic lessons whose words follow a Zipf distribution (a few
+very common terms, a long tail of rare ones), then reports build rate,
+postings compression vs. uncompressed uint32 (doc, tf) pairs, query
+p50/p95 for one- to three-term queries and snapshot save/load time.
+Run from the backend directory:
+
+    python -m benchmarks.bench_search_index [n_docs]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.search_index import SearchIndex
+
+
+VOCABULARY = 50_000
+
+
+def _words(rng: np.random.Generator, count: int) -> list:
+    ranks = np.minimum(rng.zipf(1.15, size=count), VOCABULARY)
+    return [f"w{r}" for r in ranks]
+
+
+def _percentiles_us(samples) -> tuple:
+    ordered = sorted(samples)
+    return statistics.median(ordered) * 1e6, ordered[int(len(ordered) * 0.95)] * 1e6
+
+
+def main(n: int = 100_000) -> None:
+    rng = np.random.default_rng(7)
+    index = SearchIndex()
+    started = time.perf_counter()
+    for i in range(n):
+        index.add(
+            f"lesson:{i}",
+            " ".join(_words(rng, 4)),
+            " ".join(_words(rng, 15)),
+            " ".join(_words(rng, 120)),
+            kind="course" if i % 10 == 0 else "lesson",
+        )
+    build_s = time.perf_counter() - started
+
+    print(f"corpus: {n} documents, built in {build_s:.1f}s ({n / build_s:,.0f} docs/s)")
+    stats = index.stats()
+    print(f"{'metric':<44}{'value':>12}")
+    print(f"{'terms':<44}{stats['terms']:>12,}")
+    print(f"{'postings':<44}{stats['postings']:>12,}")
+    print(f"{'postings MB':<44}{stats['postings_bytes'] / 1e6:>12.1f}")
+    print(f"{'compression vs uint32 (doc, tf)':<44}{stats['postings_compression']:>12}")
+
+    for terms in (1, 2, 3):
+        queries = [" ".join(_words(rng, terms)) for _ in range(500)]
+        timings = []
+        for query in queries:
+            t0 = time.perf_counter()
+            index.search(query, limit=10)
+            timings.append(time.perf_counter() - t0)
+        p50, p95 = _percentiles_us(timings)
+        print(f"{f'{terms}-term query p50 / p95, us':<44}{p50:>6.0f} / {p95:<6.0f}")
+
+    path = os.path.join(tempfile.mkdtemp(prefix="search_bench_"), "search.npz")
+    t0 = time.perf_counter()
+    index.snapshot(path)
+    save_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    SearchIndex.load(path)
+    load_s = time.perf_counter() - t0
+    print(f"{'snapshot MB':<44}{os.path.getsize(path) / 1e6:>12.1f}")
+    print(f"{'snapshot save / load, s':<44}{save_s:>6.2f} / {load_s:<6.2f}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,73 @@
+"""
+Spaced-repetition scheduler at realistic scale.
+
+Builds n_students x items_per_student cards, ingests a day of grades in bulk
+batches, then times the due-queue queries. Run from the backend directory:
+
+    python -m benchmarks.bench_spaced_repetition [n_students] [items_per_student]
+"""
+import sys
+import time
+
+import numpy as np
+
+from app.services.spaced_repetition import DAY_SECONDS, SpacedRepetitionScheduler
+
+
+NOW = 1_700_000_000
+
+
+def _per_call_us(fn, calls: int) -> float:
+    started = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - started) / calls * 1e6
+
+
+def main(n_students: int = 20_000, items_per_student: int = 50) -> None:
+    rng = np.random.default_rng(42)
+    srs = SpacedRepetitionScheduler(initial_cards=n_students * items_per_student)
+    students = [f"student-{i}" for i in range(n_students)]
+    items = [
+        {"question": f"Question {i}?", "options": ["a", "b", "c", "d"], "correctAnswer": "a"}
+        for i in range(items_per_student * 4)
+    ]
+
+    started = time.perf_counter()
+    for n, sid in enumerate(students):
+        offset = (n * 7) % (len(items) - items_per_student)
+        srs.register_items(sid, items[offset:offset + items_per_student], now=NOW)
+    item_ids = srs._item_ids
+    print(f"register {len(srs):,} cards: {time.perf_counter() - started:.2f} s")
+
+    # Two days of reviews in 10k-grade batches.
+    batch = 10_000
+    started = time.perf_counter()
+    graded = 0
+    for day in range(2):
+        for _ in range(len(srs) // batch // 4):
+            cards = rng.integers(0, len(srs), batch)
+            srs.grade_many(
+                [students[s] for s in srs.student[cards]],
+                [item_ids[i] for i in srs.item[cards]],
+                rng.integers(0, 6, batch).tolist(),
+                now=NOW + day * DAY_SECONDS,
+            )
+            graded += batch
+    seconds = time.perf_counter() - started
+    print(f"grade {graded:,} reviews: {seconds:.2f} s ({graded / seconds:,.0f} grades/s)")
+
+    check = NOW + 3 * DAY_SECONDS
+    results = {
+        "next 20 due (student)": _per_call_us(lambda i: srs.due_cards(students[i % n_students], 20, now=check), 20_000),
+        "due count (student)": _per_call_us(lambda i: srs.due_count(students[i % n_students], now=check), 20_000),
+        "first 100 overdue students": _per_call_us(lambda i: srs.overdue_students(now=NOW + 60, limit=100), 200),
+    }
+    for name, us in results.items():
+        print(f"{name:<28} {us:10.1f} us/call")
+    print(srs.stats())
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
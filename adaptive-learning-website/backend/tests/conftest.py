@@ -0,0 +1,78 @@
+"""
+Shared fixtures for the backend tests
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from backend.app.services.auth import sign_access_token
+from backend.app.services.gemini import GeminiService
+
+
+QUIZ_REPLY = json.dumps([{"id": 1, "question": "Q?", "options": ["a", "b"], "correctAnswer": "a"}])
+DIAGRAM_REPLY = "```mermaid\nflowchart TD\n  A --> B\n```"
+
+
+class FakeGeminiModel:
+    """
+    Stands in for a Gemini model and records every prompt.
+
+    Replies come from `replies` in order, then `text` if given, else a
+    quiz, a diagram or "lesson #<n>" depending on what the prompt asks for.
+    """
+
+    def __init__(self, replies=None, text=None, fail_with: str = "") -> None:
+        self.prompts = []
+        self.replies = list(replies or [])
+        self.text = text
+        self.fail_with = fail_with
+
+    async def generate_content_async(self, prompt):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0)
+        if self.fail_with:
+            raise Exception(self.fail_with)
+        if self.replies:
+            text = self.replies.pop(0)
+        elif self.text is not None:
+            text = self.text
+        elif "multiple-choice" in prompt:
+            text = QUIZ_REPLY
+        elif "Mermaid" in prompt:
+            text = DIAGRAM_REPLY
+        else:
+            text = f"lesson #{len(self.prompts)}"
+        return type("Response", (), {"text": text})()
+
+
+@pytest.fixture
+def student_headers(monkeypatch):
+    """Builds Authorization headers for a signed-in student (AUTH_JWT_SECRET is set)."""
+    monkeypatch.setenv("AUTH_JWT_SECRET", "test-jwt-secret")
+
+    def headers(student_id: str, organization_id: str | None = None) -> dict:
+        claims = {"sub": student_id, "aud": "authenticated", "exp": int(time.time()) + 3600}
+        if organization_id:
+            claims["app_metadata"] = {"organization_id": organization_id}
+        return {"Authorization": f"Bearer {sign_access_token(claims, 'test-jwt-secret')}"}
+
+    return headers
+
+
+@pytest.fixture
+def fake_gemini(monkeypatch):
+    """
+    Builds a GeminiService (prefetch off unless asked) whose model calls all
+    go to a FakeGeminiModel: fake_gemini(replies=..., text=..., fail_with=...,
+    model=..., **service_kwargs) -> (service, model).
+    """
+
+    def make(replies=None, text=None, fail_with="", model=None, **service_kwargs):
+        model = model or FakeGeminiModel(replies, text, fail_with)
+        service = GeminiService(**{"prefetch": False, **service_kwargs})
+        monkeypatch.setattr(service, "_get_model", lambda model_id=None: model)
+        return service, model
+
+    return make
@@ -0,0 +1,37 @@
+"""
+Tests for access-token verification
+"""
+import pytest
+
+from backend.app.services.auth import AuthError, identity_from_claims, sign_access_token, verify_access_token
+
+
+NOW = 1_700_000_000
+CLAIMS = {"sub": "student-1", "aud": "authenticated", "exp": NOW + 60, "app_metadata": {"organization_id": "org-1"}}
+
+
+def test_valid_token_yields_the_student_and_org():
+    claims = verify_access_token(sign_access_token(CLAIMS, "s3cret"), "s3cret", now=NOW)
+
+    identity = identity_from_claims(claims)
+    assert (identity.student_id, identity.organization_id) == ("student-1", "org-1")
+
+
+@pytest.mark.parametrize("token, secret, now", [
+    (sign_access_token(CLAIMS, "s3cret"), "other", NOW),
+    (sign_access_token(CLAIMS, "s3cret"), "s3cret", NOW + 3600),
+    (sign_access_token({**CLAIMS, "aud": "anon"}, "s3cret"), "s3cret", NOW),
+    (sign_access_token({**CLAIMS, "sub": ""}, "s3cret"), "s3cret", NOW),
+    ("not-a-token", "s3cret", NOW),
+])
+def test_rejects_forged_expired_and_malformed_tokens(token, secret, now):
+    with pytest.raises(AuthError):
+        verify_access_token(token, secret, now=now)
+
+
+def test_tampered_claims_fail_the_signature():
+    header, _, signature = sign_access_token(CLAIMS, "s3cret").split(".")
+    forged = sign_access_token({**CLAIMS, "sub": "someone-else"}, "s3cret").split(".")[1]
+
+    with pytest.raises(AuthError):
+        verify_access_token(f"{header}.{forged}.{signature}", "s3cret", now=NOW)
@@ -0,0 +1,98 @@
+"""
+Tests for mentor bulk precomputation of assigned study content
+"""
+import asyncio
+
+from backend.app.services.bulk_generation import BulkGenerationService
+
+
+def _setup(fake_gemini, fail_with=""):
+    service, model = fake_gemini(fail_with=fail_with)
+    return service, model, BulkGenerationService(service, concurrency=2)
+
+
+def test_bulk_job_precomputes_everything_students_ask_for(fake_gemini):
+    service, model, bulk = _setup(fake_gemini)
+
+    async def scenario():
+        job = bulk.submit("org-1", ["Loops", " loops ", "Recursion"])
+        await bulk.drain()
+        generated = len(model.prompts)
+        # Students across the class: every tool is served from the assigned cache.
+        for difficulty in (10, 50, 90):
+            await service.generate_study_tool("explain", topic="loops", difficulty=difficulty)
+        quiz = await service.generate_study_tool("quiz", topic="Recursion")
+        diagram = await service.generate_study_tool("visualize", topic="Loops", diagram_type="flowchart")
+        return job, generated, quiz, diagram
+
+    job, generated, quiz, diagram = asyncio.run(scenario())
+    # 2 distinct topics x (3 lesson variants + quiz + flowchart)
+    assert generated == 10 and len(model.prompts) == 10
+    described = job.describe()
+    assert described["status"] == "completed" and described["progress"] == 1.0
+    assert described["generated"] == 10 and described["topics"] == ["Loops", "Recursion"]
+    assert quiz[2][0]["question"] == "Q?"
+    assert diagram[1].startswith("```mermaid")
+    assert service.assigned_cache.stats()["hits"] == 5
+
+    async def resubmit():
+        again = bulk.submit("org-2", ["Loops"])
+        await bulk.drain()
+        return again
+
+    again = asyncio.run(resubmit())
+    assert again.describe()["already_cached"] == 5 and len(model.prompts) == 10
+    assert bulk.get("org-1", again.job_id) is None and bulk.get("org-2", again.job_id) is again
+
+
+def test_bulk_job_stops_when_quota_runs_out(fake_gemini):
+    service, model, bulk = _setup(fake_gemini, fail_with="429 Resource has been exhausted (quota)")
+
+    async def scenario():
+        job = bulk.submit("org-1", ["Loops", "Recursion", "Graphs"])
+        await bulk.drain()
+        return job
+
+    job = asyncio.run(scenario())
+    described = job.describe()
+    assert described["status"] == "failed" and described["failed"] == 15
+    # The first failures abort the batch instead of burning through every unit.
+    assert len(model.prompts) <= 2
+    assert "quota" in described["errors"][0]
+
+
+def test_bulk_units_are_charged_to_the_org_quota(fake_gemini, tmp_path):
+    from backend.app.services.quota import Limit, SharedQuota
+
+    service, model, _ = _setup(fake_gemini)
+    quota = SharedQuota(str(tmp_path / "quota.bin"), {"org": [Limit(60, requests=7)]})
+    bulk = BulkGenerationService(service, concurrency=1, quota=quota)
+
+    async def scenario():
+        job = bulk.submit("org-1", ["Loops", "Recursion"])
+        await bulk.drain()
+        return job
+
+    described = asyncio.run(scenario()).describe()
+    # 10 units against 7 requests a minute: the org's limit stops the batch.
+    assert described["status"] == "failed" and described["generated"] == 7
+    assert len(model.prompts) == 7 and "AI usage limit" in described["errors"][0]
+    assert quota.usage("org", "org-1")[0]["requests"] == 7
+
+
+def test_failed_units_give_their_reservation_back(fake_gemini, tmp_path):
+    from backend.app.services.quota import Limit, SharedQuota
+
+    service, model, _ = _setup(fake_gemini, fail_with="upstream exploded")
+    quota = SharedQuota(str(tmp_path / "quota.bin"), {"org": [Limit(60, requests=100, tokens=100000)]})
+    bulk = BulkGenerationService(service, concurrency=1, quota=quota)
+
+    async def scenario():
+        job = bulk.submit("org-1", ["Loops"])
+        await bulk.drain()
+        return job
+
+    described = asyncio.run(scenario()).describe()
+    assert described["failed"] == 5 and described["generated"] == 0
+    usage = quota.usage("org", "org-1")[0]
+    assert usage["used_requests"] == 5 and usage["used_tokens"] == 0
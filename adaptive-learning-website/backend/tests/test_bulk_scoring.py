@@ -0,0 +1,78 @@
+"""
+Tests for the bulk risk-scoring CLI
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from backend.app.cli.score_students import score_students
+from backend.app.mock_data import generate_mock_student_frame
+from backend.app.services.predictor import predict_student_risk, predict_student_risk_batch
+
+
+def test_vectorized_risk_matches_scalar_heuristic():
+    frame = generate_mock_student_frame(2000, seed=1)
+    batch = predict_student_risk_batch(
+        frame["interactions"].to_numpy(), frame["last_score"].to_numpy(), frame["days_overdue"].to_numpy()
+    )
+    scalar = [
+        predict_student_risk(r.interactions, r.last_score, r.days_overdue)
+        for r in frame.itertuples(index=False)
+    ]
+    assert batch.tolist() == scalar
+
+
+def test_score_students_streams_chunks_in_order(tmp_path):
+    frame = generate_mock_student_frame(2500, seed=2)
+    input_path = tmp_path / "students.csv"
+    frame.to_csv(input_path, index=False)
+    output_path = tmp_path / "scores.parquet"
+
+    summary = score_students(str(input_path), str(output_path), chunksize=400, workers=2)
+
+    scores = pd.read_parquet(output_path)
+    assert scores["student_id"].tolist() == frame["student_id"].tolist()
+    assert summary["students"] == 2500
+    assert sum(summary["risk_bands"].values()) == 2500
+    with open(tmp_path / "scores.summary.json") as f:
+        assert json.load(f)["students"] == 2500
+
+
+def test_batch_final_result_matches_single_predictions(monkeypatch):
+    from sklearn.tree import DecisionTreeClassifier
+
+    from backend.app.services import predictor
+    from backend.app.services.model_artifact import CATEGORICAL_FEATURES, FEATURE_COLUMNS, ModelArtifact
+
+    # Only default-valued students (module AAA, no disability) pass.
+    defaults = predictor.build_feature_row(0, 0)
+    encoders = {col: [defaults[col]] for col in CATEGORICAL_FEATURES}
+    encoders.update(code_module=["AAA", "BBB"], disability=["N", "Y"])
+    X = np.zeros((4, len(FEATURE_COLUMNS)), dtype=np.float32)
+    X[1, FEATURE_COLUMNS.index("code_module")] = 1
+    X[2, FEATURE_COLUMNS.index("disability")] = 1
+    X[3, FEATURE_COLUMNS.index("code_module")] = -1
+    model = DecisionTreeClassifier(random_state=0).fit(X, ["Pass", "Fail", "Fail", "Fail"])
+    rows = pd.DataFrame({
+        "studied_credits": [60, 30, 120],
+        "total_clicks": [200, 50, 900],
+        "code_module": [None, "BBB", "AAA"],
+    })
+
+    def single(row):
+        features = {"code_module": row.code_module} if isinstance(row.code_module, str) else {}
+        return predictor.predict_final_result(row.studied_credits, row.total_clicks, **features)
+
+    monkeypatch.setattr(predictor.registry, "_active", ModelArtifact(model, encoders, {"version": "v-parity"}))
+    batch = predictor.predict_final_result_batch(rows)
+    assert batch.tolist() == [single(r) for r in rows.itertuples(index=False)] == [60, 30, 60]
+
+    class LegacyModel:
+        def predict(self, frame):
+            return np.where(frame["code_module"] == "AAA", "Distinction", "Withdrawn")
+
+    monkeypatch.setattr(predictor.registry, "_active", None)
+    monkeypatch.setattr(predictor, "_ml_model", LegacyModel())
+    batch = predictor.predict_final_result_batch(rows)
+    assert batch.tolist() == [single(r) for r in rows.itertuples(index=False)] == [90, 0, 90]
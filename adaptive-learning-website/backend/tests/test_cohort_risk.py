@@ -0,0 +1,44 @@
+"""
+Tests for the org-wide at-risk ranking index
+"""
+import random
+
+import pytest
+
+from backend.app.services.cohort_risk import CohortRiskService, OrgRiskIndex
+
+
+def test_index_matches_full_sort_after_random_updates():
+    rng = random.Random(3)
+    index = OrgRiskIndex()
+    scores = {}
+    for _ in range(2000):
+        sid = f"s{rng.randrange(300)}"
+        scores[sid] = rng.choice([0, 20, 30, 40, 50, 60, 70, 90, 100])
+        index.upsert(sid, scores[sid])
+
+    expected = sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:20]
+    assert [(e["student_id"], e["risk_score"]) for e in index.top(20)] == expected
+    assert index.count_at_least(70) == sum(1 for v in scores.values() if v >= 70)
+    sid, score = next(iter(scores.items()))
+    assert index.percentile(sid) == round(100 * sum(v < score for v in scores.values()) / len(scores), 2)
+
+
+def test_service_updates_only_the_students_orgs():
+    service = CohortRiskService()
+    service.load_memberships([
+        {"organization_id": "org-a", "student_id": "alice"},
+        {"organization_id": "org-a", "student_id": "bob"},
+        {"organization_id": "org-b", "student_id": "bob"},
+    ])
+    service.update_student("alice", interactions=30, last_score=90, days_overdue=0)
+    service.update_student("bob", interactions=2, last_score=10, days_overdue=3)
+
+    assert [e["student_id"] for e in service.top("org-a", 2)] == ["bob", "alice"]
+    assert service.top("org-b", 5) == [{"student_id": "bob", "risk_score": 90.0}]
+    assert service.percentile("org-a", "bob") == 50.0
+
+    service.set_members("org-a", ["alice"])
+    assert service.at_least("org-a", 50)["count"] == 0
+    with pytest.raises(RuntimeError):
+        service.top("org-missing")
@@ -0,0 +1,96 @@
+"""
+Tests for the content-addressed store of generated content
+"""
+import asyncio
+
+from backend.app.cli import content_dict
+from backend.app.services.content_store import ContentStore, content_hash, train_dictionary
+
+
+def _lesson(i: int) -> str:
+    return (
+        f"# Lesson {i}: Topic {i}\n\n"
+        "In this lesson you will learn the key ideas, see a worked example and "
+        "finish with a quick check-your-understanding question.\n\n"
+        f"Example {i}: apply the idea to case number {i * 7}.\n"
+    )
+
+
+def test_identical_content_is_stored_once_and_indexed_by_key(tmp_path):
+    store = ContentStore(str(tmp_path / "content.db"))
+    a = store.put("Loops repeat work.\r\n", "Loops", "lesson:standard", "gemini-1.5-flash", "1")
+    b = store.put("Loops repeat work.   ", "for loops", "lesson:standard", "gemini-1.5-flash", "1")
+    assert a == b == content_hash("Loops repeat work.")
+    assert store.get("loops", "lesson:standard", "gemini-1.5-flash", "1") == "Loops repeat work."
+    # Any part of the key differing is a miss (e.g. a bumped prompt version).
+    assert store.get("loops", "lesson:standard", "gemini-1.5-flash", "2") is None
+    stats = store.stats()
+    assert stats["blobs"] == 1 and stats["entries"] == 2 and stats["dedup_ratio"] == 2.0
+    assert stats["lookups"] == 2 and stats["lookup_p50_us"] is not None
+
+
+def test_range_reads_only_touch_the_needed_chunks(tmp_path):
+    store = ContentStore(str(tmp_path / "content.db"), chunk_size=64)
+    text = "".join(_lesson(i) for i in range(10))
+    blob = store.put(text, "Everything", "course:moderate", "m", "1")
+    raw = text.strip().encode("utf-8")
+    assert store.info(blob)["chunks"] == -(-len(raw) // 64)
+    assert store.read(blob) == raw
+    assert store.read(blob, 100, 300) == raw[100:300]
+    assert list(store.stream(blob, 60, 70)) == [raw[60:64], raw[64:70]]
+
+
+def test_trained_dictionary_improves_small_lessons(tmp_path):
+    store = ContentStore(str(tmp_path / "content.db"))
+    for i in range(40):
+        store.put(_lesson(i), f"topic {i}", "lesson:standard", "m", "1")
+    plain = store.stats()["compression_ratio"]
+
+    dictionary = train_dictionary(store.samples(), size=4096)
+    assert 0 < len(dictionary) <= 4096
+    dict_id = store.add_dictionary(dictionary)
+    assert store.recompress(dict_id) == 40
+    assert store.stats()["compression_ratio"] > plain * 1.5
+    assert store.get("topic 3", "lesson:standard", "m", "1") == _lesson(3).strip()
+
+
+def test_readers_and_writers_follow_another_process_recompressing(tmp_path):
+    path = str(tmp_path / "content.db")
+    api, cli = ContentStore(path, chunk_size=64), ContentStore(path, chunk_size=64)
+    text = "".join(_lesson(i) for i in range(10))
+    blob = api.put(text, "Everything", "course:moderate", "m", "1")
+    raw = text.strip().encode("utf-8")
+    assert api.read(blob) == raw
+
+    # The API is mid-stream (blob metadata cached) when the CLI recompresses.
+    stream = api.stream(blob)
+    first = next(stream)
+    dict_id = cli.add_dictionary(train_dictionary(cli.samples(), size=2048))
+    assert cli.recompress(dict_id) == 1
+    assert first + b"".join(stream) == raw
+    assert api.read(blob, 100, 300) == raw[100:300]
+
+    # New blobs written by the API pick up the dictionary the CLI activated.
+    other = api.put(_lesson(99), "topic 99", "lesson:standard", "m", "1")
+    assert api.info(other)["dict_id"] == dict_id
+    assert cli.read(other) == _lesson(99).strip().encode("utf-8")
+
+
+def test_cli_trains_and_activates_dictionary(tmp_path):
+    path = str(tmp_path / "content.db")
+    store = ContentStore(path)
+    for i in range(12):
+        store.put(_lesson(i), f"topic {i}", "lesson:standard", "m", "1")
+    store.close()
+    assert content_dict.main(["--store", path, "--size", "2048", "--recompress"]) == 0
+    assert ContentStore(path).stats()["active_dict"] is not None
+
+
+def test_generated_lessons_survive_a_restart(tmp_path, fake_gemini):
+    path = str(tmp_path / "content.db")
+    model = None
+    for _ in range(2):
+        # A fresh service (empty in-memory cache) per "process".
+        service, model = fake_gemini(text="A standard lesson.", model=model, store=ContentStore(path))
+        assert asyncio.run(service.generate_lesson("Loops", "standard")) == "A standard lesson."
+    assert len(model.prompts) == 1
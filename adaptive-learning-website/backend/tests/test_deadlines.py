@@ -0,0 +1,73 @@
+"""
+Tests for request deadlines and upstream cancellation
+"""
+import asyncio
+import time
+
+import pytest
+
+from backend.app.services import deadlines
+from backend.app.services.deadlines import (
+    DeadlineExceeded,
+    DeadlineMiddleware,
+    call_with_deadline,
+    deadline_scope,
+)
+
+
+def test_expired_deadline_cancels_upstream_call():
+    deadlines.stats.reset()
+
+    async def scenario():
+        with deadline_scope(0.05):
+            await call_with_deadline(asyncio.sleep(5))
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(scenario())
+    assert time.monotonic() - started < 1
+    assert deadlines.stats.snapshot()["upstream_deadline_exceeded"] == 1
+
+
+def test_scopes_only_tighten_the_deadline():
+    async def scenario():
+        with deadline_scope(10):
+            outer = deadlines.remaining()
+            with deadline_scope(60):
+                inner = deadlines.remaining()
+        return outer, inner, deadlines.remaining()
+
+    outer, inner, after = asyncio.run(scenario())
+    assert inner <= outer <= 10 and after is None
+
+
+def test_client_disconnect_cancels_handler():
+    deadlines.stats.reset()
+    finished = []
+
+    async def app(scope, receive, send):
+        await receive()
+        await call_with_deadline(asyncio.sleep(5))
+        finished.append(True)
+
+    async def scenario():
+        messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            await asyncio.sleep(0.05)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            pass
+
+        middleware = DeadlineMiddleware(app, deadlines={"/api/ai": 30})
+        await middleware({"type": "http", "path": "/api/ai/study-tool"}, receive, send)
+
+    started = time.monotonic()
+    asyncio.run(scenario())
+    assert time.monotonic() - started < 1 and not finished
+    snapshot = deadlines.stats.snapshot()
+    assert snapshot["requests_disconnected"] == 1
+    assert snapshot["upstream_disconnect_cancelled"] == 1
@@ -0,0 +1,49 @@
+"""
+Tests for streaming feature drift monitoring
+"""
+import numpy as np
+
+from backend.app.services.drift import RESERVOIR_SIZE, DriftMonitor, build_reference_profile
+
+
+def _profile():
+    rng = np.random.default_rng(0)
+    return build_reference_profile(
+        {
+            "total_clicks": rng.normal(100, 20, 5000),
+            "gender": rng.choice(["M", "F"], 5000),
+        },
+        categorical=["gender"],
+        predictions=list(rng.choice(["Pass", "Fail"], 5000)),
+    )
+
+
+def test_matching_traffic_is_stable_and_shifted_traffic_is_flagged():
+    rng = np.random.default_rng(1)
+    stable, shifted = DriftMonitor(_profile()), DriftMonitor(_profile())
+
+    for clicks, gender in zip(rng.normal(100, 20, 3000), rng.choice(["M", "F"], 3000)):
+        stable.observe({"total_clicks": clicks, "gender": gender}, "Pass")
+    for clicks in rng.normal(160, 20, 3000):
+        shifted.observe({"total_clicks": clicks, "gender": "X"}, "Fail")
+
+    assert stable.report()["drifted_features"] == []
+    report = shifted.report()
+    assert set(report["drifted_features"]) == {"total_clicks", "gender"}
+    assert report["features"]["total_clicks"]["ks"] > 0.5
+    assert report["features"]["gender"]["new_categories"] == {"X": 3000}
+    assert report["prediction"]["status"] == "significant"
+
+
+def test_sketch_memory_is_bounded_and_reset_clears_counts():
+    monitor = DriftMonitor(_profile())
+    for i in range(RESERVOIR_SIZE * 4):
+        monitor.observe({"total_clicks": i, "gender": f"new-{i}"})
+
+    clicks = monitor._features["total_clicks"]
+    gender = monitor._features["gender"]
+    assert len(clicks.reservoir) == RESERVOIR_SIZE
+    assert len(gender.new_categories) <= 32
+
+    monitor.reset()
+    assert monitor.report()["observed"] == 0
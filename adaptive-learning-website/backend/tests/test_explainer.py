@@ -0,0 +1,76 @@
+"""
+Tests for the path-based tree explainer
+"""
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from backend.app.services.explainer import TreeExplainer
+
+
+def _fit_forest():
+    rng = np.random.default_rng(0)
+    X = rng.integers(0, 5, size=(300, 4)).astype(np.float32)
+    y = np.where(X[:, 0] + rng.normal(0, 1, 300) > 2, "Pass", "Fail")
+    model = RandomForestClassifier(n_estimators=20, max_depth=5, random_state=0).fit(X, y)
+    return model, X
+
+
+def test_contributions_reproduce_predict_proba():
+    model, X = _fit_forest()
+    explainer = TreeExplainer(model, ["a", "b", "c", "d"])
+
+    result = explainer.explain(X[:50])
+
+    np.testing.assert_allclose(result["proba"], model.predict_proba(X[:50]), atol=1e-9)
+    np.testing.assert_allclose(
+        result["bias"] + result["contributions"].sum(axis=1), result["proba"], atol=1e-9
+    )
+
+
+def test_explain_row_is_cached_and_ranks_the_driving_feature_first():
+    model, X = _fit_forest()
+    explainer = TreeExplainer(model, ["a", "b", "c", "d"])
+
+    first = explainer.explain_row(X[0])
+    second = explainer.explain_row(X[0].copy())
+
+    assert second is first
+    assert (explainer.cache_hits, explainer.cache_misses) == (1, 1)
+    top = explainer.top_features(first["contributions"], k=2)
+    assert top[0]["feature"] == "a"
+
+
+def test_supports_rejects_non_tree_models():
+    from sklearn.linear_model import LogisticRegression
+
+    assert not TreeExplainer.supports(LogisticRegression())
+
+
+def test_unexplainable_models_return_no_factors(monkeypatch):
+    from backend.app.services import predictor
+
+    class BrokenExplainer:
+        def explain_row(self, x):
+            raise ValueError("feature mismatch")
+
+    class Artifact:
+        version = "v-broken"
+
+        def get_explainer(self):
+            return BrokenExplainer()
+
+        def encode(self, rows):
+            return np.zeros((len(rows), 4))
+
+        def predict(self, rows):
+            return ["Pass"] * len(rows)
+
+        def get_drift_monitor(self):
+            return None
+
+    monkeypatch.setattr(predictor.registry, "_active", None)
+    monkeypatch.setattr(predictor, "_ml_model", None)
+    assert predictor.explain_final_result(credits=60, clicks=200) == (100, [], False)
+
+    monkeypatch.setattr(predictor.registry, "_active", Artifact())
+    assert predictor.explain_final_result(credits=60, clicks=200) == (60, [], False)
@@ -0,0 +1,80 @@
+"""
+Tests for the Bayesian knowledge tracing engine
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from backend.app.cli import fit_bkt
+from backend.app.services.gemini import AdaptiveTutor
+from backend.app.services.knowledge_tracing import PARAM_NAMES, KnowledgeTracer, fit_topic
+
+
+def test_batch_matches_one_by_one_updates():
+    rng = np.random.default_rng(0)
+    students = [f"s{i}" for i in rng.integers(0, 40, 2000)]
+    topics = [f"topic {i}" for i in rng.integers(0, 5, 2000)]
+    correct = rng.random(2000) < 0.6
+
+    batched = KnowledgeTracer(initial_students=4, initial_topics=2)
+    batched.apply_events(students, topics, correct)
+    sequential = KnowledgeTracer()
+    for s, t, c in zip(students, topics, correct):
+        sequential.apply_events([s], [t], [c])
+
+    for s, t in set(zip(students, topics)):
+        assert abs(batched.mastery(s, t) - sequential.mastery(s, t)) < 1e-5
+
+
+def test_mastery_tracks_answers_and_drives_tutor_mode():
+    tracer = KnowledgeTracer()
+    tracer.apply_events(["good"] * 5 + ["weak"] * 5, ["Loops"] * 10, [1] * 5 + [0] * 5)
+
+    assert tracer.mastery("good", "loops") > 0.9
+    assert tracer.struggle_score("weak", " LOOPS ") >= 70
+    assert tracer.struggle_score("good", "recursion") is None
+
+    tutor = AdaptiveTutor(service=object(), tracer=tracer)
+    # The traced score wins over whatever the client claims.
+    assert tutor.resolve_mode("loops", student_id="weak", struggle_score=0) == "simplify"
+    assert tutor.resolve_mode("loops", student_id="good", struggle_score=100) == "deep_dive"
+    assert tutor.resolve_mode("recursion", student_id="good", struggle_score=90) == "simplify"
+    assert tutor.resolve_mode("recursion") == "standard"
+
+
+def test_em_recovers_simulated_parameters():
+    rng = np.random.default_rng(1)
+    true = {"p_init": 0.2, "p_transit": 0.15, "p_slip": 0.1, "p_guess": 0.25}
+    sequences = []
+    for _ in range(800):
+        known = rng.random() < true["p_init"]
+        seq = []
+        for _ in range(12):
+            p_correct = 1 - true["p_slip"] if known else true["p_guess"]
+            seq.append(int(rng.random() < p_correct))
+            known = known or rng.random() < true["p_transit"]
+        sequences.append(seq)
+
+    fitted = fit_topic(sequences, n_iter=200)
+    for name, value in true.items():
+        assert abs(fitted[name] - value) < 0.06, (name, fitted)
+
+
+def test_fitted_params_file_loads_and_applies(tmp_path):
+    rng = np.random.default_rng(2)
+    rows = [
+        {"student_id": f"s{s}", "topic": topic, "correct": int(rng.random() < 0.6)}
+        for s in range(10) for topic in ("Loops", "Recursion") for _ in range(6)
+    ]
+    source, output = tmp_path / "responses.csv", tmp_path / "bkt.json"
+    pd.DataFrame(rows).to_csv(source, index=False)
+    assert fit_bkt.main([str(source), "--output", str(output), "--iterations", "5"]) == 0
+    assert all(sorted(p) == sorted(PARAM_NAMES) for p in json.loads(output.read_text()).values())
+
+    tracer = KnowledgeTracer(initial_topics=1)
+    # Diagnostics written by older fits are ignored rather than installed.
+    tracer.set_params({"graphs": {"p_init": 0.5, "loglik": -3.0, "iterations": 4}})
+    assert tracer.load_params(str(output)) == 2
+    assert tracer.apply_events(["s1", "s1", "s2"], ["loops", "recursion", "graphs"], [1, 0, 1]) == 3
+    assert tracer.struggle_score("s1", "Loops") is not None
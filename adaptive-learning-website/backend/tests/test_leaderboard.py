@@ -0,0 +1,147 @@
+"""
+Tests for the Fenwick-tree XP leaderboards
+"""
+import asyncio
+import random
+
+from backend.app.services.leaderboard import WEEK, Leaderboard, LeaderboardService
+from backend.app.services.progress_store import ConnectionPool, ProgressWriter
+
+
+MONDAY = 1_704_067_200  # 2024-01-01, ISO week 2024-W01
+NEXT_WEEK = MONDAY + 7 * 86400
+
+
+def test_rank_and_top_match_a_full_sort():
+    rng = random.Random(0)
+    board, scores = Leaderboard(capacity=16), {}
+    for _ in range(3000):
+        member, delta = f"s{rng.randrange(300)}", rng.randrange(0, 5000)
+        board.add(member, delta)
+        scores[member] = scores.get(member, 0) + delta
+    ordered = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    assert [row["student_id"] for row in board.top(25)] == [m for m, _ in ordered[:25]]
+    assert [row["student_id"] for row in board.top(10, offset=200)] == [m for m, _ in ordered[200:210]]
+    for member, score in scores.items():
+        assert board.rank(member) == 1 + sum(1 for s in scores.values() if s > score)
+    board.remove(ordered[0][0])
+    assert board.top(1)[0]["student_id"] == ordered[1][0] and len(board) == len(scores) - 1
+
+
+def test_coarse_buckets_still_rank_exactly():
+    board = Leaderboard(bucket_size=100)
+    for member, score in {"a": 150, "b": 199, "c": 100, "d": 1000}.items():
+        board.set(member, score)
+    assert [row["student_id"] for row in board.top(4)] == ["d", "b", "a", "c"]
+    assert board.rank("a") == 3
+
+
+def test_weekly_boards_roll_over_and_orgs_follow_membership():
+    service = LeaderboardService(keep_weeks=2)
+    service.load_scores([{"id": "a", "xp_points": 900}, {"id": "b", "xp_points": 100}, {"id": "c", "xp_points": 50}])
+    service.set_members("org1", ["b", "c"])
+    service.record_xp("c", 300, at=MONDAY)
+    assert service.top(org_id="org1")["students"][0] == {"rank": 1, "student_id": "c", "xp": 350}
+    assert service.rank("c", window=WEEK, at=MONDAY) == {"rank": 1, "of": 1, "xp": 300}
+
+    service.record_xp("b", 10, at=NEXT_WEEK)
+    assert service.rank("c", window=WEEK, at=NEXT_WEEK) is None
+    assert service.top(org_id="org1", window=WEEK, at=NEXT_WEEK)["size"] == 1
+    service.record_xp("a", 10, at=NEXT_WEEK + 7 * 86400)
+    assert len(service.stats()["weeks"]) == 2
+    assert service.rank("a") == {"rank": 1, "of": 3, "xp": 910}
+
+
+def test_snapshot_round_trip(tmp_path):
+    service = LeaderboardService()
+    service.load_scores([{"id": f"s{i}", "xp_points": i * 10} for i in range(50)])
+    service.set_members("org1", ["s1", "s2", "s40"])
+    service.record_xp("s2", 1000, at=MONDAY)
+    path = str(tmp_path / "boards.npz")
+    service.snapshot(path)
+    loaded = LeaderboardService.load(path)
+    for org_id in (None, "org1"):
+        assert loaded.top(5, org_id=org_id) == service.top(5, org_id=org_id)
+    assert loaded.rank("s2", window=WEEK, at=MONDAY) == service.rank("s2", window=WEEK, at=MONDAY)
+    loaded.record_xp("s1", 5000)
+    assert loaded.rank("s1", org_id="org1")["rank"] == 1
+
+
+def test_committed_progress_feeds_the_boards(tmp_path):
+    service = LeaderboardService()
+    writer = ProgressWriter(
+        ConnectionPool(str(tmp_path / "progress.db"), size=1), flush_interval=0.001, on_commit=service.record_batch
+    )
+
+    async def run():
+        await asyncio.gather(
+            writer.complete_chapter("s1", "chapter-1", xp_earned=500),
+            writer.complete_chapter("s1", "chapter-1", xp_earned=500),
+            writer.add_xp("s2", 50),
+        )
+
+    asyncio.run(run())
+    assert service.top(2)["students"] == [
+        {"rank": 1, "student_id": "s1", "xp": 500},
+        {"rank": 2, "student_id": "s2", "xp": 50},
+    ]
+
+
+def test_negative_deltas_are_applied_not_clamped():
+    board = Leaderboard(capacity=16)
+    board.add("a", 100)
+    board.add("b", 30)
+    assert board.add("b", -80) == -50
+    board.add("c", 0)
+    assert [row["student_id"] for row in board.top(3)] == ["a", "c", "b"]
+    assert board.rank("b") == 3 and board.rank("c") == 2
+    board.add("b", 60)
+    assert board.score("b") == 10 and board.rank("b") == 2
+
+
+def test_boards_are_seeded_from_committed_scores(tmp_path):
+    writer = ProgressWriter(ConnectionPool(str(tmp_path / "progress.db"), size=1), flush_interval=0.001)
+
+    async def run():
+        await asyncio.gather(writer.add_xp("s1", 700), writer.add_xp("s2", 40))
+        return await writer.scores()
+
+    service = LeaderboardService()
+    service.set_members("org1", ["s2"])
+    assert service.load_scores(asyncio.run(run())) == 2
+    assert service.rank("s1") == {"rank": 1, "of": 2, "xp": 700}
+    assert service.top(org_id="org1")["students"] == [{"rank": 1, "student_id": "s2", "xp": 40}]
+
+
+def test_workers_follow_each_others_commits(tmp_path):
+    from backend.app.services.leaderboard import LeaderboardFollower
+
+    path = str(tmp_path / "progress.db")
+    workers = []
+    for _ in range(2):
+        service = LeaderboardService()
+        writer = ProgressWriter(ConnectionPool(path, size=1), flush_interval=0.001)
+        workers.append((service, writer, LeaderboardFollower(service, writer)))
+    (first, first_writer, first_follower), (second, _, second_follower) = workers
+
+    async def run():
+        for _, _, follower in workers:
+            await follower.start()
+        await first_writer.set_members("org1", ["s2"])
+        await asyncio.gather(first_writer.add_xp("s1", 700), first_writer.add_xp("s2", 40))
+        await first_writer.complete_chapter("s2", "chapter-1", xp_earned=500)
+        for _, _, follower in workers:
+            await follower.poll()
+        # A fresh worker rebuilds every board, weekly ones included, from the DB.
+        restarted = LeaderboardService()
+        await LeaderboardFollower(restarted, first_writer).start()
+        return restarted
+
+    restarted = asyncio.run(run())
+    for service in (first, second, restarted):
+        assert service.top(2)["students"] == [
+            {"rank": 1, "student_id": "s1", "xp": 700},
+            {"rank": 2, "student_id": "s2", "xp": 540},
+        ]
+        assert service.rank("s2", org_id="org1", window=WEEK) == {"rank": 1, "of": 1, "xp": 540}
+    assert second_follower.last_seq == first_follower.last_seq == 3
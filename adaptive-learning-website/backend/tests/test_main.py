@@ -2,7 +2,9 @@
 Basic tests for FastAPI endpoints
 """
 from fastapi.testclient import TestClient
+from backend.app import main
 from backend.app.main import app
+from backend.app.services.deadlines import DeadlineExceeded
 
 client = TestClient(app)
 
@@ -39,3 +41,352 @@ def test_cors_headers():
     response = client.options("/api/health")
     assert response.status_code == 200
 
+
+def test_admin_routes_require_token(monkeypatch):
+    """Admin routes are disabled without ADMIN_API_TOKEN and check the header"""
+    monkeypatch.delenv("ADMIN_API_TOKEN", raising=False)
+    assert client.get("/api/admin/models").status_code == 403
+
+    monkeypatch.setenv("ADMIN_API_TOKEN", "secret")
+    assert client.get("/api/admin/models").status_code == 401
+    response = client.get("/api/admin/models", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200
+    assert "models" in response.json()
+
+
+def test_org_at_risk_ranking(monkeypatch):
+    """Membership plus per-student updates drive the org top-k endpoint"""
+    monkeypatch.setenv("ADMIN_API_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    assert client.put("/api/orgs/org-1/members", json={"student_ids": ["s1"]}).status_code == 401
+    client.put("/api/orgs/org-1/members", json={"student_ids": ["s1", "s2"]}, headers=headers)
+    client.put("/api/students/s1/risk", json={"interactions": 50, "last_score": 90, "days_overdue": 0}, headers=headers)
+    client.put("/api/students/s2/risk", json={"interactions": 1, "last_score": 10, "days_overdue": 2}, headers=headers)
+
+    assert client.get("/api/orgs/org-1/at-risk", params={"k": 1}).status_code == 401
+    assert client.get("/api/orgs/org-1/at-risk/s2/percentile").status_code == 401
+    data = client.get("/api/orgs/org-1/at-risk", params={"k": 1}, headers=headers).json()
+    assert data["size"] == 2
+    assert data["students"] == [{"student_id": "s2", "risk_score": 90.0}]
+    assert client.get("/api/orgs/org-1/at-risk/s2/percentile", headers=headers).status_code == 200
+    assert client.get("/api/orgs/unknown/at-risk", headers=headers).status_code == 404
+
+
+def test_quiz_answers_update_mastery(student_headers):
+    """Quiz answers are graded on the server and feed the tracer behind the mastery endpoint"""
+    [item_id] = main.review_scheduler.register_items(
+        "kt-1", [{"question": "Which keyword loops?", "options": ["for", "def"], "correctAnswer": "for", "topic": "Loops"}]
+    )
+    events = [{"item_id": item_id, "answer": "def"}] * 4
+    assert client.post("/api/quiz/answers", json={"events": events}).status_code == 401
+    response = client.post("/api/quiz/answers", json={"events": events}, headers=student_headers("kt-1"))
+    assert response.json() == {"applied": 4, "correct": [False] * 4}
+    unknown = client.post(
+        "/api/quiz/answers", json={"events": [{"item_id": "nope", "answer": "for"}]}, headers=student_headers("kt-1")
+    )
+    assert unknown.status_code == 404
+
+    headers = student_headers("kt-1")
+    assert client.get("/api/students/kt-1/mastery", params={"topic": "loops"}).status_code == 401
+    assert client.get("/api/students/kt-1/mastery", headers=student_headers("kt-2")).status_code == 403
+    data = client.get("/api/students/kt-1/mastery", params={"topic": "loops"}, headers=headers).json()
+    assert data["struggle_score"] >= 70
+    assert data["mode"] == "simplify"
+    assert client.get("/api/students/kt-1/mastery", params={"topic": "sql"}, headers=headers).status_code == 404
+
+
+def test_review_grades_apply_only_to_the_students_own_cards(student_headers):
+    """Grades need sign-in and a card on the caller's schedule; due queues are private"""
+    [item_id] = main.review_scheduler.register_items(
+        "srs-1", [{"question": "What does len() return?", "correctAnswer": "the length", "topic": "Builtins"}]
+    )
+    grades = {"grades": [{"student_id": "srs-1", "item_id": item_id, "grade": 4}]}
+    assert client.post("/api/reviews/grades", json=grades).status_code == 401
+    # Another student can neither grade srs-1's card nor create one for themselves.
+    assert client.post("/api/reviews/grades", json=grades, headers=student_headers("srs-2")).status_code == 404
+    unknown = {"grades": [{"item_id": "nope", "grade": 4}]}
+    assert client.post("/api/reviews/grades", json=unknown, headers=student_headers("srs-1")).status_code == 404
+    assert client.get("/api/students/srs-1/reviews/due", headers=student_headers("srs-2")).status_code == 403
+    data = client.get("/api/students/srs-1/reviews/due", headers=student_headers("srs-1")).json()
+    assert data["due_count"] == 1 and data["cards"][0]["item_id"] == item_id
+
+    assert client.post("/api/reviews/grades", json=grades, headers=student_headers("srs-1")).json() == {"applied": 1}
+    data = client.get("/api/students/srs-1/reviews/due", headers=student_headers("srs-1")).json()
+    assert data == {"student_id": "srs-1", "due_count": 0, "cards": []}
+    assert client.get("/api/students/srs-2/reviews/due", headers=student_headers("srs-2")).json()["due_count"] == 0
+
+
+def test_ai_deadline_maps_to_gateway_timeout(monkeypatch):
+    """An expired request deadline surfaces as 504, not a generic 500"""
+    async def slow_lesson(topic, mode):
+        raise DeadlineExceeded("AI call exceeded the request deadline and was cancelled.")
+
+    monkeypatch.setattr(main.gemini_service, "generate_lesson", slow_lesson)
+    response = client.post("/api/ai/generate", json={"topic": "loops", "mode": "standard"})
+    assert response.status_code == 504
+
+
+def test_bulk_generate_validates_topics_and_scopes_jobs(monkeypatch, tmp_path):
+    """Only admins submit or read batches; they need the content store; jobs are only visible to their organization"""
+    from backend.app.services.content_store import ContentStore
+
+    monkeypatch.setenv("ADMIN_API_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    assert client.post("/api/orgs/org-bulk/bulk-generate", json={"topics": ["Loops"]}).status_code == 401
+    monkeypatch.setattr(main.gemini_service, "store", None)
+    response = client.post("/api/orgs/org-bulk/bulk-generate", json={"topics": ["Loops"]}, headers=headers)
+    assert response.status_code == 503
+    monkeypatch.setattr(main.gemini_service, "store", ContentStore(str(tmp_path / "content.db")))
+    response = client.post("/api/orgs/org-bulk/bulk-generate", json={"topics": ["  "]}, headers=headers)
+    assert response.status_code == 400
+    assert client.get("/api/orgs/org-bulk/bulk-jobs").status_code == 401
+    assert client.get("/api/orgs/org-bulk/bulk-jobs/missing", headers=headers).status_code == 404
+    listed = client.get("/api/orgs/org-bulk/bulk-jobs", headers=headers).json()
+    assert listed == {"organization_id": "org-bulk", "jobs": []}
+
+
+def test_content_route_serves_byte_ranges(tmp_path, monkeypatch):
+    """Stored content streams in full or by Range; unknown hashes are 404"""
+    from backend.app.services.content_store import ContentStore
+
+    store = ContentStore(str(tmp_path / "content.db"), chunk_size=8)
+    blob = store.put("0123456789abcdef", "digits", "lesson:standard", "m", "1")
+    monkeypatch.setattr(main.gemini_service, "store", store)
+
+    full = client.get(f"/api/content/{blob}")
+    assert full.status_code == 200 and full.text == "0123456789abcdef"
+    part = client.get(f"/api/content/{blob}", headers={"Range": "bytes=6-9"})
+    assert part.status_code == 206 and part.text == "6789"
+    assert part.headers["content-range"] == "bytes 6-9/16"
+    assert client.get(f"/api/content/{blob}", headers={"Range": "bytes=-3"}).text == "def"
+    assert client.get(f"/api/content/{blob}", headers={"Range": "bytes=20-"}).status_code == 416
+    assert client.get("/api/content/missing").status_code == 404
+
+
+def test_search_route_finds_indexed_courses(monkeypatch):
+    """Indexed courses are searchable; invalid kinds are rejected"""
+    from backend.app.services.search_index import SearchIndex
+
+    index = SearchIndex()
+    index.add_course("course:graphs:moderate", {"title": "Graph Algorithms", "description": "BFS and DFS"}, topic="graphs")
+    monkeypatch.setattr(main, "search_index", index)
+
+    data = client.get("/api/search", params={"q": "graph bfs"}).json()
+    assert data["documents"] == 1 and data["results"][0]["id"] == "course:graphs:moderate"
+    assert client.get("/api/search", params={"q": "graph", "kind": "video"}).status_code == 400
+
+
+def test_saga_completion_routes_persist_through_the_writer(monkeypatch, tmp_path, student_headers):
+    """Completions are committed before the response; 503 when persistence is off"""
+    from backend.app.services.progress_store import ConnectionPool, ProgressWriter
+
+    monkeypatch.setattr(main, "progress_writer", None)
+    assert client.get("/api/saga/progress/s1", headers=student_headers("s1")).status_code == 503
+
+    writer = ProgressWriter(ConnectionPool(str(tmp_path / "progress.db"), size=1), flush_interval=0.001)
+    monkeypatch.setattr(main, "progress_writer", writer)
+    # The XP and the unlocked chapter come from the catalog, not the body.
+    body = {"student_id": "someone-else", "chapter_id": "chapter-1", "xp_earned": 10 ** 6}
+    assert client.post("/api/saga/complete-chapter", json=body).status_code == 401
+    response = client.post("/api/saga/complete-chapter", json=body, headers=student_headers("s1"))
+    assert response.status_code == 200 and response.json()["xp_earned"] == 500
+    assert client.get("/api/saga/progress/s1").status_code == 401
+    progress = client.get("/api/saga/progress/s1", headers=student_headers("s1")).json()
+    assert progress["xp_points"] == 500
+    assert {c["chapter_id"]: c["status"] for c in progress["chapters"]} == {"chapter-1": "completed", "chapter-2": "active"}
+    assert client.get("/api/saga/progress/someone-else", headers=student_headers("s1")).status_code == 403
+    assert client.get("/api/saga/progress/someone-else", headers=student_headers("someone-else")).json()["xp_points"] == 0
+    missing = {"chapter_id": "chapter-99"}
+    assert client.post("/api/saga/complete-chapter", json=missing, headers=student_headers("s1")).status_code == 404
+
+
+def test_saga_xp_route_is_admin_only_and_bounded(monkeypatch, tmp_path, student_headers):
+    """Bare XP grants are service-to-service and must be a positive, capped amount"""
+    from backend.app.services.progress_store import ConnectionPool, ProgressWriter
+
+    writer = ProgressWriter(ConnectionPool(str(tmp_path / "progress.db"), size=1), flush_interval=0.001)
+    monkeypatch.setattr(main, "progress_writer", writer)
+    monkeypatch.setenv("ADMIN_API_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    assert client.post("/api/saga/xp", json={"student_id": "s1", "amount": 100}).status_code == 401
+    for amount in (0, -50, main.MAX_XP_AWARD + 1):
+        assert client.post("/api/saga/xp", json={"student_id": "s1", "amount": amount}, headers=headers).status_code == 400
+    assert client.post("/api/saga/xp", json={"student_id": "s1", "amount": 100}, headers=headers).status_code == 200
+    assert client.get("/api/saga/progress/s1", headers=student_headers("s1")).json()["xp_points"] == 100
+
+
+def test_study_tool_over_quota_is_rejected_before_generation(monkeypatch, tmp_path, student_headers):
+    """429 with Retry-After and no upstream call once a student is over quota"""
+    from backend.app.services.quota import Limit, SharedQuota
+
+    calls = []
+
+    async def fake_generate(**kwargs):
+        calls.append(kwargs)
+        return "summarize", "Short summary.", None
+
+    quota = SharedQuota(
+        str(tmp_path / "quota.bin"),
+        {"student": [Limit(60, requests=1)], "org": [Limit(60, requests=5)], "client": [Limit(60, requests=1)]},
+    )
+    monkeypatch.setattr(main, "ai_quota", quota)
+    monkeypatch.setattr(main.gemini_service, "generate_study_tool", fake_generate)
+    # Body ids are ignored: the signed-in student and their org are charged.
+    body = {"tool_type": "summarize", "input_text": "Some notes", "student_id": "s-other", "organization_id": "org-x"}
+    headers = student_headers("s-quota", organization_id="org-1")
+    assert client.post("/api/ai/study-tool", json=body, headers=headers).status_code == 200
+    response = client.post("/api/ai/study-tool", json=body, headers=headers)
+    assert response.status_code == 429 and int(response.headers["retry-after"]) >= 1
+    assert len(calls) == 1
+    assert quota.usage("student", "s-quota")[0]["used_requests"] == 1
+    assert quota.usage("org", "org-1")[0]["used_requests"] == 1
+    assert quota.usage("student", "s-other")[0]["used_requests"] == 0
+
+    # Anonymous callers are charged to their address instead of going free.
+    assert client.post("/api/ai/study-tool", json=body).status_code == 200
+    assert client.post("/api/ai/study-tool", json=body).status_code == 429
+    assert quota.usage("client", "testclient")[0]["used_requests"] == 1
+
+
+def test_sampled_request_trace_breaks_down_stages(monkeypatch):
+    """A traced request records validation, inference and serialization"""
+    monkeypatch.setattr(main.request_tracer, "sample_rate", 0.0)
+    monkeypatch.setenv("ADMIN_API_TOKEN", "secret")
+    headers = {"X-Admin-Token": "secret"}
+    assert client.put("/api/admin/traces/sample-rate", json={"rate": 2}, headers=headers).status_code == 400
+    assert client.put("/api/admin/traces/sample-rate", json={"rate": 1}, headers=headers).status_code == 200
+    assert client.get("/api/student/status").status_code == 200
+    main.request_tracer.set_rate(0.0)
+    traces = client.get("/api/admin/traces?path=/api/student/status", headers=headers).json()
+    stages = [s["name"] for s in traces["traces"][0]["spans"]]
+    assert stages == ["validation", "inference", "serialization"]
+    assert traces["stages"]["/api/student/status"]["inference"]["count"] >= 1
+
+
+def test_course_prompt_tokens_are_accounted_per_route(monkeypatch):
+    """Course generation records prompt/response tokens and parse success"""
+    from backend.app.services.prompts import default_registry
+
+    async def fake_content(topic, difficulty):
+        return '{"title": "Graphs", "modules": []}'
+
+    registry = default_registry()
+    monkeypatch.setattr(main, "prompt_registry", registry)
+    monkeypatch.setattr(main.gemini_service, "generate_content", fake_content)
+    monkeypatch.setattr(main.gemini_service, "load_stored", lambda key: None)
+    response = client.post("/api/ai/generate-course", json={"topic": "Graph theory", "pace": "blitz"})
+    assert response.json()["course"]["title"] == "Graphs"
+    monkeypatch.setenv("ADMIN_API_TOKEN", "secret")
+    stats = client.get("/api/admin/prompts", headers={"X-Admin-Token": "secret"}).json()
+    assert stats["routes"]["/api/ai/generate-course"]["calls"] == 1
+    assert stats["templates"]["course"]["full"]["parse_success_rate"] == 1.0
+
+
+def test_generated_course_is_refetched_by_id_with_etag(monkeypatch):
+    """Courses come back by id, gzip-encoded, and 304 on a matching ETag"""
+    from backend.app.services.payloads import PayloadStore
+
+    monkeypatch.setattr(main, "payload_store", PayloadStore())
+    stored = {"title": "Stored", "description": "Graphs. " * 200, "modules": []}
+    monkeypatch.setattr(main.gemini_service, "load_stored", lambda key: stored)
+    created = client.post("/api/ai/generate-course", json={"topic": "Graphs"}, headers={"Accept-Encoding": "identity"})
+    course_id, etag = created.json()["id"], created.headers["etag"]
+    assert created.json()["course"]["title"] == "Stored" and etag == f'"{course_id}"'
+
+    fetched = client.get(f"/api/ai/courses/{course_id}", headers={"Accept-Encoding": "gzip"})
+    assert fetched.status_code == 200 and fetched.json() == created.json()
+    assert "immutable" in fetched.headers["cache-control"]
+    assert fetched.headers["etag"] == f'"{course_id}-gzip"'
+    assert client.get(f"/api/ai/courses/{course_id}", headers={"If-None-Match": etag}).status_code == 304
+    revalidated = client.get(
+        f"/api/ai/courses/{course_id}",
+        headers={"If-None-Match": fetched.headers["etag"], "Accept-Encoding": "identity"},
+    )
+    assert revalidated.status_code == 304 and revalidated.headers["etag"] == etag
+    assert client.get(f"/api/ai/sagas/{course_id}").status_code == 404
+
+
+def test_offline_library_stands_in_when_upstream_is_unavailable(monkeypatch, tmp_path):
+    """Circuit open: study tools, lessons, explanations and courses come from the offline library, flagged cached"""
+    from backend.app.services.model_router import UpstreamUnavailable
+    from backend.app.services.offline_library import LESSON, OfflineLibrary, write_library
+    from backend.app.services.payloads import PayloadStore
+
+    async def circuit_open(**kwargs):
+        raise UpstreamUnavailable("All Gemini models are temporarily unavailable (circuit open).")
+
+    path = str(tmp_path / "offline.bin")
+    write_library(path, [(LESSON, "Python Functions", "simplify", "Functions are reusable steps.")])
+    monkeypatch.setattr(main, "payload_store", PayloadStore())
+    monkeypatch.setattr(main.gemini_service, "generate_study_tool", circuit_open)
+    monkeypatch.setattr(main.gemini_service, "generate_content", lambda **kwargs: circuit_open())
+    monkeypatch.setattr(main.gemini_service, "generate_lesson", lambda **kwargs: circuit_open())
+    monkeypatch.setattr(main.gemini_service, "load_stored", lambda key: None)
+    monkeypatch.setattr(main, "offline_library", None)
+    body = {"tool_type": "explain", "topic": "functions", "difficulty": 10}
+    assert client.post("/api/ai/study-tool", json=body).status_code == 503
+    lesson = {"topic": "functions", "mode": "simplify"}
+    assert client.post("/api/ai/generate", json=lesson).status_code == 503
+    assert client.post("/api/ai/explain", json={"topic": "functions", "struggle_score": 90}).status_code == 503
+
+    monkeypatch.setattr(main, "offline_library", OfflineLibrary(path))
+    served = client.post("/api/ai/study-tool", json=body).json()
+    assert served["cached"] and served["cached_topic"] == "Python Functions"
+    assert served["content"] == "Functions are reusable steps."
+    assert client.post("/api/ai/generate", json=lesson).json() == {
+        "content": "Functions are reusable steps.", "cached": True,
+    }
+    explained = client.post("/api/ai/explain", json={"topic": "functions", "struggle_score": 90}).json()
+    assert explained == {"explanation": "Functions are reusable steps.", "cached": True}
+    course = client.post("/api/ai/generate-course", json={"topic": "Python functions", "pace": "blitz"}).json()
+    assert course["cached"] and course["course"]["title"] == "Python Functions"
+    assert course["course"]["modules"][0]["lessons"][0]["content"] == "Functions are reusable steps."
+
+
+def test_explain_pitch_follows_the_signed_in_students_mastery(monkeypatch, student_headers):
+    """The tracer state used is the caller's own; body ids are ignored"""
+    from backend.app.services.knowledge_tracing import KnowledgeTracer
+
+    modes = []
+
+    async def fake_lesson(topic, mode):
+        modes.append(mode)
+        return f"{mode} lesson"
+
+    tracer = KnowledgeTracer()
+    tracer.apply_events(["s-weak"] * 6, ["Recursion"] * 6, [0] * 6)
+    monkeypatch.setattr(main.tutor, "_tracer", tracer)
+    monkeypatch.setattr(main.gemini_service, "generate_lesson", fake_lesson)
+    body = {"topic": "Recursion", "struggle_score": 0, "student_id": "s-weak"}
+    assert client.post("/api/ai/explain", json=body).status_code == 200
+    assert client.post("/api/ai/explain", json=body, headers=student_headers("s-weak")).status_code == 200
+    assert modes == ["deep_dive", "simplify"]
+
+
+def test_failed_ai_calls_are_refunded_and_every_route_is_metered(monkeypatch, tmp_path, student_headers):
+    """A call that never reached the model costs nothing; explain and lesson share the quota"""
+    from backend.app.services.quota import Limit, SharedQuota
+
+    async def failing_generate(**kwargs):
+        raise RuntimeError("boom")
+
+    async def fake_lesson(topic, mode):
+        return "A lesson."
+
+    quota = SharedQuota(
+        str(tmp_path / "quota.bin"),
+        {"student": [Limit(60, requests=2)], "org": [Limit(60, requests=10)], "client": [Limit(60, requests=10)]},
+    )
+    monkeypatch.setattr(main, "ai_quota", quota)
+    monkeypatch.setattr(main.gemini_service, "generate_study_tool", failing_generate)
+    monkeypatch.setattr(main.gemini_service, "generate_lesson", fake_lesson)
+    headers = student_headers("s-meter", organization_id="org-1")
+
+    body = {"tool_type": "summarize", "input_text": "Some notes"}
+    assert client.post("/api/ai/study-tool", json=body, headers=headers).status_code == 500
+    assert quota.usage("student", "s-meter")[0]["used_tokens"] == 0
+
+    lesson = {"topic": "Loops", "mode": "explain"}
+    assert client.post("/api/ai/generate", json=lesson, headers=headers).status_code == 200
+    assert quota.usage("student", "s-meter")[0]["used_tokens"] > 0
+    assert client.post("/api/ai/generate", json=lesson, headers=headers).status_code == 429
@@ -0,0 +1,117 @@
+"""
+Tests for Mermaid validation/repair and the visualize tool's re-prompt policy
+"""
+import asyncio
+
+from backend.app.services.response_cache import ResponseCache
+from backend.app.services.mermaid import extract_mermaid, repair_mermaid, validate_mermaid
+
+
+def test_valid_flowchart_passes_untouched():
+    text = "```mermaid\nflowchart LR\n  A[Start] --> B{Ready?}\n  B -->|Yes| C((Go))\n```"
+    result = repair_mermaid(text, "flowchart")
+    assert result.valid and not result.repaired
+    assert validate_mermaid(text) == []
+    assert result.render() == text
+
+
+def test_flowchart_repairs_common_model_mistakes():
+    text = (
+        "Sure! Here is the diagram:\n"
+        "```mermaid\n"
+        "graph TD\n"
+        "  A[Input (raw)] -> B[Parse]\n"
+        "  B => C((Done\n"
+        "  subgraph Output\n"
+        "  C --> end\n"
+        "```\n"
+        "Data flows left to right."
+    )
+    result = repair_mermaid(text, "flowchart")
+    assert result.valid and result.repaired
+    assert result.code.splitlines() == [
+        "graph TD",
+        '  A["Input (raw)"] --> B[Parse]',
+        "  B ==> C((Done))",
+        "  subgraph Output",
+        "  C --> End",
+        "end",
+    ]
+    assert result.summary == "Data flows left to right."
+
+
+def test_missing_header_and_fence_are_added():
+    code, summary = extract_mermaid("A[Start] --> B[Stop]")
+    assert code == "A[Start] --> B[Stop]" and summary == ""
+    result = repair_mermaid("A[Start] --> B[Stop]", "Flowchart")
+    assert result.valid
+    assert result.render() == "```mermaid\nflowchart TD\nA[Start] --> B[Stop]\n```"
+
+
+def test_sequence_diagram_repairs_arrows_colons_and_blocks():
+    text = (
+        "sequenceDiagram\n"
+        "  Student->>Tutor: question\n"
+        "  Tutor-->>Student hint please\n"
+        "  loop Until solved\n"
+        "  Student=>Tutor: attempt\n"
+        "  Note over Tutor thinking\n"
+    )
+    result = repair_mermaid(text, "sequence diagram")
+    assert result.valid and result.kind == "sequence"
+    lines = result.code.splitlines()
+    assert "  Tutor-->>Student: hint please" in lines
+    assert "  Student->>Tutor: attempt" in lines
+    assert "  Note over Tutor: thinking" in lines
+    assert lines[-1] == "end"
+
+
+def test_class_diagram_balances_braces_and_fixes_relations():
+    text = (
+        "classDiagram\n"
+        "  class Animal {\n"
+        "    +String name\n"
+        "  class Dog\n"
+        "  Animal <|-- Dog\n"
+        "  Dog -> Bone\n"
+    )
+    result = repair_mermaid(text, "class diagram")
+    assert result.valid
+    lines = result.code.splitlines()
+    assert lines[3] == "}" and "  Dog --> Bone" in lines
+
+
+def test_unrepairable_output_is_reported_and_other_types_pass_through():
+    result = repair_mermaid("flowchart TD\n  A -->\n  this is prose", "flowchart")
+    assert not result.valid and len(result.unfixed) == 2
+    mindmap = repair_mermaid("```mermaid\nmindmap\n  root((Cells))\n```", "mindmap")
+    assert mindmap.valid and not mindmap.checked
+
+
+def test_visualize_repairs_locally_and_caches_by_topic_and_type(fake_gemini):
+    service, model = fake_gemini(replies=["```mermaid\ngraph TD\n  A[f(x)] -> B\n```"], cache=ResponseCache())
+
+    async def scenario():
+        first = await service.generate_study_tool("visualize", topic="Functions", diagram_type="flowchart")
+        second = await service.generate_study_tool("visualize", topic="functions ", diagram_type="flowchart")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == ("visualize", '```mermaid\ngraph TD\n  A["f(x)"] --> B\n```', None)
+    assert len(model.prompts) == 1
+    stats = service.diagram_stats.snapshot()
+    assert stats["repaired"] == 1 and stats["reprompted"] == 0 and stats["cache_hits"] == 1
+
+
+def test_visualize_reprompts_only_when_repair_fails(fake_gemini):
+    service, model = fake_gemini(replies=[
+        "```mermaid\nflowchart TD\n  A --> B\n  and then it loops back\n```",
+        "```mermaid\nflowchart TD\n  A --> B\n  B --> A\n```",
+    ])
+    mode, content, _ = asyncio.run(
+        service.generate_study_tool("visualize", topic="Loops", diagram_type="flowchart")
+    )
+    assert len(model.prompts) == 2
+    assert "syntax errors" in model.prompts[1] and "expected an arrow" in model.prompts[1]
+    assert content == "```mermaid\nflowchart TD\n  A --> B\n  B --> A\n```"
+    assert service.diagram_stats.snapshot()["reprompted"] == 1
@@ -0,0 +1,64 @@
+"""
+Tests for the versioned model registry and shadow scoring
+"""
+import time
+
+import numpy as np
+from sklearn.dummy import DummyClassifier
+
+from backend.app.services.model_artifact import FEATURE_COLUMNS, ModelArtifact
+from backend.app.services.model_registry import ModelRegistry
+
+
+def _save_constant_model(root, version, label):
+    model = DummyClassifier(strategy="constant", constant=label)
+    model.fit(np.zeros((2, len(FEATURE_COLUMNS))), [label, "Fail" if label != "Fail" else "Pass"])
+    ModelArtifact(model, {}, {"version": version}).save(str(root))
+
+
+def test_activate_swaps_model_and_moves_pointer(tmp_path):
+    _save_constant_model(tmp_path, "v1", "Pass")
+    _save_constant_model(tmp_path, "v2", "Fail")
+    registry = ModelRegistry(str(tmp_path))
+
+    assert registry.load_initial().version == "v2"  # newest wins without a pointer
+    held = registry.active
+    registry.activate("v1")
+
+    assert registry.active.version == "v1"
+    assert held.predict([{}]) == ["Fail"]  # in-flight reference keeps working
+    assert registry.read_pointer() == "v1"
+    assert [m["active"] for m in registry.list_models()] == [True, False]
+
+
+def test_reload_follows_pointer_written_by_another_worker(tmp_path):
+    _save_constant_model(tmp_path, "v1", "Pass")
+    _save_constant_model(tmp_path, "v2", "Fail")
+    worker_a = ModelRegistry(str(tmp_path))
+    worker_b = ModelRegistry(str(tmp_path))
+    worker_a.activate("v1")
+    worker_b.load_initial()
+
+    worker_a.activate("v2")
+    assert worker_b.reload_if_changed()
+    assert worker_b.active.version == "v2"
+    assert not worker_b.reload_if_changed()
+
+
+def test_shadow_scoring_collects_agreement(tmp_path):
+    _save_constant_model(tmp_path, "v1", "Pass")
+    _save_constant_model(tmp_path, "v2", "Fail")
+    registry = ModelRegistry(str(tmp_path))
+    registry.activate("v1")
+    registry.set_shadow("v2", sample_rate=1.0)
+
+    for _ in range(10):
+        registry.observe({}, "Pass", 0.5)
+    deadline = time.time() + 5
+    while registry.shadow.stats()["compared"] < 10 and time.time() < deadline:
+        time.sleep(0.01)
+
+    stats = registry.clear_shadow()
+    assert stats["compared"] == 10
+    assert stats["agreement_rate"] == 0.0
+    assert registry.shadow is None
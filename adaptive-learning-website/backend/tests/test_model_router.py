@@ -0,0 +1,97 @@
+"""
+Tests for hedged, multi-model Gemini routing
+"""
+import asyncio
+
+import pytest
+
+from backend.app.services.model_router import CLOSED, OPEN, ModelRouter, is_upstream_error
+
+
+class FakeUpstream:
+    def __init__(self, delays=None, errors=None):
+        self.delays = delays or {}
+        self.errors = errors or {}
+        self.calls = []
+        self.cancelled = []
+
+    async def __call__(self, model_id, prompt):
+        self.calls.append(model_id)
+        try:
+            await asyncio.sleep(self.delays.get(model_id, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(model_id)
+            raise
+        if model_id in self.errors:
+            raise self.errors[model_id]
+        return f"{model_id}:{prompt}"
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    upstream = FakeUpstream(delays={"primary": 1.0, "backup": 0.01})
+    router = ModelRouter(["primary", "backup"], upstream, default_hedge_delay=0.05, min_hedge_delay=0.01)
+
+    assert asyncio.run(router.generate("hi")) == "backup:hi"
+    assert upstream.cancelled == ["primary"]
+    stats = router.stats()
+    assert stats["hedges"] == 1 and stats["hedge_wins"] == 1
+
+
+def test_quota_error_fails_over_and_opens_circuit():
+    upstream = FakeUpstream(errors={"primary": Exception("429 Resource has been exhausted (quota)")})
+    router = ModelRouter(["primary", "backup"], upstream, failure_threshold=2, cooldown=60)
+
+    for _ in range(3):
+        assert asyncio.run(router.generate("q")) == "backup:q"
+    # Third request skipped the open primary without calling it.
+    assert upstream.calls == ["primary", "backup", "primary", "backup", "backup"]
+    assert router.health["primary"].state == OPEN
+    assert router.health["backup"].state == CLOSED
+    assert router.stats()["models"][0]["quota_errors"] == 2
+
+
+def test_all_models_failing_raises_runtime_error():
+    upstream = FakeUpstream(errors={"a": Exception("429 quota"), "b": Exception("429 quota")})
+    router = ModelRouter(["a", "b"], upstream)
+    with pytest.raises(RuntimeError, match="quota exceeded"):
+        asyncio.run(router.generate("q"))
+
+
+def test_half_open_probe_closes_circuit():
+    upstream = FakeUpstream(errors={"only": Exception("503 unavailable")})
+    router = ModelRouter(["only"], upstream, failure_threshold=1, cooldown=0)
+    with pytest.raises(RuntimeError):
+        asyncio.run(router.generate("q"))
+    assert router.health["only"].state == OPEN
+
+    upstream.errors.clear()
+    assert asyncio.run(router.generate("q")) == "only:q"
+    assert router.health["only"].state == CLOSED
+
+
+class InvalidArgument(Exception):
+    code = 400
+
+
+def test_client_errors_are_reraised_without_failover_or_health_cost():
+    upstream = FakeUpstream(errors={"primary": InvalidArgument("Request contains an invalid argument.")})
+    router = ModelRouter(["primary", "backup"], upstream, failure_threshold=1)
+
+    for _ in range(2):
+        with pytest.raises(InvalidArgument):
+            asyncio.run(router.generate("q"))
+    assert upstream.calls == ["primary", "primary"]
+    assert router.health["primary"].state == CLOSED and router.health["primary"].failures == 0
+    assert router.stats()["client_errors"] == 2
+
+
+def test_upstream_error_classification():
+    class ServiceUnavailable(Exception):
+        code = 503
+
+    assert is_upstream_error(ServiceUnavailable("try later"))
+    assert is_upstream_error(ConnectionResetError())
+    assert is_upstream_error(TimeoutError())
+    assert is_upstream_error(Exception("429 quota"))
+    assert not is_upstream_error(InvalidArgument("400 bad"))
+    assert not is_upstream_error(ValueError("prompt was blocked by safety settings"))
@@ -0,0 +1,78 @@
+"""
+Tests for the memory-mapped offline content library
+"""
+import json
+
+import pytest
+
+from backend.app.cli import build_offline_library
+from backend.app.services.offline_library import DIAGRAM, LESSON, QUIZ, OfflineLibrary, write_library
+
+
+def _library(tmp_path) -> OfflineLibrary:
+    quiz = [{"id": i, "question": f"Q{i}", "options": ["a", "b"], "correctAnswer": "a"} for i in range(10)]
+    entries = [
+        (LESSON, "Python Functions", "simplify", "functions, simply"),
+        (LESSON, "Python Functions", "standard", "functions"),
+        (LESSON, "Control Flow: If Statements and Loops", "deep_dive", "loops in depth"),
+        (QUIZ, "Python Functions", "", json.dumps(quiz)),
+        (DIAGRAM, "Python Functions", "flowchart", "```mermaid\nflowchart TD\nA-->B\n```"),
+    ]
+    path = tmp_path / "offline.bin"
+    assert write_library(str(path), entries) == 5
+    return OfflineLibrary(str(path))
+
+
+def test_exact_neighbouring_mode_and_closest_topic_lookups(tmp_path):
+    library = _library(tmp_path)
+    exact = library.lookup(LESSON, "  python   FUNCTIONS ", "standard")
+    assert exact.text == "functions" and exact.exact
+    # No deep_dive for functions: the nearest mode of the same topic wins over other topics.
+    nearest = library.lookup(LESSON, "Python Functions", "deep_dive")
+    assert nearest.variant == "standard" and not nearest.exact
+    closest = library.lookup(LESSON, "loops and if statements", "simplify")
+    assert closest.topic == "Control Flow: If Statements and Loops" and closest.text == "loops in depth"
+    assert library.lookup(LESSON, "Quantum chromodynamics", "standard") is None
+    assert library.stats()["misses"] == 1 and library.stats()["closest"] == 2
+
+
+def test_study_tool_entries_and_bad_files(tmp_path):
+    library = _library(tmp_path)
+    mode, content, quiz, entry = library.study_tool("quiz", "functions in python", "standard", None, 3)
+    assert mode == "quiz" and content is None and [q["id"] for q in quiz] == [0, 1, 2]
+    assert entry.topic == "Python Functions"
+    assert library.study_tool("visualize", "Python Functions", "standard", None, 5)[1].startswith("```mermaid")
+    assert library.study_tool("summarize", "Python Functions", "standard", None, 5) is None
+    library.close()
+    bogus = tmp_path / "bogus.bin"
+    bogus.write_bytes(b"\0" * 64)
+    with pytest.raises(RuntimeError):
+        OfflineLibrary(str(bogus))
+
+
+def test_cli_packs_seed_and_listed_topics(tmp_path, monkeypatch, fake_gemini):
+    service, model = fake_gemini()
+    reply = model.generate_content_async
+
+    async def no_diagrams(prompt):
+        if "Mermaid" in prompt:
+            # Prose that no repair turns into a diagram.
+            return await reply_with("Sorry, I can only describe this in words.", prompt)
+        return await reply(prompt)
+
+    async def reply_with(text, prompt):
+        model.prompts.append(prompt)
+        return type("Response", (), {"text": text})()
+
+    monkeypatch.setattr(model, "generate_content_async", no_diagrams)
+    monkeypatch.setattr(build_offline_library, "GeminiService", lambda prefetch=False: service)
+    topics, output = tmp_path / "topics.txt", tmp_path / "offline.bin"
+    topics.write_text("Graph Theory\n\ngraph   theory\n")
+    assert build_offline_library.main(["--output", str(output), "--topics", str(topics), "--num-questions", "2"]) == 0
+    library = OfflineLibrary(str(output))
+    assert library.lookup(LESSON, "graph theory", "deep_dive").text.startswith("lesson #")
+    assert json.loads(library.lookup(QUIZ, "graph theory").text)
+    assert "Python Functions" in library.topics and library.meta["model"] == service.router.model_ids[0]
+    # Diagrams were attempted, but invalid ones are not packed.
+    assert any("Mermaid" in prompt for prompt in model.prompts)
+    assert DIAGRAM not in library.meta["counts"]
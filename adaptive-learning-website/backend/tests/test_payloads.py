@@ -0,0 +1,51 @@
+"""
+Tests for serialize-once payload storage
+"""
+import gzip
+import json
+
+from backend.app.services.payloads import PayloadStore, etag_matches
+
+
+def _course(n_modules: int = 60) -> dict:
+    return {"course": {"title": "Graphs", "modules": [{"title": f"Module {i}", "lessons": []} for i in range(n_modules)]}}
+
+
+def test_payload_is_encoded_once_and_keyed_by_content(tmp_path):
+    store = PayloadStore()
+    encoded = store.put("course", _course())
+    body = json.loads(encoded.identity)
+    assert list(body) == ["id", "course"] and body["id"] == encoded.id
+    assert gzip.decompress(encoded.gzip) == encoded.identity
+    assert store.put("course", _course()) is encoded
+    assert store.put("saga", _course()).id != encoded.id
+    assert store.get("course", encoded.id) is encoded and store.get("course", "missing") is None
+    assert store.stats()["deduplicated"] == 1 and store.stats()["misses"] == 1
+    tiny = store.put("course", {"course": {}})
+    assert tiny.gzip is None and tiny.select("gzip") == (None, tiny.identity)
+
+
+def test_encoding_negotiation_and_etags():
+    encoded = PayloadStore().put("course", _course())
+    assert encoded.select("gzip, deflate")[0] == "gzip"
+    assert encoded.select("gzip;q=0, identity")[0] is None
+    assert encoded.select("*")[0] in ("gzip", "br")
+    assert encoded.select(None)[0] is None
+    assert etag_matches(f'"other", W/{encoded.etag}', encoded.etag)
+    assert etag_matches("*", encoded.etag) and not etag_matches('"other"', encoded.etag)
+    assert encoded.etag_for("br") == f'"{encoded.id}-br"' and encoded.etag_for(None) == encoded.etag
+    # Any variant's tag revalidates the payload, whatever encoding is sent now.
+    assert etag_matches(encoded.etag_for("gzip"), encoded.etag_for("br"))
+    assert etag_matches(f'W/{encoded.etag_for("br")}', encoded.etag)
+    assert not etag_matches('"other-gzip"', encoded.etag)
+
+
+def test_directory_backed_store_serves_other_instances(tmp_path):
+    encoded = PayloadStore(directory=str(tmp_path)).put("saga", _course())
+    other = PayloadStore(directory=str(tmp_path))
+    loaded = other.get("saga", encoded.id)
+    assert loaded.identity == encoded.identity and loaded.gzip == encoded.gzip
+    assert other.get("course", encoded.id) is None and other.get("saga", "../x") is None
+    small = PayloadStore(max_bytes=1)
+    first, second = small.put("saga", _course(1)), small.put("saga", _course(2))
+    assert small.get("saga", first.id) is None and small.get("saga", second.id) is second
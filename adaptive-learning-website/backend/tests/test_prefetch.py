@@ -0,0 +1,59 @@
+"""
+Tests for the lesson response cache and speculative prefetch
+"""
+import asyncio
+
+from backend.app.services.response_cache import ResponseCache
+
+
+def test_prefetch_makes_adjacent_slider_moves_cache_hits(fake_gemini):
+    service, model = fake_gemini(prefetch=True)
+
+    async def scenario():
+        await service.generate_study_tool("explain", topic="Loops", difficulty=50)
+        await service.prefetcher.drain()
+        generated = len(model.prompts)
+        await service.generate_study_tool("explain", topic="loops", difficulty=10)
+        return generated
+
+    generated = asyncio.run(scenario())
+    # standard, then simplify + deep_dive speculatively; the slider move is free.
+    assert generated == 3
+    stats = service.cache.stats()
+    assert stats["prefetch_stored"] == 2 and stats["prefetch_hits"] == 1
+    service.cache.clear()
+    assert service.cache.stats()["prefetch_wasted"] == 1
+
+
+def test_prefetch_is_opt_in_and_budgeted(monkeypatch, fake_gemini):
+    monkeypatch.delenv("GEMINI_CACHE", raising=False)
+    service, model = fake_gemini()
+    asyncio.run(service.generate_study_tool("explain", topic="Loops", difficulty=50))
+    asyncio.run(service.generate_study_tool("explain", topic="Loops", difficulty=50))
+    # Without prefetch or GEMINI_CACHE every request reaches the model.
+    assert len(model.prompts) == 2 and service.prefetcher is None
+    assert not service.cache.enabled and len(service.cache) == 0
+
+    monkeypatch.setenv("GEMINI_CACHE", "1")
+    service, model = fake_gemini()
+    asyncio.run(service.generate_study_tool("explain", topic="Loops", difficulty=50))
+    asyncio.run(service.generate_study_tool("explain", topic="Loops", difficulty=50))
+    assert len(model.prompts) == 1 and service.cache.enabled
+
+    monkeypatch.setenv("GEMINI_PREFETCH_BUDGET_PER_MINUTE", "1")
+    service, model = fake_gemini(prefetch=True)
+
+    async def scenario():
+        await service.generate_study_tool("explain", topic="Loops", difficulty=50)
+        await service.prefetcher.drain()
+
+    asyncio.run(scenario())
+    assert len(model.prompts) == 2
+    assert service.prefetcher.stats()["skipped_budget"] == 1
+
+
+def test_cache_expires_entries():
+    cache = ResponseCache(ttl_seconds=0)
+    cache.put("k", "v", prefetched=True)
+    assert cache.get("k") is None
+    assert cache.stats()["prefetch_wasted"] == 1
@@ -0,0 +1,60 @@
+"""
+Tests for the sampling profiler and sampled request traces
+"""
+import threading
+import time
+
+import pytest
+
+from backend.app.services.profiling import _NULL_SPAN, RequestTracer, SamplingProfiler, span
+
+
+def _busy_loop(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(200))
+
+
+def test_profiler_collapses_a_busy_threads_stack():
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        collapsed = SamplingProfiler(interval=0.001).profile(0.2)
+    finally:
+        stop.set()
+        worker.join()
+    lines = collapsed.splitlines()
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy and any("_busy_loop (test_profiling.py" in line for line in busy)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_profiler_rejects_bad_durations_and_overlapping_runs():
+    profiler = SamplingProfiler(max_seconds=1)
+    with pytest.raises(RuntimeError):
+        profiler.profile(5)
+    started = threading.Event()
+
+    def run():
+        started.set()
+        profiler.profile(0.3)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    started.wait()
+    time.sleep(0.05)
+    assert profiler.running
+    with pytest.raises(RuntimeError):
+        profiler.profile(0.1)
+    thread.join()
+    assert not profiler.running and profiler.samples > 0
+
+
+def test_untraced_spans_are_a_shared_noop_and_rates_are_validated():
+    assert span("upstream") is _NULL_SPAN
+    tracer = RequestTracer()
+    assert not tracer.should_sample()
+    with pytest.raises(RuntimeError):
+        tracer.set_rate(1.5)
+    tracer.set_rate(1.0)
+    assert tracer.should_sample()
@@ -0,0 +1,72 @@
+"""
+Tests for batched saga progress and XP persistence
+"""
+import asyncio
+
+import pytest
+
+from backend.app.services.progress_store import ConnectionPool, ProgressWriter
+
+
+def _writer(tmp_path, **kwargs) -> ProgressWriter:
+    return ProgressWriter(ConnectionPool(str(tmp_path / "progress.db"), size=2), **kwargs)
+
+
+def test_burst_is_coalesced_into_one_batch(tmp_path):
+    writer = _writer(tmp_path, flush_interval=0.05)
+
+    async def burst():
+        await asyncio.gather(
+            *[writer.add_xp(f"s{i % 5}", 10) for i in range(100)],
+            writer.complete_chapter("s0", "chapter-1", xp_earned=500, next_chapter_id="chapter-2"),
+            writer.complete_chapter("s0", "chapter-1", xp_earned=500, next_chapter_id="chapter-2"),
+        )
+        return await writer.progress("s0")
+
+    progress = asyncio.run(burst())
+    assert progress["xp_points"] == 20 * 10 + 500
+    assert progress["chapters"] == [
+        {"chapter_id": "chapter-1", "status": "completed", "xp_earned": 500},
+        {"chapter_id": "chapter-2", "status": "active", "xp_earned": 0},
+    ]
+    stats = writer.stats()
+    assert stats["batches"] == 1 and stats["ops"] == 102 and stats["duplicate_completions"] == 1
+
+
+def test_completions_apply_in_order_and_are_idempotent(tmp_path):
+    writer = _writer(tmp_path, flush_interval=0.01, max_batch=2)
+
+    async def run():
+        # Chapter 2 is completed in the same window that chapter 1 unlocks it.
+        await asyncio.gather(
+            writer.complete_chapter("s1", "chapter-1", xp_earned=100, next_chapter_id="chapter-2"),
+            writer.complete_chapter("s1", "chapter-2", xp_earned=200, next_chapter_id="chapter-3"),
+            writer.complete_chapter("s1", "chapter-1", xp_earned=100, next_chapter_id="chapter-2"),
+        )
+        await writer.complete_chapter("s1", "chapter-2", xp_earned=200)
+        await writer.close()
+        return await writer.progress("s1")
+
+    progress = asyncio.run(run())
+    assert progress["xp_points"] == 300
+    assert [c["status"] for c in progress["chapters"]] == ["completed", "completed", "active"]
+    assert writer.stats()["batches"] >= 2
+
+
+def test_failed_batch_reports_to_every_caller(tmp_path):
+    writer = _writer(tmp_path, flush_interval=0.01)
+
+    async def run():
+        writer.pool._connections[0].execute("DROP TABLE students")
+        return await asyncio.gather(writer.add_xp("s1", 5), writer.add_xp("s2", 5), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, Exception) for r in results)
+    assert writer.stats()["failed_batches"] == 1
+    with pytest.raises(RuntimeError):
+        asyncio.run(_closed_submit(writer))
+
+
+async def _closed_submit(writer: ProgressWriter) -> None:
+    await writer.close()
+    await writer.add_xp("s1", 1)
@@ -0,0 +1,70 @@
+"""
+Tests for the prompt template registry and compaction A/B
+"""
+import pytest
+
+from backend.app.services.prompts import PromptRegistry, PromptTemplate, Removable, default_registry
+
+
+def _registry(**kwargs) -> PromptRegistry:
+    registry = PromptRegistry(min_trials=10, seed=7, **kwargs)
+    registry.register(
+        PromptTemplate(
+            "demo",
+            ["Answer about {topic} as JSON.\n", Removable("Example:\n    {{\"a\": 1}}\nBe thorough about {topic}!")],
+            output_tokens=40,
+        )
+    )
+    return registry
+
+
+def test_compact_variant_drops_removable_sections_and_routes_are_counted():
+    registry = _registry(compaction="ab")
+    variants = {}
+    for _ in range(20):
+        rendered = registry.render("demo", "/api/demo", topic="loops")
+        variants[rendered.variant] = rendered.text
+    assert variants["full"] == 'Answer about loops as JSON.\nExample:\n    {"a": 1}\nBe thorough about loops!'
+    assert variants["compact"] == "Answer about loops as JSON."
+    usage = registry.stats()["routes"]["/api/demo"]
+    assert usage["calls"] == 20 and usage["input_tokens"] > usage["instruction_tokens"] > 0
+    rendered = registry.render("demo", "/api/demo", topic="loops")
+    assert rendered.output_tokens == 40
+    registry.record(rendered, True, 0.2, "x" * 400)
+    assert registry.render("demo", "/api/demo", topic="x").output_tokens in (40, 100)
+    assert registry.stats()["routes"]["/api/demo"]["output_tokens"] == 100
+
+
+def test_auto_promotes_compact_once_full_is_reliable_and_reverts_on_regression():
+    registry = _registry(compaction="auto")
+    for _ in range(10):
+        assert registry.render("demo", "r", topic="t").variant == "full"
+        registry.record(registry.render("demo", "r", topic="t"), True, 0.5)
+    assert registry.phase["demo"] == "trial"
+    while registry.phase["demo"] == "trial":
+        rendered = registry.render("demo", "r", topic="t")
+        registry.record(rendered, True, 0.3 if rendered.variant == "compact" else 0.5)
+    assert registry.phase["demo"] == "compact"
+    stats = registry.stats()["templates"]["demo"]
+    assert stats["compact"]["latency_p50_ms"] < stats["full"]["latency_p50_ms"]
+    for _ in range(3):
+        registry.record(registry.render("demo", "r", topic="t"), False, 0.3)
+    assert registry.phase["demo"] == "full"
+
+
+def test_auto_keeps_full_when_compact_parses_worse():
+    registry = _registry(compaction="auto")
+    for _ in range(10):
+        registry.record(registry.render("demo", "r", topic="t"), True, 0.5)
+    while registry.phase["demo"] == "trial":
+        rendered = registry.render("demo", "r", topic="t")
+        registry.record(rendered, rendered.variant == "full", 0.3)
+    assert registry.phase["demo"] == "full"
+    with pytest.raises(RuntimeError):
+        PromptRegistry(compaction="always")
+
+
+def test_default_templates_shrink_when_compacted():
+    tokens = default_registry().stats()["templates"]
+    for name in ("course", "saga", "quiz"):
+        assert tokens[name]["instruction_tokens"]["compact"] < tokens[name]["instruction_tokens"]["full"]
@@ -0,0 +1,80 @@
+"""
+Tests for cross-worker AI quota accounting
+"""
+import multiprocessing
+
+import pytest
+
+from backend.app.services.quota import Limit, QuotaExceeded, SharedQuota, estimate_request_tokens
+
+
+NOW = 1_700_000_000.0
+
+
+def _quota(tmp_path, **kwargs) -> SharedQuota:
+    limits = {"student": [Limit(60, requests=3), Limit(3600, tokens=1000)], "org": [Limit(60, requests=5)]}
+    return SharedQuota(str(tmp_path / "quota.bin"), limits, **kwargs)
+
+
+def test_over_limit_is_rejected_without_counting(tmp_path):
+    quota = _quota(tmp_path)
+    principals = [("student", "s1"), ("org", "o1")]
+    for i in range(3):
+        quota.admit(principals, 100, now=NOW + i)
+    with pytest.raises(QuotaExceeded) as exc:
+        quota.admit(principals, 100, now=NOW + 3)
+    assert exc.value.principal == "student s1" and 0 < exc.value.retry_after <= 60
+    # The rejected request did not count against the org either.
+    assert quota.usage("org", "o1", now=NOW + 3)[0]["used_requests"] == 3
+    quota.admit([("student", "s2"), ("org", "o1")], 100, now=NOW + 3)
+    assert quota.stats()["rejected"] == 1
+
+
+def test_windows_slide_and_settle_corrects_tokens(tmp_path):
+    quota = _quota(tmp_path)
+    for i in range(3):
+        quota.admit([("student", "s1")], 100, now=NOW + i * 20)
+    # The first request (t=0) has left the minute window 61s later; tokens are hourly.
+    quota.admit([("student", "s1")], 100, now=NOW + 66)
+    usage = quota.usage("student", "s1", now=NOW + 66)
+    assert usage[0]["used_requests"] == 3 and usage[1]["used_tokens"] == 400
+    quota.settle([("student", "s1")], -300, now=NOW + 66)
+    quota.admit([("student", "s1")], 900, now=NOW + 130)
+    with pytest.raises(QuotaExceeded):
+        quota.admit([("student", "s1")], 1, now=NOW + 131)
+
+
+def test_full_stripe_evicts_the_stalest_principal(tmp_path):
+    quota = _quota(tmp_path, stripes=1, slots=2)
+    quota.admit([("student", "a")], 10, now=NOW)
+    quota.admit([("student", "b")], 10, now=NOW + 1)
+    quota.admit([("student", "c")], 10, now=NOW + 2)
+    assert quota.usage("student", "a", now=NOW + 2)[0]["used_requests"] == 0
+    assert quota.usage("student", "b", now=NOW + 2)[0]["used_requests"] == 1
+    quota.close()
+
+
+def _worker(path, results):
+    quota = SharedQuota(path, {"org": [Limit(60, requests=100)]})
+    admitted = 0
+    for _ in range(60):
+        try:
+            quota.admit([("org", "o1")], 10, now=NOW)
+            admitted += 1
+        except QuotaExceeded:
+            pass
+    results.put(admitted)
+
+
+def test_limit_holds_across_processes(tmp_path):
+    path = str(tmp_path / "quota.bin")
+    SharedQuota(path, {"org": [Limit(60, requests=100)]}).close()
+    ctx = multiprocessing.get_context("fork")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_worker, args=(path, results)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+    assert sum(results.get(timeout=5) for _ in workers) == 100
+    assert estimate_request_tokens("quiz", "x" * 40, 2) == 10 + 300
@@ -0,0 +1,114 @@
+"""
+Tests for the saga next-chapter recommender
+"""
+import asyncio
+
+import pandas as pd
+
+from backend.app.cli import build_recommender
+from backend.app.services.personalization import PersonalizationService
+from backend.app.services.recommender import ChapterRecommender, build_neighbors
+
+
+# Two tracks: web students do basics -> http -> flask, data students do basics -> numpy -> pandas.
+TRACKS = {
+    "web": ["Python Basics", "HTTP", "Flask", "Databases"],
+    "data": ["Python Basics", "NumPy", "Pandas", "Plotting"],
+}
+
+
+def _records(per_track: int = 10):
+    students, items = [], []
+    for track, topics in TRACKS.items():
+        for s in range(per_track):
+            for topic in topics[: 2 + s % 3]:
+                students.append(f"{track}-{s}")
+                items.append(topic)
+    return students, items
+
+
+def test_neighbours_follow_co_completion():
+    recommender = build_neighbors(*_records(), k=5, shrinkage=0.0)
+    assert [n["topic"] for n in recommender.similar("numpy")[:2]] == ["pandas", "python basics"]
+    picks = recommender.recommend(["Python Basics", "HTTP"], limit=2)
+    assert [p["topic"] for p in picks] == ["flask", "databases"]
+    assert recommender.recommend(["Quantum Computing"]) == []
+    assert "flask" not in {p["topic"] for p in recommender.recommend(["http"], exclude=["Flask"])}
+
+
+def test_min_support_drops_rare_pairs():
+    students, items = _records()
+    recommender = build_neighbors(students + ["x", "x"], items + ["Flask", "Plotting"], k=5, min_support=2)
+    assert "plotting" not in {n["topic"] for n in recommender.similar("flask")}
+
+
+def test_cli_builds_table_from_saga_progress_export(tmp_path):
+    students, items = _records()
+    frame = pd.DataFrame({"student_id": students, "chapter_id": items, "status": "completed"})
+    frame.loc[len(frame)] = ["web-0", "Plotting", "locked"]
+    source, output = tmp_path / "progress.csv", tmp_path / "recommender.npz"
+    frame.to_csv(source, index=False)
+    assert build_recommender.main([str(source), "--output", str(output), "--neighbors", "3"]) == 0
+    loaded = ChapterRecommender.load(str(output))
+    assert len(loaded) == 7 and loaded.stats()["students"] == 20
+    assert loaded.recommend(["pandas"], limit=1)[0]["topic"] == "numpy"
+
+
+def test_saga_uses_recommendations_before_the_llm(monkeypatch):
+    service = PersonalizationService(recommender=build_neighbors(*_records(), k=5))
+
+    async def no_llm(**kwargs):
+        raise AssertionError("LLM should not be called")
+
+    monkeypatch.setattr(service.gemini_service, "generate_content", no_llm)
+    chapters = asyncio.run(service.generate_personalized_saga(
+        "beginner", ["web_dev"], "moderate", ["games"], completed_topics=["Python Basics"]
+    ))
+    assert [c["chapter_number"] for c in chapters] == list(range(1, len(chapters) + 1))
+    assert len(chapters) >= 3 and service.saga_sources == {"recommender": 1, "llm": 0}
+
+
+def test_saga_min_score_sends_weak_picks_to_the_llm(monkeypatch):
+    service = PersonalizationService(recommender=build_neighbors(*_records(), k=5), min_score=1e9)
+    calls = []
+
+    async def llm(**kwargs):
+        calls.append(kwargs)
+        raise RuntimeError("offline")
+
+    monkeypatch.setattr(service.gemini_service, "generate_content", llm)
+    asyncio.run(service.generate_personalized_saga(
+        "beginner", ["web_dev"], "moderate", ["games"], completed_topics=["Python Basics"]
+    ))
+    assert calls and service.saga_sources["recommender"] == 0
+
+
+def test_next_chapters_route_applies_the_min_score(monkeypatch):
+    from fastapi.testclient import TestClient
+
+    from backend.app import main
+
+    service = PersonalizationService(recommender=build_neighbors(*_records(), k=5))
+    monkeypatch.setattr(main, "personalization_service", service)
+    client = TestClient(main.app)
+    body = {"completed_topics": ["Python Basics", "HTTP"], "limit": 2}
+    picks = client.post("/api/ai/saga/next-chapters", json=body).json()["recommendations"]
+    assert picks[0]["topic"] == "flask" and all(p["score"] >= service.min_score for p in picks)
+    service.min_score = 1e9
+    assert client.post("/api/ai/saga/next-chapters", json=body).json() == {"recommendations": []}
+
+
+def test_unusable_saga_responses_are_recorded_as_parse_failures(monkeypatch):
+    from backend.app.services.prompts import default_registry
+
+    service = PersonalizationService(prompts=default_registry("off"))
+    replies = iter(['{"title": "not a list"}', "[1, 2]", '[{"title": "Loops"}]'])
+
+    async def llm(**kwargs):
+        return next(replies)
+
+    monkeypatch.setattr(service.gemini_service, "generate_content", llm)
+    for _ in range(3):
+        asyncio.run(service.generate_personalized_saga("beginner", ["web_dev"], "moderate", ["games"]))
+    full = service.gemini_service.prompts.stats()["templates"]["saga"]["full"]
+    assert full["recorded"] == 3 and full["parse_success_rate"] == round(1 / 3, 4)
@@ -0,0 +1,117 @@
+"""
+Tests for the BM25 search index over generated courses and lessons
+"""
+import asyncio
+
+from backend.app.services.search_index import SearchIndex, tokenize
+
+
+COURSE = {
+    "title": "Mastering Recursion",
+    "description": "Think recursively about problems.",
+    "modules": [
+        {
+            "title": "Trees",
+            "description": "Walking tree structures",
+            "lessons": [{"title": "Depth-first search", "content": "DFS visits children before siblings."}],
+        }
+    ],
+}
+
+
+def _index() -> SearchIndex:
+    index = SearchIndex()
+    index.add("lesson:loops", "Loops", body="For loops and while loops repeat a block of code.")
+    index.add("lesson:recursion", "recursion", body="A recursive function calls itself until a base case.")
+    index.add_course("course:recursion", COURSE, topic="recursion")
+    return index
+
+
+def test_bm25_ranks_field_matches_and_filters_by_kind():
+    assert tokenize("The Loops are running") == ["loop", "running"]
+    index = _index()
+    results = index.search("recursion")
+    assert [r["id"] for r in results] == ["lesson:recursion", "course:recursion"]
+    assert results[0]["score"] >= results[1]["score"] > 0
+    assert [r["id"] for r in index.search("depth first search trees")] == ["course:recursion"]
+    assert [r["id"] for r in index.search("recursion", kind="course")] == ["course:recursion"]
+    assert index.search("quantum") == [] and index.search("the of and") == []
+
+
+def test_readding_a_document_replaces_it():
+    index = _index()
+    index.add("lesson:loops", "Loops", body="Iteration with range().")
+    assert index.search("while") == []
+    assert [r["id"] for r in index.search("iteration")] == ["lesson:loops"]
+    stats = index.stats()
+    assert stats["documents"] == 3 and stats["tombstoned"] == 1
+
+
+def test_posting_gaps_widen_only_when_needed():
+    index = SearchIndex()
+    index.add("first", "rare term")
+    for i in range(70_000):
+        index.add(f"filler-{i}", "filler")
+    index.add("last", "rare term")
+    postings = index._postings["rare"]
+    assert postings.gaps.typecode == "I" and list(postings.decode()[0]) == [0, 70_001]
+    assert index._postings["filler"].gaps.typecode == "B"
+    assert {r["id"] for r in index.search("rare")} == {"first", "last"}
+
+
+def test_snapshot_round_trip_keeps_results_and_accepts_new_documents(tmp_path):
+    index = _index()
+    path = str(tmp_path / "search.npz")
+    index.snapshot(path)
+    loaded = SearchIndex.load(path)
+    assert loaded.search("recursive function") == index.search("recursive function")
+    assert loaded.stats() == index.stats()
+    loaded.add("lesson:recursion-2", "recursion", body="Tail recursion.")
+    assert len(loaded.search("recursion")) == 3
+
+
+def test_periodic_snapshots_run_in_the_background_with_one_writer(tmp_path):
+    path = str(tmp_path / "search.npz")
+    worker_a = SearchIndex(snapshot_path=path, snapshot_every=2)
+    worker_b = SearchIndex(snapshot_path=path, snapshot_every=2)
+    for index, name in ((worker_a, "a"), (worker_b, "b")):
+        index.add(f"{name}-1", "loops", body="For loops repeat.")
+        index.add(f"{name}-2", "lists", body="Lists hold items.")
+
+    assert worker_a.maybe_snapshot(background=True)
+    worker_a.wait_for_snapshot()
+    # worker_a holds the writer lock, so worker_b leaves the file alone.
+    assert not worker_b.maybe_snapshot(background=True)
+    assert worker_a.adds_since_snapshot == 0 and worker_b.adds_since_snapshot == 2
+    assert {r["id"] for r in SearchIndex.load(path).search("loops")} == {"a-1"}
+
+
+def test_generated_lessons_become_searchable(fake_gemini):
+    index = SearchIndex()
+    service, _ = fake_gemini(text="Binary search halves the range each step.", search_index=index)
+    asyncio.run(service.generate_lesson("Binary Search", "simplify"))
+    [hit] = index.search("halves range")
+    assert hit["id"] == "lesson:binary search:simplify" and hit["kind"] == "lesson"
+
+
+def test_workers_index_what_others_saved_to_the_content_store(tmp_path, fake_gemini):
+    from backend.app.services.content_store import ContentStore
+
+    path = str(tmp_path / "content.db")
+    writer_index, reader_index = SearchIndex(), SearchIndex()
+    writer, _ = fake_gemini(text="Binary search halves the range each step.", search_index=writer_index,
+                            store=ContentStore(path))
+    reader, _ = fake_gemini(search_index=reader_index, store=ContentStore(path))
+    asyncio.run(writer.generate_lesson("Binary Search", "simplify"))
+    assert reader_index.search("halves range") == []
+
+    assert reader.index_stored() == 1
+    [hit] = reader_index.search("halves range")
+    assert hit["id"] == "lesson:binary search:simplify"
+    # Already indexed content is not added again, however often we refresh.
+    assert reader.index_stored() == 0 and writer.index_stored() == 0
+    assert reader_index.stats()["tombstoned"] == 0
+
+    snapshot = str(tmp_path / "index.npz")
+    reader_index.snapshot(snapshot)
+    assert SearchIndex.load(snapshot).synced_through == reader_index.synced_through > 0
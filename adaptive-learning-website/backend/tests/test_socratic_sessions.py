@@ -0,0 +1,81 @@
+"""
+Tests for stateful Socratic sessions
+"""
+import time
+
+from fastapi.testclient import TestClient
+
+from backend.app import main
+from backend.app.services.socratic_sessions import (
+    SocraticSession,
+    SocraticSessionStore,
+    estimate_tokens,
+)
+
+
+def test_prompt_stays_under_budget_as_session_grows():
+    session = SocraticSession("recursion", prompt_budget=800, synopsis_budget=150)
+    sizes = []
+    for turn in range(300):
+        message = f"Is turn {turn} about the base case? I think it stops when n is zero."
+        prompt = session.build_prompt(message)
+        sizes.append(estimate_tokens(prompt))
+        session.record_turn(message, f"What happens at step {turn} if n is negative? Try tracing it.")
+    assert max(sizes) <= 800
+    # Flat once compaction kicks in: no growth with session length.
+    assert max(sizes[100:]) - min(sizes[100:]) < 50
+    assert session.synopsis and "step 299" in session.build_prompt("next")
+
+
+def test_store_evicts_by_ttl_and_memory_cap():
+    store = SocraticSessionStore(ttl_seconds=60, max_sessions=3)
+    sessions = [store.create(f"topic {i}") for i in range(5)]
+    assert len(store) == 3 and store.get(sessions[0].session_id) is None
+
+    # The least recently used session has been idle past the TTL.
+    sessions[2].last_active = time.monotonic() - 120
+    assert store.stats()["evicted_ttl"] == 1 and store.get(sessions[2].session_id) is None
+
+    small = SocraticSessionStore(max_bytes=200)
+    first = small.create("a")
+    first.record_turn("x" * 150, "y" * 150)
+    small.touch(first)
+    assert len(small) == 0 and small.stats()["bytes"] == 0
+
+
+def test_websocket_streams_turns_and_resumes(monkeypatch):
+    prompts = []
+
+    async def fake_stream(prompt):
+        prompts.append(prompt)
+        for part in ("What do you ", "think happens?"):
+            yield part
+
+    monkeypatch.setattr(main.gemini_service, "stream_generate", fake_stream)
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/socratic") as ws:
+        ws.send_json({"type": "start", "topic": "closures"})
+        session_id = ws.receive_json()["session_id"]
+        ws.send_json({"type": "message", "text": "A closure captures variables."})
+        deltas = [ws.receive_json(), ws.receive_json()]
+        end = ws.receive_json()
+    assert [d["text"] for d in deltas] == ["What do you ", "think happens?"]
+    assert end["type"] == "turn_end" and end["turn"] == 1
+
+    with client.websocket_connect("/ws/socratic") as ws:
+        ws.send_json({"type": "start", "session_id": session_id})
+        assert ws.receive_json()["resumed"] is True
+        ws.send_json({"type": "message", "text": "So it keeps a reference?"})
+        while ws.receive_json()["type"] != "turn_end":
+            pass
+    assert "A closure captures variables." in prompts[-1]
+
+
+def test_websocket_caps_topics_and_rejects_oversized_frames():
+    client = TestClient(main.app)
+    with client.websocket_connect("/ws/socratic") as ws:
+        ws.send_text("x" * (main.MAX_SOCRATIC_FRAME_CHARS + 1))
+        assert ws.receive_json() == {"type": "error", "detail": "Message too large."}
+        ws.send_json({"type": "start", "topic": "recursion " * 100})
+        session_id = ws.receive_json()["session_id"]
+    assert len(main.socratic_sessions.get(session_id).topic) == main.MAX_SOCRATIC_TOPIC_CHARS
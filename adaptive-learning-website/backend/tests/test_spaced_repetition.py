@@ -0,0 +1,78 @@
+"""
+Tests for the spaced-repetition scheduler
+"""
+import numpy as np
+import pytest
+
+from backend.app.services.spaced_repetition import DAY_SECONDS, SpacedRepetitionScheduler, is_correct_answer
+
+
+NOW = 1_700_000_000
+ITEMS = [
+    {"question": f"Q{i}?", "options": ["a", "b"], "correctAnswer": "a"} for i in range(5)
+]
+
+
+def test_sm2_intervals_and_lapses():
+    srs = SpacedRepetitionScheduler(initial_cards=2)
+    (item, *_rest) = srs.register_items("alice", ITEMS, now=NOW)
+
+    intervals = []
+    for day in range(3):
+        srs.grade_many(["alice"], [item], [5], now=NOW + day)
+        intervals.append(srs.due_cards("alice", now=NOW + 10**9)[-1]["interval_days"])
+    assert intervals[:2] == [1.0, 6.0] and intervals[2] > 6.0
+
+    srs.grade_many(["alice"], [item], [1], now=NOW)
+    card = next(c for c in srs.due_cards("alice", limit=10, now=NOW + 10**9) if c["item_id"] == item)
+    assert card["interval_days"] == 1.0 and card["lapses"] == 1 and card["repetitions"] == 0
+    with pytest.raises(RuntimeError):
+        srs.grade_many(["alice"], ["missing"], [4], now=NOW)
+
+
+def test_stored_items_grade_answers():
+    srs = SpacedRepetitionScheduler()
+    (item_id, *_rest) = srs.register_items("alice", ITEMS, now=NOW)
+
+    item = srs.get_item(item_id)
+    assert item["question"] == "Q0?" and srs.get_item("missing") is None
+    assert is_correct_answer(item, " A ") and not is_correct_answer(item, "b")
+    assert not is_correct_answer({"correctAnswer": ""}, "")
+
+
+def test_due_queues_match_brute_force():
+    rng = np.random.default_rng(0)
+    srs = SpacedRepetitionScheduler(initial_cards=4)
+    students = [f"s{i}" for i in range(50)]
+    ids = []
+    for sid in students:
+        ids = srs.register_items(sid, ITEMS, now=NOW)
+    for step in range(5):
+        picks = rng.integers(0, 50, 400)
+        srs.grade_many(
+            [students[p] for p in picks],
+            [ids[i] for i in rng.integers(0, 5, 400)],
+            rng.integers(0, 6, 400).tolist(),
+            now=NOW + step * DAY_SECONDS,
+        )
+
+    check = NOW + 3 * DAY_SECONDS
+    due = srs.due[:len(srs)]
+    overdue = {
+        srs._student_ids[s] for s in np.unique(srs.student[:len(srs)][due <= check])
+    }
+    assert {e["student_id"] for e in srs.overdue_students(now=check, limit=1000)} == overdue
+    for sid in students[:10]:
+        cards = srs.due_cards(sid, limit=100, now=check)
+        assert [c["due"] for c in cards] == sorted(c["due"] for c in cards)
+        assert all(c["due"] <= check for c in cards)
+        assert len(cards) == srs.due_count(sid, now=check)
+
+
+def test_grading_without_create_needs_an_existing_card():
+    srs = SpacedRepetitionScheduler()
+    [item] = srs.register_items("alice", [{"question": "2+2?", "correctAnswer": "4"}], now=NOW)
+    with pytest.raises(RuntimeError):
+        srs.grade_many(["bob"], [item], [5], now=NOW, create=False)
+    assert srs.due_count("bob", now=NOW) == 0
+    assert srs.grade_many(["alice"], [item], [5], now=NOW, create=False) == 1
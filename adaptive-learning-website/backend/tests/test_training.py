@@ -0,0 +1,105 @@
+"""
+Tests for the out-of-core training pipeline
+"""
+import os
+import random
+
+import pandas as pd
+
+from backend.app.cli.train import aggregate_csv, train
+from backend.app.services.model_artifact import ModelArtifact, read_metadata
+
+
+def _write_dataset(path, n_students=60, rows_per_student=4):
+    rng = random.Random(7)
+    rows = []
+    for student in range(n_students):
+        result = rng.choice(["Pass", "Fail", "Distinction", "Withdrawn"])
+        for _ in range(rows_per_student):
+            rows.append({
+                "id_student": 1000 + student,
+                "code_module": rng.choice(["AAA", "BBB"]) if student % 2 else "AAA",
+                "code_presentation": "2013J",
+                "gender": "M" if student % 3 else "F",
+                "region": "East Anglian Region",
+                "highest_education": "HE Qualification",
+                "imd_band": "?" if student % 5 == 0 else "90-100%",
+                "age_band": "0-35",
+                "num_of_prev_attempts": 0,
+                "studied_credits": 60,
+                "disability": "N",
+                "score": rng.randint(0, 100),
+                "total_clicks": rng.randint(0, 50),
+                "total_vle_interactions": rng.randint(0, 20),
+                "final_result": result,
+            })
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def test_chunked_aggregation_matches_in_memory_groupby(tmp_path):
+    csv_path = tmp_path / "data.csv"
+    _write_dataset(csv_path)
+
+    streamed = aggregate_csv(str(csv_path), chunksize=7)
+    df = pd.read_csv(csv_path)
+    expected = df.groupby(["id_student", "code_module", "code_presentation"]).agg(
+        total_clicks=("total_clicks", "sum"), score=("score", "mean")
+    )
+
+    streamed = streamed.set_index(["id_student", "code_module", "code_presentation"]).sort_index()
+    assert len(streamed) == len(expected)
+    assert (streamed["total_clicks"].to_numpy() == expected.sort_index()["total_clicks"].to_numpy()).all()
+    assert abs(streamed["avg_assessment_score"].sum() - expected["score"].sum()) < 1e-2
+
+
+def test_train_writes_versioned_artifact_and_reuses_cache(tmp_path):
+    csv_path = tmp_path / "data.csv"
+    _write_dataset(csv_path)
+    kwargs = dict(
+        output_dir=str(tmp_path / "models"),
+        cache_dir=str(tmp_path / "cache"),
+        chunksize=50,
+        n_jobs=1,
+        n_estimators=5,
+        max_depth=3,
+    )
+
+    first = train(str(csv_path), **kwargs)
+    assert not first["metadata"]["cache_hit"]
+    assert [s["stage"] for s in first["metadata"]["stages"]] == ["aggregate", "encode", "fit", "evaluate"]
+
+    artifact = ModelArtifact.load(first["artifact_dir"])
+    assert artifact.version == first["metadata"]["version"]
+    assert read_metadata(first["artifact_dir"])["input_hash"] == first["metadata"]["input_hash"]
+    prediction = artifact.predict([{"code_module": "AAA", "studied_credits": 60, "total_clicks": 10}])
+    assert prediction[0] in artifact.metadata["classes"]
+
+    profile = first["metadata"]["reference_profile"]
+    assert profile["features"]["gender"]["type"] == "categorical"
+    assert artifact.get_drift_monitor() is not None
+
+    second = train(str(csv_path), **kwargs)
+    assert second["metadata"]["cache_hit"]
+    assert os.listdir(tmp_path / "cache")
+
+
+def test_compress_benchmarks_candidates_and_serves_one(tmp_path):
+    csv_path = tmp_path / "data.csv"
+    _write_dataset(csv_path)
+
+    result = train(
+        str(csv_path),
+        output_dir=str(tmp_path / "models"),
+        cache_dir=str(tmp_path / "cache"),
+        n_jobs=1,
+        n_estimators=60,
+        max_depth=4,
+        serve_candidate="pruned_forest_25",
+    )
+
+    report = result["metadata"]["compression"]
+    names = [c["name"] for c in report["candidates"]]
+    assert names[0] == "teacher" and "distilled_gbdt" in names
+    assert all(c["size_kb"] > 0 and c["single_row_p50_ms"] is not None for c in report["candidates"])
+    artifact = ModelArtifact.load(result["artifact_dir"])
+    assert len(artifact.model.estimators_) == 25